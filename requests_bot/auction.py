@@ -6,8 +6,6 @@
 
 import re
 import time
-import json
-import os
 from bs4 import BeautifulSoup
 from urllib.parse import urljoin
 
@@ -18,6 +16,8 @@ from .backpack import (
     add_to_auction_blacklist,
 )
 from .config import get_craft_items
+from .price_service import get_price_service
+from . import order_book
 from .sales_tracker import record_listed
 from .watchdog import reset_watchdog
 
@@ -81,31 +81,10 @@ CRAFT_ITEM_NAMES = {
 # Кэш цен аукциона (чтобы боты не перебивали друг друга)
 # ============================================
 
-PRICE_CACHE_FILE = os.path.join(os.path.dirname(__file__), "..", "profiles", "auction_price_cache.json")
+# Хранилище — общий PriceService (shared_prices.json, серебро/шт)
 PRICE_CACHE_TTL = 24 * 60 * 60  # 24 часа в секундах
 
 
-def load_price_cache() -> dict:
-    """Загружает кэш цен из файла"""
-    try:
-        if os.path.exists(PRICE_CACHE_FILE):
-            with open(PRICE_CACHE_FILE, "r", encoding="utf-8") as f:
-                return json.load(f)
-    except Exception as e:
-        print(f"[AUCTION] Ошибка чтения кэша цен: {e}")
-    return {}
-
-
-def save_price_cache(cache: dict):
-    """Сохраняет кэш цен в файл"""
-    try:
-        os.makedirs(os.path.dirname(PRICE_CACHE_FILE), exist_ok=True)
-        with open(PRICE_CACHE_FILE, "w", encoding="utf-8") as f:
-            json.dump(cache, f, ensure_ascii=False, indent=2)
-    except Exception as e:
-        print(f"[AUCTION] Ошибка записи кэша цен: {e}")
-
-
 def get_cached_price(item_name: str) -> int | None:
     """
     Получает цену из кэша если она свежая.
@@ -113,19 +92,17 @@ def get_cached_price(item_name: str) -> int | None:
     Returns:
         int: цена за единицу в серебре, или None если кэш устарел/отсутствует
     """
-    cache = load_price_cache()
-
-    if item_name not in cache:
+    service = get_price_service()
+    entry = service.get_entry(item_name)
+    if not entry:
         return None
 
-    entry = cache[item_name]
-    age = time.time() - entry.get("timestamp", 0)
-
+    age = time.time() - entry.get("ts", 0)
     if age > PRICE_CACHE_TTL:
         print(f"[AUCTION] Кэш для '{item_name}' устарел ({age/3600:.1f}ч)")
         return None
 
-    price = entry.get("price_per_unit", 0)
+    price = int(entry.get("silver", 0))
     profile = entry.get("profile", "?")
     hours_ago = age / 3600
     print(f"[AUCTION] Цена из кэша: {item_name} = {price}с/шт ({profile}, {hours_ago:.1f}ч назад)")
@@ -135,15 +112,7 @@ def get_cached_price(item_name: str) -> int | None:
 
 def set_cached_price(item_name: str, price_per_unit: int, profile: str = "unknown"):
     """Записывает цену в кэш"""
-    cache = load_price_cache()
-
-    cache[item_name] = {
-        "price_per_unit": price_per_unit,
-        "timestamp": time.time(),
-        "profile": profile
-    }
-
-    save_price_cache(cache)
+    get_price_service().set(item_name, price_per_unit, source="auction", profile=profile)
     print(f"[AUCTION] Кэш обновлён: {item_name} = {price_per_unit}с/шт")
 
 
@@ -238,49 +207,34 @@ class AuctionClient:
 
         return 1
 
-    def get_competitor_min_price(self):
+    @staticmethod
+    def _parse_lot(lot):
         """
-        Получает минимальную цену конкурента.
+        Количество и цена выкупа одного лота.
 
         Returns:
-            tuple: (gold, silver, count) или (0, 0, 0) если конкурентов нет
+            tuple: (gold, silver, count, ours) или None если кнопки выкупа нет
         """
-        soup = self.client.soup()
-        if not soup:
-            return 0, 0, 0
-
-        # Ищем лоты конкурентов (у которых есть кнопка-ссылка "выкупить")
         # Наш собственный лот имеет span.go-btn (не кликабельный), а конкуренты - a.go-btn
-        all_lots = soup.select("div.list-el")
-        competitor = None
-        for lot in all_lots:
-            # Проверяем есть ли кнопка-ссылка (a, не span)
-            buy_btn = lot.select_one("a.go-btn._auction")
-            if buy_btn:
-                competitor = lot
-                break
-
-        if not competitor:
-            return 0, 0, 0
+        buy_btn = lot.select_one("a.go-btn._auction")
+        ours = buy_btn is None
+        if ours:
+            buy_btn = lot.select_one("span.go-btn._auction")
+            if not buy_btn:
+                return None
 
         # Получаем количество в лоте
         count = 1
-        count_span = competitor.select_one("span.e-count")
+        count_span = lot.select_one("span.e-count")
         if count_span:
             text = count_span.get_text(strip=True)
             match = re.search(r'[xх](\d+)', text, re.IGNORECASE)
             if match:
                 count = int(match.group(1))
 
-        # Получаем цену выкупа
-        buy_btn = competitor.select_one("a.go-btn._auction")
-
         gold = 0
         silver = 0
 
-        # Парсим HTML кнопки для извлечения цены
-        btn_html = str(buy_btn)
-
         # Ищем золото - число перед иконкой золота или после
         gold_icon = buy_btn.select_one("span.i12-money_gold")
         silver_icon = buy_btn.select_one("span.i12-money_silver")
@@ -297,7 +251,38 @@ class AuctionClient:
         elif silver_icon and len(numbers) >= 1:
             silver = int(numbers[0])
 
-        return gold, silver, count
+        return gold, silver, count, ours
+
+    def get_competitor_min_price(self, item_name=None):
+        """
+        Получает минимальную цену конкурента.
+
+        Если передан item_name — все лоты страницы публикуются в общий
+        стакан (order_book) и историю цен.
+
+        Args:
+            item_name: Название предмета (для стакана)
+
+        Returns:
+            tuple: (gold, silver, count) или (0, 0, 0) если конкурентов нет
+        """
+        soup = self.client.soup()
+        if not soup:
+            return 0, 0, 0
+
+        parsed = [p for p in (self._parse_lot(lot) for lot in soup.select("div.list-el")) if p]
+
+        if item_name and parsed:
+            order_book.publish(item_name, [(count, gold * 100 + silver, ours)
+                                           for gold, silver, count, ours in parsed],
+                               source="auction", profile=self.profile)
+
+        # Первый лот конкурента (у которого есть кнопка-ссылка "выкупить")
+        for gold, silver, count, ours in parsed:
+            if not ours:
+                return gold, silver, count
+
+        return 0, 0, 0
 
     @staticmethod
     def _apply_demand_multiplier(total_silver, item_name):
@@ -336,7 +321,7 @@ class AuctionClient:
         #         return gold, silver
 
         # Смотрим конкурентов на рынке
-        comp_gold, comp_silver, comp_count = self.get_competitor_min_price()
+        comp_gold, comp_silver, comp_count = self.get_competitor_min_price(item_name=item_name)
 
         if comp_count == 0 or (comp_gold == 0 and comp_silver == 0):
             # Конкурентов нет - используем дефолтную цену
@@ -436,6 +421,72 @@ class AuctionClient:
 
         return "success"
 
+    def list_item(self, name, auction_url, stats):
+        """
+        Выставляет один предмет: страница аукциона → цена → лот.
+
+        Args:
+            name: Название предмета
+            auction_url: URL кнопки "аукцион" из рюкзака
+            stats: Статистика sell_all (listed/errors обновляются)
+
+        Returns:
+            str: "listed", "error",
+                 "no_price" / "low_price" — добавлен в blacklist, надо разобрать,
+                 "no_price_exempt" / "low_price_exempt" — не продаём, но и не разбираем
+        """
+        # Переходим на страницу аукциона
+        print(f"[AUCTION] Выставляю: {name}")
+        self.client.get(auction_url)
+        time.sleep(0.5)
+
+        # Получаем наше количество
+        my_count = self.get_my_item_count()
+
+        # Рассчитываем цену
+        comp_gold, comp_silver, comp_count = self.get_competitor_min_price()
+
+        # Рассчитываем цену (с учётом дефолтных цен для железа)
+        gold, silver = self.calculate_price(my_count, item_name=name)
+
+        if gold is None:
+            if is_blacklist_exempt(name):
+                # Крафт/осколки - не блеклистим, пропускаем
+                print(f"[AUCTION] Нет конкурентов для '{name}' - пропускаем (exempt)")
+                return "no_price_exempt"
+            # Неизвестный предмет без конкурентов - разбираем и добавляем в blacklist
+            print(f"[AUCTION] Нет конкурентов для '{name}' - разбираем, добавляю в blacklist")
+            add_to_auction_blacklist(name)
+            return "no_price"
+
+        if comp_gold > 0 or comp_silver > 0:
+            print(f"[AUCTION] Конкурент: {comp_gold}g {comp_silver}s за x{comp_count}")
+        print(f"[AUCTION] Наш товар: x{my_count} -> ставим {gold}g {silver}s")
+
+        # Создаём лот
+        result = self.try_create_lot(gold, silver)
+
+        if result == "success":
+            print(f"[AUCTION] Лот создан!")
+            stats["listed"] += 1
+            # Записываем в статистику продаж
+            record_listed(name, my_count, gold, silver, profile=self.profile)
+            order_book.add_own_lot(name, my_count, gold * 100 + silver, self.profile)
+            time.sleep(0.5)
+            return "listed"
+
+        if result == "low_price":
+            if is_blacklist_exempt(name):
+                print(f"[AUCTION] Цена слишком низкая для '{name}' - пропускаем (exempt)")
+                return "low_price_exempt"
+            print(f"[AUCTION] Цена слишком низкая - '{name}' для разборки, добавляю в blacklist")
+            add_to_auction_blacklist(name)
+            return "low_price"
+
+        print(f"[AUCTION] Ошибка при создании лота")
+        stats["errors"] += 1
+        return "error"
+
     def sell_all(self, max_pages=3):
         """
         Выставляет все подходящие предметы на аукцион.
@@ -536,18 +587,12 @@ class AuctionClient:
             is_green = target["is_green"]
             difficulty = target.get("difficulty")  # None, "normal", "heroic", "brutal"
 
-            # Предметы со сложностью normal/heroic - разбираем (только brutal продаём)
-            if difficulty and difficulty != "brutal" and "disassemble" in target["buttons"]:
-                print(f"[AUCTION] '{name}' сложность {difficulty} (не brutal) - разбираем")
-                if self.backpack.disassemble_item(target):
-                    stats["disassembled"] += 1
-                current_page = 1  # предметы сдвинулись
-                continue
-
-            # Зелёные предметы с кнопкой разборки - разбираем
-            # Зелёные БЕЗ кнопки разборки - выставляем на аукцион
-            if is_green and "disassemble" in target["buttons"]:
-                print(f"[AUCTION] '{name}' зелёный с разборкой - разбираем")
+            # Зелёные и normal/heroic (продаём только brutal) с кнопкой
+            # разборки - разбираем; без разборки - выставляем на аукцион.
+            # Решение общее с очисткой рюкзака (items.classify)
+            if target.action() == "disassemble":
+                reason = "зелёный" if is_green else f"сложность {difficulty} (не brutal)"
+                print(f"[AUCTION] '{name}' {reason} с разборкой - разбираем")
                 if self.backpack.disassemble_item(target):
                     stats["disassembled"] += 1
                 current_page = 1  # предметы сдвинулись
@@ -560,60 +605,12 @@ class AuctionClient:
                 current_page = 1
                 continue
 
-            # Переходим на страницу аукциона
-            print(f"[AUCTION] Выставляю: {name}")
-            auction_url = target["buttons"]["auction"]
-            self.client.get(auction_url)
-            time.sleep(0.5)
-
-            # Получаем наше количество
-            my_count = self.get_my_item_count()
-
-            # Рассчитываем цену
-            comp_gold, comp_silver, comp_count = self.get_competitor_min_price()
-
-            # Рассчитываем цену (с учётом дефолтных цен для железа)
-            gold, silver = self.calculate_price(my_count, item_name=name)
-
-            if gold is None:
-                if is_blacklist_exempt(name):
-                    # Крафт/осколки - не блеклистим, пропускаем
-                    print(f"[AUCTION] Нет конкурентов для '{name}' - пропускаем (exempt)")
-                    continue
-                # Неизвестный предмет без конкурентов - разбираем и добавляем в blacklist
-                print(f"[AUCTION] Нет конкурентов для '{name}' - разбираем, добавляю в blacklist")
-                add_to_auction_blacklist(name)
+            status = self.list_item(name, target["buttons"]["auction"], stats)
+            if status in ("no_price", "low_price"):
                 items_to_disassemble.append(name)
-                continue
-
-            if comp_gold > 0 or comp_silver > 0:
-                print(f"[AUCTION] Конкурент: {comp_gold}g {comp_silver}s за x{comp_count}")
-            print(f"[AUCTION] Наш товар: x{my_count} -> ставим {gold}g {silver}s")
-
-            # Создаём лот
-            result = self.try_create_lot(gold, silver)
-
-            # После аукциона всегда сбрасываем на стр.1 (предметы сдвигаются)
-            current_page = 1
-
-            if result == "success":
-                print(f"[AUCTION] Лот создан!")
-                stats["listed"] += 1
-                # Записываем в статистику продаж
-                record_listed(name, my_count, gold, silver, profile=self.profile)
-                time.sleep(0.5)
-
-            elif result == "low_price":
-                if is_blacklist_exempt(name):
-                    print(f"[AUCTION] Цена слишком низкая для '{name}' - пропускаем (exempt)")
-                else:
-                    print(f"[AUCTION] Цена слишком низкая - '{name}' для разборки, добавляю в blacklist")
-                    add_to_auction_blacklist(name)
-                    items_to_disassemble.append(name)
-
-            else:
-                print(f"[AUCTION] Ошибка при создании лота")
-                stats["errors"] += 1
+            if status not in ("no_price", "no_price_exempt"):
+                # После аукциона всегда сбрасываем на стр.1 (предметы сдвигаются)
+                current_page = 1
 
         # Разбираем предметы с низкой ценой
         if items_to_disassemble:
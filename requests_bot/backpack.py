@@ -11,8 +11,10 @@ from bs4 import BeautifulSoup
 from urllib.parse import urljoin
 
 from requests_bot.config import (
-    BASE_URL, AUCTION_BLACKLIST_FILE, BACKPACK_THRESHOLD, get_protected_items, is_unprotected_override
+    BASE_URL, AUCTION_BLACKLIST_FILE, BACKPACK_THRESHOLD
 )
+from requests_bot.watchdog import reset_watchdog
+from requests_bot.items import Item, KEEP, DROP, JUNK_DROP_PREFIXES, classify, quality_from_classes
 
 # Чёрный список аукциона - вечный (без TTL)
 
@@ -31,16 +33,9 @@ def is_protected_item(item_name):
 
     Список исключений (unprotected) переопределяет защиту:
     если предмет в исключениях — вернём False даже если он матчит protected.
+    Решение берётся из общего кэша items.classify.
     """
-    # Сначала проверяем исключения — они главнее
-    if is_unprotected_override(item_name):
-        return False
-
-    protected_items = get_protected_items()
-    for protected in protected_items:
-        if protected.lower() in item_name.lower():
-            return True
-    return False
+    return classify(item_name) == KEEP
 
 
 def load_auction_blacklist():
@@ -242,8 +237,7 @@ class BackpackClient:
                     count = int(match.group(1))
 
             # Качество (зелёный = iGood, легендарный = iLegendary)
-            is_green = "iGood" in classes
-            is_legendary = "iLegendary" in classes
+            quality = quality_from_classes(classes)
 
             # Сложность предмета (normal/hard/impossible) - из иконки
             # <img src="/images/icons/item_impossible.png"> = brutal
@@ -289,16 +283,9 @@ class BackpackClient:
             if difficulty and "auction" in buttons:
                 log_debug(f"[BACKPACK] '{name[:25]}' difficulty={difficulty}")
 
-            items.append({
-                "name": name,
-                "count": count,
-                "is_green": is_green,
-                "is_legendary": is_legendary,
-                # Легендарные = защищены, но список исключений переопределяет
-                "is_protected": False if is_unprotected_override(name) else (is_protected_item(name) or is_legendary),
-                "difficulty": difficulty,  # None, "normal", "heroic", "brutal"
-                "buttons": buttons,
-            })
+            # Защита/решение (легендарные = защищены, исключения главнее)
+            # считаются в items.classify один раз на (name, quality, difficulty)
+            items.append(Item(name, count, quality, difficulty, buttons))
 
         return items
 
@@ -379,19 +366,35 @@ class BackpackClient:
 
     def open_bonus(self, item):
         """
-        Открывает бонусный предмет.
+        Открывает одну штуку бонусного предмета.
+
+        После открытия перечитывает вернувшуюся страницу рюкзака и переносит
+        в item свежие кнопки и количество (URL открытия одноразовый). Если
+        предмета на странице больше нет — count = 0, кнопок нет.
 
         Args:
             item: Словарь с информацией о предмете
 
         Returns:
-            bool: Успешно ли
+            bool: Открыт ли (предмет исчез или его стало меньше)
         """
         if "open" not in item["buttons"]:
             return False
 
-        url = item["buttons"]["open"]
-        self.client.get(url)
+        before = item["count"]
+        self.client.get(item["buttons"]["open"])
+        items = self.get_items()
+        if not items and self.open_backpack():
+            # Открытие увело не в рюкзак (страница награды) — возвращаемся
+            items = self.get_items()
+
+        if not _update_item(item, items):
+            item["count"] = 0
+            item["buttons"] = {}
+        elif item["count"] >= before:
+            log_warning(f"[BACKPACK] Не удалось открыть: {item['name']}")
+            return False
+
         self.bonuses_opened += 1
         return True
 
@@ -400,20 +403,11 @@ class BackpackClient:
         if not self.open_backpack():
             return 0
 
-        # Ключевые слова для открываемых предметов
-        openable_keywords = ["бонус", "сундук", "ларец", "ящик", "шкатулка"]
-
         opened = 0
         for _ in range(50):  # Защита от бесконечного цикла
             items = self.get_items()
             # Ищем предметы с кнопкой "open" и подходящим названием
-            openable_items = []
-            for item in items:
-                if "open" not in item["buttons"]:
-                    continue
-                name_lower = item["name"].lower()
-                if any(kw in name_lower for kw in openable_keywords):
-                    openable_items.append(item)
+            openable_items = [item for item in items if is_openable(item)]
 
             if not openable_items:
                 break
@@ -525,12 +519,8 @@ class BackpackClient:
 
         return dropped
 
-    # Префиксы предметов-неликвида, которые ВЫКИДЫВАЕМ, а не продаём.
-    # Осколки + низкосортные самоцветы (Мутный/Треснувший/Надколотый):
-    # продаются копейками и вечно висят на аукционе (exempt от блэклиста) —
-    # по решению юзера выкидываем. is_protected проверяется отдельно, так что
-    # защищённые предметы (напр. "Треснутый Кристалл Тикуана") не затрагиваются.
-    JUNK_DROP_PREFIXES = ("Осколок", "Мутный", "Треснувший", "Надколотый")
+    # Префиксы неликвида (см. items.JUNK_DROP_PREFIXES)
+    JUNK_DROP_PREFIXES = JUNK_DROP_PREFIXES
 
     def drop_junk_stacks(self, skip_open=False):
         """
@@ -638,14 +628,97 @@ class BackpackClient:
 
         return False
 
+    def load_model(self, max_pages=3):
+        """
+        Открывает рюкзак и парсит все страницы по одному разу.
+
+        Returns:
+            BackpackModel или None если рюкзак не открылся
+        """
+        if not self.open_backpack():
+            return None
+        pages = [self.get_items()]
+        for page in range(2, max_pages + 1):
+            if not self.go_to_next_page(page - 1):
+                break
+            pages.append(self.get_items())
+        model = BackpackModel(pages)
+        log_debug(f"[BACKPACK] Разобрано страниц: {len(pages)}, предметов: {len(model)}")
+        return model
+
+    def _refetch_item(self, model, item):
+        """
+        Перечитывает страницу, где по модели сейчас лежит предмет, и
+        обновляет его кнопки и количество.
+
+        Returns:
+            bool: предмет найден на странице
+        """
+        page = model.page_of(item)
+        if not self.open_backpack():
+            return False
+        for p in range(1, page):
+            if not self.go_to_next_page(p):
+                return False
+        return _update_item(item, self.get_items())
+
+    def _refresh_item(self, model, item):
+        """
+        Свежие кнопки предмета перед действием.
+
+        Wicket-URL действуют только до следующей смены страницы, поэтому URL
+        из разбора модели годятся лишь для первого действия. Если текущая
+        страница — рюкзак с этим предметом (после разборки/выброса игра
+        возвращает в рюкзак), кнопки берутся с неё без запроса, иначе
+        страница предмета перечитывается.
+
+        Returns:
+            bool: предмет найден, кнопки обновлены
+        """
+        if "rack" in (self.client.current_url or "").lower() and _update_item(item, self.get_items()):
+            return True
+        return self._refetch_item(model, item)
+
+    def _apply(self, model, action, item):
+        """Разборка/выброс по свежему URL (страница перечитана перед действием)."""
+        do = self.disassemble_item if action == "disassemble" else self.drop_item
+        if not self._refresh_item(model, item):
+            log_warning(f"[BACKPACK] Предмет не найден в рюкзаке: {item['name']}")
+            return False
+        if action not in item["buttons"]:
+            return False
+        if do(item):
+            model.remove(item)
+            return True
+        return False
+
+    def _open_bonuses(self, model):
+        """
+        Открывает все бонусы/сундуки модели: стак — пока предмет не исчезнет
+        (кнопка берётся со страницы, перечитанной после каждого открытия).
+        """
+        opened = 0
+        # Сундуки/ларцы защищены от продажи, но открывать их надо
+        for item in [i for i in model.items if is_openable(i)]:
+            if opened >= 50 or not self._refresh_item(model, item):
+                continue
+            while is_openable(item) and opened < 50:
+                log_backpack(f"Открываю: {item['name']}")
+                if not self.open_bonus(item):
+                    break
+                opened += 1
+        return opened
+
     def cleanup(self, max_pages=3, profile: str = "unknown"):
         """
-        Полная очистка рюкзака.
+        Полная очистка рюкзака: разбор всех страниц, план, один проход.
 
-        1. Открывает бонусы
-        2. Выставляет на аукцион (через AuctionClient)
-        3. Разбирает предметы
-        4. Выбрасывает зелёные без пользы
+        1. Открывает бонусы (если открыли — рюкзак перечитывается: в нём
+           появилось содержимое сундуков)
+        2. Выбрасывает неликвид (осколки) ДО аукциона
+        3. Выставляет на аукцион (через AuctionClient.list_item)
+        4. Разбирает оставшееся
+        5. Выбрасывает предметы без аукциона/разборки
 
         Args:
             max_pages: Максимум страниц для обработки
@@ -663,51 +736,68 @@ class BackpackClient:
 
         log_backpack("Начинаю очистку рюкзака...")
 
-        # 1. Сначала открываем бонусы на всех страницах
-        for page in range(1, max_pages + 1):
-            if page > 1:
-                if not self.go_to_next_page(page - 1):
-                    break
-                log_debug(f"[BACKPACK] Страница {page} (бонусы)")
-
-            opened = self.open_all_bonuses()
-            stats["bonuses"] += opened
+        model = self.load_model(max_pages)
+        if model is None:
+            log_warning("[BACKPACK] Не удалось открыть рюкзак")
+            return stats
 
-        # 1.5 Выкидываем неликвид (осколки) ДО аукциона — чтобы не выставлялись
-        for page in range(1, max_pages + 1):
-            if not self.open_backpack():
-                break
-            if page > 1:
-                if not self.go_to_next_page(page - 1):
-                    break
-            stats["dropped"] += self.drop_junk_stacks(skip_open=True)
+        # 1. Бонусы — содержимое сундуков меняет рюкзак, поэтому перечитываем
+        stats["bonuses"] = self._open_bonuses(model)
+        if stats["bonuses"]:
+            model = self.load_model(max_pages)
+            if model is None:
+                return stats
 
-        # 2. Выставляем на аукцион (аукцион сам обрабатывает все страницы)
         try:
-            from requests_bot.auction import AuctionClient
+            from requests_bot.auction import AuctionClient, get_batch_size_for_item
             auction = AuctionClient(self.client, profile=profile)
-            auction_stats = auction.sell_all()
-            stats["auctioned"] = auction_stats.get("listed", 0)
-            stats["disassembled"] += auction_stats.get("disassembled", 0)
         except Exception as e:
             log_warning(f"[BACKPACK] Ошибка аукциона: {e}")
+            auction, get_batch_size_for_item = None, None
+
+        plan = plan_cleanup(model.items, load_auction_blacklist(), get_batch_size_for_item)
+        summary = {}
+        for _, action, _ in plan:
+            summary[action] = summary.get(action, 0) + 1
+        log_backpack(f"План очистки ({len(model)} предметов): {summary}")
+
+        auction_stats = {"listed": 0, "disassembled": 0, "errors": 0}
+        for phase, action, item in plan:
+            if action == "auction":
+                if auction is None:
+                    continue
+                reset_watchdog()
+                # Blacklist мог обновиться из mail
+                if item["name"] in load_auction_blacklist():
+                    log_backpack(f"'{item['name']}' в чёрном списке (recheck) - пропускаю")
+                    continue
+                if not self._refresh_item(model, item) or "auction" not in item["buttons"]:
+                    log_warning(f"[BACKPACK] Предмет не найден в рюкзаке: {item['name']}")
+                    continue
+                status = auction.list_item(item["name"], item["buttons"]["auction"], auction_stats)
+                if status == "listed":
+                    model.remove(item)
+                    continue
+                # Не продали: blacklisted — разобрать или выкинуть,
+                # остальное — разобрать, если можно (как раньше шаг разборки)
+                if "disassemble" in item["buttons"]:
+                    action = "disassemble"
+                elif status in ("no_price", "low_price") and "drop" in item["buttons"]:
+                    action = "drop"
+                else:
+                    continue
 
-        # 3. Разбираем оставшееся и выбрасываем мусор
-        for page in range(1, max_pages + 1):
-            if not self.open_backpack():
-                break
-            if page > 1:
-                if not self.go_to_next_page(page - 1):
-                    break
-                log_debug(f"[BACKPACK] Страница {page} (разборка)")
+            if action == "disassemble":
+                log_backpack(f"Разбираю: {item['name']}")
+            elif phase == "drop_junk":
+                log_backpack(f"Выбрасываю неликвид: {item['name']}")
+            else:
+                log_backpack(f"Выбрасываю (мусор): {item['name']}")
 
-            # Разбираем (включая зелёные) — skip_open чтобы не сбрасывать страницу
-            disassembled = self.disassemble_all(skip_green=False, skip_open=True)
-            stats["disassembled"] += disassembled
+            if self._apply(model, action, item):
+                stats["disassembled" if action == "disassemble" else "dropped"] += 1
 
-            # Выбрасываем ВСЕ бесполезные предметы (не только зелёные)
-            dropped = self.drop_unusable(skip_open=True)
-            stats["dropped"] += dropped
+        stats["auctioned"] = auction_stats["listed"]
 
         log_backpack(f"Очистка завершена: бонусов {stats['bonuses']}, аукцион {stats['auctioned']}, разобрано {stats['disassembled']}, выброшено {stats['dropped']}")
         return stats
@@ -733,6 +823,123 @@ class BackpackClient:
         return self.cleanup(max_pages)
 
 
+# ============================================
+# План очистки рюкзака
+# ============================================
+# Раньше каждый шаг cleanup (бонусы, неликвид, аукцион, разборка, мусор)
+# заново открывал рюкзак и перечитывал страницу после КАЖДОГО действия.
+# Теперь страницы парсятся один раз в BackpackModel, план действий
+# строится целиком (plan_cleanup) и выполняется за один проход. URL
+# действий одноразовые (Wicket), поэтому перед каждым действием кнопки
+# предмета берутся с текущей страницы рюкзака, а если его там нет —
+# со страницы, где он лежит по модели (сдвиг после удалений модель
+# учитывает локально).
+
+# Ключевые слова для открываемых предметов
+OPENABLE_KEYWORDS = ("бонус", "сундук", "ларец", "ящик", "шкатулка")
+
+# Порядок фаз плана (как шаги старого cleanup)
+PLAN_PHASES = ("drop_junk", "blacklist", "auction", "disassemble", "drop")
+
+
+class BackpackModel:
+    """
+    Все предметы рюкзака одним списком в порядке страниц.
+
+    Позиция предмета = индекс в списке, страница = позиция // page_size
+    (1-based). После удаления предмета всё, что было после него, сдвигается
+    на одну позицию — ровно как в игре.
+    """
+
+    def __init__(self, pages):
+        self.items = [item for page in pages for item in page]
+        # Размер страницы известен, только если страниц больше одной
+        self.page_size = len(pages[0]) if len(pages) > 1 and pages[0] else None
+
+    def page_of(self, item):
+        if not self.page_size or item not in self.items:
+            return 1
+        return self.items.index(item) // self.page_size + 1
+
+    def remove(self, item):
+        if item in self.items:
+            self.items.remove(item)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def _update_item(item, items):
+    """
+    Ищет тот же предмет (имя, качество, сложность) среди свежеразобранных и
+    переносит в него кнопки и количество.
+
+    Returns:
+        bool: предмет найден
+    """
+    for fresh in items:
+        if (fresh["name"] == item["name"] and fresh["quality"] == item["quality"]
+                and fresh["difficulty"] == item["difficulty"]):
+            item["buttons"] = fresh["buttons"]
+            item["count"] = fresh["count"]
+            return True
+    return False
+
+
+def is_openable(item):
+    if "open" not in item["buttons"]:
+        return False
+    name_lower = item["name"].lower()
+    return any(kw in name_lower for kw in OPENABLE_KEYWORDS)
+
+
+def plan_cleanup(items, blacklist, batch_size_for=None):
+    """
+    Решает, что делать с каждым предметом (без запросов к серверу).
+
+    Решение по предмету — items.classify (общий кэш с аукционом и крафтом),
+    с учётом кнопок — Item.action. Сверху: предметы из blacklist разбираем
+    или выкидываем, на аукцион — только при набранной партии.
+
+    Args:
+        items: предметы (get_items / BackpackModel.items)
+        blacklist: чёрный список аукциона
+        batch_size_for: name -> минимальная партия для аукциона (None — 1)
+
+    Returns:
+        list: [(phase, action, item), ...] в порядке выполнения,
+              action — "disassemble" / "drop" / "auction"
+    """
+    blacklist = set(blacklist)
+    planned = {phase: [] for phase in PLAN_PHASES}
+
+    for item in items:
+        if item.is_protected:
+            continue
+        buttons = item.buttons
+
+        if item.name in blacklist and item.decision != DROP:
+            if "disassemble" in buttons:
+                planned["blacklist"].append(("disassemble", item))
+            elif "drop" in buttons:
+                planned["blacklist"].append(("drop", item))
+            continue
+
+        batch_size = batch_size_for(item.name) if batch_size_for else 1
+        action = item.action(can_sell=item.count >= batch_size)
+        if action is None:
+            continue
+        if item.decision == DROP and action == "drop":
+            phase = "drop_junk"
+        elif "auction" in buttons and item.count >= batch_size:
+            phase = "auction"
+        else:
+            phase = action
+        planned[phase].append((action, item))
+
+    return [(phase, action, item) for phase in PLAN_PHASES for action, item in planned[phase]]
+
+
 def test_backpack(client):
     """Тест модуля рюкзака"""
     print("=" * 50)
@@ -35,6 +35,7 @@ from requests_bot.backpack import BackpackClient
 from requests_bot.popups import PopupsClient
 from requests_bot.pets import PetClient
 from requests_bot.stats import init_stats, get_stats, print_stats, set_stats_profile
+from requests_bot import write_behind
 from requests_bot.watchdog import (
     reset_watchdog, check_watchdog, reset_no_progress_counter,
     mark_progress, reset_progress_tracking, check_auto_recovery, trigger_auto_restart
@@ -1563,6 +1564,9 @@ class VMMOBot:
                     telegram_notify(f"🔄 [{username}] Авторестарт: нет прогресса 20+ мин")
                     raise AutoRestartException("Нет прогресса 20+ мин")
 
+                # Граница цикла — сбрасываем stats/resources, если пора
+                write_behind.flush_due()
+
                 if max_cycles and cycle >= max_cycles:
                     log_info(f"Достигнут лимит циклов ({max_cycles})")
                     break
@@ -1586,6 +1590,7 @@ class VMMOBot:
                 log_debug(f"Ошибка сохранения финальных ресурсов: {e}")
 
             self.print_session_stats()
+            write_behind.flush_all()
 
 
 def main():
@@ -1641,6 +1646,10 @@ def main():
             pass
     atexit.register(cleanup)
 
+    # Панель/TG останавливают бота SIGTERM'ом — сначала сбрасываем
+    # отложенные stats.json/resources.json (atexit на сигнал не срабатывает)
+    write_behind.install_signal_handlers()
+
     max_restarts = 10
     restart_count = 0
 
@@ -1,2 +1,3 @@
 # VMMO Bot Cache
-from .file_cache import FileCache, JSONCache
+from .file_cache import FileCache, JSONCache, atomic_write_json
+from .config_store import ConfigStore
@@ -0,0 +1,97 @@
+# ============================================
+# VMMO Config Store - общий кэш JSON-конфигов
+# ============================================
+# settings.json, profiles/<p>/config.json, protected/unprotected_items.json
+# читались с диска в куче мест, часто json.load на КАЖДЫЙ вызов
+# (get_setting, get_setting_from_disk, get_craft_items_from_disk,
+# get_config панели/TG).
+#
+# Теперь один FileCache(revalidate=True) на путь: документ парсится один
+# раз и перечитывается, только когда у файла сменились mtime/size. Правки
+# из панели/TG (другой процесс) бот видит на ближайшем обращении — ценой
+# одного stat(), без повторного парсинга. Запись атомарная, подписчики
+# on_change узнают об изменении (своей записи или чужой).
+#
+# read() отдаёт ОБЩИЙ объект — только для чтения. Кто собирается менять
+# документ и сохранять — берёт read_copy().
+# ============================================
+
+import copy
+import os
+import threading
+
+from .file_cache import FileCache
+
+
+class ConfigStore:
+    """Реестр FileCache по путям (пути нормализуются)."""
+
+    def __init__(self):
+        self._files = {}
+        self._lock = threading.Lock()
+
+    def file(self, path: str, indent: int = 2) -> FileCache:
+        """FileCache для пути (создаётся при первом обращении)."""
+        path = os.path.abspath(path)
+        fc = self._files.get(path)
+        if fc is None:
+            with self._lock:
+                fc = self._files.get(path)
+                if fc is None:
+                    fc = FileCache(path, name="CONFIG", revalidate=True, indent=indent)
+                    self._files[path] = fc
+        return fc
+
+    def read(self, path: str, default=None):
+        """
+        Документ из кэша (общий объект — НЕ менять).
+
+        Returns:
+            Распарсенный JSON или default, если файла нет или он битый
+        """
+        fc = self.file(path)
+        data = fc.data
+        return data if fc.loaded_ok else default
+
+    def read_copy(self, path: str, default=None):
+        """Глубокая копия документа (можно менять и сохранять через write)."""
+        return copy.deepcopy(self.read(path, default))
+
+    def write(self, path: str, data, indent: int = None) -> bool:
+        """
+        Атомарно записывает документ и обновляет кэш.
+
+        Args:
+            path: путь к файлу
+            data: документ (после записи кэш держит его копию)
+            indent: отступ JSON (по умолчанию — как у FileCache пути)
+
+        Returns:
+            bool: True если записано
+        """
+        fc = self.file(path)
+        if indent is not None:
+            fc.indent = indent
+        return fc.save(copy.deepcopy(data))
+
+    def on_change(self, path: str, callback):
+        """Подписка на изменение файла: callback(path, data)."""
+        self.file(path).on_change(callback)
+
+    def invalidate(self, path: str = None):
+        """Забывает кэш пути (или всех путей) — следующее чтение пойдёт с диска."""
+        with self._lock:
+            files = [self._files.get(os.path.abspath(path))] if path else list(self._files.values())
+        for fc in files:
+            if fc is not None:
+                fc._cache = None
+
+
+# Общий store процесса
+store = ConfigStore()
+
+read = store.read
+read_copy = store.read_copy
+write = store.write
+on_change = store.on_change
+invalidate = store.invalidate
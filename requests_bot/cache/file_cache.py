@@ -2,22 +2,71 @@
 # VMMO File Cache Base
 # ============================================
 # Базовый класс для JSON кэширования
-# Используется в: auction.py, craft_prices.py, sell_resources.py
+# Используется в: config_store (конфиги), auction.py, craft_prices.py, sell_resources.py
+#
+# revalidate=True — документ перечитывается, только если у файла сменились
+# (mtime, size) (один stat() на обращение вместо json.load). Запись —
+# атомарная (временный файл + os.replace), чтобы бот из другого процесса
+# не прочитал наполовину записанный JSON.
 # ============================================
 
 import os
+import sys
 import json
 import time
-from typing import Any, Dict, Optional
+import tempfile
+import threading
+from typing import Any, Callable, Dict, Optional
 from pathlib import Path
 
-# Логирование
-try:
-    from requests_bot.logger import log_debug, log_warning, log_error
-except ImportError:
-    def log_debug(msg): pass
-    def log_warning(msg): print(f"[WARN] {msg}")
-    def log_error(msg): print(f"[ERROR] {msg}")
+
+# Логирование — через logger, только если процесс его уже загрузил (бот).
+# Сами не импортируем: logger импортирует config (а config — этот модуль)
+# и при импорте открывает лог сессии, что не нужно панели и TG.
+def _log(level: str, msg: str):
+    logger = sys.modules.get("requests_bot.logger")
+    if logger is None:
+        if level != "debug":
+            print(f"[{level.upper()}] {msg}")
+        return
+    getattr(logger, f"log_{level}")(msg)
+
+
+def log_debug(msg): _log("debug", msg)
+def log_warning(msg): _log("warning", msg)
+def log_error(msg): _log("error", msg)
+
+
+def _file_sig(path: str):
+    """(mtime_ns, size) файла или None если его нет"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def atomic_write_json(path: str, data: Any, indent: int = 2):
+    """
+    Пишет JSON атомарно: во временный файл рядом и os.replace поверх.
+
+    Raises:
+        OSError, TypeError: ошибка записи/сериализации (файл не тронут)
+    """
+    dir_path = os.path.dirname(path)
+    if dir_path:
+        os.makedirs(dir_path, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=dir_path or ".", prefix=".tmp_", suffix=".json")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=indent)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
 
 
 class FileCache:
@@ -30,17 +79,26 @@ class FileCache:
         name: Имя кэша для логов
     """
 
-    def __init__(self, file_path: str, ttl: int = 0, name: str = "CACHE"):
+    def __init__(self, file_path: str, ttl: int = 0, name: str = "CACHE",
+                 revalidate: bool = False, indent: int = 2):
         """
         Args:
             file_path: Путь к файлу кэша
             ttl: Время жизни записей в секундах (0 = без ограничения)
             name: Имя для логирования
+            revalidate: Перечитывать файл, если он изменился на диске (stat)
+            indent: Отступ JSON при записи
         """
         self.file_path = file_path
         self.ttl = ttl
         self.name = name
+        self.revalidate = revalidate
+        self.indent = indent
+        self.loaded_ok = False  # файл есть и распарсился
         self._cache: Optional[Dict] = None
+        self._sig = None
+        self._lock = threading.RLock()
+        self._callbacks = []
 
     def load(self) -> Dict:
         """
@@ -49,18 +107,52 @@ class FileCache:
         Returns:
             Dict: Данные кэша или пустой словарь при ошибке
         """
-        try:
-            if os.path.exists(self.file_path):
-                with open(self.file_path, "r", encoding="utf-8") as f:
-                    self._cache = json.load(f)
+        with self._lock:
+            sig = _file_sig(self.file_path)
+            try:
+                if sig is not None:
+                    with open(self.file_path, "r", encoding="utf-8") as f:
+                        self._cache = json.load(f)
+                    self._sig = sig
+                    self.loaded_ok = True
                     return self._cache
-        except json.JSONDecodeError as e:
-            log_error(f"[{self.name}] Ошибка парсинга кэша: {e}")
-        except Exception as e:
-            log_warning(f"[{self.name}] Ошибка чтения кэша: {e}")
+            except json.JSONDecodeError as e:
+                log_error(f"[{self.name}] Ошибка парсинга кэша: {e}")
+            except Exception as e:
+                log_warning(f"[{self.name}] Ошибка чтения кэша: {e}")
+
+            # Битый/отсутствующий файл — пустой кэш до следующего изменения файла
+            self._cache = {}
+            self._sig = sig
+            self.loaded_ok = False
+            return self._cache
+
+    def _ensure_loaded(self):
+        """Загружает кэш при первом обращении (и при смене файла, если revalidate)."""
+        if self._cache is None:
+            self.load()
+        elif self.revalidate and _file_sig(self.file_path) != self._sig:
+            old = self._cache
+            self.load()
+            if self._cache != old:
+                log_debug(f"[{self.name}] Файл изменён снаружи, перечитан")
+                self._notify()
 
-        self._cache = {}
-        return self._cache
+    def on_change(self, callback: Callable[[str, Any], None]):
+        """
+        Подписка на изменение данных: callback(file_path, data).
+
+        Вызывается после save() и после перечитывания изменённого снаружи
+        файла (при revalidate — на ближайшем обращении, без фоновых потоков).
+        """
+        self._callbacks.append(callback)
+
+    def _notify(self):
+        for callback in list(self._callbacks):
+            try:
+                callback(self.file_path, self._cache)
+            except Exception as e:
+                log_warning(f"[{self.name}] Ошибка в обработчике изменений: {e}")
 
     def save(self, data: Dict = None):
         """
@@ -68,25 +160,28 @@ class FileCache:
 
         Args:
             data: Данные для сохранения (если None - сохраняет текущий кэш)
-        """
-        if data is not None:
-            self._cache = data
 
-        if self._cache is None:
-            return
+        Returns:
+            bool: True если записано
+        """
+        with self._lock:
+            if data is not None:
+                self._cache = data
 
-        try:
-            # Создаём директорию если нет
-            dir_path = os.path.dirname(self.file_path)
-            if dir_path:
-                os.makedirs(dir_path, exist_ok=True)
+            if self._cache is None:
+                return False
 
-            with open(self.file_path, "w", encoding="utf-8") as f:
-                json.dump(self._cache, f, ensure_ascii=False, indent=2)
+            try:
+                atomic_write_json(self.file_path, self._cache, self.indent)
+                self._sig = _file_sig(self.file_path)
+                self.loaded_ok = True
+                log_debug(f"[{self.name}] Кэш сохранён: {self.file_path}")
+            except Exception as e:
+                log_error(f"[{self.name}] Ошибка записи кэша: {e}")
+                return False
 
-            log_debug(f"[{self.name}] Кэш сохранён: {self.file_path}")
-        except Exception as e:
-            log_error(f"[{self.name}] Ошибка записи кэша: {e}")
+        self._notify()
+        return True
 
     def get(self, key: str, default: Any = None) -> Any:
         """
@@ -99,8 +194,7 @@ class FileCache:
         Returns:
             Значение или default
         """
-        if self._cache is None:
-            self.load()
+        self._ensure_loaded()
 
         return self._cache.get(key, default)
 
@@ -113,8 +207,7 @@ class FileCache:
             value: Значение
             save: Сохранять сразу в файл
         """
-        if self._cache is None:
-            self.load()
+        self._ensure_loaded()
 
         self._cache[key] = value
 
@@ -123,8 +216,7 @@ class FileCache:
 
     def delete(self, key: str, save: bool = True):
         """Удаляет ключ из кэша"""
-        if self._cache is None:
-            self.load()
+        self._ensure_loaded()
 
         if key in self._cache:
             del self._cache[key]
@@ -144,8 +236,7 @@ class FileCache:
     @property
     def data(self) -> Dict:
         """Возвращает все данные кэша"""
-        if self._cache is None:
-            self.load()
+        self._ensure_loaded()
         return self._cache
 
 
@@ -169,8 +260,7 @@ class JSONCache(FileCache):
         Returns:
             (value, timestamp) или (None, 0) если не найдено
         """
-        if self._cache is None:
-            self.load()
+        self._ensure_loaded()
 
         entry = self._cache.get(key, {})
         if isinstance(entry, dict) and "value" in entry:
@@ -212,8 +302,7 @@ class JSONCache(FileCache):
             value: Значение
             save: Сохранять сразу
         """
-        if self._cache is None:
-            self.load()
+        self._ensure_loaded()
 
         self._cache[key] = {
             "value": value,
@@ -258,8 +347,7 @@ class JSONCache(FileCache):
             max_age: Максимальный возраст
             save: Сохранять после очистки
         """
-        if self._cache is None:
-            self.load()
+        self._ensure_loaded()
 
         ttl = max_age if max_age is not None else self.ttl
         if ttl <= 0:
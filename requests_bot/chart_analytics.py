@@ -0,0 +1,325 @@
+# ============================================
+# VMMO Chart Analytics - агрегаты графиков на NumPy
+# ============================================
+# Графики панели (по минутам / по дням / заработок по дням) раньше
+# считались в питоне: разбор ISO-времени каждого снэпшота, вложенные
+# defaultdict и last_known по профилям.
+#
+# Здесь снэпшоты грузятся одним запросом из зеркала fleet_history в
+# массивы (время x профиль x ресурс), а дальше всё векторно:
+#   - forward-fill профиля между его снэпшотами (до первого — 0);
+#   - бакеты по минуте / локальному дню (последний снэпшот бакета);
+#   - первый/последний снэпшот дня профиля -> заработок за день;
+#   - сумма по профилям.
+# Длинные ряды прореживаются LTTB до MAX_POINTS точек — браузеру не
+# нужны тысячи точек на график шириной в экран.
+#
+# NumPy опционален: без него функции отдают те же ряды SQL-агрегатами
+# fleet_history (без прореживания).
+# ============================================
+
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, List
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+from requests_bot import fleet_history
+from requests_bot.resource_history import RESOURCE_COLUMNS
+
+# Максимум точек ряда, отдаваемых браузеру
+MAX_POINTS = 500
+
+MINUTE = 60
+DAY = 86400
+
+RESOURCE_KEYS = [RESOURCE_COLUMNS[c] for c in fleet_history.CHART_COLUMNS]
+
+
+# ═══════════════════════════════════════════════════════════════════
+# LTTB (Largest-Triangle-Three-Buckets)
+# ═══════════════════════════════════════════════════════════════════
+
+def lttb_indices(x, y, threshold: int = MAX_POINTS):
+    """
+    Индексы точек, которые оставляет LTTB.
+
+    Несколько рядов на общей оси x (ресурсы одного графика) прореживаются
+    одним набором индексов: ряды нормируются к [0, 1], площади
+    треугольников по рядам складываются.
+
+    Args:
+        x: время, shape (n,)
+        y: значения, shape (n,) или (n, k)
+        threshold: сколько точек оставить (первая и последняя — всегда)
+
+    Returns:
+        np.ndarray: отсортированные индексы
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64).reshape(n, -1)
+    low = y.min(axis=0)
+    span = y.max(axis=0) - low
+    span[span == 0] = 1
+    y = (y - low) / span
+
+    # Внутренние точки 1..n-2 делятся на threshold-2 бакетов
+    every = (n - 2) / (threshold - 2)
+    edges = (np.arange(threshold - 1) * every).astype(np.int64) + 1
+    edges[-1] = n - 1
+
+    # Средние всех бакетов сразу; последний "бакет" — последняя точка
+    starts = np.append(edges[:-1], n - 1)
+    sizes = np.diff(np.append(starts, n))[:, None]
+    avg_x = np.add.reduceat(x, starts) / sizes[:, 0]
+    avg_y = np.add.reduceat(y, starts, axis=0) / sizes
+
+    out = np.empty(threshold, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # Треугольник: выбранная точка, кандидат, среднее следующего бакета
+        area = np.abs((x[a] - avg_x[i + 1]) * (y[lo:hi] - y[a])
+                      - (x[a] - x[lo:hi])[:, None] * (avg_y[i + 1] - y[a])).sum(axis=1)
+        a = lo + int(area.argmax())
+        out[i + 1] = a
+    return out
+
+
+def downsample(timestamps: List, series: Dict[str, List], threshold: int = MAX_POINTS):
+    """
+    Прореживает ряды графика с общей осью времени.
+
+    Args:
+        timestamps: epoch-секунды точек
+        series: {ключ: значения}
+        threshold: максимум точек
+
+    Returns:
+        tuple: (timestamps, series) — те же типы, не длиннее threshold
+    """
+    if not NUMPY_AVAILABLE or len(timestamps) <= threshold or not series:
+        return timestamps, series
+    keys = list(series)
+    idx = lttb_indices(np.asarray(timestamps),
+                       np.column_stack([np.asarray(series[k]) for k in keys]), threshold)
+    return ([timestamps[i] for i in idx],
+            {k: [series[k][i] for i in idx] for k in keys})
+
+
+# ═══════════════════════════════════════════════════════════════════
+# Загрузка снэпшотов в массивы
+# ═══════════════════════════════════════════════════════════════════
+
+class Samples:
+    """
+    Снэпшоты профилей в виде массивов (по возрастанию времени).
+
+    Attributes:
+        ts: epoch-секунды, shape (n,)
+        profile: индекс профиля, shape (n,)
+        values: ресурсы (RESOURCE_KEYS), shape (n, R)
+        n_profiles: сколько профилей запрошено
+    """
+
+    def __init__(self, profiles: List[str]):
+        self.profiles = list(profiles)
+        self.n_profiles = len(profiles)
+        self.last_rowid = 0
+        self.ts = np.empty(0, dtype=np.int64)
+        self.profile = np.empty(0, dtype=np.int64)
+        self.values = np.empty((0, len(RESOURCE_KEYS)), dtype=np.int64)
+
+    def __len__(self):
+        return len(self.ts)
+
+    def extend(self, rows):
+        """Добавляет строки fleet_history.snapshots (rowid, profile, ts, *ресурсы)."""
+        if not rows:
+            return
+        pos = {p: i for i, p in enumerate(self.profiles)}
+        profile = np.fromiter((pos[row[1]] for row in rows), dtype=np.int64, count=len(rows))
+        data = np.array([row[2:] for row in rows], dtype=np.int64)
+        self.last_rowid = rows[-1][0]
+
+        ts = np.concatenate([self.ts, data[:, 0]])
+        profile = np.concatenate([self.profile, profile])
+        values = np.concatenate([self.values, data[:, 1:]])
+        # Старше срока хранения зеркала — не держим
+        keep = ts >= int(time.time()) - fleet_history.KEEP_DAYS * DAY
+        order = np.argsort(ts[keep], kind="stable")
+        self.ts = ts[keep][order]
+        self.profile = profile[keep][order]
+        self.values = values[keep][order]
+
+    def since(self, ts: int) -> "Samples":
+        """Снэпшоты начиная с ts (срез без копирования данных)."""
+        start = int(np.searchsorted(self.ts, ts, side="left"))
+        view = Samples.__new__(Samples)
+        view.profiles, view.n_profiles, view.last_rowid = self.profiles, self.n_profiles, self.last_rowid
+        view.ts, view.profile, view.values = self.ts[start:], self.profile[start:], self.values[start:]
+        return view
+
+    def local_day(self):
+        """Номер локального дня каждого снэпшота (дней от 1970-01-01)."""
+        hours, inverse = np.unique(self.ts // 3600, return_inverse=True)
+        offsets = np.array([time.localtime(int(h) * 3600).tm_gmtoff for h in hours],
+                           dtype=np.int64)
+        return (self.ts + offsets[inverse]) // DAY
+
+
+# Снэпшоты по наборам профилей: догружаются только новые строки зеркала
+_samples = {}
+_samples_lock = threading.Lock()
+
+
+def load_samples(profiles: List[str], hours: int) -> Samples:
+    """Снэпшоты профилей за последние hours часов."""
+    key = (id(fleet_history.get_fleet()), tuple(profiles))
+    with _samples_lock:
+        samples = _samples.get(key)
+        if samples is None:
+            samples = _samples[key] = Samples(profiles)
+        samples.extend(fleet_history.snapshots(profiles, samples.last_rowid))
+        return samples.since(int(time.time()) - hours * 3600)
+
+
+# ═══════════════════════════════════════════════════════════════════
+# Векторные операции
+# ═══════════════════════════════════════════════════════════════════
+
+def last_per_bucket(bucket, profile, n_profiles: int, values):
+    """
+    Сетка (бакет x профиль x ресурс) из последних снэпшотов бакета.
+
+    Returns:
+        tuple: (уникальные бакеты, сетка с NaN там, где снэпшота не было)
+    """
+    buckets, b_idx = np.unique(bucket, return_inverse=True)
+    grid = np.full((len(buckets), n_profiles, values.shape[1]), np.nan)
+    # Снэпшоты по возрастанию времени: переставляем так, чтобы последний
+    # снэпшот ячейки шёл первым, и берём первое вхождение ключа
+    key = b_idx * n_profiles + profile
+    _, first = np.unique(key[::-1], return_index=True)
+    last = len(key) - 1 - first
+    grid[b_idx[last], profile[last]] = values[last]
+    return buckets, grid
+
+
+def forward_fill(grid):
+    """NaN по оси времени (ось 0) -> последнее известное значение, до первого — 0."""
+    mask = ~np.isnan(grid)
+    idx = np.where(mask, np.arange(grid.shape[0]).reshape(-1, *([1] * (grid.ndim - 1))), 0)
+    np.maximum.accumulate(idx, axis=0, out=idx)
+    filled = np.take_along_axis(grid, idx, axis=0)
+    return np.nan_to_num(filled, nan=0.0)
+
+
+def first_last_per_bucket(bucket, profile, n_profiles: int, values):
+    """
+    Первый и последний снэпшот каждого (бакет, профиль).
+
+    Returns:
+        tuple: (уникальные бакеты, индекс бакета пары, первые значения, последние)
+    """
+    buckets, b_idx = np.unique(bucket, return_inverse=True)
+    key = b_idx * n_profiles + profile
+    keys, first = np.unique(key, return_index=True)
+    _, last_rev = np.unique(key[::-1], return_index=True)
+    last = len(key) - 1 - last_rev
+    return buckets, keys // n_profiles, values[first], values[last]
+
+
+# ═══════════════════════════════════════════════════════════════════
+# Ряды графиков панели (формат api_stats_chart)
+# ═══════════════════════════════════════════════════════════════════
+
+def _empty() -> Dict:
+    return {"timestamps": [], "resources": {r: [] for r in RESOURCE_KEYS}}
+
+
+def _day_iso(day: int, hour: int = 0) -> str:
+    d = date(1970, 1, 1) + timedelta(days=int(day))
+    return datetime(d.year, d.month, d.day, hour).isoformat() + '+03:00'
+
+
+def _series(totals) -> Dict[str, List[int]]:
+    return {r: totals[:, i].astype(np.int64).tolist() for i, r in enumerate(RESOURCE_KEYS)}
+
+
+def minute_totals(profiles: List[str], hours: int, max_points: int = MAX_POINTS) -> Dict:
+    """
+    Сумма ресурсов профилей на каждую минуту со снэпшотом (профиль без
+    снэпшота в эту минуту — последним известным значением).
+    """
+    if not NUMPY_AVAILABLE:
+        return fleet_history.minute_totals(profiles, hours)
+
+    s = load_samples(profiles, hours)
+    if not len(s):
+        return _empty()
+
+    minutes, grid = last_per_bucket(s.ts // MINUTE * MINUTE, s.profile, s.n_profiles, s.values)
+    totals = forward_fill(grid).sum(axis=1)
+
+    idx = lttb_indices(minutes, totals, max_points)
+    return {
+        "timestamps": [datetime.fromtimestamp(int(m)).isoformat() + '+03:00' for m in minutes[idx]],
+        "resources": _series(totals[idx]),
+    }
+
+
+def daily_totals(profiles: List[str], hours: int) -> Dict:
+    """
+    Сумма ресурсов профилей на начало каждого дня (последний снэпшот дня,
+    дни без снэпшотов — последним известным значением).
+    """
+    if not NUMPY_AVAILABLE:
+        return fleet_history.daily_totals(profiles, hours)
+
+    s = load_samples(profiles, hours)
+    if not len(s):
+        return _empty()
+
+    days, grid = last_per_bucket(s.local_day(), s.profile, s.n_profiles, s.values)
+    # Непрерывный ряд дней: пропущенные дни — пустые строки сетки
+    all_days = np.arange(days[0], days[-1] + 1)
+    full = np.full((len(all_days),) + grid.shape[1:], np.nan)
+    full[days - days[0]] = grid
+    totals = forward_fill(full).sum(axis=1)
+
+    return {
+        "timestamps": [_day_iso(d) for d in all_days],
+        "resources": _series(totals),
+    }
+
+
+def daily_earnings(profiles: List[str], hours: int) -> Dict:
+    """Заработок по дням: сумма (последний - первый снэпшот дня) по профилям."""
+    if not NUMPY_AVAILABLE:
+        return fleet_history.daily_earnings(profiles, hours)
+
+    s = load_samples(profiles, hours)
+    if not len(s):
+        return _empty()
+
+    days, pair_day, first, last = first_last_per_bucket(
+        s.local_day(), s.profile, s.n_profiles, s.values)
+    earned = np.zeros((len(days), s.values.shape[1]), dtype=np.int64)
+    np.add.at(earned, pair_day, last - first)
+
+    return {
+        "timestamps": [_day_iso(d, 12) for d in days],
+        "resources": _series(earned),
+    }
@@ -37,7 +37,14 @@ REQUEST_LOG_MAX_LINES = 2000  # макс. строк в JSONL перед rotate
 class VMMOClient:
     """HTTP клиент для VMMO на requests"""
 
-    def __init__(self):
+    def __init__(self, profile=None):
+        """
+        Args:
+            profile: ProfileContext, к которому привязан клиент (куки, логин,
+                     лог запросов). None — активный профиль на момент вызова
+                     (config.COOKIES_FILE / get_credentials), как раньше.
+        """
+        self.profile_ctx = profile
         self.session = requests.Session()
         self.session.headers.update(DEFAULT_HEADERS)
         self.current_page = None  # Последний загруженный HTML
@@ -67,7 +74,10 @@ class VMMOClient:
         по известному имени.
         """
         try:
-            profile = config.get_profile_name() or "unknown"
+            if self.profile_ctx is not None:
+                profile = self.profile_ctx.name or "unknown"
+            else:
+                profile = config.get_profile_name() or "unknown"
             log_dir = os.path.join(SCRIPT_DIR, "logs", "requests")
             os.makedirs(log_dir, exist_ok=True)
             self._log_path = os.path.join(log_dir, f"{profile}.jsonl")
@@ -124,10 +134,22 @@ class VMMOClient:
         return entries[-n:]
 
 
+    def _cookies_path(self):
+        """Файл кук: профиля клиента, иначе активного профиля."""
+        if self.profile_ctx is not None:
+            return self.profile_ctx.cookies_file
+        return config.COOKIES_FILE  # Динамически берём из config
+
+    def _credentials(self):
+        """Логин/пароль: профиля клиента, иначе активного профиля."""
+        if self.profile_ctx is not None:
+            return self.profile_ctx.get_credentials()
+        return config.get_credentials()
+
     def load_cookies(self, cookies_path=None):
         """Загружает куки из файла (формат Playwright)"""
         if cookies_path is None:
-            cookies_path = config.COOKIES_FILE  # Динамически берём из config
+            cookies_path = self._cookies_path()
 
         print(f"[CLIENT] Loading cookies from: {cookies_path}")
 
@@ -495,8 +517,7 @@ class VMMOClient:
         # Нужен перелогин
         print("[WARN] Session expired, re-logging...")
         try:
-            from requests_bot.config import get_credentials
-            username, password = get_credentials()
+            username, password = self._credentials()
             if self.login(username, password):
                 print("[OK] Re-login successful")
                 return True
@@ -551,16 +572,17 @@ class VMMOClient:
         if not username or not password:
             # Сначала пробуем из профиля
             try:
-                from requests_bot.config import get_credentials
-                profile_user, profile_pass = get_credentials()
+                profile_user, profile_pass = self._credentials()
                 if profile_user and profile_pass:
                     username = profile_user
                     password = profile_pass
             except Exception:
                 pass
 
-            # Фоллбэк на settings.json
-            if not username or not password:
+            # Фоллбэк на settings.json (не для клиента конкретного профиля —
+            # иначе залогинимся чужим аккаунтом и запишем куки ему в профиль)
+            bound = self.profile_ctx is not None and self.profile_ctx.name
+            if (not username or not password) and not bound:
                 try:
                     with open(SETTINGS_FILE, "r", encoding="utf-8") as f:
                         settings = json.load(f)
@@ -643,7 +665,7 @@ class VMMOClient:
 
     def _save_cookies(self):
         """Сохраняет куки в файл (формат Playwright)"""
-        cookies_path = config.COOKIES_FILE
+        cookies_path = self._cookies_path()
         cookies = []
 
         for cookie in self.session.cookies:
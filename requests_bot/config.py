@@ -6,22 +6,21 @@
 # ============================================
 
 import os
+import copy
 import json
+import threading
+import contextvars
+from contextlib import contextmanager
+
+from requests_bot.cache import config_store
 
 # Пути (базовые, могут быть переопределены профилем)
 SCRIPT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 PROFILES_DIR = os.path.join(SCRIPT_DIR, "profiles")
 
-# Текущий профиль (устанавливается через set_profile)
-_current_profile = None
-_profile_config = {}
-PROFILE_DIR = None  # Папка текущего профиля
-
-# Пути по умолчанию (переопределяются при загрузке профиля)
-LOGS_DIR = os.path.join(SCRIPT_DIR, "logs")
-COOKIES_FILE = os.path.join(SCRIPT_DIR, "cookies.json")
+# Пути профиля (PROFILE_DIR, LOGS_DIR, COOKIES_FILE, STATS_FILE) больше не
+# глобалы модуля — их отдаёт активный ProfileContext (см. __getattr__ ниже).
 SETTINGS_FILE = os.path.join(SCRIPT_DIR, "settings.json")
-STATS_FILE = os.path.join(SCRIPT_DIR, "stats.json")
 AUCTION_BLACKLIST_FILE = os.path.join(SCRIPT_DIR, "auction_blacklist.json")
 
 # URLs
@@ -111,14 +110,11 @@ _DEFAULT_PROTECTED_ITEMS = [
 PROTECTED_ITEMS_FILE = os.path.join(SCRIPT_DIR, "protected_items.json")
 
 def _load_protected_items():
-    """Загружает защищённые предметы из файла или возвращает дефолт"""
-    if os.path.exists(PROTECTED_ITEMS_FILE):
-        try:
-            with open(PROTECTED_ITEMS_FILE, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except (json.JSONDecodeError, IOError) as e:
-            print(f"[CONFIG] Ошибка загрузки protected_items: {e}")
-    return _DEFAULT_PROTECTED_ITEMS.copy()
+    """Защищённые предметы из файла (через config_store) или дефолт"""
+    items = config_store.read(PROTECTED_ITEMS_FILE)
+    if not isinstance(items, list):
+        return _DEFAULT_PROTECTED_ITEMS
+    return items
 
 # Загружаем при старте
 PROTECTED_ITEMS = _load_protected_items()
@@ -139,23 +135,18 @@ def add_protected_item(item_name):
 
     # Проверяем, нет ли уже такого (частичное совпадение)
     item_lower = item_name.lower()
-    for existing in PROTECTED_ITEMS:
+    for existing in get_protected_items():
         if existing.lower() in item_lower or item_lower in existing.lower():
             print(f"[CONFIG] Предмет '{item_name}' уже защищён (как '{existing}')")
             return True
 
-    # Добавляем
-    PROTECTED_ITEMS.append(item_name)
-
-    # Сохраняем в файл
-    try:
-        with open(PROTECTED_ITEMS_FILE, "w", encoding="utf-8") as f:
-            json.dump(PROTECTED_ITEMS, f, ensure_ascii=False, indent=2)
-        print(f"[CONFIG] Добавлен защищённый предмет: {item_name}")
-        return True
-    except IOError as e:
-        print(f"[CONFIG] Ошибка сохранения protected_items: {e}")
+    # Добавляем и сохраняем (кэш решений сбросит on_change)
+    if not config_store.write(PROTECTED_ITEMS_FILE, PROTECTED_ITEMS + [item_name]):
+        print("[CONFIG] Ошибка сохранения protected_items")
         return False
+    PROTECTED_ITEMS = _load_protected_items()
+    print(f"[CONFIG] Добавлен защищённый предмет: {item_name}")
+    return True
 
 
 def reload_protected_items():
@@ -164,29 +155,29 @@ def reload_protected_items():
     Используется веб-панелью после изменений.
     """
     global PROTECTED_ITEMS
+    config_store.invalidate(PROTECTED_ITEMS_FILE)
     PROTECTED_ITEMS = _load_protected_items()
+    _invalidate_item_decisions()
     return PROTECTED_ITEMS
 
 
-def get_protected_items():
-    """
-    Возвращает актуальный список защищённых предметов.
-    Перезагружает из файла если он изменился.
-    """
-    global PROTECTED_ITEMS, _protected_items_mtime
-
+def _invalidate_item_decisions(*_):
+    """Сбрасывает кэш решений по предметам (items.classify) сразу, не дожидаясь mtime."""
     try:
-        current_mtime = os.path.getmtime(PROTECTED_ITEMS_FILE) if os.path.exists(PROTECTED_ITEMS_FILE) else 0
-        if current_mtime != _protected_items_mtime:
-            PROTECTED_ITEMS = _load_protected_items()
-            _protected_items_mtime = current_mtime
-    except OSError:
+        from requests_bot.items import invalidate
+        invalidate()
+    except ImportError:
         pass
 
-    return PROTECTED_ITEMS
 
-# Время модификации файла для отслеживания изменений
-_protected_items_mtime = os.path.getmtime(PROTECTED_ITEMS_FILE) if os.path.exists(PROTECTED_ITEMS_FILE) else 0
+def get_protected_items():
+    """
+    Возвращает актуальный список защищённых предметов (не менять).
+    Файл перечитывается, только если он изменился (mtime/size).
+    """
+    global PROTECTED_ITEMS
+    PROTECTED_ITEMS = _load_protected_items()
+    return PROTECTED_ITEMS
 
 
 # ============================================
@@ -197,38 +188,28 @@ _protected_items_mtime = os.path.getmtime(PROTECTED_ITEMS_FILE) if os.path.exist
 # Пример: "Зуб Падшего Дракона" (легендарка, но мусор)
 
 UNPROTECTED_ITEMS_FILE = os.path.join(SCRIPT_DIR, "unprotected_items.json")
-UNPROTECTED_ITEMS = []
-_unprotected_items_mtime = 0
 
 
 def _load_unprotected_items():
-    """Загружает список исключений из файла"""
-    if os.path.exists(UNPROTECTED_ITEMS_FILE):
-        try:
-            with open(UNPROTECTED_ITEMS_FILE, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except (json.JSONDecodeError, IOError) as e:
-            print(f"[CONFIG] Ошибка загрузки unprotected_items: {e}")
-    return []
+    """Список исключений из файла (через config_store)"""
+    items = config_store.read(UNPROTECTED_ITEMS_FILE)
+    return items if isinstance(items, list) else []
 
 
 UNPROTECTED_ITEMS = _load_unprotected_items()
-_unprotected_items_mtime = os.path.getmtime(UNPROTECTED_ITEMS_FILE) if os.path.exists(UNPROTECTED_ITEMS_FILE) else 0
 
 
 def get_unprotected_items():
-    """Возвращает актуальный список исключений (перезагружает если файл изменился)"""
-    global UNPROTECTED_ITEMS, _unprotected_items_mtime
+    """Возвращает актуальный список исключений (перечитывается только при изменении файла)"""
+    global UNPROTECTED_ITEMS
+    UNPROTECTED_ITEMS = _load_unprotected_items()
+    return UNPROTECTED_ITEMS
 
-    try:
-        current_mtime = os.path.getmtime(UNPROTECTED_ITEMS_FILE) if os.path.exists(UNPROTECTED_ITEMS_FILE) else 0
-        if current_mtime != _unprotected_items_mtime:
-            UNPROTECTED_ITEMS = _load_unprotected_items()
-            _unprotected_items_mtime = current_mtime
-    except OSError:
-        pass
 
-    return UNPROTECTED_ITEMS
+# Правка списков (панель, TG, add_protected_item) — сразу сбрасываем
+# решения items.classify
+config_store.on_change(PROTECTED_ITEMS_FILE, _invalidate_item_decisions)
+config_store.on_change(UNPROTECTED_ITEMS_FILE, _invalidate_item_decisions)
 
 
 def is_unprotected_override(item_name):
@@ -265,17 +246,13 @@ AJAX_HEADERS = {
 
 
 def load_settings():
-    """Загружает настройки из settings.json"""
-    try:
-        with open(SETTINGS_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except (json.JSONDecodeError, FileNotFoundError, IOError):
-        return {}
+    """Загружает настройки из settings.json (копия — можно менять)"""
+    return config_store.read_copy(SETTINGS_FILE, {})
 
 
 def get_setting(key, default=None):
-    """Получает настройку по ключу"""
-    settings = load_settings()
+    """Получает настройку по ключу (settings.json парсится только при изменении)"""
+    settings = config_store.read(SETTINGS_FILE, {})
     return settings.get(key, default)
 
 
@@ -283,101 +260,215 @@ def get_setting(key, default=None):
 # Profile Management
 # ============================================
 
-def set_profile(profile_name):
+class ProfileContext:
     """
-    Устанавливает профиль и обновляет все пути.
-    Вызывается при старте бота с --profile аргументом.
+    Профиль бота: пути, конфиг, логин/пароль и HTTP-клиент.
+
+    Раньше всё это жило в глобалах модуля, и в процессе мог быть активен
+    только один профиль. Теперь профиль — объект: его можно передать явно
+    или сделать активным в текущем потоке/asyncio-задаче через use_profile().
+    Старые функции (get_profile_name, get_credentials, is_*_enabled, ...)
+    читают активный профиль — см. current_profile().
     """
-    global _current_profile, _profile_config, PROFILE_DIR
-    global LOGS_DIR, COOKIES_FILE, STATS_FILE
-    global SKIP_DUNGEONS, DUNGEON_ACTION_LIMITS
 
-    profile_dir = os.path.join(PROFILES_DIR, profile_name)
-    PROFILE_DIR = profile_dir  # Сохраняем глобально
-    config_file = os.path.join(profile_dir, "config.json")
+    def __init__(self, name=None, config=None):
+        self.name = name
+        self.config = config if config is not None else {}
+        if name:
+            self.profile_dir = os.path.join(PROFILES_DIR, name)
+            self.logs_dir = os.path.join(self.profile_dir, "logs")
+            self.cookies_file = os.path.join(self.profile_dir, "cookies.json")
+            self.stats_file = os.path.join(self.profile_dir, "stats.json")
+        else:
+            # Без профиля — пути по умолчанию (корень проекта)
+            self.profile_dir = None
+            self.logs_dir = os.path.join(SCRIPT_DIR, "logs")
+            self.cookies_file = os.path.join(SCRIPT_DIR, "cookies.json")
+            self.stats_file = os.path.join(SCRIPT_DIR, "stats.json")
+        self._client = None
+
+    @classmethod
+    def load(cls, profile_name):
+        """Читает профиль с диска (без активации)."""
+        profile_dir = os.path.join(PROFILES_DIR, profile_name)
+        if not os.path.exists(profile_dir):
+            raise ValueError(f"Profile '{profile_name}' not found in {PROFILES_DIR}")
+
+        # Создаём папку logs внутри профиля если нет
+        os.makedirs(os.path.join(profile_dir, "logs"), exist_ok=True)
+
+        config = config_store.read_copy(os.path.join(profile_dir, "config.json"), {})
+        return cls(profile_name, config)
+
+    @property
+    def config_file(self):
+        if not self.profile_dir:
+            return None
+        return os.path.join(self.profile_dir, "config.json")
+
+    def get_credentials(self):
+        """Логин/пароль профиля или (None, None)"""
+        username = self.config.get("username")
+        password = self.config.get("password")
+        if username and password:
+            return username, password
+        return None, None
+
+    @property
+    def client(self):
+        """
+        VMMOClient профиля (создаётся при первом обращении).
+
+        Куки, логин/пароль для перелогина и лог запросов привязаны к этому
+        профилю — клиентом можно пользоваться и вне use_profile().
+        """
+        if self._client is None:
+            from requests_bot.client import VMMOClient
+            client = VMMOClient(profile=self)
+            client.load_cookies()
+            self._client = client
+        return self._client
+
+    def __repr__(self):
+        return f"ProfileContext({self.name!r})"
+
+
+# Профиль процесса (set_profile) и профиль текущего потока/задачи (use_profile).
+# Новые потоки стартуют с пустым контекстом — для них действует профиль процесса.
+_process_profile = ProfileContext()
+_active_profile = contextvars.ContextVar("vmmo_profile", default=None)
+
+# Старые имена путей профиля -> атрибуты ProfileContext
+_PROFILE_PATHS = {
+    "PROFILE_DIR": "profile_dir",
+    "LOGS_DIR": "logs_dir",
+    "COOKIES_FILE": "cookies_file",
+    "STATS_FILE": "stats_file",
+}
+
+
+def __getattr__(name):
+    # config.COOKIES_FILE / from requests_bot.config import PROFILE_DIR —
+    # всегда пути активного профиля
+    attr = _PROFILE_PATHS.get(name)
+    if attr is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(current_profile(), attr)
+
 
-    if not os.path.exists(profile_dir):
-        raise ValueError(f"Profile '{profile_name}' not found in {PROFILES_DIR}")
+def current_profile():
+    """Активный ProfileContext (потока/задачи, иначе процесса)"""
+    return _active_profile.get() or _process_profile
 
-    # Создаём папку logs внутри профиля если нет
-    profile_logs = os.path.join(profile_dir, "logs")
-    os.makedirs(profile_logs, exist_ok=True)
 
-    # Обновляем глобальные пути
-    _current_profile = profile_name
-    LOGS_DIR = profile_logs
-    COOKIES_FILE = os.path.join(profile_dir, "cookies.json")
-    STATS_FILE = os.path.join(profile_dir, "stats.json")
+def _cfg():
+    return current_profile().config
+
+
+@contextmanager
+def use_profile(profile):
+    """
+    Делает профиль активным в текущем потоке/asyncio-задаче.
+
+        with use_profile("char3") as ctx:
+            ctx.client.get("/city")
+            is_arena_enabled()  # читает конфиг char3
+
+    Args:
+        profile: имя профиля или ProfileContext
+    """
+    ctx = profile if isinstance(profile, ProfileContext) else ProfileContext.load(profile)
+    token = _active_profile.set(ctx)
+    try:
+        yield ctx
+    finally:
+        _active_profile.reset(token)
+
+
+def set_profile(profile_name):
+    """
+    Устанавливает профиль и обновляет все пути.
+    Вызывается при старте бота с --profile аргументом.
+
+    Внутри use_profile() меняет профиль только текущего потока/задачи,
+    иначе — профиль всего процесса.
+    """
+    global _process_profile
+    global SKIP_DUNGEONS, ONLY_DUNGEONS
+
+    ctx = ProfileContext.load(profile_name)
+    if _active_profile.get() is not None:
+        _active_profile.set(ctx)
+    else:
+        _process_profile = ctx
 
     try:
-        print(f"[CONFIG] COOKIES_FILE = {COOKIES_FILE}")
+        print(f"[CONFIG] COOKIES_FILE = {ctx.cookies_file}")
     except UnicodeEncodeError:
         print(f"[CONFIG] COOKIES_FILE = (path with special chars)")
 
     # Загружаем конфиг профиля
-    if os.path.exists(config_file):
-        with open(config_file, "r", encoding="utf-8") as f:
-            _profile_config = json.load(f)
-        print(f"[CONFIG] Loaded profile: {profile_name} ({_profile_config.get('name', 'unnamed')})")
+    if os.path.exists(ctx.config_file):
+        print(f"[CONFIG] Loaded profile: {profile_name} ({ctx.config.get('name', 'unnamed')})")
 
         # Миграция старого формата craft_queue → craft_items
         migrate_craft_queue_to_items()
     else:
-        _profile_config = {}
         print(f"[CONFIG] Profile '{profile_name}' has no config.json, using defaults")
 
-    # Обновляем настройки из профиля
-    global SKIP_DUNGEONS, ONLY_DUNGEONS
-    if "skip_dungeons" in _profile_config:
-        SKIP_DUNGEONS = _profile_config["skip_dungeons"].copy()
+    # Обновляем настройки из профиля (списки данжей — на процесс, их читает
+    # только цикл бота)
+    profile_config = ctx.config
+    if "skip_dungeons" in profile_config:
+        SKIP_DUNGEONS = profile_config["skip_dungeons"].copy()
     else:
         SKIP_DUNGEONS = []
 
-    if "only_dungeons" in _profile_config:
-        ONLY_DUNGEONS = _profile_config["only_dungeons"].copy()
+    if "only_dungeons" in profile_config:
+        ONLY_DUNGEONS = profile_config["only_dungeons"].copy()
     else:
         ONLY_DUNGEONS = []
 
-    if "dungeon_action_limits" in _profile_config:
-        DUNGEON_ACTION_LIMITS.update(_profile_config["dungeon_action_limits"])
+    if "dungeon_action_limits" in profile_config:
+        DUNGEON_ACTION_LIMITS.update(profile_config["dungeon_action_limits"])
 
     # ВАЖНО: скипы из deaths.json больше НЕ грузятся в SKIP_DUNGEONS намертво.
     # Эффективный skip вычисляется get_dungeon_difficulty (decay + авто-ретест),
     # SKIP_DUNGEONS остаётся только для ручного списка из конфига профиля.
 
-    return _profile_config
+    return profile_config
 
 
 def get_profile_config():
     """Возвращает конфиг текущего профиля"""
-    return _profile_config
+    return _cfg()
 
 
 def get_profile_name():
     """Возвращает имя текущего профиля"""
-    return _current_profile
+    return current_profile().name
 
 
 def get_profile_username():
     """Возвращает username из профиля (для уведомлений)"""
-    return _profile_config.get("username", _current_profile or "unknown")
+    return _cfg().get("username", current_profile().name or "unknown")
 
 
 def get_game_nickname():
     """Возвращает игровой ник (для инвайтов в пати). Фоллбек на username."""
-    return _profile_config.get("game_nickname") or _profile_config.get("username", _current_profile or "unknown")
+    return _cfg().get("game_nickname") or _cfg().get("username", current_profile().name or "unknown")
 
 
 def is_dungeons_enabled():
     """Проверяет, включены ли обычные данжены для текущего профиля"""
-    return _profile_config.get("dungeons_enabled", True)
+    return _cfg().get("dungeons_enabled", True)
 
 
 # ARCHIVED: is_event_dungeon_enabled() and is_ny_event_dungeon_enabled() moved to archive/events/ (2026-01)
 
 def is_party_dungeon_enabled():
     """Проверяет, включены ли пати-данжены для текущего профиля"""
-    return _profile_config.get("party_dungeon_enabled", False)
+    return _cfg().get("party_dungeon_enabled", False)
 
 
 def get_party_dungeon_config():
@@ -393,31 +484,31 @@ def get_party_dungeon_config():
         dict: {"dungeon_id": str, "difficulty": str, "members": int}
     """
     return {
-        "dungeon_id": _profile_config.get("party_dungeon_id", "dng:CitadelHolding"),
-        "difficulty": _profile_config.get("party_dungeon_difficulty", "impossible"),
-        "members": _profile_config.get("party_dungeon_members", 2),
-        "role": _profile_config.get("party_dungeon_role", "member"),
+        "dungeon_id": _cfg().get("party_dungeon_id", "dng:CitadelHolding"),
+        "difficulty": _cfg().get("party_dungeon_difficulty", "impossible"),
+        "members": _cfg().get("party_dungeon_members", 2),
+        "role": _cfg().get("party_dungeon_role", "member"),
     }
 
 
 def is_tavern_caravans_enabled():
     """Дэйли-караваны таверны (tavern_quests.py). Дефолт: включено."""
-    return _profile_config.get("tavern_caravans_enabled", True)
+    return _cfg().get("tavern_caravans_enabled", True)
 
 
 def is_dozor_enabled():
     """Дэйли-дозоры таверны (dozor_quests.py). Дефолт: включено."""
-    return _profile_config.get("dozor_enabled", True)
+    return _cfg().get("dozor_enabled", True)
 
 
 def is_valentine_event_enabled():
     """Проверяет, включен ли февральский ивент-данж для текущего профиля"""
-    return _profile_config.get("valentine_event_enabled", False)
+    return _cfg().get("valentine_event_enabled", False)
 
 
 def is_event_party_enabled():
     """Включена ли координированная пати на ивент-данж (Пупупу+Полюби в FireTower)."""
-    return _profile_config.get("event_party_enabled", False)
+    return _cfg().get("event_party_enabled", False)
 
 
 def get_event_party_config():
@@ -429,8 +520,8 @@ def get_event_party_config():
         "event_party_dungeon_id": "dng:FireTower"  // опционально
     """
     return {
-        "role": _profile_config.get("event_party_role", "member"),
-        "dungeon_id": _profile_config.get("event_party_dungeon_id", "dng:FireTower"),
+        "role": _cfg().get("event_party_role", "member"),
+        "dungeon_id": _cfg().get("event_party_dungeon_id", "dng:FireTower"),
     }
 
 
@@ -447,7 +538,7 @@ def get_event_party_difficulty():
     Default 'hero' — на брутале пати из 2 без потионов выживала ~88с
     и не дотягивала до конца. Hero даёт запас прочности.
     """
-    return _profile_config.get("event_party_difficulty", "hero")
+    return _cfg().get("event_party_difficulty", "hero")
 
 
 def is_wake_for_event_party_at_night():
@@ -457,7 +548,7 @@ def is_wake_for_event_party_at_night():
     периодически проверяет КД ивент-данжа и просыпается на ивент-пати,
     когда у обоих участников КД=0.
     """
-    return _profile_config.get("wake_for_event_party_at_night", False)
+    return _cfg().get("wake_for_event_party_at_night", False)
 
 
 def get_party_roll_strategy():
@@ -467,7 +558,7 @@ def get_party_roll_strategy():
     'secondary' — нажимаем roll=2 (не откажусь)
     None        — нет конфига, дефолт (нажмём roll=1 если есть)
     """
-    return _profile_config.get("party_roll_strategy")
+    return _cfg().get("party_roll_strategy")
 
 
 def get_party_roll_exceptions():
@@ -476,27 +567,27 @@ def get_party_roll_exceptions():
     Пример: ['Компас Дегура'] — для primary роллера это будет roll=2,
     для secondary — roll=1.
     """
-    return _profile_config.get("party_roll_exceptions", [])
+    return _cfg().get("party_roll_exceptions", [])
 
 
 def is_arena_enabled():
     """Проверяет, включена ли арена для текущего профиля"""
-    return _profile_config.get("arena_enabled", False)
+    return _cfg().get("arena_enabled", False)
 
 
 def get_arena_max_fights():
     """Возвращает максимум боёв на арене за сессию"""
-    return _profile_config.get("arena_max_fights", 50)
+    return _cfg().get("arena_max_fights", 50)
 
 
 def is_arena_gold():
     """Проверяет, включена ли арена за золото (kind=1, bet=1)"""
-    return _profile_config.get("arena_gold", False)
+    return _cfg().get("arena_gold", False)
 
 
 def is_hell_games_enabled():
     """Проверяет, включены ли Адские Игры для текущего профиля"""
-    return _profile_config.get("hell_games_enabled", True)
+    return _cfg().get("hell_games_enabled", True)
 
 
 def is_light_side():
@@ -505,32 +596,32 @@ def is_light_side():
     Светлые атакуют dark источники, тёмные атакуют light.
     По умолчанию False (тёмный).
     """
-    return _profile_config.get("is_light_side", False)
+    return _cfg().get("is_light_side", False)
 
 
 def is_pet_resurrection_enabled():
     """Проверяет, включено ли автовоскрешение питомца для текущего профиля"""
-    return _profile_config.get("pet_resurrection_enabled", False)
+    return _cfg().get("pet_resurrection_enabled", False)
 
 
 def is_survival_mines_enabled():
     """Проверяет, включена ли Заброшенная Шахта для текущего профиля"""
-    return _profile_config.get("survival_mines_enabled", False)
+    return _cfg().get("survival_mines_enabled", False)
 
 
 def is_daily_rewards_enabled():
     """Проверяет, включен ли автосбор ежедневных наград для текущего профиля"""
-    return _profile_config.get("daily_rewards_enabled", True)  # По умолчанию ВКЛ
+    return _cfg().get("daily_rewards_enabled", True)  # По умолчанию ВКЛ
 
 
 def is_admin_mail_enabled():
     """Проверяет, включен ли автосбор писем от Администрации"""
-    return _profile_config.get("admin_mail_enabled", True)  # По умолчанию ВКЛ
+    return _cfg().get("admin_mail_enabled", True)  # По умолчанию ВКЛ
 
 
 def is_iron_craft_enabled():
     """Проверяет, включен ли крафт железа для текущего профиля"""
-    return _profile_config.get("iron_craft_enabled", False)
+    return _cfg().get("iron_craft_enabled", False)
 
 
 def is_craft_only_mode():
@@ -540,12 +631,17 @@ def is_craft_only_mode():
     рюкзака, почты, данжей, ивентов, арены, шахты. Нужно для персонажей,
     которым переводят золото через аукцион: их рюкзак и рубины трогать нельзя.
     """
-    return _profile_config.get("craft_only_mode", False)
+    return _cfg().get("craft_only_mode", False)
+
+
+def get_craft_level():
+    """Уровень мастера горного дела (None — не задан, рецепты не ограничиваем)"""
+    return _cfg().get("craft_level")
 
 
 def is_sell_crafts_on_startup():
     """Продавать все крафты при старте бота (по умолчанию True)"""
-    return _profile_config.get("sell_crafts_on_startup", True)
+    return _cfg().get("sell_crafts_on_startup", True)
 
 
 def get_dungeon_tabs():
@@ -556,7 +652,7 @@ def get_dungeon_tabs():
     Формат в config.json:
     "dungeon_tabs": ["tab2", "tab3"]  // 50+ и 30-39
     """
-    return _profile_config.get("dungeon_tabs", ["tab2"])
+    return _cfg().get("dungeon_tabs", ["tab2"])
 
 
 def get_extra_dungeons():
@@ -568,7 +664,7 @@ def get_extra_dungeons():
         {"tab": "tab3", "id": "dng:ShadowGuard"}
     ]
     """
-    return _profile_config.get("extra_dungeons", [])
+    return _cfg().get("extra_dungeons", [])
 
 
 # ============================================
@@ -608,7 +704,7 @@ def get_craft_items():
     Returns:
         list: Список предметов для крафта
     """
-    return _profile_config.get("craft_items", [])
+    return _cfg().get("craft_items", [])
 
 
 def get_craft_items_from_disk():
@@ -619,17 +715,10 @@ def get_craft_items_from_disk():
     Returns:
         list: Список предметов для крафта
     """
-    global _current_profile
-    if not _current_profile:
-        return []
-
-    config_file = os.path.join(PROFILES_DIR, _current_profile, "config.json")
-    try:
-        with open(config_file, "r", encoding="utf-8") as f:
-            config = json.load(f)
-            return config.get("craft_items", [])
-    except Exception:
+    config_file = current_profile().config_file
+    if not config_file:
         return []
+    return list(config_store.read(config_file, {}).get("craft_items", []))
 
 
 def get_setting_from_disk(key, default=None):
@@ -637,17 +726,10 @@ def get_setting_from_disk(key, default=None):
     Читает настройку напрямую с диска (не из памяти).
     Нужно для подхвата изменений через веб-панель без рестарта.
     """
-    global _current_profile
-    if not _current_profile:
-        return default
-
-    config_file = os.path.join(PROFILES_DIR, _current_profile, "config.json")
-    try:
-        with open(config_file, "r", encoding="utf-8") as f:
-            config = json.load(f)
-            return config.get(key, default)
-    except Exception:
+    config_file = current_profile().config_file
+    if not config_file:
         return default
+    return config_store.read(config_file, {}).get(key, default)
 
 
 def add_craft_item(item_id, batch_size):
@@ -661,15 +743,14 @@ def add_craft_item(item_id, batch_size):
     Returns:
         bool: True если успешно
     """
-    global _profile_config
-
     if item_id not in CRAFTABLE_ITEMS:
         return False
 
-    if "craft_items" not in _profile_config:
-        _profile_config["craft_items"] = []
+    profile_config = _cfg()
+    if "craft_items" not in profile_config:
+        profile_config["craft_items"] = []
 
-    _profile_config["craft_items"].append({
+    profile_config["craft_items"].append({
         "item": item_id,
         "batch_size": int(batch_size)
     })
@@ -685,8 +766,7 @@ def set_craft_finish_time(finish_timestamp):
     Args:
         finish_timestamp: Unix timestamp когда крафт завершится
     """
-    global _profile_config
-    _profile_config["craft_finish_time"] = finish_timestamp
+    _cfg()["craft_finish_time"] = finish_timestamp
     save_profile_config()
 
 
@@ -697,14 +777,14 @@ def get_craft_finish_time():
     Returns:
         int or None: Unix timestamp или None если крафт не запущен
     """
-    return _profile_config.get("craft_finish_time")
+    return _cfg().get("craft_finish_time")
 
 
 def clear_craft_finish_time():
     """Очищает сохранённое время завершения крафта"""
-    global _profile_config
-    if "craft_finish_time" in _profile_config:
-        del _profile_config["craft_finish_time"]
+    profile_config = _cfg()
+    if "craft_finish_time" in profile_config:
+        del profile_config["craft_finish_time"]
         save_profile_config()
 
 
@@ -741,12 +821,11 @@ def remove_craft_item(index):
     Returns:
         bool: True если успешно
     """
-    global _profile_config
-
-    items = _profile_config.get("craft_items", [])
+    profile_config = _cfg()
+    items = profile_config.get("craft_items", [])
     if 0 <= index < len(items):
         items.pop(index)
-        _profile_config["craft_items"] = items
+        profile_config["craft_items"] = items
         save_profile_config()
         return True
     return False
@@ -754,8 +833,7 @@ def remove_craft_item(index):
 
 def clear_craft_items():
     """Очищает весь список автокрафта"""
-    global _profile_config
-    _profile_config["craft_items"] = []
+    _cfg()["craft_items"] = []
     save_profile_config()
 
 
@@ -764,9 +842,8 @@ def migrate_craft_queue_to_items():
     Конвертирует старый craft_queue в новый craft_items.
     Вызывается автоматически при загрузке конфига.
     """
-    global _profile_config
-
-    old_queue = _profile_config.get("craft_queue", [])
+    profile_config = _cfg()
+    old_queue = profile_config.get("craft_queue", [])
 
     # Проверяем что это старый формат (есть поле "done")
     if old_queue and isinstance(old_queue, list) and len(old_queue) > 0:
@@ -776,8 +853,8 @@ def migrate_craft_queue_to_items():
                 {"item": task["item"], "batch_size": task["count"]}
                 for task in old_queue
             ]
-            _profile_config["craft_items"] = new_items
-            del _profile_config["craft_queue"]
+            profile_config["craft_items"] = new_items
+            del profile_config["craft_queue"]
             save_profile_config()
             print(f"[CONFIG] Мигрирован craft_queue → craft_items ({len(new_items)} предметов)")
 
@@ -787,12 +864,11 @@ def save_profile_config():
     Перед записью подтягивает с диска настройки, которые могли быть
     изменены извне (веб-панель, Telegram), чтобы не затереть их.
     """
-    global _profile_config, _current_profile
-
-    if not _current_profile:
+    ctx = current_profile()
+    if not ctx.name:
         return False
 
-    config_file = os.path.join(PROFILES_DIR, _current_profile, "config.json")
+    config_file = ctx.config_file
     try:
         # Диск — источник правды для ВСЕХ пользовательских настроек: тумблеры,
         # resource_sell, резервы/стаки, dungeon_difficulties, craft_mode,
@@ -802,31 +878,30 @@ def save_profile_config():
         # save_profile_config от бота: смерть, смена сложности, крафт).
         # Из памяти сохраняем только рантайм-ключи, которые пишет сам цикл бота.
         BOT_RUNTIME_KEYS = ("craft_finish_time",)
-        if os.path.exists(config_file):
-            with open(config_file, "r", encoding="utf-8") as f:
-                disk_config = json.load(f)
-
+        disk_config = config_store.read_copy(config_file)
+        if disk_config is None and os.path.exists(config_file):
+            print(f"[CONFIG] Ошибка сохранения: {config_file} не читается")
+            return False  # битый файл — не затираем памятью
+        if disk_config is not None:
             # Спец-случай миграции craft_queue → craft_items: если в памяти уже
             # мигрировано (есть craft_items), а на диске ещё старый craft_queue —
             # миграция в процессе, память главнее, чтобы не откатить её.
             mid_migration = (
-                "craft_items" in _profile_config
+                "craft_items" in ctx.config
                 and "craft_queue" in disk_config
                 and "craft_items" not in disk_config
             )
-            saved_items = _profile_config.get("craft_items") if mid_migration else None
-            runtime = {k: _profile_config[k] for k in BOT_RUNTIME_KEYS if k in _profile_config}
+            saved_items = ctx.config.get("craft_items") if mid_migration else None
+            runtime = {k: ctx.config[k] for k in BOT_RUNTIME_KEYS if k in ctx.config}
 
             # Берём с диска всё пользовательское, поверх — рантайм-ключи из памяти
-            _profile_config = disk_config
-            _profile_config.update(runtime)
+            ctx.config = disk_config
+            ctx.config.update(runtime)
             if mid_migration:
-                _profile_config["craft_items"] = saved_items
-                _profile_config.pop("craft_queue", None)
+                ctx.config["craft_items"] = saved_items
+                ctx.config.pop("craft_queue", None)
 
-        with open(config_file, "w", encoding="utf-8") as f:
-            json.dump(_profile_config, f, ensure_ascii=False, indent=2)
-        return True
+        return config_store.write(config_file, ctx.config)
     except Exception as e:
         print(f"[CONFIG] Ошибка сохранения: {e}")
         return False
@@ -834,17 +909,17 @@ def save_profile_config():
 
 def get_survival_mines_max_wave():
     """Возвращает максимальную волну для выхода из шахты (по умолчанию 31)"""
-    return _profile_config.get("survival_mines_max_wave", 31)
+    return _cfg().get("survival_mines_max_wave", 31)
 
 
 def get_survival_mines_max_level():
     """Возвращает максимальный уровень для шахты (после него бот останавливается)"""
-    return _profile_config.get("survival_mines_max_level", None)
+    return _cfg().get("survival_mines_max_level", None)
 
 
 def get_skill_cooldowns():
     """Возвращает КД скиллов для текущего профиля"""
-    skill_cds = _profile_config.get("skill_cooldowns", {})
+    skill_cds = _cfg().get("skill_cooldowns", {})
     # Конвертируем ключи в int
     return {int(k): v for k, v in skill_cds.items()} if skill_cds else None
 
@@ -861,18 +936,14 @@ def get_skill_hp_threshold():
     Returns:
         dict: {skill_pos: min_hp} или {} если не задано
     """
-    thresholds = _profile_config.get("skill_hp_threshold", {})
+    thresholds = _cfg().get("skill_hp_threshold", {})
     # Конвертируем ключи в int
     return {int(k): v for k, v in thresholds.items()} if thresholds else {}
 
 
 def get_credentials():
     """Возвращает логин/пароль для текущего профиля"""
-    username = _profile_config.get("username")
-    password = _profile_config.get("password")
-    if username and password:
-        return username, password
-    return None, None
+    return current_profile().get_credentials()
 
 
 # ============================================
@@ -925,7 +996,7 @@ def get_resource_sell_settings():
     Returns:
         dict: Настройки для каждого ресурса
     """
-    saved = _profile_config.get("resource_sell", {})
+    saved = _cfg().get("resource_sell", {})
     result = {}
 
     for res_key, defaults in DEFAULT_RESOURCE_SELL_SETTINGS.items():
@@ -958,8 +1029,6 @@ def get_resource_sell_config(resource_key):
 # ============================================
 
 # Файл для хранения смертей (создаётся в папке профиля)
-_deaths_file = None
-
 # Уровни сложности (от высокой к низкой)
 DIFFICULTY_LEVELS = ["brutal", "hero", "normal"]
 
@@ -998,29 +1067,55 @@ def _recent_deaths(data, now=None):
 
 def _get_deaths_file():
     """Получает путь к файлу смертей"""
-    global _deaths_file
-    if _deaths_file:
-        return _deaths_file
+    # Не кэшируем: в процессе может быть активно несколько профилей
+    profile_dir = current_profile().profile_dir
+    if profile_dir:
+        return os.path.join(profile_dir, "deaths.json")
+    return os.path.join(SCRIPT_DIR, "deaths.json")
 
-    if _current_profile:
-        profile_dir = os.path.join(PROFILES_DIR, _current_profile)
-        _deaths_file = os.path.join(profile_dir, "deaths.json")
-    else:
-        _deaths_file = os.path.join(SCRIPT_DIR, "deaths.json")
 
-    return _deaths_file
+# Кэш deaths.json и таблицы сложностей (по пути файла — профилей в
+# процессе может быть несколько). deaths.json раньше перечитывался и
+# парсился на КАЖДЫЙ get_dungeon_difficulty, т.е. по разу на данж за цикл.
+# Теперь файл читается только при смене (mtime, size), а сложности всех
+# данжей считаются одним проходом и живут до ближайшего перехода по
+# времени (протухание смерти, конец game-lock, ретест скипа).
+_deaths_lock = threading.RLock()
+_deaths_cache = {}       # path -> ((mtime, size), deaths)
+_difficulty_cache = {}   # path -> (deaths_sig, bases, valid_until, table)
 
 
-def load_deaths():
-    """Загружает историю смертей из файла"""
-    deaths_file = _get_deaths_file()
+def _file_sig(path):
     try:
-        if os.path.exists(deaths_file):
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def _load_deaths_shared(deaths_file):
+    """deaths.json из кэша (общий объект — НЕ менять). Returns: (sig, deaths)"""
+    sig = _file_sig(deaths_file)
+    with _deaths_lock:
+        cached = _deaths_cache.get(deaths_file)
+        if cached and cached[0] == sig:
+            return cached
+    deaths = {}
+    if sig is not None:
+        try:
             with open(deaths_file, "r", encoding="utf-8") as f:
-                return json.load(f)
-    except Exception as e:
-        print(f"[CONFIG] Ошибка загрузки deaths.json: {e}")
-    return {}
+                deaths = json.load(f)
+        except Exception as e:
+            print(f"[CONFIG] Ошибка загрузки deaths.json: {e}")
+            return sig, {}  # битый файл не кэшируем — перечитаем после записи
+    with _deaths_lock:
+        _deaths_cache[deaths_file] = (sig, deaths)
+    return sig, deaths
+
+
+def load_deaths():
+    """Загружает историю смертей из файла (копия — можно менять и сохранять)"""
+    return copy.deepcopy(_load_deaths_shared(_get_deaths_file())[1])
 
 
 def save_deaths(deaths):
@@ -1031,6 +1126,22 @@ def save_deaths(deaths):
             json.dump(deaths, f, ensure_ascii=False, indent=2)
     except Exception as e:
         print(f"[CONFIG] Ошибка сохранения deaths.json: {e}")
+        with _deaths_lock:
+            _deaths_cache.pop(deaths_file, None)
+            _difficulty_cache.pop(deaths_file, None)
+        return
+    # Кэш — сразу из записанного (mtime может не смениться в пределах
+    # разрешения ФС), таблица сложностей пересчитается при следующем запросе
+    with _deaths_lock:
+        _deaths_cache[deaths_file] = (_file_sig(deaths_file), copy.deepcopy(deaths))
+        _difficulty_cache.pop(deaths_file, None)
+
+
+def invalidate_deaths_cache():
+    """Сбрасывает кэш deaths.json и сложностей (после правки файла снаружи)."""
+    with _deaths_lock:
+        _deaths_cache.clear()
+        _difficulty_cache.clear()
 
 
 def record_lock(dungeon_id, dungeon_name, reason, detail=None):
@@ -1117,44 +1228,35 @@ def record_death(dungeon_id, dungeon_name, difficulty="brutal", suspect=False):
     return new_diff, should_skip
 
 
-def get_dungeon_difficulty(dungeon_id):
+def _compute_difficulty(data, base, now):
     """
-    ЭФФЕКТИВНАЯ сложность данжена (вычисляется, а не хранится).
-
-    Лесенка: base (из профиля, дефолт brutal) минус ступень за каждую
-    НЕДАВНЮЮ не-suspect смерть (окно DEATH_WINDOW_DAYS). За пределами
-    normal — skip, но не вечный: SKIP_RETEST_DAYS тишины после последней
-    смерти → пробный заход на normal. Смерти протухают → данж сам
-    карабкается обратно normal → hero → brutal.
-
-    Блокировки игрой (record_lock: prerequisite/level) скипают данж на
-    GAME_LOCK_TTL_HOURS, потом перепроверяются (сервер-пад мог наврать).
+    Сложность одного данжа по его записи в deaths.json.
 
     Returns:
-        str: 'brutal' | 'hero' | 'normal' | 'skip'
+        tuple: (difficulty, changes_at) — changes_at: ближайший момент, когда
+               результат может смениться сам по себе (datetime или None)
     """
     from datetime import datetime, timedelta
 
-    profile_difficulties = _profile_config.get("dungeon_difficulties", {})
-    base = profile_difficulties.get(dungeon_id, "brutal")
-
-    deaths = load_deaths()
-    data = deaths.get(dungeon_id)
-    if not data:
-        return base
-
-    now = datetime.now()
+    changes = []
 
     # Блокировка игрой — skip с TTL (без даты = старый формат, даём пробу)
     if data.get("lock_reason"):
         try:
-            locked_at = datetime.fromisoformat(data["locked_at"])
-            if now - locked_at < timedelta(hours=GAME_LOCK_TTL_HOURS):
-                return "skip"
+            unlock_at = datetime.fromisoformat(data["locked_at"]) + timedelta(hours=GAME_LOCK_TTL_HOURS)
+            if now < unlock_at:
+                return "skip", unlock_at
         except Exception:
             pass  # нет/битая дата — блок протух, пробуем данж
 
     recent = _recent_deaths(data, now)
+    for e in recent:
+        try:
+            changes.append(datetime.fromisoformat(e["time"]) + timedelta(days=DEATH_WINDOW_DAYS))
+        except Exception:
+            continue
+    changes_at = min(changes) if changes else None
+
     try:
         idx = DIFFICULTY_LEVELS.index(base)
     except ValueError:
@@ -1162,13 +1264,13 @@ def get_dungeon_difficulty(dungeon_id):
     idx += len(recent)
 
     if idx < len(DIFFICULTY_LEVELS):
-        return DIFFICULTY_LEVELS[idx]
+        return DIFFICULTY_LEVELS[idx], changes_at
 
     # Одна смерть — не приговор: скип только при 2+ недавних смертях.
     # Иначе ручная база normal (слабые чары) превращала единственную
     # случайную смерть (недохил, лаг сервера) в мгновенный скип данжа.
     if len(recent) < 2:
-        return DIFFICULTY_LEVELS[-1]  # остаёмся на normal — ещё попытка
+        return DIFFICULTY_LEVELS[-1], changes_at  # остаёмся на normal — ещё попытка
 
     # Смертей больше лесенки — skip, но с авто-ретестом после тишины
     last_time = None
@@ -1178,11 +1280,78 @@ def get_dungeon_difficulty(dungeon_id):
             last_time = t
     if last_time:
         try:
-            if now - datetime.fromisoformat(last_time) >= timedelta(days=SKIP_RETEST_DAYS):
-                return "normal"  # пробный заход
+            retest_at = datetime.fromisoformat(last_time) + timedelta(days=SKIP_RETEST_DAYS)
+            if now >= retest_at:
+                return "normal", changes_at  # пробный заход
+            return "skip", min(retest_at, changes_at) if changes_at else retest_at
         except Exception:
             pass
-    return "skip"
+    return "skip", changes_at
+
+
+def get_dungeon_difficulties():
+    """
+    Таблица ЭФФЕКТИВНЫХ сложностей всех данжей из deaths.json.
+
+    Считается одним проходом и кэшируется до смены файла, смены
+    dungeon_difficulties профиля или ближайшего перехода по времени.
+    Данжей без записи в deaths.json в таблице нет (у них — база профиля).
+
+    Returns:
+        dict: {dungeon_id: 'brutal' | 'hero' | 'normal' | 'skip'} (не менять)
+    """
+    from datetime import datetime
+
+    deaths_file = _get_deaths_file()
+    sig, deaths = _load_deaths_shared(deaths_file)
+    bases = _cfg().get("dungeon_difficulties", {})
+    now = datetime.now()
+
+    with _deaths_lock:
+        cached = _difficulty_cache.get(deaths_file)
+    if cached:
+        c_sig, c_bases, valid_until, table = cached
+        if c_sig == sig and c_bases == bases and (valid_until is None or now < valid_until):
+            return table
+
+    table = {}
+    valid_until = None
+    for dungeon_id, data in deaths.items():
+        if not isinstance(data, dict):
+            continue
+        difficulty, changes_at = _compute_difficulty(data, bases.get(dungeon_id, "brutal"), now)
+        table[dungeon_id] = difficulty
+        if changes_at and (valid_until is None or changes_at < valid_until):
+            valid_until = changes_at
+
+    with _deaths_lock:
+        _difficulty_cache[deaths_file] = (sig, dict(bases), valid_until, table)
+    return table
+
+
+def get_dungeon_difficulty(dungeon_id):
+    """
+    ЭФФЕКТИВНАЯ сложность данжена (вычисляется, а не хранится).
+
+    Лесенка: base (из профиля, дефолт brutal) минус ступень за каждую
+    НЕДАВНЮЮ не-suspect смерть (окно DEATH_WINDOW_DAYS). За пределами
+    normal — skip, но не вечный: SKIP_RETEST_DAYS тишины после последней
+    смерти → пробный заход на normal. Смерти протухают → данж сам
+    карабкается обратно normal → hero → brutal.
+
+    Блокировки игрой (record_lock: prerequisite/level) скипают данж на
+    GAME_LOCK_TTL_HOURS, потом перепроверяются (сервер-пад мог наврать).
+
+    Берётся из таблицы get_dungeon_difficulties() — deaths.json не
+    перечитывается на каждый вызов.
+
+    Returns:
+        str: 'brutal' | 'hero' | 'normal' | 'skip'
+    """
+    difficulty = get_dungeon_difficulties().get(dungeon_id)
+    if difficulty is None:
+        return _cfg().get("dungeon_difficulties", {}).get(dungeon_id, "brutal")
+    return difficulty
 
 
 def get_death_stats():
@@ -809,7 +809,7 @@ class IronCraftClient:
 
     # NOTE: Удалены мёртвые методы: _get_wait_time, run_cycle, run_full_cycle
 
-    def sell_all_mining(self, mode="all", force_min_stack=None):
+    def sell_all_mining(self, mode="all", force_min_stack=None, on_listed=None):
         """
         Продаёт материалы горного дела на аукционе.
 
@@ -820,6 +820,8 @@ class IronCraftClient:
                   "all" - всё
             force_min_stack: если указан, игнорирует стандартные минимальные размеры стаков
                              и использует это значение (1 = продавать всё)
+            on_listed: callback(name, count, gold, silver) после каждого
+                       выставленного лота (прогресс для sell_crafts)
 
         Использует AuctionClient для автоматического ценообразования.
         """
@@ -1039,8 +1041,13 @@ class IronCraftClient:
                         from requests_bot.config import get_profile_name
                         prof = self.profile if self.profile and self.profile != "unknown" else get_profile_name()
                         record_listed(name, my_count, gold, silver, profile=prof or "unknown")
-                    except Exception:
-                        pass
+                        # Другие боты увидят наш лот в общем стакане без перезагрузки
+                        from requests_bot import order_book
+                        order_book.add_own_lot(name, my_count, gold * 100 + silver, prof or "unknown")
+                    except Exception as e:
+                        log_warning(f"[CRAFT] Ошибка записи лота '{name}': {e}")
+                    if on_listed:
+                        on_listed(name, my_count, gold, silver)
                 elif result == "low_price":
                     log_info(f"[CRAFT] Цена слишком низкая, пропускаю '{name}'")
                     skipped_items.add(name)  # Больше не пытаемся продать этот тип
@@ -18,6 +18,15 @@ from .recipes import (
     get_recipe_requires,
 )
 
+# Граф рецептов (предпосчитанные требования и этапы)
+from . import dag
+from .dag import (
+    get_requirements,
+    get_ingredients,
+    topological_order,
+    reload_recipes_if_changed,
+)
+
 # Экспорт из distribution.py (локи, координация)
 from .distribution import (
     FileLock,
@@ -47,9 +56,9 @@ from .quotas import (
 
 # Экспорт из prices.py (кэш цен)
 from .prices import (
-    SHARED_CACHE_FILE,
     CACHE_UPDATE_LOCKFILE,
     CACHE_TTL,
+    CRAFT_PRICES_MARKER,
     AUCTION_FEE,
     AUCTION_CATEGORIES,
     load_shared_cache,
@@ -58,5 +67,12 @@ from .prices import (
     is_cache_expired,
 )
 
+# Вектор/матричная модель профита (NumPy опционален)
+from .profit_model import (
+    ProfitModel,
+    NUMPY_AVAILABLE,
+    rank_recipes,
+)
+
 # Классы остаются в основном модуле requests_bot/craft.py
 # для обратной совместимости (IronCraftClient, CyclicCraftClient)
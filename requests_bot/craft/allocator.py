@@ -0,0 +1,285 @@
+# ============================================
+# VMMO Craft Allocator
+# ============================================
+# Распределение ботов по рецептам как задача оптимизации:
+#   максимизировать суммарный ожидаемый з/час
+#   при ограничениях: ёмкость рынка (из sell-through), кап ботов на рецепт,
+#   уровень крафта бота (рецепт уровня выше — недоступен).
+#
+# Модель рецепта: N ботов производят N*u шт/час, рынок забирает не больше
+# capacity шт/час. Проданное приносит net_sell, себестоимость тратится на
+# всё произведённое:
+#   value(N) = min(N*u, capacity) * net_sell - N*u * cost
+# value вогнута по N, поэтому жадный выбор по предельному приросту
+# оптимален для одинаковых ботов. Уровни ботов ломают это — после жадного
+# прохода делаем обмены (переброс одного бота / своп пары), пока они
+# улучшают итог. Всё детерминировано: порядок ботов и рецептов
+# фиксирован, ничьи решаются по recipe_id/профилю.
+# ============================================
+
+import re
+import time
+
+from requests_bot.craft.recipes import RECIPES
+from requests_bot.craft import dag as recipe_dag
+from requests_bot.craft.profit_model import get_model as get_profit_model
+
+# Рецепт без статистики продаж — ёмкость неизвестна (ограничивает только кап)
+UNKNOWN_CAPACITY = float("inf")
+# Спрос выше этого — рынок не выбран, даём запас сверх проданного
+ABSORPTION_SCALE_UP = 0.75
+ABSORPTION_HEADROOM = 0.5
+# Меньше лотов в окне — статистике не верим
+ABSORPTION_MIN_LOTS = 10
+# Предел обменов (защита от зацикливания на равных значениях)
+MAX_EXCHANGE_ROUNDS = 50
+# Минимальный выигрыш обмена (з/час), ниже — шум
+EXCHANGE_EPS = 1e-6
+
+
+def market_capacity(sold_units, sold_lots, expired_lots, window_hours):
+    """
+    Ёмкость рынка (шт/час) по статистике окна.
+
+    Рынок с низким sell-through уже насыщен — берёт столько, сколько продано.
+    С высоким — спрос не выбран, допускаем ABSORPTION_HEADROOM сверху.
+
+    Returns:
+        float: шт/час или UNKNOWN_CAPACITY если данных мало
+    """
+    lots = sold_lots + expired_lots
+    if lots < ABSORPTION_MIN_LOTS or window_hours <= 0:
+        return UNKNOWN_CAPACITY
+    rate = sold_units / window_hours
+    if sold_lots / lots >= ABSORPTION_SCALE_UP:
+        rate *= 1 + ABSORPTION_HEADROOM
+    return rate
+
+
+def recipe_value(params, n):
+    """Ожидаемый з/час от n ботов на рецепте."""
+    if n <= 0:
+        return 0.0
+    produced = n * params["units_per_hour"]
+    sold = min(produced, params.get("capacity", UNKNOWN_CAPACITY))
+    return sold * params["net_sell"] - produced * params["cost"]
+
+
+def _marginal(params, n):
+    return recipe_value(params, n + 1) - recipe_value(params, n)
+
+
+def _can_take(params, counts, recipe_id, level):
+    cap = params.get("cap")
+    if cap is not None and counts.get(recipe_id, 0) >= cap:
+        return False
+    return level is None or params.get("level", 1) <= level
+
+
+def allocate(bots, recipes, overflow=False):
+    """
+    Назначает ботов на рецепты.
+
+    Args:
+        bots: [(profile, craft_level или None), ...]
+        recipes: {recipe_id: {"net_sell": з/шт после комиссии, "cost": з/шт,
+                  "units_per_hour": шт/час на бота, "capacity": шт/час,
+                  "cap": макс. ботов или None, "level": уровень рецепта}}
+        overflow: ботов, не влезших ни в один кап, всё равно раздать туда,
+                  где прирост больше (без капа, с учётом уровня)
+
+    Returns:
+        dict: {profile: recipe_id}. Бот, которому ничего не доступно,
+              в результат не попадает.
+    """
+    recipe_ids = sorted(recipes)
+    # Сначала самые ограниченные боты (низкий уровень), дальше по имени
+    order = sorted(bots, key=lambda b: (b[1] if b[1] is not None else 99, b[0]))
+    levels = dict(bots)
+
+    assignment = {}
+    counts = {r: 0 for r in recipe_ids}
+
+    # 1. Жадный проход: каждый бот — на рецепт с наибольшим приростом
+    for profile, level in order:
+        best, best_gain = None, None
+        for recipe_id in recipe_ids:
+            params = recipes[recipe_id]
+            if not _can_take(params, counts, recipe_id, level):
+                continue
+            gain = _marginal(params, counts[recipe_id])
+            if best_gain is None or gain > best_gain + EXCHANGE_EPS:
+                best, best_gain = recipe_id, gain
+        if best is not None:
+            assignment[profile] = best
+            counts[best] += 1
+
+    # 2. Обмены: переброс одного бота или своп двух, пока растёт итог
+    for _ in range(MAX_EXCHANGE_ROUNDS):
+        if not _improve_once(assignment, counts, recipes, recipe_ids, levels):
+            break
+
+    # 3. Лишние боты сверх капов (как раньше equal-distribution в квотах)
+    if overflow:
+        for profile, level in order:
+            if profile in assignment:
+                continue
+            candidates = [r for r in recipe_ids if level_ok(recipes[r], level)]
+            if not candidates:
+                continue
+            best = max(candidates, key=lambda r: (_marginal(recipes[r], counts[r]), -counts[r]))
+            assignment[profile] = best
+            counts[best] += 1
+
+    return assignment
+
+
+def _improve_once(assignment, counts, recipes, recipe_ids, levels):
+    """Один лучший улучшающий ход (move или swap). True — если сделан."""
+    best_move, best_gain = None, EXCHANGE_EPS
+
+    profiles = sorted(assignment)
+    for profile in profiles:
+        src = assignment[profile]
+        src_params = recipes[src]
+        loss = recipe_value(src_params, counts[src]) - recipe_value(src_params, counts[src] - 1)
+        for dst in recipe_ids:
+            if dst == src:
+                continue
+            params = recipes[dst]
+            if not _can_take(params, counts, dst, levels.get(profile)):
+                continue
+            gain = _marginal(params, counts[dst]) - loss
+            if gain > best_gain:
+                best_move, best_gain = ("move", profile, dst), gain
+
+    # Своп меняет состав только при разных уровнях ботов — счётчики те же,
+    # но бот высокого уровня освобождает место под рецепт, недоступный другому.
+    # Значение при этом не меняется, поэтому своп делаем, только если он
+    # открывает улучшающий move (проверяется на следующем раунде).
+    if best_move is None:
+        for i, a in enumerate(profiles):
+            for b in profiles[i + 1:]:
+                ra, rb = assignment[a], assignment[b]
+                if ra == rb or levels.get(a) == levels.get(b):
+                    continue
+                if not (level_ok(recipes[rb], levels.get(a)) and level_ok(recipes[ra], levels.get(b))):
+                    continue
+                assignment[a], assignment[b] = rb, ra
+                if _has_improving_move(assignment, counts, recipes, recipe_ids, levels):
+                    return True
+                assignment[a], assignment[b] = ra, rb
+        return False
+
+    _, profile, dst = best_move
+    counts[assignment[profile]] -= 1
+    counts[dst] += 1
+    assignment[profile] = dst
+    return True
+
+
+def level_ok(params, level):
+    return level is None or params.get("level", 1) <= level
+
+
+def _has_improving_move(assignment, counts, recipes, recipe_ids, levels):
+    for profile, src in assignment.items():
+        src_params = recipes[src]
+        loss = recipe_value(src_params, counts[src]) - recipe_value(src_params, counts[src] - 1)
+        for dst in recipe_ids:
+            if dst != src and _can_take(recipes[dst], counts, dst, levels.get(profile)):
+                if _marginal(recipes[dst], counts[dst]) - loss > EXCHANGE_EPS:
+                    return True
+    return False
+
+
+def total_value(assignment, recipes):
+    """Суммарный ожидаемый з/час назначения."""
+    counts = {}
+    for recipe_id in assignment.values():
+        counts[recipe_id] = counts.get(recipe_id, 0) + 1
+    return sum(recipe_value(recipes[r], n) for r, n in counts.items())
+
+
+def quotas_from_assignment(assignment):
+    """{recipe_id: ботов} из назначения."""
+    quotas = {}
+    for recipe_id in assignment.values():
+        quotas[recipe_id] = quotas.get(recipe_id, 0) + 1
+    return quotas
+
+
+# ============================================
+# Параметры рецептов из цен и статистики продаж
+# ============================================
+
+def _norm_item(name):
+    return re.sub(r"\s*x\d+$", "", str(name))
+
+
+def load_market_stats(since_ts, until_ts=None):
+    """
+    Продажи по предметам за окно из ledger.
+
+    Returns:
+        dict: {item_name: {"sold_units", "sold_lots", "expired_lots"}}
+    """
+    try:
+        from requests_bot import sales_ledger
+        aggs = sales_ledger.window_aggregates(since_ts, until_ts, normalize=_norm_item)
+    except Exception as e:
+        print(f"[CRAFT_ALLOC] Ошибка чтения статистики продаж: {e}")
+        return {}
+    return {
+        name: {"sold_units": a["sold_units"], "sold_lots": a["sold_lots"],
+               "expired_lots": a["expired_lots"]}
+        for name, a in aggs.items()
+    }
+
+
+def build_recipe_params(prices, recipe_ids, market_stats, window_hours, caps=None):
+    """
+    Параметры для allocate() по ценам, статистике окна и капам.
+
+    Args:
+        prices: {item_name: золото за 1 шт}
+        recipe_ids: какие рецепты распределять
+        market_stats: результат load_market_stats() за окно
+        window_hours: длина окна статистики в часах
+        caps: {recipe_id: макс. ботов} (нет ключа — без капа)
+
+    Returns:
+        dict: {recipe_id: params} (см. allocate)
+    """
+    caps = caps or {}
+    model = get_profit_model(recipe_ids)
+    point = model.evaluate(prices)
+    params = {}
+    for recipe_id, name in zip(model.recipe_ids, model.names):
+        total_time = recipe_dag.get_requirements(recipe_id)["total_time"]
+        if total_time <= 0:
+            continue
+        stats = market_stats.get(name, {})
+        params[recipe_id] = {
+            "net_sell": point[recipe_id]["net_sell_price"],
+            "cost": point[recipe_id]["cost"],
+            "units_per_hour": 3600.0 / total_time,
+            "capacity": market_capacity(stats.get("sold_units", 0), stats.get("sold_lots", 0),
+                                        stats.get("expired_lots", 0), window_hours),
+            "cap": caps.get(recipe_id),
+            "level": RECIPES[recipe_id].get("level", 1),
+        }
+    return params
+
+
+def plan(prices, recipe_ids, bots, window_days, caps=None, overflow=True):
+    """
+    Назначение ботов по статистике последних window_days дней.
+
+    Returns:
+        tuple: (assignment {profile: recipe_id}, params)
+    """
+    since = time.time() - window_days * 24 * 3600
+    params = build_recipe_params(prices, recipe_ids, load_market_stats(since),
+                                 window_days * 24, caps)
+    return allocate(bots, params, overflow=overflow), params
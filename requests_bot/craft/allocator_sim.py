@@ -0,0 +1,136 @@
+# ============================================
+# VMMO Craft Allocator Simulator
+# ============================================
+# Реплей последних N дней продаж: сравнивает оптимизатор (allocator) со
+# старой эвристикой квот (веса по позиции + лимиты по времени крафта).
+#
+# Для каждого дня:
+#   - план строится по статистике ДО этого дня (окно window_days);
+#   - оценивается по фактической ёмкости рынка В ЭТОТ день.
+# Цены — текущие из общего кэша (истории цен в ledger нет), так что
+# сравнение показывает именно качество раскладки при известном спросе.
+#
+# Запуск: python -m requests_bot.craft.allocator_sim --days 14 --bots 23
+# ============================================
+
+import argparse
+import time
+
+from requests_bot.craft import allocator
+from requests_bot.craft.profit_model import rank_recipes
+from requests_bot.craft.quotas import get_max_bots_for_recipe
+from requests_bot.craft.prices import load_shared_cache
+from requests_bot.craft.distribution import FINAL_RECIPES
+
+DAY = 24 * 3600
+
+
+def legacy_quotas(profitable_recipes, total_bots):
+    """Старая эвристика calculate_quotas (до оптимизатора) — для сравнения."""
+    weights = [5, 4, 4, 3, 3, 2, 1, 1, 1, 1, 1]
+
+    quotas = {}
+    remaining = total_bots
+
+    for i, (recipe_id, _profit) in enumerate(profitable_recipes):
+        weight = weights[i] if i < len(weights) else 1
+        quota = min(weight, get_max_bots_for_recipe(recipe_id), remaining)
+        quotas[recipe_id] = quota
+        remaining -= quota
+        if remaining <= 0:
+            break
+
+    if remaining > 0:
+        for recipe_id in quotas:
+            add = min(remaining, get_max_bots_for_recipe(recipe_id) - quotas[recipe_id])
+            if add > 0:
+                quotas[recipe_id] += add
+                remaining -= add
+            if remaining <= 0:
+                break
+
+    if remaining > 0:
+        for recipe_id in FINAL_RECIPES:
+            quotas.setdefault(recipe_id, 0)
+        while remaining > 0:
+            eligible = {r: q for r, q in quotas.items() if r != "platinumBar"} or quotas
+            min_recipe = min(eligible.keys(), key=lambda r: quotas[r])
+            quotas[min_recipe] += 1
+            remaining -= 1
+
+    return quotas
+
+
+def _legacy_profitable(prices, recipe_ids):
+    """Фильтр get_profitable_recipes: профит >= 10% от среднего, иначе топ-3."""
+    ranking = [(r["recipe_id"], r["profit_per_hour"])
+               for r in rank_recipes(prices, recipe_ids, n_scenarios=0)]
+    profits = [p for _, p in ranking if p > 0]
+    if not profits:
+        return ranking[:3]
+    threshold = max(sum(profits) / len(profits) * 0.1, 0)
+    return [(r, p) for r, p in ranking if p >= threshold] or ranking[:3]
+
+
+def _quota_value(quotas, params):
+    return sum(allocator.recipe_value(params[r], n) for r, n in quotas.items() if r in params)
+
+
+def replay(days=14, total_bots=21, window_days=3, prices=None, recipe_ids=None):
+    """
+    Прогоняет обе стратегии по последним days дням.
+
+    Returns:
+        list: [{"day": "YYYY-MM-DD", "legacy": з/день, "optimizer": з/день,
+                "legacy_quotas": {...}, "optimizer_quotas": {...}}, ...]
+    """
+    prices = prices if prices is not None else (load_shared_cache() or {})
+    recipe_ids = recipe_ids or list(FINAL_RECIPES)
+    caps = {r: get_max_bots_for_recipe(r) for r in recipe_ids}
+    bots = [(f"bot{i}", None) for i in range(total_bots)]
+
+    today = time.time() // DAY * DAY
+    results = []
+    for d in range(days, 0, -1):
+        day_start = today - d * DAY
+
+        # План — по тому, что было известно до начала дня
+        history = allocator.load_market_stats(day_start - window_days * DAY, day_start)
+        plan_params = allocator.build_recipe_params(prices, recipe_ids, history, window_days * 24, caps)
+        optimizer_quotas = allocator.quotas_from_assignment(
+            allocator.allocate(bots, plan_params, overflow=True))
+        legacy = legacy_quotas(_legacy_profitable(prices, recipe_ids), total_bots)
+
+        # Оценка — по фактическому спросу этого дня
+        actual = allocator.load_market_stats(day_start, day_start + DAY)
+        actual_params = allocator.build_recipe_params(prices, recipe_ids, actual, 24)
+
+        results.append({
+            "day": time.strftime("%Y-%m-%d", time.localtime(day_start)),
+            "legacy": _quota_value(legacy, actual_params) * 24,
+            "optimizer": _quota_value(optimizer_quotas, actual_params) * 24,
+            "legacy_quotas": {r: n for r, n in legacy.items() if n},
+            "optimizer_quotas": optimizer_quotas,
+        })
+    return results
+
+
+def print_report(results):
+    total_legacy = sum(r["legacy"] for r in results)
+    total_opt = sum(r["optimizer"] for r in results)
+    print(f"{'день':<12}{'эвристика':>12}{'оптимизатор':>14}")
+    for r in results:
+        print(f"{r['day']:<12}{r['legacy']:>12.1f}{r['optimizer']:>14.1f}")
+    print(f"{'итого':<12}{total_legacy:>12.1f}{total_opt:>14.1f}")
+    if results:
+        print(f"\nПоследний день:\n  эвристика:   {results[-1]['legacy_quotas']}\n"
+              f"  оптимизатор: {results[-1]['optimizer_quotas']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Реплей продаж: эвристика квот vs оптимизатор")
+    parser.add_argument("--days", type=int, default=14)
+    parser.add_argument("--bots", type=int, default=21)
+    parser.add_argument("--window", type=int, default=3, help="окно статистики для плана, дней")
+    args = parser.parse_args()
+    print_report(replay(days=args.days, total_bots=args.bots, window_days=args.window))
@@ -0,0 +1,187 @@
+# ============================================
+# VMMO Craft Recipe DAG
+# ============================================
+# Граф рецептов, посчитанный один раз: топологический порядок,
+# базовые ресурсы на 1 шт и список этапов крафта "с нуля".
+#
+# Раньше get_full_requirements / _get_full_requirements_static и
+# web_panel.build_ingredient_chain заново обходили RECIPES на каждый вызов.
+# Теперь это O(1) lookup (+ масштабирование на count).
+#
+# Если recipes.py поменялся на диске — reload_recipes_if_changed()
+# перечитывает его в те же словари RECIPES/ITEM_NAMES и сбрасывает граф.
+# ============================================
+
+import os
+import importlib
+
+from requests_bot.craft import recipes as _recipes_module
+from requests_bot.craft.recipes import RECIPES, ITEM_NAMES
+
+# Ресурсы игрока, которые не крафтятся
+BASE_RESOURCES = ("minerals", "sapphires", "rubies", "silver")
+
+
+def _recipes_file_mtime():
+    try:
+        return os.path.getmtime(_recipes_module.__file__)
+    except OSError:
+        return None
+
+
+_dag = None                              # {"order", "base", "steps", "tree"}
+_recipes_mtime = _recipes_file_mtime()   # mtime recipes.py при загрузке
+
+
+def _build():
+    """
+    Строит граф по RECIPES.
+
+    Returns:
+        dict: {
+            "order": [recipe_id, ...],   # зависимости раньше зависящих
+            "base": {recipe_id: {minerals, sapphires, rubies, silver, total_time}},
+            "steps": {recipe_id: [{"recipe", "name", "count", "time"}, ...]},
+            "tree": {recipe_id: [(ing_id, amount), ...]},
+        }
+
+    Raises:
+        ValueError: цикл в рецептах
+    """
+    order = []
+    state = {}  # recipe_id -> "visiting" / "done"
+
+    def visit(recipe_id, path):
+        mark = state.get(recipe_id)
+        if mark == "done":
+            return
+        if mark == "visiting":
+            raise ValueError(f"Цикл в рецептах: {' -> '.join(path + [recipe_id])}")
+        state[recipe_id] = "visiting"
+        for req_id in RECIPES[recipe_id].get("requires", {}):
+            if req_id in RECIPES:
+                visit(req_id, path + [recipe_id])
+        state[recipe_id] = "done"
+        order.append(recipe_id)
+
+    for recipe_id in RECIPES:
+        visit(recipe_id, [])
+
+    base = {}
+    steps = {}
+    tree = {}
+    for recipe_id in order:
+        recipe = RECIPES[recipe_id]
+        totals = {key: recipe.get(key, 0) for key in BASE_RESOURCES}
+        totals["total_time"] = recipe.get("craft_time", 0)
+
+        # Шаги компонентов идут ПЕРЕД текущим шагом (как в рекурсивной версии:
+        # каждый следующий компонент вставляется в начало списка)
+        recipe_steps = [{
+            "recipe": recipe_id,
+            "name": recipe["name"],
+            "count": 1,
+            "time": recipe.get("craft_time", 0),
+        }]
+        requires = recipe.get("requires", {})
+        for req_id, req_count in requires.items():
+            if req_id not in RECIPES:
+                continue
+            sub = base[req_id]
+            for key in totals:
+                totals[key] += sub[key] * req_count
+            recipe_steps = _scale_steps(steps[req_id], req_count) + recipe_steps
+
+        base[recipe_id] = totals
+        steps[recipe_id] = recipe_steps
+        tree[recipe_id] = list(requires.items())
+
+    return {"order": order, "base": base, "steps": steps, "tree": tree}
+
+
+def _scale_steps(steps, count):
+    return [{**step, "count": step["count"] * count, "time": step["time"] * count}
+            for step in steps]
+
+
+def get_dag():
+    """Граф рецептов (строится один раз, до invalidate())."""
+    global _dag
+    if _dag is None:
+        _dag = _build()
+    return _dag
+
+
+def invalidate():
+    """Сбрасывает граф — следующий вызов пересоберёт его по RECIPES."""
+    global _dag
+    _dag = None
+
+
+def reload_recipes_if_changed():
+    """
+    Перечитывает recipes.py, если файл изменился с момента загрузки.
+
+    Новые значения кладутся в ТЕ ЖЕ словари RECIPES/ITEM_NAMES, так что
+    все `from ... import RECIPES` видят изменения без рестарта.
+
+    Returns:
+        bool: True если рецепты перезагружены
+    """
+    global _recipes_mtime
+    mtime = _recipes_file_mtime()
+    if mtime is None or mtime == _recipes_mtime:
+        return False
+
+    fresh = importlib.reload(_recipes_module)
+    RECIPES.clear()
+    RECIPES.update(fresh.RECIPES)
+    ITEM_NAMES.clear()
+    ITEM_NAMES.update(fresh.ITEM_NAMES)
+    # Модуль снова указывает на общие словари
+    fresh.RECIPES = RECIPES
+    fresh.ITEM_NAMES = ITEM_NAMES
+    _recipes_mtime = mtime
+    invalidate()
+    return True
+
+
+def topological_order():
+    """Рецепты в порядке крафта: компоненты раньше того, что из них делают."""
+    return list(get_dag()["order"])
+
+
+def get_requirements(recipe_id, count=1, with_steps=False):
+    """
+    Все базовые ресурсы и время для крафта count шт "с нуля".
+
+    Args:
+        recipe_id: ID рецепта
+        count: сколько штук крафтим
+        with_steps: добавить "craft_steps" (этапы крафта)
+
+    Returns:
+        dict: {"minerals", "sapphires", "rubies", "silver", "total_time"[, "craft_steps"]}
+    """
+    dag = get_dag()
+    base = dag["base"].get(recipe_id)
+    if base is None:
+        result = {key: 0 for key in BASE_RESOURCES}
+        result["total_time"] = 0
+        if with_steps:
+            result["craft_steps"] = []
+        return result
+
+    result = {key: value * count for key, value in base.items()}
+    if with_steps:
+        result["craft_steps"] = _scale_steps(dag["steps"][recipe_id], count)
+    return result
+
+
+def get_ingredients(recipe_id):
+    """Прямые компоненты рецепта: [(ing_id, кол-во на 1 шт), ...]."""
+    return get_dag()["tree"].get(recipe_id, [])
+
+
+# Строим при импорте — дальше только lookup
+get_dag()
@@ -5,19 +5,18 @@
 # ============================================
 
 import os
-import sys
-import time
-import json
 
 from requests_bot.config import CRAFT_CACHE_TTL
+from requests_bot.price_service import get_price_service
 
-# Путь к общему кэшу цен (доступен всем персонажам)
+# Лок обновления общего кэша цен (сами цены — в PriceService)
 SCRIPT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-SHARED_CACHE_FILE = os.path.join(SCRIPT_DIR, "shared_auction_cache.json")
 CACHE_UPDATE_LOCKFILE = os.path.join(SCRIPT_DIR, "shared_cache_update.lock")
 
 # Алиас для обратной совместимости
 CACHE_TTL = CRAFT_CACHE_TTL
+# Маркер полного обновления крафт-цен в PriceService
+CRAFT_PRICES_MARKER = "craft_prices"
 
 # Комиссия аукциона (5%)
 AUCTION_FEE = 0.05
@@ -25,49 +24,33 @@ AUCTION_FEE = 0.05
 
 def load_shared_cache():
     """
-    Загружает общий кэш цен из файла.
+    Загружает общий кэш цен (PriceService).
 
     Returns:
-        dict: {"prices": {item_name: price}, "timestamp": int} или None
+        dict: {item_name: цена за 1 шт в золоте} или None если кэш устарел
     """
-    if not os.path.exists(SHARED_CACHE_FILE):
-        return None
-
-    try:
-        with open(SHARED_CACHE_FILE, "r", encoding="utf-8") as f:
-            cache = json.load(f)
-
-        timestamp = cache.get("timestamp", 0)
-        age = time.time() - timestamp
+    service = get_price_service()
+    age = service.marker_age(CRAFT_PRICES_MARKER)
 
-        if age > CACHE_TTL:
+    if age > CACHE_TTL:
+        if age != float("inf"):
             print(f"[CACHE] Кэш устарел ({age/3600:.1f}ч), обновляем...")
-            return None
-
-        print(f"[CACHE] Используем кэш (возраст: {age/3600:.1f}ч)")
-        return cache.get("prices", {})
-    except Exception as e:
-        print(f"[CACHE] Ошибка чтения кэша: {e}")
         return None
 
+    print(f"[CACHE] Используем кэш (возраст: {age/3600:.1f}ч)")
+    return {name: silver / 100.0 for name, silver in service.get_many(max_age=CACHE_TTL).items()}
+
 
 def save_shared_cache(prices):
     """
     Сохраняет цены в общий кэш.
 
     Args:
-        prices: dict {item_name: price}
+        prices: dict {item_name: цена за 1 шт в золоте}
     """
-    try:
-        cache = {
-            "prices": prices,
-            "timestamp": int(time.time())
-        }
-        with open(SHARED_CACHE_FILE, "w", encoding="utf-8") as f:
-            json.dump(cache, f, ensure_ascii=False, indent=2)
-        print(f"[CACHE] Сохранено {len(prices)} цен в общий кэш")
-    except Exception as e:
-        print(f"[CACHE] Ошибка сохранения кэша: {e}")
+    silver_prices = {name: price * 100.0 for name, price in prices.items()}
+    get_price_service().update(silver_prices, source="craft", marker=CRAFT_PRICES_MARKER)
+    print(f"[CACHE] Сохранено {len(prices)} цен в общий кэш")
 
 
 def get_cached_price(item_name):
@@ -78,12 +61,12 @@ def get_cached_price(item_name):
         item_name: название предмета
 
     Returns:
-        float or None: цена или None если не найдена
+        float or None: цена за 1 шт в золоте или None если не найдена
     """
-    cached_prices = load_shared_cache()
-    if cached_prices:
-        return cached_prices.get(item_name)
-    return None
+    silver = get_price_service().get(item_name, max_age=CACHE_TTL)
+    if silver is None:
+        return None
+    return silver / 100.0
 
 
 def is_cache_expired():
@@ -93,18 +76,7 @@ def is_cache_expired():
     Returns:
         bool: True если кэш устарел или не существует
     """
-    if not os.path.exists(SHARED_CACHE_FILE):
-        return True
-
-    try:
-        with open(SHARED_CACHE_FILE, "r", encoding="utf-8") as f:
-            cache = json.load(f)
-
-        timestamp = cache.get("timestamp", 0)
-        age = time.time() - timestamp
-        return age > CACHE_TTL
-    except Exception:
-        return True
+    return get_price_service().marker_age(CRAFT_PRICES_MARKER) > CACHE_TTL
 
 
 # Категории аукциона для разных типов предметов
@@ -0,0 +1,211 @@
+# ============================================
+# VMMO Craft Profit Model
+# ============================================
+# Профит всех рецептов одной операцией:
+#   себестоимость = A (рецепты × базовые ресурсы) @ p (цены ресурсов)
+#   профит/час   = (продажа × (1 - комиссия) - себестоимость) / время
+#
+# Сценарии: N случайно возмущённых векторов цен (лог-нормальный шум,
+# среднее сохраняется) → разброс профита/час по каждому рецепту. Профит
+# линеен по ценам, поэтому ожидание = профит при текущих ценах, а
+# сценарии дают только std — насколько рейтинг устойчив к колебаниям.
+#
+# NumPy опционален: без него те же формулы считаются циклами — медленнее,
+# и сценарии другие (свой генератор), но тоже детерминированные.
+# ============================================
+
+import math
+import random
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from requests_bot.craft.recipes import RECIPES
+from requests_bot.craft import dag as recipe_dag
+from requests_bot.craft.prices import AUCTION_FEE
+
+# Столбцы матрицы требований и их цены (серебро — фиксированный курс)
+RESOURCE_COLUMNS = ("minerals", "sapphires", "rubies", "silver")
+RESOURCE_PRICE_NAMES = ("Минерал", "Сапфир", "Рубин", None)
+SILVER_TO_GOLD = 0.01
+
+SCENARIO_COUNT = 1000     # сценариев для оценки разброса
+SCENARIO_SIGMA = 0.10     # относительный шум цены в сценарии
+SCENARIO_SEED = 42        # фиксированный seed — рейтинг детерминирован
+
+NUMPY_AVAILABLE = np is not None
+
+_models = {}  # tuple(recipe_ids) -> ProfitModel
+
+
+class ProfitModel:
+    """
+    Матрица требований для набора рецептов.
+
+    Attributes:
+        recipe_ids: порядок строк
+        names: название результата каждого рецепта (цена продажи)
+        matrix: рецепты × RESOURCE_COLUMNS (кол-во на 1 шт "с нуля")
+        times: полное время крафта 1 шт, сек
+    """
+
+    def __init__(self, recipe_ids):
+        self.recipe_ids = [r for r in recipe_ids if r in RECIPES]
+        self.names = [RECIPES[r]["name"] for r in self.recipe_ids]
+        rows = []
+        times = []
+        for recipe_id in self.recipe_ids:
+            reqs = recipe_dag.get_requirements(recipe_id)
+            rows.append([reqs[col] for col in RESOURCE_COLUMNS])
+            times.append(reqs["total_time"])
+        self.dag = recipe_dag.get_dag()
+        if NUMPY_AVAILABLE:
+            self.matrix = np.array(rows, dtype=float).reshape(len(rows), len(RESOURCE_COLUMNS))
+            self.times = np.array(times, dtype=float)
+        else:
+            self.matrix = rows
+            self.times = times
+
+    # ---------- векторы цен ----------
+
+    def resource_prices(self, prices):
+        """Вектор цен базовых ресурсов (золото за 1 шт) в порядке RESOURCE_COLUMNS."""
+        return [prices.get(name, 0) if name else SILVER_TO_GOLD for name in RESOURCE_PRICE_NAMES]
+
+    def sell_prices(self, prices):
+        return [prices.get(name, 0) for name in self.names]
+
+    # ---------- расчёт ----------
+
+    def evaluate(self, prices):
+        """
+        Профит всех рецептов при одном векторе цен.
+
+        Args:
+            prices: {item_name: золото за 1 шт}
+
+        Returns:
+            dict: {recipe_id: {"cost", "net_sell_price", "profit", "profit_per_hour", "total_time"}}
+        """
+        p = self.resource_prices(prices)
+        s = self.sell_prices(prices)
+        if NUMPY_AVAILABLE:
+            costs = self.matrix @ np.array(p, dtype=float)
+            net = np.array(s, dtype=float) * (1 - AUCTION_FEE)
+            profits = net - costs
+            pph = np.divide(profits * 3600, self.times,
+                            out=np.zeros_like(profits), where=self.times > 0)
+            costs, net, profits, pph = costs.tolist(), net.tolist(), profits.tolist(), pph.tolist()
+            times = self.times.tolist()
+        else:
+            costs = [sum(a * b for a, b in zip(row, p)) for row in self.matrix]
+            net = [x * (1 - AUCTION_FEE) for x in s]
+            profits = [n - c for n, c in zip(net, costs)]
+            pph = [(pr * 3600 / t) if t > 0 else 0 for pr, t in zip(profits, self.times)]
+            times = self.times
+
+        return {
+            recipe_id: {
+                "cost": costs[i],
+                "net_sell_price": net[i],
+                "profit": profits[i],
+                "profit_per_hour": pph[i],
+                "total_time": times[i],
+            }
+            for i, recipe_id in enumerate(self.recipe_ids)
+        }
+
+    def scenarios(self, prices, n=SCENARIO_COUNT, sigma=SCENARIO_SIGMA, seed=SCENARIO_SEED):
+        """
+        Профит/час по N возмущённым векторам цен.
+
+        Каждая цена (ресурсы и продажа) умножается на exp(sigma*z - sigma²/2),
+        z ~ N(0, 1) — среднее цены сохраняется. Серебро не шумит.
+
+        Returns:
+            dict: {recipe_id: {"mean": float, "std": float}} профита/час
+        """
+        p = self.resource_prices(prices)
+        s = self.sell_prices(prices)
+        drift = -sigma * sigma / 2
+
+        if NUMPY_AVAILABLE:
+            rng = np.random.default_rng(seed)
+            p_noise = np.exp(sigma * rng.standard_normal((n, len(p))) + drift)
+            p_noise[:, RESOURCE_PRICE_NAMES.index(None)] = 1.0
+            s_noise = np.exp(sigma * rng.standard_normal((n, len(s))) + drift)
+            P = p_noise * np.array(p, dtype=float)                  # N × ресурсы
+            S = s_noise * np.array(s, dtype=float)                  # N × рецепты
+            profits = S * (1 - AUCTION_FEE) - P @ self.matrix.T     # N × рецепты
+            rate = np.divide(3600.0, self.times, out=np.zeros_like(self.times), where=self.times > 0)
+            pph = profits * rate
+            mean, std = pph.mean(axis=0).tolist(), pph.std(axis=0).tolist()
+        else:
+            rng = random.Random(seed)
+            rate = [(3600.0 / t) if t > 0 else 0 for t in self.times]
+            sums = [0.0] * len(self.recipe_ids)
+            sq_sums = [0.0] * len(self.recipe_ids)
+            for _ in range(n):
+                ps = [v if name is None else v * math.exp(sigma * rng.gauss(0, 1) + drift)
+                      for v, name in zip(p, RESOURCE_PRICE_NAMES)]
+                for i, row in enumerate(self.matrix):
+                    sell = s[i] * math.exp(sigma * rng.gauss(0, 1) + drift)
+                    cost = sum(a * b for a, b in zip(row, ps))
+                    value = (sell * (1 - AUCTION_FEE) - cost) * rate[i]
+                    sums[i] += value
+                    sq_sums[i] += value * value
+            mean = [x / n for x in sums]
+            std = [math.sqrt(max(0.0, q / n - m * m)) for q, m in zip(sq_sums, mean)]
+
+        return {
+            recipe_id: {"mean": mean[i], "std": std[i]}
+            for i, recipe_id in enumerate(self.recipe_ids)
+        }
+
+
+def get_model(recipe_ids):
+    """ProfitModel для набора рецептов (кэшируется, пересобирается вместе с графом)."""
+    key = tuple(recipe_ids)
+    model = _models.get(key)
+    if model is None or model.dag is not recipe_dag.get_dag():
+        model = ProfitModel(key)
+        _models[key] = model
+    return model
+
+
+def rank_recipes(prices, recipe_ids, n_scenarios=SCENARIO_COUNT, sigma=SCENARIO_SIGMA):
+    """
+    Рейтинг рецептов по ожидаемому профиту/час с разбросом.
+
+    Ожидание считается точно (профит линеен по ценам), сценарии дают std.
+    Рецепт без цены продажи получает 0 (как и раньше — рынка нет).
+
+    Args:
+        prices: {item_name: золото за 1 шт}
+        recipe_ids: какие рецепты сравнивать
+        n_scenarios: сколько сценариев цен (0 — без разброса)
+        sigma: относительный шум цены в сценарии
+
+    Returns:
+        list: [{"recipe_id", "profit_per_hour", "std_per_hour"}, ...]
+              по убыванию profit_per_hour
+    """
+    model = get_model(recipe_ids)
+    point = model.evaluate(prices)
+    spread = model.scenarios(prices, n=n_scenarios, sigma=sigma) if n_scenarios else {}
+
+    ranking = []
+    for recipe_id, name in zip(model.recipe_ids, model.names):
+        if prices.get(name, 0) <= 0:
+            ranking.append({"recipe_id": recipe_id, "profit_per_hour": 0, "std_per_hour": 0})
+            continue
+        ranking.append({
+            "recipe_id": recipe_id,
+            "profit_per_hour": point[recipe_id]["profit_per_hour"],
+            "std_per_hour": spread.get(recipe_id, {}).get("std", 0),
+        })
+
+    ranking.sort(key=lambda x: x["profit_per_hour"], reverse=True)
+    return ranking
@@ -7,6 +7,10 @@
 import time
 
 from requests_bot.craft.recipes import RECIPES
+from requests_bot.craft import dag as recipe_dag
+from requests_bot.craft.profit_model import rank_recipes
+from requests_bot.craft import allocator
+from requests_bot.craft.prices import load_shared_cache
 from requests_bot.craft.distribution import (
     FileLock,
     FINAL_RECIPES,
@@ -16,53 +20,19 @@ from requests_bot.craft.distribution import (
     save_craft_locks,
 )
 
+# Окно продаж для ёмкости рынка в оптимизаторе
+ALLOCATOR_WINDOW_DAYS = 7
+
 
 def _get_full_requirements_static(recipe_id, count=1):
     """
     Статическая версия get_full_requirements без необходимости создавать CraftPriceChecker.
-    Рекурсивно вычисляет все базовые ресурсы для крафта.
+    Берёт базовые ресурсы из предпосчитанного графа рецептов (craft.dag).
 
     Returns:
         dict: {"minerals": int, "sapphires": int, "rubies": int, "silver": int, "total_time": int}
     """
-    if recipe_id not in RECIPES:
-        return {"minerals": 0, "sapphires": 0, "rubies": 0, "silver": 0, "total_time": 0}
-
-    recipe = RECIPES[recipe_id]
-    result = {
-        "minerals": 0,
-        "sapphires": 0,
-        "rubies": 0,
-        "silver": 0,
-        "total_time": 0,
-    }
-
-    # Время на сам крафт
-    result["total_time"] = recipe.get("craft_time", 0) * count
-
-    # Ресурсы этого рецепта
-    if "minerals" in recipe:
-        result["minerals"] = recipe["minerals"] * count
-    if "sapphires" in recipe:
-        result["sapphires"] = recipe["sapphires"] * count
-    if "rubies" in recipe:
-        result["rubies"] = recipe["rubies"] * count
-    if "silver" in recipe:
-        result["silver"] = recipe["silver"] * count
-
-    # Рекурсивно обрабатываем зависимости
-    if "requires" in recipe:
-        for req_id, req_count in recipe["requires"].items():
-            total_req = req_count * count
-            sub_req = _get_full_requirements_static(req_id, total_req)
-
-            result["minerals"] += sub_req["minerals"]
-            result["sapphires"] += sub_req["sapphires"]
-            result["rubies"] += sub_req["rubies"]
-            result["silver"] += sub_req["silver"]
-            result["total_time"] += sub_req["total_time"]
-
-    return result
+    return recipe_dag.get_requirements(recipe_id, count)
 
 
 def get_craft_time_hours(recipe_id):
@@ -155,46 +125,9 @@ def get_sorted_recipes_by_profit(cached_prices):
     if not cached_prices:
         return [(r, 0) for r in FINAL_RECIPES]
 
-    # Комиссия аукциона (5%)
-    AUCTION_FEE = 0.05
-
-    recipe_profits = []
-
-    for recipe_id in FINAL_RECIPES:
-        if recipe_id not in RECIPES:
-            continue
-
-        recipe = RECIPES[recipe_id]
-        result_name = recipe["name"]
-        sell_price = cached_prices.get(result_name, 0)
-
-        if sell_price <= 0:
-            recipe_profits.append((recipe_id, 0))
-            continue
-
-        # Расчёт себестоимости
-        reqs = _get_full_requirements_static(recipe_id)
-        mineral_price = cached_prices.get("Минерал", 0)
-
-        total_cost = (
-            reqs["minerals"] * mineral_price +
-            reqs["silver"] / 100.0
-        )
-        total_time = reqs["total_time"]
-
-        if total_time <= 0:
-            recipe_profits.append((recipe_id, 0))
-            continue
-
-        # Учитываем комиссию аукциона 5%
-        net_sell_price = sell_price * (1 - AUCTION_FEE)
-        profit = net_sell_price - total_cost
-        profit_per_hour = (profit / total_time) * 3600
-        recipe_profits.append((recipe_id, profit_per_hour))
-
-    # Сортируем по профиту (убывание)
-    recipe_profits.sort(key=lambda x: x[1], reverse=True)
-    return recipe_profits
+    # Себестоимость всех рецептов одним умножением матрицы на вектор цен
+    ranking = rank_recipes(cached_prices, FINAL_RECIPES, n_scenarios=0)
+    return [(r["recipe_id"], r["profit_per_hour"]) for r in ranking]
 
 
 def get_profitable_recipes(cached_prices):
@@ -229,67 +162,32 @@ def get_profitable_recipes(cached_prices):
     return profitable
 
 
-def calculate_quotas(profitable_recipes, total_bots=21):
+def calculate_quotas(profitable_recipes, total_bots=21, cached_prices=None):
     """
-    Распределяет ботов по рецептам с учётом весов И времени крафта.
+    Распределяет ботов по рецептам оптимизатором (craft.allocator).
 
-    Веса по позиции: 1-й=5, 2-й=4, 3-й=4, 4-й=3, 5-й=3, 6-й=2, остальные=1
+    Максимизирует суммарный ожидаемый з/час с учётом ёмкости рынка
+    (sell-through за ALLOCATOR_WINDOW_DAYS) и лимитов по времени крафта
+    (get_max_bots_for_recipe). Боты сверх всех лимитов раздаются туда,
+    где прирост больше.
 
     Args:
         profitable_recipes: list of (recipe_id, profit) отсортированный по убыванию
         total_bots: общее количество ботов
+        cached_prices: кэш цен (None — из общего кэша)
 
     Returns:
         dict: {recipe_id: quota, ...}
     """
-    weights = [5, 4, 4, 3, 3, 2, 1, 1, 1, 1, 1]  # макс 11 рецептов
-
-    quotas = {}
-    remaining = total_bots
-
-    for i, (recipe_id, profit) in enumerate(profitable_recipes):
-        weight = weights[i] if i < len(weights) else 1
-        max_for_this = get_max_bots_for_recipe(recipe_id)
-        quota = min(weight, max_for_this, remaining)
-        quotas[recipe_id] = quota
-        remaining -= quota
-
-        hours = get_craft_time_hours(recipe_id)
-        if hours >= 2:
-            print(f"[CRAFT_QUOTAS] {recipe_id}: {hours:.1f}ч → лимит {max_for_this} ботов")
-
-        if remaining <= 0:
-            break
-
-    # Если остались боты - добавляем к рецептам где ещё есть место до лимита
-    if remaining > 0:
-        for recipe_id in quotas:
-            max_for_this = get_max_bots_for_recipe(recipe_id)
-            add = min(remaining, max_for_this - quotas[recipe_id])
-            if add > 0:
-                quotas[recipe_id] += add
-                remaining -= add
-            if remaining <= 0:
-                break
-
-    # Если ВСЁ ЕЩЁ остались боты - распределяем равномерно по ВСЕМ рецептам
-    # КРОМЕ platinumBar (слишком долгий - 13ч)
-    if remaining > 0:
-        for recipe_id in FINAL_RECIPES:
-            if recipe_id not in quotas:
-                quotas[recipe_id] = 0
-
-        while remaining > 0:
-            eligible = {r: q for r, q in quotas.items() if r != "platinumBar"}
-            if not eligible:
-                eligible = quotas
-
-            min_recipe = min(eligible.keys(), key=lambda r: quotas[r])
-            quotas[min_recipe] += 1
-            remaining -= 1
-
-        print(f"[CRAFT_QUOTAS] Равномерно распределены лишние боты")
-
+    if cached_prices is None:
+        cached_prices = load_shared_cache() or {}
+    recipe_ids = [r for r, _ in profitable_recipes]
+    caps = {r: get_max_bots_for_recipe(r) for r in recipe_ids}
+    bots = [(f"bot{i}", None) for i in range(total_bots)]
+    assignment, _ = allocator.plan(cached_prices, recipe_ids, bots, ALLOCATOR_WINDOW_DAYS, caps)
+
+    quotas = {r: 0 for r in recipe_ids}
+    quotas.update(allocator.quotas_from_assignment(assignment))
     return quotas
 
 
@@ -334,7 +232,8 @@ def acquire_craft_lock(profile, cached_prices=None):
 
             # Получаем профитные рецепты и рассчитываем квоты
             profitable = get_profitable_recipes(cached_prices)
-            quotas = calculate_quotas(profitable, total_bots=max(active_bots + 1, 21))
+            quotas = calculate_quotas(profitable, total_bots=max(active_bots + 1, 21),
+                                      cached_prices=cached_prices)
 
             # Считаем ботов на каждом рецепте
             bot_counts = {recipe: 0 for recipe in FINAL_RECIPES}
@@ -8,16 +8,47 @@ import re
 import time
 import json
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from urllib.parse import urlencode, quote
+
+import requests
 from bs4 import BeautifulSoup
 
-from requests_bot.config import BASE_URL
+from requests_bot.config import BASE_URL, get_craft_level
 from requests_bot.craft import RECIPES, ITEM_NAMES
-
-# Путь к общему кэшу цен (доступен всем персонажам)
+from requests_bot.craft import dag as recipe_dag
+from requests_bot.craft.profit_model import get_model as get_profit_model, rank_recipes
+from requests_bot.craft import allocator
+from requests_bot.price_service import get_price_service
+from requests_bot.price_history import record_lots
+from requests_bot import order_book
+
+# Общие файлы координации (доступны всем персонажам)
 SCRIPT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-SHARED_CACHE_FILE = os.path.join(SCRIPT_DIR, "shared_auction_cache.json")
 CACHE_TTL = 14400  # 4 часа в секундах
+# Маркер полного обновления крафт-цен в PriceService
+CRAFT_PRICES_MARKER = "craft_prices"
+# Маркер начала обновления (для частично свежего кэша)
+CRAFT_PRICES_REFRESHING_MARKER = "craft_prices_refreshing"
+REFRESH_PARTIAL_TTL = 300        # refresh старше 5 мин считаем брошенным
+
+# Параллельное обновление цен: потоки и общий rate limit
+REFRESH_WORKERS = 3
+REFRESH_MIN_INTERVAL = 0.3       # сек между запросами (все потоки вместе)
+
+# Инкрементальный refresh: перезапрашиваем только цены, которые по своей
+# волатильности (PriceService) могли уйти больше чем на порог.
+PRICE_DRIFT_THRESHOLD = 0.05     # ожидаемый уход цены, после которого она протухла
+PRICE_DEFAULT_VOL = 0.03         # волатильность (доля/√час), пока нет истории
+PRICE_MIN_AGE = 15 * 60          # моложе — не перезапрашиваем никогда
+PRICE_MAX_AGE_BASE = 2 * 3600    # Минерал/Сапфир/Рубин — входят во всё
+PRICE_MAX_AGE_FINAL = CACHE_TTL  # финальные рецепты (выбор крафта)
+PRICE_MAX_AGE_OTHER = 24 * 3600  # промежуточные — только для buy-профита
+PRICE_MIN_RELEVANCE = 0.1        # нижняя граница веса промежуточных
+BASE_PRICE_ITEMS = ("Минерал", "Сапфир", "Рубин")
+# Стакан от другого бота (order_book) моложе этого заменяет поиск на аукционе
+ORDER_BOOK_MAX_AGE = 10 * 60
 
 # Путь к файлу локов крафта (распределение между ботами)
 CRAFT_LOCKS_FILE = os.path.join(SCRIPT_DIR, "shared_craft_locks.json")
@@ -129,7 +160,6 @@ RECIPE_BOT_CAP = {
 # ============================================
 CRAFT_CAPS_FILE = os.path.join(SCRIPT_DIR, "craft_caps.json")
 CRAFT_CAPS_LOCKFILE = os.path.join(SCRIPT_DIR, "craft_caps.lock")
-SALES_STATS_FILE = os.path.join(SCRIPT_DIR, "profiles", "sales_stats.json")
 
 REBALANCE_INTERVAL = 24 * 3600   # решения не чаще раза в сутки
 REBALANCE_WINDOW_DAYS = 3        # окно статистики продаж
@@ -138,6 +168,7 @@ ST_SCALE_UP = 0.75               # спрос выше — +1 слот
 ST_SCALE_DOWN = 0.40             # спрос ниже — -1 слот
 ST_EXCLUDE = 0.25                # спрос ниже при cap<=1 — рецепт в исключения
 CAP_HARD_MAX = 8                 # потолок слотов на рецепт
+ALLOCATOR_WINDOW_DAYS = 7        # окно продаж для ёмкости рынка в оптимизаторе
 
 _caps_cache = {"mtime": None, "data": None}
 
@@ -180,19 +211,14 @@ def _sales_window_lots(days):
     """(sold, expired): {item_name: лотов} за окно, трансферы не считаются."""
     sold, expired = {}, {}
     try:
-        import datetime as _dt
-        since = (_dt.datetime.now() - _dt.timedelta(days=days)).isoformat()
-        with open(SALES_STATS_FILE, "r", encoding="utf-8") as f:
-            d = json.load(f)
+        from requests_bot import sales_ledger
+        since = time.time() - days * 24 * 3600
         _norm = lambda n: re.sub(r"\s*x\d+$", "", str(n))
-        for r in d.get("sold", []):
-            if not r.get("transfer") and str(r.get("timestamp", "")) >= since:
-                k = _norm(r.get("item"))
-                sold[k] = sold.get(k, 0) + 1
-        for r in d.get("expired", []):
-            if str(r.get("timestamp", "")) >= since:
-                k = _norm(r.get("item"))
-                expired[k] = expired.get(k, 0) + 1
+        for k, agg in sales_ledger.window_aggregates(since, normalize=_norm).items():
+            if agg["sold_lots"]:
+                sold[k] = agg["sold_lots"]
+            if agg["expired_lots"]:
+                expired[k] = agg["expired_lots"]
     except Exception as e:
         print(f"[CRAFT_CAPS] Ошибка чтения статистики продаж: {e}")
     return sold, expired
@@ -363,43 +389,8 @@ def get_sorted_recipes_by_profit():
         # Нет кэша - возвращаем в дефолтном порядке
         return [(r, 0) for r in FINAL_RECIPES]
 
-    recipe_profits = []
-
-    for recipe_id in FINAL_RECIPES:
-        if recipe_id not in RECIPES:
-            continue
-
-        recipe = RECIPES[recipe_id]
-        result_name = recipe["name"]
-        sell_price = cached_prices.get(result_name, 0)
-
-        if sell_price <= 0:
-            recipe_profits.append((recipe_id, 0))
-            continue
-
-        # Расчёт себестоимости
-        reqs = _get_full_requirements_static(recipe_id)
-        mineral_price = cached_prices.get("Минерал", 0)
-
-        total_cost = (
-            reqs["minerals"] * mineral_price +
-            reqs["silver"] / 100.0
-        )
-        total_time = reqs["total_time"]
-
-        if total_time <= 0:
-            recipe_profits.append((recipe_id, 0))
-            continue
-
-        # Учитываем комиссию аукциона 5%
-        net_sell_price = sell_price * (1 - AUCTION_FEE)
-        profit = net_sell_price - total_cost
-        profit_per_hour = (profit / total_time) * 3600
-        recipe_profits.append((recipe_id, profit_per_hour))
-
-    # Сортируем по профиту (убывание)
-    recipe_profits.sort(key=lambda x: x[1], reverse=True)
-    return recipe_profits
+    ranking = rank_recipes(cached_prices, FINAL_RECIPES, n_scenarios=0)
+    return [(r["recipe_id"], r["profit_per_hour"]) for r in ranking]
 
 
 def get_profitable_recipes():
@@ -478,14 +469,11 @@ def get_max_bots_for_recipe(recipe_id):
 
 def calculate_quotas(profitable_recipes, total_bots=21):
     """
-    Распределяет ботов по рецептам с учётом весов И времени крафта.
-
-    Веса по позиции: 1-й=5, 2-й=4, 3-й=4, 4-й=3, 5-й=3, 6-й=2, остальные=1
+    Распределяет ботов по рецептам оптимизатором (craft.allocator).
 
-    Лимиты по времени крафта:
-    - >= 4 часов → max 2 бота (платиновый слиток)
-    - >= 2 часов → max 3 бота (бронзовый/торовый слиток)
-    - < 2 часов → max 5 ботов
+    Максимизирует суммарный ожидаемый з/час с учётом ёмкости рынка
+    (sell-through за ALLOCATOR_WINDOW_DAYS) и капов get_bot_cap. Боты сверх
+    всех капов раздаются туда, где прирост больше.
 
     Args:
         profitable_recipes: list of (recipe_id, profit) отсортированный по убыванию
@@ -494,59 +482,21 @@ def calculate_quotas(profitable_recipes, total_bots=21):
     Returns:
         dict: {recipe_id: quota, ...}
     """
-    weights = [5, 4, 4, 3, 3, 2, 1, 1, 1, 1, 1]  # макс 11 рецептов
-
-    quotas = {}
-    remaining = total_bots
-
-    for i, (recipe_id, profit) in enumerate(profitable_recipes):
-        weight = weights[i] if i < len(weights) else 1
-        max_for_this = get_max_bots_for_recipe(recipe_id)
-        quota = min(weight, max_for_this, remaining)
-        quotas[recipe_id] = quota
-        remaining -= quota
-
-        hours = get_craft_time_hours(recipe_id)
-        if hours >= 2:
-            print(f"[CRAFT_QUOTAS] {recipe_id}: {hours:.1f}ч → лимит {max_for_this} ботов")
-
-        if remaining <= 0:
-            break
-
-    # Если остались боты - добавляем к рецептам где ещё есть место до лимита
-    if remaining > 0:
-        for recipe_id in quotas:
-            max_for_this = get_max_bots_for_recipe(recipe_id)
-            add = min(remaining, max_for_this - quotas[recipe_id])
-            if add > 0:
-                quotas[recipe_id] += add
-                remaining -= add
-            if remaining <= 0:
-                break
-
-    # Если ВСЁ ЕЩЁ остались боты - распределяем равномерно по ВСЕМ рецептам
-    # КРОМЕ platinumBar (слишком долгий - 13ч)
-    if remaining > 0:
-        # Добавляем все рецепты в quotas (если ещё нет)
-        for recipe_id in FINAL_RECIPES:
-            if recipe_id not in quotas:
-                quotas[recipe_id] = 0
-
-        while remaining > 0:
-            # Находим рецепт с минимумом ботов (кроме platinumBar)
-            eligible = {r: q for r, q in quotas.items() if r != "platinumBar"}
-            if not eligible:
-                eligible = quotas
-
-            min_recipe = min(eligible.keys(), key=lambda r: quotas[r])
-            quotas[min_recipe] += 1
-            remaining -= 1
-
-        print(f"[CRAFT_QUOTAS] Равномерно распределены лишние боты")
-
+    recipe_ids = [r for r, _ in profitable_recipes]
+    bots = [(f"bot{i}", None) for i in range(total_bots)]
+    assignment, _ = _plan_allocation(recipe_ids, bots)
+    quotas = {r: 0 for r in recipe_ids}
+    quotas.update(allocator.quotas_from_assignment(assignment))
     return quotas
 
 
+def _plan_allocation(recipe_ids, bots):
+    """Назначение ботов оптимизатором по текущим ценам, продажам и капам."""
+    prices = load_shared_cache() or {}
+    caps = {r: get_bot_cap(r) for r in recipe_ids}
+    return allocator.plan(prices, recipe_ids, bots, ALLOCATOR_WINDOW_DAYS, caps)
+
+
 def _find_open_probe_recipe(locks, now, current_recipe):
     """
     Возвращает probe-рецепт (из RECIPE_BOT_CAP) со СВОБОДНЫМ слотом и профитом
@@ -576,25 +526,74 @@ def _find_open_probe_recipe(locks, now, current_recipe):
     return None
 
 
-def acquire_craft_lock(profile):
+def _active_bots(locks, now, profile, level):
+    """[(profile, craft_level)] для всех ботов со свежим локом + текущий профиль."""
+    bots = [
+        (p, li.get("level"))
+        for p, li in locks.items()
+        if p != profile and now - li.get("timestamp", 0) <= LOCK_TTL
+    ]
+    bots.append((profile, level))
+    return bots
+
+
+def _pick_deficit_recipe(targets, counts, params, level, caps, profit):
+    """
+    Рецепт, где ботов меньше, чем хочет оптимизатор (наибольший недобор,
+    при равенстве — выгоднее). None — недобора нет.
+    """
+    best, best_key = None, None
+    for recipe_id in sorted(params):
+        if not allocator.level_ok(params[recipe_id], level):
+            continue
+        if recipe_id in caps and counts.get(recipe_id, 0) >= caps[recipe_id]:
+            continue
+        deficit = targets.get(recipe_id, 0) - counts.get(recipe_id, 0)
+        if deficit <= 0:
+            continue
+        key = (deficit, profit.get(recipe_id, 0))
+        if best_key is None or key > best_key:
+            best, best_key = recipe_id, key
+    return best
+
+
+def _fresh_counts(locks, now, exclude=None):
+    counts = {recipe: 0 for recipe in FINAL_RECIPES}
+    for p, lock_info in locks.items():
+        recipe_id = lock_info.get("recipe_id")
+        if p == exclude or not recipe_id or recipe_id not in FINAL_RECIPES:
+            continue
+        if now - lock_info.get("timestamp", 0) > LOCK_TTL:
+            continue  # Протух - не считаем
+        counts[recipe_id] = counts.get(recipe_id, 0) + 1
+    return counts
+
+
+def acquire_craft_lock(profile, craft_level=None):
     """
     Берёт лок на крафт для профиля (с file lock для атомарности).
 
-    Структура: {profile: {"recipe_id": "ironBar", "timestamp": 123}, ...}
+    Структура: {profile: {"recipe_id": "ironBar", "timestamp": 123, "level": 3}, ...}
 
-    Логика (равномерное распределение):
+    Логика (оптимизатор craft.allocator):
     1. Если у профиля есть активный лок - продлеваем (но уступаем свободному
-       probe-слоту более выгодного рецепта — чтобы проба активировалась сама)
-    2. Считаем сколько ботов на каждом рецепте (без протухших)
-    3. Находим минимальное количество ботов
-    4. Среди рецептов с минимумом берём самый выгодный
+       probe-слоту более выгодного рецепта, а также уходим, если на рецепте
+       больше ботов, чем хочет оптимизатор, а где-то недобор)
+    2. Оптимизатор раскладывает всех активных ботов по рецептам
+       (ёмкость рынка, капы, уровень крафта каждого бота)
+    3. Берём рецепт с наибольшим недобором до плана (при равенстве — выгоднее)
 
     Args:
         profile: имя профиля (char1, char2, ...)
+        craft_level: уровень крафта бота (None — из config профиля)
 
     Returns:
         str: recipe_id который взяли
     """
+    # Граница партии — заодно подхватываем правки recipes.py без рестарта
+    recipe_dag.reload_recipes_if_changed()
+    level = craft_level if craft_level is not None else get_craft_level()
+
     try:
         with FileLock(CRAFT_LOCKS_LOCKFILE):
             locks = load_craft_locks()
@@ -631,47 +630,50 @@ def acquire_craft_lock(profile):
                         # (иначе новый probe-рецепт никогда не активируется — все
                         # вечно продлевают старое). Переключится только 1 бот (cap).
                         probe = _find_open_probe_recipe(locks, now, recipe_id)
+                        surplus_to = None
                         if probe is None:
+                            # Перебор относительно плана оптимизатора при недоборе
+                            # в другом месте — уходим (по одному на границе партии)
+                            candidate_ids = [r for r in FINAL_RECIPES if r in RECIPES and r not in excluded_now]
+                            assignment, params = _plan_allocation(candidate_ids, _active_bots(locks, now, profile, level))
+                            targets = allocator.quotas_from_assignment(assignment)
+                            counts = _fresh_counts(locks, now)
+                            if counts.get(recipe_id, 0) > targets.get(recipe_id, 0):
+                                surplus_to = _pick_deficit_recipe(
+                                    targets, _fresh_counts(locks, now, exclude=profile), params,
+                                    level, caps_now, dict(get_sorted_recipes_by_profit()))
+                        if probe is None and surplus_to is None:
                             locks[profile]["timestamp"] = now
+                            locks[profile]["level"] = level
                             save_craft_locks(locks)
                             return recipe_id
-                        print(f"[CRAFT_LOCKS] {profile}: свободен probe-слот '{probe}' (выгоднее {recipe_id}) — перевыбираю")
-                        # проваливаемся в реселект ниже — он выберет probe как топ
-
-            # Считаем ботов на каждом рецепте (внутри лока!)
-            bot_counts = {recipe: 0 for recipe in FINAL_RECIPES}
-            for p, lock_info in locks.items():
-                recipe_id = lock_info.get("recipe_id")
-                if not recipe_id or recipe_id not in FINAL_RECIPES:
-                    continue
-                timestamp = lock_info.get("timestamp", 0)
-                if now - timestamp > LOCK_TTL:
-                    continue  # Протух - не считаем
-                bot_counts[recipe_id] = bot_counts.get(recipe_id, 0) + 1
-
-            # Получаем рецепты отсортированные по профиту (без исключённых)
-            sorted_recipes = get_sorted_recipes_by_profit()
-            sorted_recipes = [(r, p) for r, p in sorted_recipes if r not in excluded_now]
-
-            # Кап-лимит: рецепты с живым капом (craft_caps.json), уже забившие
-            # его, убираем из выбора — чтобы новый предмет не наспамили все боты.
-            # Остальные рецепты (без капа) распределяются как раньше.
-            sorted_recipes = [
-                (r, p) for r, p in sorted_recipes
-                if r not in caps_now or bot_counts.get(r, 0) < caps_now[r]
-            ]
-
-            # Находим минимальное кол-во ботов среди доступных рецептов
-            available_counts = [bot_counts.get(r, 0) for r, _ in sorted_recipes]
-            min_count = min(available_counts) if available_counts else 0
-
-            # Среди рецептов с минимумом ботов берём самый выгодный
-            for recipe_id, profit in sorted_recipes:
-                if bot_counts.get(recipe_id, 0) == min_count:
-                    locks[profile] = {"recipe_id": recipe_id, "timestamp": now}
-                    save_craft_locks(locks)
-                    print(f"[CRAFT_LOCKS] {profile}: взял {recipe_id} (ботов: {min_count}, профит: {profit:.1f}з/ч)")
-                    return recipe_id
+                        if probe is not None:
+                            print(f"[CRAFT_LOCKS] {profile}: свободен probe-слот '{probe}' (выгоднее {recipe_id}) — перевыбираю")
+                        else:
+                            print(f"[CRAFT_LOCKS] {profile}: на {recipe_id} ботов больше плана, "
+                                  f"на {surplus_to} недобор — перевыбираю")
+                        # проваливаемся в реселект ниже
+
+            # Считаем ботов на каждом рецепте (внутри лока!), без себя
+            bot_counts = _fresh_counts(locks, now, exclude=profile)
+
+            # Оптимизатор раскладывает всех активных ботов (с нами) по рецептам
+            candidate_ids = [r for r in FINAL_RECIPES if r in RECIPES and r not in excluded_now]
+            assignment, params = _plan_allocation(candidate_ids, _active_bots(locks, now, profile, level))
+            targets = allocator.quotas_from_assignment(assignment)
+            profit = dict(get_sorted_recipes_by_profit())
+
+            # Берём рецепт с наибольшим недобором до плана; нет недобора —
+            # то, что оптимизатор назначил именно нам
+            recipe_id = _pick_deficit_recipe(targets, bot_counts, params, level, caps_now, profit)
+            if recipe_id is None:
+                recipe_id = assignment.get(profile)
+            if recipe_id:
+                locks[profile] = {"recipe_id": recipe_id, "timestamp": now, "level": level}
+                save_craft_locks(locks)
+                print(f"[CRAFT_LOCKS] {profile}: взял {recipe_id} (ботов: {bot_counts.get(recipe_id, 0)}"
+                      f"/{targets.get(recipe_id, 0)}, профит: {profit.get(recipe_id, 0):.1f}з/ч)")
+                return recipe_id
 
             # Fallback - первый из списка
             recipe_id = FINAL_RECIPES[0]
@@ -705,7 +707,9 @@ def refresh_craft_lock(profile, recipe_id):
             batch = get_optimal_batch_size(recipe_id)
 
             # Обновляем/создаём лок для профиля (сбрасываем прогресс после продажи)
-            locks[profile] = {"recipe_id": recipe_id, "timestamp": now, "current": 0, "batch": batch}
+            level = locks.get(profile, {}).get("level")
+            locks[profile] = {"recipe_id": recipe_id, "timestamp": now, "current": 0, "batch": batch,
+                              "level": level}
             save_craft_locks(locks)
             print(f"[CRAFT_LOCKS] {profile}: обновил лок на {recipe_id}")
     except Exception as e:
@@ -733,7 +737,8 @@ def update_craft_progress(profile, recipe_id, current_count, batch_size):
                 "recipe_id": recipe_id,
                 "timestamp": now,
                 "current": current_count,
-                "batch": batch_size
+                "batch": batch_size,
+                "level": locks.get(profile, {}).get("level"),
             }
             save_craft_locks(locks)
     except Exception as e:
@@ -788,33 +793,43 @@ AUCTION_CATEGORIES = {
 }
 
 
+def _fresh_cached_prices():
+    """{item_name: золото/шт} для цен моложе их собственного max age."""
+    service = get_price_service()
+    result = {}
+    for name in _all_price_items():
+        silver = service.get(name, max_age=_price_max_age(name))
+        if silver is not None:
+            result[name] = silver / 100.0
+    return result
+
+
 def load_shared_cache():
     """
-    Загружает общий кэш цен из файла.
+    Загружает общий кэш цен (PriceService).
+
+    Кэш годен, пока не протухла ни одна критичная цена (минерал + финальные
+    рецепты); промежуточные живут дольше и подтягиваются инкрементально.
 
     Returns:
-        dict: {"prices": {item_name: price}, "timestamp": int}
+        dict: {item_name: цена за 1 шт в золоте} или None если кэш устарел
     """
-    if not os.path.exists(SHARED_CACHE_FILE):
+    service = get_price_service()
+    critical = _critical_price_items()
+    stale_critical = [name for name in get_stale_items() if name in critical]
+
+    if stale_critical:
+        if _partial_cache_ready():
+            print("[CACHE] Используем частично обновлённый кэш (идёт refresh)")
+            return _fresh_cached_prices()
+        age = service.marker_age(CRAFT_PRICES_MARKER)
+        if age != float("inf"):
+            print(f"[CACHE] Устарели цены: {', '.join(stale_critical)}, обновляем...")
         return None
 
-    try:
-        with open(SHARED_CACHE_FILE, "r", encoding="utf-8") as f:
-            cache = json.load(f)
-
-        # Проверяем срок действия
-        timestamp = cache.get("timestamp", 0)
-        age = time.time() - timestamp
-
-        if age > CACHE_TTL:
-            print(f"[CACHE] Кэш устарел ({age/3600:.1f}ч), обновляем...")
-            return None
-
-        print(f"[CACHE] Используем кэш (возраст: {age/3600:.1f}ч)")
-        return cache.get("prices", {})
-    except Exception as e:
-        print(f"[CACHE] Ошибка чтения кэша: {e}")
-        return None
+    age = service.marker_age(CRAFT_PRICES_MARKER)
+    print(f"[CACHE] Используем кэш (последний refresh: {age/3600:.1f}ч назад)")
+    return _fresh_cached_prices()
 
 
 def save_shared_cache(prices):
@@ -822,18 +837,11 @@ def save_shared_cache(prices):
     Сохраняет цены в общий кэш.
 
     Args:
-        prices: dict {item_name: price}
+        prices: dict {item_name: цена за 1 шт в золоте}
     """
-    try:
-        cache = {
-            "prices": prices,
-            "timestamp": int(time.time())
-        }
-        with open(SHARED_CACHE_FILE, "w", encoding="utf-8") as f:
-            json.dump(cache, f, ensure_ascii=False, indent=2)
-        print(f"[CACHE] Сохранено {len(prices)} цен в общий кэш")
-    except Exception as e:
-        print(f"[CACHE] Ошибка сохранения кэша: {e}")
+    silver_prices = {name: price * 100.0 for name, price in prices.items()}
+    get_price_service().update(silver_prices, source="craft", marker=CRAFT_PRICES_MARKER)
+    print(f"[CACHE] Сохранено {len(prices)} цен в общий кэш")
 
 
 def get_cached_price(item_name):
@@ -844,12 +852,12 @@ def get_cached_price(item_name):
         item_name: название предмета
 
     Returns:
-        float or None: цена или None если не найдена
+        float or None: цена за 1 шт в золоте или None если не найдена
     """
-    cached_prices = load_shared_cache()
-    if cached_prices:
-        return cached_prices.get(item_name)
-    return None
+    silver = get_price_service().get(item_name, max_age=CACHE_TTL)
+    if silver is None:
+        return None
+    return silver / 100.0
 
 
 def is_cache_expired():
@@ -857,20 +865,9 @@ def is_cache_expired():
     Проверяет истёк ли кэш цен.
 
     Returns:
-        bool: True если кэш устарел или не существует
+        bool: True если есть хоть одна цена, которую пора перезапросить
     """
-    if not os.path.exists(SHARED_CACHE_FILE):
-        return True
-
-    try:
-        with open(SHARED_CACHE_FILE, "r", encoding="utf-8") as f:
-            cache = json.load(f)
-
-        timestamp = cache.get("timestamp", 0)
-        age = time.time() - timestamp
-        return age > CACHE_TTL
-    except Exception:
-        return True
+    return bool(get_stale_items())
 
 
 def get_best_craft_from_cache():
@@ -895,64 +892,34 @@ def get_best_craft_from_cache():
     Returns:
         tuple: (item_id: str or None, needs_refresh: bool)
     """
-    # Проверяем кэш
-    if is_cache_expired():
-        print("[CRAFT_PRICES] Кэш устарел, требуется обновление")
-        return (None, True)
-
+    # Кэш годен, пока свежи критичные цены (промежуточные не мешают выбору)
     cached_prices = load_shared_cache()
     if not cached_prices:
         print("[CRAFT_PRICES] Кэш пуст, требуется обновление")
         return (None, True)
 
-    # Используем глобальную константу FINAL_RECIPES
+    # Все финальные рецепты одной матричной операцией + разброс по сценариям цен
+    model = get_profit_model(FINAL_RECIPES)
+    point = model.evaluate(cached_prices)
+    spread = model.scenarios(cached_prices)
+
     best_recipe = None
     best_profit_per_hour = -float('inf')
 
-    for recipe_id in FINAL_RECIPES:
-        if recipe_id not in RECIPES:
-            continue
-
-        recipe = RECIPES[recipe_id]
-        result_name = recipe["name"]
-
+    for recipe_id, result_name in zip(model.recipe_ids, model.names):
         # Цена продажи
         sell_price = cached_prices.get(result_name, 0)
         if sell_price <= 0:
             continue
 
-        # Расчёт полной себестоимости "с нуля"
-        # Используем рекурсивный расчёт через временный checker
-        total_cost = 0
-        total_time = 0
-
-        # Простой расчёт себестоимости по кэшу
-        # Минералы - основной ресурс
-        mineral_price = cached_prices.get("Минерал", 0)
-        sapphire_price = cached_prices.get("Сапфир", 0)
-        ruby_price = cached_prices.get("Рубин", 0)
-
-        # Получаем полные требования для рецепта
-        reqs = _get_full_requirements_static(recipe_id)
-
-        total_cost = (
-            reqs["minerals"] * mineral_price +
-            reqs["sapphires"] * sapphire_price +
-            reqs["rubies"] * ruby_price +
-            reqs["silver"] / 100.0  # серебро в золото
-        )
-        total_time = reqs["total_time"]
-
-        if total_time <= 0:
+        info = point[recipe_id]
+        if info["total_time"] <= 0:
             continue
 
-        # Учитываем комиссию аукциона 5%
-        net_sell_price = sell_price * (1 - AUCTION_FEE)
-        profit = net_sell_price - total_cost
-        profit_per_hour = (profit / total_time) * 3600
-
-        print(f"[CRAFT_PRICES] {result_name}: продажа={sell_price:.2f}з (-5%={net_sell_price:.2f}з), себестоимость={total_cost:.2f}з, "
-              f"профит={profit:.2f}з, профит/час={profit_per_hour:.2f}з")
+        profit_per_hour = info["profit_per_hour"]
+        print(f"[CRAFT_PRICES] {result_name}: продажа={sell_price:.2f}з (-5%={info['net_sell_price']:.2f}з), "
+              f"себестоимость={info['cost']:.2f}з, профит={info['profit']:.2f}з, "
+              f"профит/час={profit_per_hour:.2f}±{spread[recipe_id]['std']:.2f}з")
 
         if profit_per_hour > best_profit_per_hour:
             best_profit_per_hour = profit_per_hour
@@ -969,49 +936,12 @@ def get_best_craft_from_cache():
 def _get_full_requirements_static(recipe_id, count=1):
     """
     Статическая версия get_full_requirements без необходимости создавать CraftPriceChecker.
-    Рекурсивно вычисляет все базовые ресурсы для крафта.
+    Берёт базовые ресурсы из предпосчитанного графа рецептов (craft.dag).
 
     Returns:
         dict: {"minerals": int, "sapphires": int, "rubies": int, "silver": int, "total_time": int}
     """
-    if recipe_id not in RECIPES:
-        return {"minerals": 0, "sapphires": 0, "rubies": 0, "silver": 0, "total_time": 0}
-
-    recipe = RECIPES[recipe_id]
-    result = {
-        "minerals": 0,
-        "sapphires": 0,
-        "rubies": 0,
-        "silver": 0,
-        "total_time": 0,
-    }
-
-    # Время на сам крафт
-    result["total_time"] = recipe.get("craft_time", 0) * count
-
-    # Ресурсы этого рецепта
-    if "minerals" in recipe:
-        result["minerals"] = recipe["minerals"] * count
-    if "sapphires" in recipe:
-        result["sapphires"] = recipe["sapphires"] * count
-    if "rubies" in recipe:
-        result["rubies"] = recipe["rubies"] * count
-    if "silver" in recipe:
-        result["silver"] = recipe["silver"] * count
-
-    # Рекурсивно обрабатываем зависимости
-    if "requires" in recipe:
-        for req_id, req_count in recipe["requires"].items():
-            total_req = req_count * count
-            sub_req = _get_full_requirements_static(req_id, total_req)
-
-            result["minerals"] += sub_req["minerals"]
-            result["sapphires"] += sub_req["sapphires"]
-            result["rubies"] += sub_req["rubies"]
-            result["silver"] += sub_req["silver"]
-            result["total_time"] += sub_req["total_time"]
-
-    return result
+    return recipe_dag.get_requirements(recipe_id, count)
 
 
 def get_optimal_batch_size(recipe_id):
@@ -1095,12 +1025,16 @@ def refresh_craft_prices_cache(client):
             # Лок занят другим ботом - проверяем свежесть кэша
             print("[CRAFT_PRICES] Другой бот обновляет кэш, проверяю свежесть...")
 
-            # Ждём до 30 секунд пока кэш обновится
-            for _ in range(6):
-                time.sleep(5)
+            # Ждём до 30 секунд пока кэш обновится. Цены публикуются по
+            # одной — как только критичные на месте, работаем с ними.
+            for _ in range(30):
+                time.sleep(1)
                 if not is_cache_expired():
                     print("[CRAFT_PRICES] Кэш обновлён другим ботом")
                     return True
+                if _partial_cache_ready():
+                    print("[CRAFT_PRICES] Критичные цены уже обновлены другим ботом")
+                    return True
 
             print("[CRAFT_PRICES] Кэш всё ещё устарел, пробую сам...")
             # Берём блокирующий лок
@@ -1114,13 +1048,14 @@ def refresh_craft_prices_cache(client):
 
         try:
             # Ещё раз проверяем - может уже обновили
-            if not is_cache_expired():
+            stale = get_stale_items()
+            if not stale:
                 print("[CRAFT_PRICES] Кэш уже свежий")
                 return True
 
-            print("[CRAFT_PRICES] Обновляю кэш цен с аукциона...")
+            print(f"[CRAFT_PRICES] Обновляю {len(stale)} устаревших цен с аукциона...")
             checker = CraftPriceChecker(client, use_cache=False)
-            prices = checker.get_all_craft_prices()
+            prices = checker.get_all_craft_prices(items=stale)
 
             if prices and len(prices) > 0:
                 print(f"[CRAFT_PRICES] Кэш обновлён: {len(prices)} цен")
@@ -1143,6 +1078,211 @@ def refresh_craft_prices_cache(client):
         return False
 
 
+_LIST_EL_RE = re.compile(r'<div[^>]*class="[^"]*\blist-el\b')
+_LOT_FRAGMENT_MAX = 8000
+
+
+def parse_first_lot(html):
+    """
+    Парсит только первый лот (div.list-el) страницы аукциона.
+
+    Вырезает фрагмент HTML от первого list-el до второго и отдаёт в
+    BeautifulSoup только его — полная страница не парсится.
+
+    Returns:
+        tuple: (qty, gold, silver) или None если лотов нет / нет блока цены
+    """
+    m = _LIST_EL_RE.search(html)
+    if not m:
+        return None
+    nxt = _LIST_EL_RE.search(html, m.end())
+    end = nxt.start() if nxt else min(len(html), m.start() + _LOT_FRAGMENT_MAX)
+    lot = BeautifulSoup(html[m.start():end], "html.parser")
+
+    # Получаем количество (формат: x1000)
+    text = lot.get_text()
+    qty_match = re.search(r'x(\d+)', text)
+    qty = int(qty_match.group(1)) if qty_match else 1
+
+    # Получаем цену из блока _auction
+    auction_div = lot.select_one("div._auction")
+    if not auction_div:
+        # Альтернативный поиск цены
+        auction_div = lot.select_one("div.b-actions")
+
+    if not auction_div:
+        print(f"[PRICES] Не найден блок цены")
+        return None
+
+    # Парсим цену по иконкам валюты
+    # Формат: <span class="i12 i12-money_gold"></span><span>73</span>
+    #         <span class="i12 i12-money_silver"></span><span>90</span>
+    gold = 0
+    silver = 0
+
+    gold_icon = auction_div.select_one("span.i12-money_gold")
+    silver_icon = auction_div.select_one("span.i12-money_silver")
+
+    if gold_icon:
+        next_span = gold_icon.find_next_sibling("span")
+        if next_span and next_span.get_text(strip=True).isdigit():
+            gold = int(next_span.get_text(strip=True))
+
+    if silver_icon:
+        next_span = silver_icon.find_next_sibling("span")
+        if next_span and next_span.get_text(strip=True).isdigit():
+            silver = int(next_span.get_text(strip=True))
+
+    return qty, gold, silver
+
+
+class _RateLimiter:
+    """Общий для потоков лимит: не чаще одного запроса в min_interval секунд."""
+
+    def __init__(self, min_interval):
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._next = 0.0
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.min_interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+def _clone_session(client):
+    """Отдельная requests.Session с куками и заголовками клиента (для потока)."""
+    session = requests.Session()
+    session.headers.update(client.session.headers)
+    session.cookies.update(client.session.cookies)
+    return session
+
+
+def _critical_price_items():
+    """Цены, без которых не посчитать профит рецептов для автовыбора."""
+    items = {"Минерал"}
+    for recipe_id in FINAL_RECIPES:
+        if recipe_id in RECIPES:
+            items.add(RECIPES[recipe_id]["name"])
+    return items
+
+
+def _partial_cache_ready():
+    """
+    Идёт обновление (маркер свежий) и критичные цены уже опубликованы —
+    ждущие боты могут работать на частично обновлённом кэше.
+    """
+    service = get_price_service()
+    if service.marker_age(CRAFT_PRICES_REFRESHING_MARKER) > REFRESH_PARTIAL_TTL:
+        return False
+    return all(service.age(name) <= service.marker_age(CRAFT_PRICES_REFRESHING_MARKER)
+               for name in _critical_price_items())
+
+
+def _all_price_items():
+    """Все предметы, цены которых нужны крафту (рецепты, их входы, камни)."""
+    items = set(BASE_PRICE_ITEMS)
+    for recipe in RECIPES.values():
+        items.add(recipe["name"])
+        for req_id in recipe.get("requires", {}):
+            if req_id in ITEM_NAMES:
+                items.add(ITEM_NAMES[req_id])
+    return items
+
+
+def _price_max_age(item_name):
+    """Жёсткий предел возраста цены: базовые ресурсы < финалы < промежуточные."""
+    if item_name in BASE_PRICE_ITEMS:
+        return PRICE_MAX_AGE_BASE
+    if item_name in _critical_price_items():
+        return PRICE_MAX_AGE_FINAL
+    return PRICE_MAX_AGE_OTHER
+
+
+def _price_relevance():
+    """
+    Вес цены в профите: сколько з/час крафта она двигает, нормировано к 1.
+
+    Финальный рецепт двигает свою выручку, базовые ресурсы — свою долю
+    себестоимости во всех финальных рецептах. Промежуточные нужны только
+    для buy-профита — их вес берём от собственной выручки и режем.
+    Без цен в кэше считаем в штуках/час (все цены = 1).
+    """
+    service = get_price_service()
+
+    def price(name):
+        silver = service.get(name, max_age=float("inf"))
+        return silver / 100.0 if silver else 1.0
+
+    weights = {}
+    final_names = set()
+    for recipe_id in FINAL_RECIPES:
+        if recipe_id not in RECIPES:
+            continue
+        reqs = _get_full_requirements_static(recipe_id)
+        if reqs["total_time"] <= 0:
+            continue
+        per_hour = 3600.0 / reqs["total_time"]
+        name = RECIPES[recipe_id]["name"]
+        final_names.add(name)
+        weights[name] = weights.get(name, 0) + price(name) * per_hour
+        for res_key, res_name in (("minerals", "Минерал"), ("sapphires", "Сапфир"), ("rubies", "Рубин")):
+            if reqs[res_key]:
+                weights[res_name] = weights.get(res_name, 0) + reqs[res_key] * price(res_name) * per_hour
+
+    top = max(weights.values(), default=0) or 1.0
+    relevance = {name: w / top for name, w in weights.items()}
+    for name in _critical_price_items():
+        # Критичные цены не должны "засыпать" из-за малого веса
+        relevance[name] = 1.0
+    for name in _all_price_items():
+        if name in relevance:
+            continue
+        relevance[name] = PRICE_MIN_RELEVANCE
+    return relevance
+
+
+def get_stale_items():
+    """
+    Цены, которые пора перезапросить, от самых влияющих на профит.
+
+    Цена протухла, если:
+      - её нет и последний refresh был дольше её max age назад
+        (не ищем каждый раз то, чего нет на аукционе);
+      - она старше своего max age;
+      - ожидаемый уход (volatility * √возраст) × вес в профите > порога.
+    Моложе PRICE_MIN_AGE цены не трогаем никогда.
+
+    Returns:
+        list: названия предметов, отсортированные по drift × вес (убыв.)
+    """
+    service = get_price_service()
+    relevance = _price_relevance()
+    last_refresh = service.marker_age(CRAFT_PRICES_MARKER)
+    critical = _critical_price_items()
+
+    scored = []
+    for name in _all_price_items():
+        weight = relevance.get(name, PRICE_MIN_RELEVANCE)
+        max_age = _price_max_age(name)
+        age = service.age(name)
+        if age == float("inf"):
+            if last_refresh > max_age:
+                scored.append((float("inf"), name in critical, name))
+            continue
+        if age < PRICE_MIN_AGE:
+            continue
+        score = service.expected_drift(name, PRICE_DEFAULT_VOL) * weight
+        if age > max_age or score >= PRICE_DRIFT_THRESHOLD:
+            scored.append((score, name in critical, name))
+
+    scored.sort(key=lambda x: (x[0], x[1]), reverse=True)
+    return [name for _, _, name in scored]
+
+
 class CraftPriceChecker:
     """Получает цены с аукциона для крафтовых материалов"""
 
@@ -1158,12 +1298,12 @@ class CraftPriceChecker:
         self.use_cache = use_cache
 
     # ============================================
-    # Рекурсивный расчёт полной себестоимости "с нуля"
+    # Расчёт полной себестоимости "с нуля"
     # ============================================
 
     def get_full_requirements(self, recipe_id, count=1):
         """
-        Рекурсивно вычисляет ВСЕ базовые ресурсы для крафта.
+        Все базовые ресурсы для крафта (lookup в графе рецептов craft.dag).
 
         Args:
             recipe_id: ID рецепта (например "platinumBar")
@@ -1179,62 +1319,7 @@ class CraftPriceChecker:
                 "craft_steps": list,  # этапы крафта
             }
         """
-        if recipe_id not in RECIPES:
-            return {"minerals": 0, "sapphires": 0, "rubies": 0, "silver": 0, "total_time": 0, "craft_steps": []}
-
-        recipe = RECIPES[recipe_id]
-        result = {
-            "minerals": 0,
-            "sapphires": 0,
-            "rubies": 0,
-            "silver": 0,
-            "total_time": 0,
-            "craft_steps": [],
-        }
-
-        # Время на сам крафт этого предмета
-        result["total_time"] = recipe.get("craft_time", 0) * count
-
-        # Минералы этого рецепта
-        if "minerals" in recipe:
-            result["minerals"] = recipe["minerals"] * count
-
-        # Сапфиры и рубины этого рецепта
-        if "sapphires" in recipe:
-            result["sapphires"] = recipe["sapphires"] * count
-        if "rubies" in recipe:
-            result["rubies"] = recipe["rubies"] * count
-
-        # Серебро (игровая валюта, 100 серебра = 1 золото)
-        if "silver" in recipe:
-            result["silver"] = recipe["silver"] * count
-
-        # Добавляем этот шаг
-        result["craft_steps"].append({
-            "recipe": recipe_id,
-            "name": recipe["name"],
-            "count": count,
-            "time": recipe.get("craft_time", 0) * count,
-        })
-
-        # Рекурсивно обрабатываем зависимости
-        if "requires" in recipe:
-            for req_id, req_count in recipe["requires"].items():
-                total_req = req_count * count  # сколько нужно для count штук
-
-                # Рекурсивно получаем требования для компонента
-                sub_req = self.get_full_requirements(req_id, total_req)
-
-                result["minerals"] += sub_req["minerals"]
-                result["sapphires"] += sub_req["sapphires"]
-                result["rubies"] += sub_req["rubies"]
-                result["silver"] += sub_req["silver"]
-                result["total_time"] += sub_req["total_time"]
-
-                # Вставляем шаги компонентов ПЕРЕД текущим шагом
-                result["craft_steps"] = sub_req["craft_steps"] + result["craft_steps"]
-
-        return result
+        return recipe_dag.get_requirements(recipe_id, count, with_steps=True)
 
     def calculate_full_cost(self, recipe_id):
         """
@@ -1287,12 +1372,14 @@ class CraftPriceChecker:
                 return cat_info
         return None
 
-    def search_item(self, item_name):
+    def search_item(self, item_name, session=None):
         """
         Ищет предмет на аукционе и возвращает цену за 1 шт.
 
         Args:
             item_name: Название предмета (например "Минерал")
+            session: отдельная requests.Session (параллельный refresh) —
+                     тогда self.client и его current_page не трогаются
 
         Returns:
             float or None: Цена за 1 шт в золоте (с учётом серебра)
@@ -1313,56 +1400,35 @@ class CraftPriceChecker:
 
         search_url = f"{BASE_URL}/auction?" + urlencode(params, encoding='utf-8')
 
+        # Свежий стакан от бота, который только что был на этой странице —
+        # поиск не нужен
+        lot = order_book.min_lot(item_name, max_age=ORDER_BOOK_MAX_AGE)
+        if lot:
+            gold, silver, qty = lot
+            price_per_unit = (gold + silver / 100.0) / qty
+            print(f"[PRICES] {item_name}: из общего стакана {qty} шт за {gold}з {silver}с = {price_per_unit:.4f}з/шт")
+            return price_per_unit
+
         print(f"[PRICES] Ищу '{item_name}' на аукционе...")
 
         try:
-            self.client.get(search_url)
-            soup = self.client.soup()
+            if session is not None:
+                html = session.get(search_url, timeout=15).text
+            else:
+                self.client.get(search_url)
+                html = self.client.current_page
 
-            if not soup:
+            if not html:
                 print(f"[PRICES] Не удалось загрузить страницу")
                 return None
 
-            # Парсим первый лот
-            lot = soup.select_one("div.list-el")
-            if not lot:
+            # Парсим только первый лот
+            parsed = parse_first_lot(html)
+            if parsed is None:
                 print(f"[PRICES] Нет лотов для '{item_name}'")
                 return None
 
-            # Получаем количество (формат: x1000)
-            text = lot.get_text()
-            qty_match = re.search(r'x(\d+)', text)
-            qty = int(qty_match.group(1)) if qty_match else 1
-
-            # Получаем цену из блока _auction
-            auction_div = lot.select_one("div._auction")
-            if not auction_div:
-                # Альтернативный поиск цены
-                auction_div = lot.select_one("div.b-actions")
-
-            if not auction_div:
-                print(f"[PRICES] Не найден блок цены")
-                return None
-
-            # Парсим цену по иконкам валюты
-            # Формат: <span class="i12 i12-money_gold"></span><span>73</span>
-            #         <span class="i12 i12-money_silver"></span><span>90</span>
-            gold = 0
-            silver = 0
-
-            gold_icon = auction_div.select_one("span.i12-money_gold")
-            silver_icon = auction_div.select_one("span.i12-money_silver")
-
-            if gold_icon:
-                next_span = gold_icon.find_next_sibling("span")
-                if next_span and next_span.get_text(strip=True).isdigit():
-                    gold = int(next_span.get_text(strip=True))
-
-            if silver_icon:
-                next_span = silver_icon.find_next_sibling("span")
-                if next_span and next_span.get_text(strip=True).isdigit():
-                    silver = int(next_span.get_text(strip=True))
-
+            qty, gold, silver = parsed
             if gold == 0 and silver == 0:
                 print(f"[PRICES] Не удалось распарсить цену")
                 return None
@@ -1372,6 +1438,8 @@ class CraftPriceChecker:
             price_per_unit = total_price / qty
 
             print(f"[PRICES] {item_name}: {qty} шт за {gold}з {silver}с = {price_per_unit:.4f}з/шт")
+            # В историю — только первый лот (страница дальше не парсится)
+            record_lots(item_name, [(qty, gold * 100 + silver, False)], source="craft")
 
             return price_per_unit
 
@@ -1381,11 +1449,31 @@ class CraftPriceChecker:
             traceback.print_exc()
             return None
 
-    def get_all_craft_prices(self):
+    def get_price_items(self):
+        """
+        Все предметы, цены которых нужны крафту. Сначала — критичные для
+        выбора рецепта (минерал + финальные рецепты), чтобы ждущие боты
+        могли стартовать на частично обновлённом кэше.
+
+        Returns:
+            list: названия предметов
+        """
+        all_items = _all_price_items()
+        critical = _critical_price_items()
+        return sorted(all_items & critical) + sorted(all_items - critical)
+
+    def get_all_craft_prices(self, items=None):
         """
         Получает цены на все крафтовые материалы.
         Использует общий кэш если доступен.
 
+        Без кэша — параллельный поиск REFRESH_WORKERS сессиями под общим
+        rate limit; каждая цена сразу публикуется в PriceService.
+
+        Args:
+            items: список предметов для перезапроса (None — все). Остальные
+                цены берутся из кэша как есть.
+
         Returns:
             dict: {item_name: price_per_unit}
         """
@@ -1398,37 +1486,49 @@ class CraftPriceChecker:
                 return cached_prices
 
         # Кэш не найден - парсим с аукциона
-        # Собираем все уникальные названия
-        all_items = set()
+        partial = items is not None
+        if not partial:
+            items = self.get_price_items()
 
-        # Из рецептов
-        for recipe_id, recipe in RECIPES.items():
-            all_items.add(recipe["name"])
-            if "requires" in recipe:
-                for req_id in recipe["requires"]:
-                    if req_id in ITEM_NAMES:
-                        all_items.add(ITEM_NAMES[req_id])
+        print(f"[PRICES] Парсим цены для {len(items)} предметов с аукциона "
+              f"({REFRESH_WORKERS} потока)...")
 
-        # Ресурсы для крафта
-        all_items.add("Минерал")
-        all_items.add("Сапфир")
-        all_items.add("Рубин")
+        service = get_price_service()
+        service.update({}, marker=CRAFT_PRICES_REFRESHING_MARKER)
 
-        print(f"[PRICES] Парсим цены для {len(all_items)} предметов с аукциона...")
+        limiter = _RateLimiter(REFRESH_MIN_INTERVAL)
+        local = threading.local()
 
-        prices = {}
-        for item_name in sorted(all_items):
-            price = self.search_item(item_name)
-            if price is not None:
-                prices[item_name] = price
-            time.sleep(0.5)  # Пауза между запросами
+        def fetch(item_name):
+            if not hasattr(local, "session"):
+                local.session = _clone_session(self.client)
+            limiter.wait()
+            return self.search_item(item_name, session=local.session)
 
-        self.prices = prices
+        prices = {}
+        with ThreadPoolExecutor(max_workers=REFRESH_WORKERS) as pool:
+            futures = {pool.submit(fetch, name): name for name in items}
+            for future in as_completed(futures):
+                item_name = futures[future]
+                try:
+                    price = future.result()
+                except Exception as e:
+                    print(f"[PRICES] Ошибка поиска '{item_name}': {e}")
+                    continue
+                if price is not None:
+                    prices[item_name] = price
+                    # Инкрементальная публикация — ждущие боты видят цену сразу
+                    service.set(item_name, price * 100.0, source="craft")
 
         # Всегда сохраняем в общий кэш после парсинга
         # use_cache контролирует только ЧТЕНИЕ, не запись
         save_shared_cache(prices)
 
+        if partial:
+            # Свежие цены поверх того, что ещё живо в кэше
+            prices = {**_fresh_cached_prices(), **prices}
+        self.prices = prices
+
         return prices
 
     def calculate_craft_profit(self, recipe_id):
@@ -1590,33 +1690,38 @@ class CraftPriceChecker:
         """
         profits = []
 
+        # Полный расчёт "с нуля" для всех рецептов — одна матричная операция,
+        # плюс разброс профита/час по сценариям цен
+        model = get_profit_model(list(RECIPES))
+        full = model.evaluate(self.prices)
+        spread = model.scenarios(self.prices)
+
         for recipe_id in RECIPES:
             profit_info = self.calculate_craft_profit(recipe_id)
             if profit_info:
                 profit_info["recipe_id"] = recipe_id
 
                 # Добавляем полный расчёт "с нуля"
-                full_cost = self.calculate_full_cost(recipe_id)
-                profit_info["full_minerals"] = full_cost["minerals"]
-                profit_info["full_sapphires"] = full_cost["sapphires"]
-                profit_info["full_rubies"] = full_cost["rubies"]
-                profit_info["full_silver"] = full_cost["silver"]
-                profit_info["full_time"] = full_cost["total_time"]
-                profit_info["full_cost"] = full_cost["total_cost"]
-                profit_info["craft_steps"] = full_cost["craft_steps"]
+                reqs = recipe_dag.get_requirements(recipe_id, with_steps=True)
+                full_cost = full[recipe_id]
+                profit_info["full_minerals"] = reqs["minerals"]
+                profit_info["full_sapphires"] = reqs["sapphires"]
+                profit_info["full_rubies"] = reqs["rubies"]
+                profit_info["full_silver"] = reqs["silver"]
+                profit_info["full_time"] = reqs["total_time"]
+                profit_info["full_cost"] = full_cost["cost"]
+                profit_info["craft_steps"] = reqs["craft_steps"]
 
                 # Профит "с нуля" = цена продажи (после комиссии) - полная себестоимость
-                profit_info["full_profit"] = profit_info["net_sell_price"] - full_cost["total_cost"]
-                if full_cost["total_cost"] > 0:
-                    profit_info["full_profit_percent"] = (profit_info["full_profit"] / full_cost["total_cost"]) * 100
+                profit_info["full_profit"] = full_cost["profit"]
+                if full_cost["cost"] > 0:
+                    profit_info["full_profit_percent"] = (full_cost["profit"] / full_cost["cost"]) * 100
                 else:
                     profit_info["full_profit_percent"] = 0
 
-                # Профит в час (золото/час при крафте с нуля)
-                if full_cost["total_time"] > 0:
-                    profit_info["profit_per_hour"] = (profit_info["full_profit"] / full_cost["total_time"]) * 3600
-                else:
-                    profit_info["profit_per_hour"] = 0
+                # Профит в час (золото/час при крафте с нуля) и его std по сценариям
+                profit_info["profit_per_hour"] = full_cost["profit_per_hour"]
+                profit_info["profit_per_hour_std"] = spread[recipe_id]["std"]
 
                 # Добавляем расчёт "с покупкой компонентов"
                 buy_info = self.calculate_buy_profit(recipe_id)
@@ -0,0 +1,147 @@
+# ============================================
+# VMMO Dashboard Aggregator - снимок флота для панели
+# ============================================
+# Каждый запрос "/" и "/api/stats" собирал статистику заново: по каждому
+# профилю config.json, resources.json, status.json, char_info.json,
+# get_craft_info (кэш инвентаря + рекурсия build_ingredient_chain) и
+# проверка живости через .lock и os.kill.
+#
+# Теперь снимок собирает фоновый поток процесса панели:
+#   - сразу, если у отслеживаемых файлов сменились (mtime, size) — stat
+#     раз в POLL_INTERVAL секунд, без зависимостей вроде inotify;
+#   - и не реже раза в REFRESH_INTERVAL секунд (живость процессов,
+#     "N минут назад" в активности);
+#   - по invalidate() — после действий из панели (старт/стоп бота,
+#     сохранение конфига); запрос после invalidate() ждёт свежий снимок.
+# Эндпоинты отдают снимок из памяти — JSON сериализован заранее, ETag
+# посчитан, повторный запрос с If-None-Match получает 304.
+# ============================================
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+
+from requests_bot.cache.file_cache import _file_sig
+
+# Как часто проверять изменение файлов (сек)
+POLL_INTERVAL = 1
+# Как часто пересобирать снимок без изменений файлов (сек)
+REFRESH_INTERVAL = 5
+# Сколько запрос ждёт свежий снимок после invalidate() (сек)
+STALE_WAIT = 3
+
+# data — собранные данные, body — JSON для API, etag — хэш body
+Snapshot = namedtuple("Snapshot", "data body etag built_at")
+
+
+class DashboardAggregator:
+    """Снимок, который держит в памяти и обновляет фоновый поток."""
+
+    def __init__(self, build, watch=None, to_json=None, name="DASHBOARD",
+                 poll=POLL_INTERVAL, interval=REFRESH_INTERVAL):
+        """
+        Args:
+            build: build() -> данные снимка
+            watch: watch() -> пути файлов, смена которых требует пересборки
+            to_json: to_json(data) -> объект для body (по умолчанию data)
+            name: тег для логов
+            poll: период проверки файлов (сек)
+            interval: период пересборки без изменений (сек)
+        """
+        self.build = build
+        self.watch = watch or (lambda: [])
+        self.to_json = to_json or (lambda data: data)
+        self.name = name
+        self.poll = poll
+        self.interval = interval
+
+        self._snap = None
+        self._sigs = {}
+        self._requested = 0  # номер invalidate()
+        self._built_for = 0  # до какого invalidate() снимок актуален
+        self._cond = threading.Condition()
+        self._build_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    # ------------------------------------------------------------------
+    # Сборка
+    # ------------------------------------------------------------------
+
+    def _current_sigs(self):
+        return {path: _file_sig(path) for path in self.watch()}
+
+    def _changed(self) -> bool:
+        return self._current_sigs() != self._sigs
+
+    def rebuild(self):
+        """Собирает снимок сейчас (в вызывающем потоке)."""
+        with self._build_lock:
+            with self._cond:
+                target = self._requested
+            # Подписи — до сборки: изменения во время сборки вызовут ещё одну
+            sigs = self._current_sigs()
+            data = self.build()
+            body = json.dumps(self.to_json(data), ensure_ascii=False, default=str).encode("utf-8")
+            snap = Snapshot(data, body, hashlib.sha1(body).hexdigest()[:20], time.time())
+            with self._cond:
+                self._snap = snap
+                self._sigs = sigs
+                self._built_for = max(self._built_for, target)
+                self._cond.notify_all()
+            return snap
+
+    def _loop(self):
+        while True:
+            woke = self._wake.wait(self.poll)
+            self._wake.clear()
+            try:
+                snap = self._snap
+                due = snap is None or time.time() - snap.built_at >= self.interval
+                if woke or due or self._changed():
+                    self.rebuild()
+            except Exception as e:
+                print(f"[{self.name}] Ошибка сборки снимка: {e}")
+                time.sleep(self.poll)
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._cond:
+            if self._thread is None or not self._thread.is_alive() or self._pid != os.getpid():
+                self._thread = threading.Thread(target=self._loop, name="dashboard", daemon=True)
+                self._pid = os.getpid()
+                self._thread.start()
+
+    # ------------------------------------------------------------------
+    # Для эндпоинтов
+    # ------------------------------------------------------------------
+
+    def snapshot(self, wait: float = STALE_WAIT) -> Snapshot:
+        """
+        Текущий снимок из памяти.
+
+        Первый вызов собирает снимок сам; после invalidate() ждёт (до wait
+        секунд) снимок, собранный позже него.
+        """
+        self._ensure_thread()
+        with self._cond:
+            snap = self._snap
+            fresh = self._built_for >= self._requested
+        if snap is None:
+            return self.rebuild()
+        if not fresh:
+            with self._cond:
+                self._cond.wait_for(lambda: self._built_for >= self._requested, timeout=wait)
+                snap = self._snap
+        return snap
+
+    def invalidate(self):
+        """Данные изменились — пересобрать снимок как можно скорее."""
+        with self._cond:
+            self._requested += 1
+        self._wake.set()
@@ -0,0 +1,122 @@
+# ============================================
+# VMMO Difficulty Bench
+# ============================================
+# Микро-бенчмарк накладных расходов цикла на сложности данжей.
+#
+# "было": как get_all_available_dungeons до кэша — deaths.json
+#          перечитывается и парсится на каждый get_dungeon_difficulty
+#          (по разу на данж + ивент-данжи).
+# "стало": get_dungeon_difficulties() — таблица из кэша, файл не трогаем,
+#          пока не сменился mtime.
+#
+# Данные синтетические (временная папка профиля), реальные профили не
+# затрагиваются.
+#
+# Запуск: python -m requests_bot.difficulty_bench --dungeons 40 --cycles 200
+# ============================================
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from requests_bot import config
+
+# Сколько ивент-данжей дополнительно проверяется за цикл (valentine_event/bot)
+EVENT_LOOKUPS = 3
+
+
+def make_deaths(n_dungeons, seed=1):
+    """Синтетический deaths.json: часть данжей со свежими смертями, часть с game-lock."""
+    rnd = random.Random(seed)
+    now = datetime.now()
+    deaths = {}
+    for i in range(n_dungeons):
+        entries = [{"time": (now - timedelta(hours=rnd.randint(1, 24 * 10))).isoformat(),
+                    "difficulty": rnd.choice(config.DIFFICULTY_LEVELS)}
+                   for _ in range(rnd.randint(0, 6))]
+        data = {"name": f"Данж {i}", "deaths": entries}
+        if i % 7 == 0:
+            data["lock_reason"] = "level"
+            data["locked_at"] = (now - timedelta(hours=rnd.randint(1, 48))).isoformat()
+        deaths[f"dng:Bench{i}"] = data
+    return deaths
+
+
+def legacy_cycle(deaths_file, bases):
+    """Проход цикла без кэша: parse на каждый lookup."""
+    now = datetime.now()
+
+    def lookup(dungeon_id):
+        with open(deaths_file, "r", encoding="utf-8") as f:
+            deaths = json.load(f)
+        data = deaths.get(dungeon_id)
+        base = bases.get(dungeon_id, "brutal")
+        if not data:
+            return base
+        return config._compute_difficulty(data, base, now)[0]
+
+    with open(deaths_file, "r", encoding="utf-8") as f:
+        ids = list(json.load(f))
+    skipped = {d for d in ids if lookup(d) == "skip"}
+    for i in range(EVENT_LOOKUPS):
+        lookup(f"dng:Event{i}")
+    return skipped
+
+
+def cached_cycle():
+    """Проход цикла через таблицу сложностей."""
+    skipped = {d for d, diff in config.get_dungeon_difficulties().items() if diff == "skip"}
+    for i in range(EVENT_LOOKUPS):
+        config.get_dungeon_difficulty(f"dng:Event{i}")
+    return skipped
+
+
+def _time(fn, cycles):
+    start = time.perf_counter()
+    for _ in range(cycles):
+        fn()
+    return (time.perf_counter() - start) / cycles
+
+
+def run(n_dungeons=40, cycles=200):
+    """
+    Меряет оба варианта на одном и том же файле.
+
+    Returns:
+        dict: {"dungeons", "legacy_us", "cached_us", "speedup"} — мкс на цикл
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        ctx = config.ProfileContext("bench", {})
+        ctx.profile_dir = tmp
+        with config.use_profile(ctx):
+            config.save_deaths(make_deaths(n_dungeons))
+            deaths_file = os.path.join(tmp, "deaths.json")
+            bases = ctx.config.get("dungeon_difficulties", {})
+
+            assert legacy_cycle(deaths_file, bases) == cached_cycle()
+            legacy = _time(lambda: legacy_cycle(deaths_file, bases), cycles)
+            cached = _time(cached_cycle, cycles)
+        config.invalidate_deaths_cache()
+
+    return {
+        "dungeons": n_dungeons,
+        "legacy_us": legacy * 1e6,
+        "cached_us": cached * 1e6,
+        "speedup": legacy / cached if cached else float("inf"),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Накладные расходы цикла на сложности данжей")
+    parser.add_argument("--dungeons", type=int, default=40, help="данжей в deaths.json")
+    parser.add_argument("--cycles", type=int, default=200)
+    args = parser.parse_args()
+    r = run(args.dungeons, args.cycles)
+    print(f"данжей: {r['dungeons']}")
+    print(f"было:   {r['legacy_us']:>10.1f} мкс/цикл")
+    print(f"стало:  {r['cached_us']:>10.1f} мкс/цикл")
+    print(f"быстрее в {r['speedup']:.0f} раз")
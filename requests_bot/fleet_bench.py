@@ -0,0 +1,156 @@
+# ============================================
+# VMMO Fleet Bench
+# ============================================
+# Время ответа графиков/итогов панели для "все профили".
+#
+# "было": как api_stats_chart/api_stats_summary/api_stats_sessions до
+#          fleet_history — get_history/get_sessions по каждому профилю,
+#          разбор ISO-времени и сведение в питоне.
+# "стало": fleet_history — один SQL-агрегат по зеркалу (холодный прогон
+#          включает первую синхронизацию всех профилей).
+#
+# Данные синтетические (временная папка профилей), реальные профили не
+# затрагиваются.
+#
+# Запуск: python -m requests_bot.fleet_bench --profiles 22 --days 30
+# ============================================
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime
+
+from requests_bot import resource_history, fleet_history
+from requests_bot.resource_history import RESOURCE_COLUMNS
+
+RESOURCE_KEYS = [RESOURCE_COLUMNS[c] for c in fleet_history.CHART_COLUMNS]
+HOURS = 720
+
+
+def make_history(profiles, days, seed=1):
+    """Почасовые снэпшоты и по сессии в день на каждый профиль."""
+    rnd = random.Random(seed)
+    now = int(time.time())
+    start = now - days * 86400
+    for profile in profiles:
+        values = {c: rnd.randint(0, 10000) for c in RESOURCE_COLUMNS}
+        snapshots = []
+        for ts in range(start, now, resource_history.HISTORY_INTERVAL):
+            for c in values:
+                values[c] += rnd.randint(-5, 50)
+            snapshots.append((ts, {c: values[c] for c in values}))
+        with resource_history._Transaction(profile) as conn:
+            for ts, db_res in snapshots:
+                conn.execute(
+                    f"INSERT INTO resource_snapshots (ts, {', '.join(db_res)}, source) "
+                    f"VALUES (?, {', '.join('?' * len(db_res))}, 'auto')",
+                    (ts, *db_res.values()))
+                resource_history._add_to_rollups(conn, ts, db_res)
+            for day in range(days):
+                s_ts = start + day * 86400
+                conn.execute(
+                    "INSERT INTO bot_sessions (start_ts, end_ts, gold_start, gold_end) "
+                    "VALUES (?, ?, ?, ?)", (s_ts, s_ts + 6 * 3600, day * 100, day * 100 + 70))
+
+
+def legacy_requests(profiles):
+    """Все пять запросов панели по-старому."""
+    histories = {p: resource_history.get_history(HOURS, p) for p in profiles}
+
+    # all: сумма по минутам с last_known
+    grouped = defaultdict(dict)
+    for p, history in histories.items():
+        for snap in history:
+            dt = datetime.fromisoformat(snap['timestamp']).replace(second=0, microsecond=0)
+            grouped[dt.isoformat() + '+03:00'][p] = snap['resources']
+    last_known = {p: {r: 0 for r in RESOURCE_KEYS} for p in profiles}
+    minute = []
+    for ts in sorted(grouped):
+        for p, res in grouped[ts].items():
+            for r in RESOURCE_KEYS:
+                last_known[p][r] = res.get(r, 0)
+        minute.append({r: sum(last_known[p][r] for p in profiles) for r in RESOURCE_KEYS})
+
+    # days / earnings: первый и последний снэпшот дня по профилям
+    daily = defaultdict(dict)
+    for p, history in histories.items():
+        for snap in history:
+            dt = datetime.fromisoformat(snap['timestamp'])
+            day = daily[dt.date()].setdefault(p, {'first': snap, 'last': snap})
+            day['last'] = snap
+    earnings = {d: {r: sum(v['last']['resources'].get(r, 0) - v['first']['resources'].get(r, 0)
+                           for v in per_profile.values()) for r in RESOURCE_KEYS}
+                for d, per_profile in daily.items()}
+
+    # summary
+    summary = {r: sum(h[-1]['resources'].get(r, 0) - h[0]['resources'].get(r, 0)
+                      for h in histories.values() if len(h) >= 2) for r in RESOURCE_KEYS}
+
+    # sessions
+    sessions = []
+    for p in profiles:
+        sessions.extend(resource_history.get_sessions(20, p))
+    sessions.sort(key=lambda x: x['start_time'], reverse=True)
+    return minute, earnings, summary, sessions[:20]
+
+
+def fleet_requests(fleet, profiles):
+    return (fleet.minute_totals(profiles, HOURS), fleet.daily_totals(profiles, HOURS),
+            fleet.daily_earnings(profiles, HOURS), fleet.period_change(profiles, HOURS),
+            fleet.sessions(profiles, 20))
+
+
+def _time(fn, runs):
+    start = time.perf_counter()
+    for _ in range(runs):
+        fn()
+    return (time.perf_counter() - start) / runs
+
+
+def run(n_profiles=22, days=30, runs=5):
+    """
+    Returns:
+        dict: {"profiles", "days", "legacy_ms", "fleet_cold_ms", "fleet_ms", "speedup"}
+    """
+    profiles = [f"bench{i}" for i in range(n_profiles)]
+    saved_dir = resource_history.PROFILES_DIR
+    with tempfile.TemporaryDirectory() as tmp:
+        resource_history.PROFILES_DIR = tmp
+        try:
+            make_history(profiles, days)
+            fleet = fleet_history.FleetHistory(os.path.join(tmp, "fleet_history.db"))
+
+            cold = _time(lambda: fleet_requests(fleet, profiles), 1)
+            legacy = _time(lambda: legacy_requests(profiles), runs)
+            warm = _time(lambda: fleet_requests(fleet, profiles), runs)
+
+            assert legacy_requests(profiles)[2] == fleet.period_change(profiles, HOURS)
+        finally:
+            resource_history.close_connections()
+            resource_history.PROFILES_DIR = saved_dir
+
+    return {
+        "profiles": n_profiles,
+        "days": days,
+        "legacy_ms": legacy * 1e3,
+        "fleet_cold_ms": cold * 1e3,
+        "fleet_ms": warm * 1e3,
+        "speedup": legacy / warm if warm else float("inf"),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Время ответа статистики панели по всем профилям")
+    parser.add_argument("--profiles", type=int, default=22)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+    r = run(args.profiles, args.days, args.runs)
+    print(f"профилей: {r['profiles']}, дней: {r['days']}")
+    print(f"было:            {r['legacy_ms']:>8.1f} мс (chart all + days + earnings + summary + sessions)")
+    print(f"стало (холодно): {r['fleet_cold_ms']:>8.1f} мс (с первой синхронизацией)")
+    print(f"стало:           {r['fleet_ms']:>8.1f} мс")
+    print(f"быстрее в {r['speedup']:.0f} раз")
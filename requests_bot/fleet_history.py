@@ -0,0 +1,412 @@
+# ============================================
+# VMMO Fleet History - история ресурсов всех профилей в одной БД
+# ============================================
+# Панель для "все профили" открывала resource_history.db каждого профиля,
+# тащила всю историю в питон и сводила её вручную (сумма по ботам на
+# минуту/день, заработок по дням, итоги, сессии).
+#
+# Теперь у панели есть своя БД profiles/fleet_history.db — зеркало
+# историй профилей с колонкой profile. Перед запросом зеркало догоняется
+# инкрементально: профильная БД подключается через ATTACH (по одной —
+# лимит SQLite на ATTACH по умолчанию 10, профилей больше), копируются
+# только новые строки, DETACH. Профили, у которых файлы БД не менялись,
+# не трогаются вовсе. Сами агрегаты — один SQL-запрос на весь флот.
+#
+# Зеркало — производные данные: его можно удалить, оно соберётся заново.
+# ============================================
+
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from requests_bot import resource_history
+from requests_bot.resource_history import RESOURCE_COLUMNS
+
+# Ресурсы на графиках панели (марки не рисуем)
+CHART_COLUMNS = [c for c in RESOURCE_COLUMNS if c != 'stamps']
+
+# Сырые строки старше — удаляются из зеркала (как cleanup_old_data)
+KEEP_DAYS = 90
+
+# Версия схемы зеркала (PRAGMA user_version); при смене зеркало пересобирается
+MIRROR_VERSION = 1
+
+_COLUMNS = list(RESOURCE_COLUMNS)
+_SESSION_COLUMNS = [f"{c}_{edge}" for c in _COLUMNS for edge in ("start", "end")]
+
+
+def _rollup_columns() -> List[str]:
+    return [name for c in _COLUMNS for name in (f"{c}_first", c)]
+
+
+_SCHEMA = f'''
+    CREATE TABLE IF NOT EXISTS fleet_snapshots (
+        profile TEXT NOT NULL,
+        src_id INTEGER NOT NULL,
+        ts INTEGER NOT NULL,
+        {', '.join(f'{c} INTEGER DEFAULT 0' for c in _COLUMNS)},
+        -- приращение к предыдущему снэпшоту профиля (для сумм по минутам)
+        {', '.join(f'd_{c} INTEGER DEFAULT 0' for c in _COLUMNS)},
+        source TEXT,
+        PRIMARY KEY (profile, src_id)
+    );
+    CREATE INDEX IF NOT EXISTS idx_fleet_snapshots_ts ON fleet_snapshots(ts);
+
+    CREATE TABLE IF NOT EXISTS fleet_daily (
+        profile TEXT NOT NULL,
+        bucket INTEGER NOT NULL,
+        n INTEGER NOT NULL,
+        first_ts INTEGER NOT NULL,
+        last_ts INTEGER NOT NULL,
+        {', '.join(f'{c} INTEGER DEFAULT 0' for c in _rollup_columns())},
+        PRIMARY KEY (profile, bucket)
+    );
+    CREATE INDEX IF NOT EXISTS idx_fleet_daily_bucket ON fleet_daily(bucket);
+
+    CREATE TABLE IF NOT EXISTS fleet_sessions (
+        profile TEXT NOT NULL,
+        src_id INTEGER NOT NULL,
+        start_ts INTEGER NOT NULL,
+        end_ts INTEGER,
+        {', '.join(f'{c} INTEGER DEFAULT 0' for c in _SESSION_COLUMNS)},
+        PRIMARY KEY (profile, src_id)
+    );
+    CREATE INDEX IF NOT EXISTS idx_fleet_sessions_start ON fleet_sessions(start_ts);
+
+    -- Подпись файлов профильной БД на момент последней синхронизации
+    CREATE TABLE IF NOT EXISTS fleet_sync (
+        profile TEXT PRIMARY KEY,
+        sig TEXT NOT NULL
+    );
+'''
+
+
+def _db_sig(db_path: str):
+    """Подпись профильной БД: (mtime_ns, size) основного файла и WAL"""
+    parts = []
+    for path in (db_path, db_path + "-wal"):
+        try:
+            st = os.stat(path)
+            parts.append(f"{st.st_mtime_ns}:{st.st_size}")
+        except OSError:
+            parts.append("-")
+    return None if parts[0] == "-" else "/".join(parts)
+
+
+def _in(profiles) -> str:
+    return ", ".join("?" * len(profiles))
+
+
+def _iso(ts: int) -> str:
+    """epoch -> ISO с московским timezone (формат графиков панели)"""
+    return datetime.fromtimestamp(ts).isoformat() + '+03:00'
+
+
+class FleetHistory:
+    """Зеркало resource_history.db всех профилей + агрегаты по флоту."""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._conn = None
+        self._pid = None
+        self._lock = threading.RLock()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is not None and self._pid == os.getpid():
+            return self._conn
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None,
+                               check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        if conn.execute("PRAGMA user_version").fetchone()[0] != MIRROR_VERSION:
+            for table in ("fleet_snapshots", "fleet_daily", "fleet_sessions", "fleet_sync"):
+                conn.execute(f"DROP TABLE IF EXISTS {table}")
+            conn.execute(f"PRAGMA user_version={MIRROR_VERSION}")
+        conn.executescript(_SCHEMA)
+        self._conn, self._pid = conn, os.getpid()
+        return conn
+
+    # ------------------------------------------------------------------
+    # Синхронизация
+    # ------------------------------------------------------------------
+
+    def sync(self, profiles: List[str]) -> int:
+        """
+        Догоняет зеркало по профильным БД.
+
+        Args:
+            profiles: имена профилей
+
+        Returns:
+            int: сколько профилей реально синхронизировано (у остальных
+                 файлы БД не менялись)
+        """
+        synced = 0
+        with self._lock:
+            conn = self._connection()
+            known = {row['profile']: row['sig'] for row in
+                     conn.execute("SELECT profile, sig FROM fleet_sync")}
+            for profile in profiles:
+                db_path = resource_history._get_db_path(profile)
+                sig = _db_sig(db_path) if db_path else None
+                if sig is None or sig == known.get(profile):
+                    continue
+                try:
+                    self._sync_profile(conn, profile, db_path)
+                    synced += 1
+                except sqlite3.Error as e:
+                    print(f"[FLEET] Ошибка синхронизации {profile}: {e}")
+        return synced
+
+    def _sync_profile(self, conn: sqlite3.Connection, profile: str, db_path: str):
+        # Схема профильной БД актуальна (старые ISO-БД мигрируются здесь)
+        resource_history.init_db(profile)
+        sig = _db_sig(db_path)
+
+        conn.execute("ATTACH DATABASE ? AS src", (db_path,))
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._copy_rows(conn, profile)
+                conn.execute("INSERT OR REPLACE INTO fleet_sync (profile, sig) VALUES (?, ?)",
+                             (profile, sig))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.execute("DETACH DATABASE src")
+
+    def _copy_rows(self, conn: sqlite3.Connection, profile: str):
+        cols = ", ".join(_COLUMNS)
+        last = conn.execute(
+            f"SELECT src_id, {cols} FROM fleet_snapshots WHERE profile = ? "
+            f"ORDER BY src_id DESC LIMIT 1", (profile,)).fetchone()
+        last_id = last['src_id'] if last else 0
+        # Приращение первой новой строки считаем от последней уже зеркальной
+        deltas = ", ".join(f"{c} - COALESCE(LAG({c}) OVER (ORDER BY id), ?)" for c in _COLUMNS)
+        conn.execute(
+            f"INSERT OR REPLACE INTO fleet_snapshots (profile, src_id, ts, {cols}, "
+            f"{', '.join('d_' + c for c in _COLUMNS)}, source) "
+            f"SELECT ?, id, ts, {cols}, {deltas}, source FROM src.resource_snapshots WHERE id > ?",
+            (profile, *[(last[c] or 0) if last else 0 for c in _COLUMNS], last_id))
+        conn.execute("DELETE FROM fleet_snapshots WHERE profile = ? AND ts < ?",
+                     (profile, int(time.time()) - KEEP_DAYS * 86400))
+
+        # Дневной роллап: последний бакет профиля мог дополниться — берём с него
+        rollup = ", ".join(_rollup_columns())
+        last_bucket = conn.execute(
+            "SELECT COALESCE(MAX(bucket), 0) FROM fleet_daily WHERE profile = ?",
+            (profile,)).fetchone()[0]
+        conn.execute(
+            f"INSERT OR REPLACE INTO fleet_daily (profile, bucket, n, first_ts, last_ts, {rollup}) "
+            f"SELECT ?, bucket, n, first_ts, last_ts, {rollup} FROM src.snapshots_daily "
+            f"WHERE bucket >= ?",
+            (profile, last_bucket))
+
+        # Сессии: новые + незавершённые (у них позже проставится end_ts)
+        session_cols = ", ".join(_SESSION_COLUMNS)
+        from_id = conn.execute(
+            "SELECT COALESCE(MIN(src_id), (SELECT COALESCE(MAX(src_id), 0) + 1 "
+            "FROM fleet_sessions WHERE profile = ?)) "
+            "FROM fleet_sessions WHERE profile = ? AND end_ts IS NULL",
+            (profile, profile)).fetchone()[0]
+        conn.execute(
+            f"INSERT OR REPLACE INTO fleet_sessions (profile, src_id, start_ts, end_ts, {session_cols}) "
+            f"SELECT ?, id, start_ts, end_ts, {session_cols} FROM src.bot_sessions WHERE id >= ?",
+            (profile, from_id))
+
+    def _query(self, profiles: List[str], sql: str, params=()) -> List[sqlite3.Row]:
+        self.sync(profiles)
+        with self._lock:
+            return self._connection().execute(sql, params).fetchall()
+
+    # ------------------------------------------------------------------
+    # Агрегаты
+    # ------------------------------------------------------------------
+
+    def minute_totals(self, profiles: List[str], hours: int) -> Dict:
+        """
+        Сумма ресурсов профилей на каждую минуту со снэпшотом.
+
+        Профиль без снэпшота в эту минуту входит в сумму последним
+        известным значением: сумма = накопленная сумма приращений (d_*) по
+        минутам. Первый снэпшот профиля в периоде входит целиком (как и
+        раньше, до периода профиль считается нулём) — для него добавляем
+        недостающее значение - приращение.
+
+        Returns:
+            dict: {'timestamps': [...], 'resources': {рус: [...]}}
+        """
+        since = int(time.time()) - hours * 3600
+        deltas = ", ".join(f"d_{c} AS {c}" for c in CHART_COLUMNS)
+        bases = ", ".join(f"f.{c} - f.d_{c}" for c in CHART_COLUMNS)
+        totals = ", ".join(f"SUM(SUM({c})) OVER (ORDER BY m) AS {c}" for c in CHART_COLUMNS)
+        rows = self._query(profiles, f'''
+            WITH g AS (
+                SELECT profile, MIN(src_id) AS first_id
+                FROM fleet_snapshots
+                WHERE profile IN ({_in(profiles)}) AND ts >= ?
+                GROUP BY profile
+            ), d AS (
+                SELECT ts / 60 * 60 AS m, {deltas}
+                FROM fleet_snapshots
+                WHERE profile IN ({_in(profiles)}) AND ts >= ?
+                UNION ALL
+                SELECT f.ts / 60 * 60, {bases}
+                FROM g JOIN fleet_snapshots f ON f.profile = g.profile AND f.src_id = g.first_id
+            )
+            SELECT m, {totals} FROM d GROUP BY m ORDER BY m
+        ''', (*profiles, since, *profiles, since))
+        return self._series(rows, 'm')
+
+    def daily_totals(self, profiles: List[str], hours: int) -> Dict:
+        """
+        Сумма ресурсов профилей на начало каждого дня (последний снэпшот дня,
+        дни без снэпшотов — последним известным значением).
+        """
+        deltas = ", ".join(
+            f"{c} - COALESCE(LAG({c}) OVER (PARTITION BY profile ORDER BY bucket), 0) AS {c}"
+            for c in CHART_COLUMNS)
+        totals = ", ".join(f"SUM(SUM({c})) OVER (ORDER BY bucket) AS {c}" for c in CHART_COLUMNS)
+        rows = self._query(profiles, f'''
+            WITH d AS (
+                SELECT bucket, {deltas}
+                FROM fleet_daily
+                WHERE profile IN ({_in(profiles)}) AND last_ts >= ?
+            )
+            SELECT bucket, {totals} FROM d GROUP BY bucket ORDER BY bucket
+        ''', (*profiles, int(time.time()) - hours * 3600))
+
+        if not rows:
+            return self._series([], 'bucket')
+
+        # Заполняем пропущенные дни последним известным значением
+        by_date = {datetime.fromtimestamp(row['bucket']).date(): row for row in rows}
+        timestamps = []
+        resources = {RESOURCE_COLUMNS[c]: [] for c in CHART_COLUMNS}
+        date, last = min(by_date), max(by_date)
+        row = None
+        while date <= last:
+            row = by_date.get(date, row)
+            timestamps.append(datetime(date.year, date.month, date.day).isoformat() + '+03:00')
+            for c in CHART_COLUMNS:
+                resources[RESOURCE_COLUMNS[c]].append(row[c] or 0)
+            date += timedelta(days=1)
+        return {"timestamps": timestamps, "resources": resources}
+
+    def daily_earnings(self, profiles: List[str], hours: int) -> Dict:
+        """Заработок по дням: сумма (последний - первый снэпшот дня) по профилям."""
+        sums = ", ".join(f"SUM({c} - {c}_first) AS {c}" for c in CHART_COLUMNS)
+        rows = self._query(profiles, f'''
+            SELECT bucket + 12 * 3600 AS noon, {sums}
+            FROM fleet_daily
+            WHERE profile IN ({_in(profiles)}) AND last_ts >= ?
+            GROUP BY bucket ORDER BY bucket
+        ''', (*profiles, int(time.time()) - hours * 3600))
+        return self._series(rows, 'noon')
+
+    def period_change(self, profiles: List[str], hours: int) -> Dict:
+        """Изменение ресурсов за период (последний - первый снэпшот), сумма по профилям."""
+        diffs = ", ".join(f"COALESCE(SUM(l.{c} - f.{c}), 0) AS {c}" for c in CHART_COLUMNS)
+        rows = self._query(profiles, f'''
+            WITH g AS (
+                SELECT profile, MIN(src_id) AS first_id, MAX(src_id) AS last_id
+                FROM fleet_snapshots
+                WHERE profile IN ({_in(profiles)}) AND ts >= ?
+                GROUP BY profile HAVING COUNT(*) >= 2
+            )
+            SELECT {diffs}
+            FROM g
+            JOIN fleet_snapshots f ON f.profile = g.profile AND f.src_id = g.first_id
+            JOIN fleet_snapshots l ON l.profile = g.profile AND l.src_id = g.last_id
+        ''', (*profiles, int(time.time()) - hours * 3600))
+        return {RESOURCE_COLUMNS[c]: rows[0][c] for c in CHART_COLUMNS}
+
+    def snapshots(self, profiles: List[str], after_rowid: int = 0) -> List[tuple]:
+        """
+        Сырые снэпшоты профилей, добавленные в зеркало после after_rowid
+        (для chart_analytics — догружает только новое).
+
+        Returns:
+            list: кортежи (rowid, profile, ts, *CHART_COLUMNS) по возрастанию rowid
+        """
+        self.sync(profiles)
+        with self._lock:
+            cursor = self._connection().cursor()
+            cursor.row_factory = None  # кортежи — их быстрее грузить в массивы
+            return cursor.execute(f'''
+                SELECT rowid, profile, ts, {', '.join(CHART_COLUMNS)}
+                FROM fleet_snapshots
+                WHERE profile IN ({_in(profiles)}) AND rowid > ?
+                ORDER BY rowid
+            ''', (*profiles, after_rowid)).fetchall()
+
+    def sessions(self, profiles: List[str], limit: int = 20) -> List[Dict]:
+        """Последние завершённые сессии профилей (формат get_sessions + 'profile')."""
+        earned = ", ".join(f"{c}_end - {c}_start AS {c}" for c in _COLUMNS)
+        rows = self._query(profiles, f'''
+            SELECT profile, start_ts, end_ts, {earned}
+            FROM fleet_sessions
+            WHERE profile IN ({_in(profiles)}) AND end_ts IS NOT NULL
+            ORDER BY start_ts DESC LIMIT ?
+        ''', (*profiles, limit))
+        return [{
+            'profile': row['profile'],
+            'start_time': datetime.fromtimestamp(row['start_ts']).isoformat(),
+            'end_time': datetime.fromtimestamp(row['end_ts']).isoformat(),
+            'duration_hours': round((row['end_ts'] - row['start_ts']) / 3600, 1),
+            'earned': {RESOURCE_COLUMNS[c]: row[c] for c in _COLUMNS if row[c]},
+        } for row in rows]
+
+    @staticmethod
+    def _series(rows, ts_key: str) -> Dict:
+        return {
+            "timestamps": [_iso(row[ts_key]) for row in rows],
+            "resources": {RESOURCE_COLUMNS[c]: [row[c] or 0 for row in rows]
+                          for c in CHART_COLUMNS},
+        }
+
+
+_fleet = None
+_fleet_lock = threading.Lock()
+
+
+def get_fleet() -> FleetHistory:
+    """Общее зеркало процесса (profiles/fleet_history.db)."""
+    global _fleet
+    if _fleet is None:
+        with _fleet_lock:
+            if _fleet is None:
+                _fleet = FleetHistory(os.path.join(resource_history.PROFILES_DIR,
+                                                   "fleet_history.db"))
+    return _fleet
+
+
+def minute_totals(profiles, hours):
+    return get_fleet().minute_totals(profiles, hours)
+
+
+def daily_totals(profiles, hours):
+    return get_fleet().daily_totals(profiles, hours)
+
+
+def daily_earnings(profiles, hours):
+    return get_fleet().daily_earnings(profiles, hours)
+
+
+def period_change(profiles, hours):
+    return get_fleet().period_change(profiles, hours)
+
+
+def snapshots(profiles, after_rowid=0):
+    return get_fleet().snapshots(profiles, after_rowid)
+
+
+def sessions(profiles, limit=20):
+    return get_fleet().sessions(profiles, limit)
@@ -0,0 +1,209 @@
+# ============================================
+# VMMO Items - модель предмета рюкзака и решение "что с ним делать"
+# ============================================
+# get_items() раньше отдавал список словарей и для КАЖДОГО предмета
+# заново считал is_protected_item / is_unprotected_override (проход по
+# спискам из JSON с подстроками) плюс логику легендарок и сложности.
+#
+# Теперь:
+#   Item — компактный объект (__slots__), совместимый со старым
+#          словарным доступом (item["name"], item.get("count", 1)).
+#   classify(name, quality, difficulty) — решение keep/sell/disassemble/drop,
+#          мемоизировано по ключу. Кэш сбрасывается только когда меняется
+#          protected_items.json / unprotected_items.json (mtime).
+#
+# Одно и то же решение используют очистка рюкзака (backpack), аукцион
+# (auction.sell_all) и продажа крафта (craft / sell_crafts) — они больше
+# не расходятся в том, что защищено, а что можно разобрать.
+# ============================================
+
+import os
+import time
+
+from requests_bot.config import (
+    PROTECTED_ITEMS_FILE, UNPROTECTED_ITEMS_FILE, get_protected_items, is_unprotected_override
+)
+
+# Решения
+KEEP = "keep"                # защищён — не трогаем
+SELL = "sell"                # на аукцион (нет аукциона — разбираем/выкидываем)
+DISASSEMBLE = "disassemble"  # разбираем, даже если можно продать
+DROP = "drop"                # неликвид — выкидываем
+
+# Качество (по классу ссылки с названием)
+QUALITY_GREEN = "green"          # iGood
+QUALITY_LEGENDARY = "legendary"  # iLegendary
+QUALITY_COMMON = "common"
+
+# Префиксы предметов-неликвида, которые ВЫКИДЫВАЕМ, а не продаём.
+# Осколки + низкосортные самоцветы (Мутный/Треснувший/Надколотый):
+# продаются копейками и вечно висят на аукционе (exempt от блэклиста) —
+# по решению юзера выкидываем. Защищённые предметы (напр. "Треснутый
+# Кристалл Тикуана") решаются раньше и не затрагиваются.
+JUNK_DROP_PREFIXES = ("Осколок", "Мутный", "Треснувший", "Надколотый")
+
+# Как часто (сек) проверять mtime файлов защиты
+CLASSIFY_CHECK_INTERVAL = 1.0
+
+_decisions = {}        # (name, quality, difficulty) -> решение
+_files_sig = None      # mtime файлов, под которые посчитан кэш
+_checked_at = 0.0
+
+
+def quality_from_classes(classes):
+    """Качество предмета по CSS-классам ссылки с названием."""
+    if "iGood" in classes:
+        return QUALITY_GREEN
+    if "iLegendary" in classes:
+        return QUALITY_LEGENDARY
+    return QUALITY_COMMON
+
+
+def _mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return 0
+
+
+def _validate_cache():
+    """Сбрасывает кэш решений, если изменился protected/unprotected список."""
+    global _files_sig, _checked_at
+    now = time.time()
+    if now - _checked_at < CLASSIFY_CHECK_INTERVAL and _files_sig is not None:
+        return
+    _checked_at = now
+    sig = (_mtime(PROTECTED_ITEMS_FILE), _mtime(UNPROTECTED_ITEMS_FILE))
+    if sig != _files_sig:
+        _decisions.clear()
+        _files_sig = sig
+
+
+def invalidate():
+    """Сбрасывает кэш решений (например, после правки списков из панели)."""
+    global _files_sig
+    _decisions.clear()
+    _files_sig = None
+
+
+def _is_protected(name, quality):
+    # Исключения главнее защиты (в т.ч. легендарной)
+    if is_unprotected_override(name):
+        return False
+    if quality == QUALITY_LEGENDARY:
+        return True
+    name_lower = name.lower()
+    return any(protected.lower() in name_lower for protected in get_protected_items())
+
+
+def _decide(name, quality, difficulty):
+    if _is_protected(name, quality):
+        return KEEP
+    if name.startswith(JUNK_DROP_PREFIXES):
+        return DROP
+    # Продаём только brutal; зелёные и normal/heroic — в разбор
+    if quality == QUALITY_GREEN or (difficulty and difficulty != "brutal"):
+        return DISASSEMBLE
+    return SELL
+
+
+def classify(name, quality=QUALITY_COMMON, difficulty=None):
+    """
+    Решение для предмета (считается один раз на ключ).
+
+    Args:
+        name: название
+        quality: QUALITY_GREEN / QUALITY_LEGENDARY / QUALITY_COMMON
+        difficulty: None, "normal", "heroic", "brutal"
+
+    Returns:
+        str: KEEP / SELL / DISASSEMBLE / DROP
+    """
+    _validate_cache()
+    key = (name, quality, difficulty)
+    decision = _decisions.get(key)
+    if decision is None:
+        decision = _decide(name, quality, difficulty)
+        _decisions[key] = decision
+    return decision
+
+
+class Item:
+    """
+    Предмет рюкзака.
+
+    Поддерживает старый словарный доступ: item["name"], item["is_protected"],
+    item.get("count", 1), item["buttons"] = {...}.
+    """
+
+    __slots__ = ("name", "count", "quality", "difficulty", "buttons")
+
+    _KEYS = ("name", "count", "quality", "difficulty", "buttons",
+             "is_green", "is_legendary", "is_protected", "decision")
+
+    def __init__(self, name, count=1, quality=QUALITY_COMMON, difficulty=None, buttons=None):
+        self.name = name
+        self.count = count
+        self.quality = quality
+        self.difficulty = difficulty
+        self.buttons = buttons if buttons is not None else {}
+
+    @property
+    def is_green(self):
+        return self.quality == QUALITY_GREEN
+
+    @property
+    def is_legendary(self):
+        return self.quality == QUALITY_LEGENDARY
+
+    @property
+    def decision(self):
+        return classify(self.name, self.quality, self.difficulty)
+
+    @property
+    def is_protected(self):
+        return self.decision == KEEP
+
+    def action(self, can_sell=True):
+        """
+        Что сделать с предметом с учётом его кнопок.
+
+        Args:
+            can_sell: продажа допустима (например, набрана партия)
+
+        Returns:
+            str: "auction" / "disassemble" / "drop" или None (не трогаем)
+        """
+        decision = self.decision
+        buttons = self.buttons
+        if decision == KEEP:
+            return None
+        if decision == DROP and "drop" in buttons:
+            return "drop"
+        if "auction" in buttons and can_sell:
+            if decision == DISASSEMBLE and "disassemble" in buttons:
+                return "disassemble"
+            return "auction"
+        if "disassemble" in buttons:
+            return "disassemble"
+        if "auction" not in buttons and "drop" in buttons:
+            return "drop"
+        return None
+
+    # ---------- совместимость со словарём ----------
+
+    def __getitem__(self, key):
+        if key not in self._KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self._KEYS else default
+
+    def __repr__(self):
+        return f"Item({self.name!r} x{self.count}, {self.quality}, {self.difficulty}, {list(self.buttons)})"
@@ -8,13 +8,42 @@ import re
 from bs4 import BeautifulSoup
 from urllib.parse import urljoin
 
-from requests_bot.sales_tracker import record_sale, record_expired
+from requests_bot.sales_tracker import record_sale, record_expired, record_mail_batch
 from requests_bot.backpack import add_to_auction_blacklist
 from requests_bot.auction import is_blacklist_exempt
 from requests_bot.config import is_admin_mail_enabled
 
 BASE_URL = "https://vmmo.vten.ru"
 
+# Виды писем (по тексту в списке)
+MAIL_SOLD = "sold"        # продажа на аукционе
+MAIL_EXPIRED = "expired"  # истёк срок лота — предмет вернулся
+MAIL_ADMIN = "admin"      # от Администрации
+MAIL_MONEY = "money"      # прочее (деньги/предметы от игроков и системы)
+
+# Сколько писем собираем подряд до одной проверки рюкзака
+MAIL_BATCH_SIZE = 10
+# Защита от бесконечного цикла в пакетном режиме (пачек за вызов)
+MAIL_MAX_BATCHES = 10
+
+
+def classify_message(text: str, sender: str = "") -> str:
+    """
+    Вид письма по тексту из списка.
+
+    Returns:
+        str: MAIL_SOLD / MAIL_EXPIRED / MAIL_ADMIN / MAIL_MONEY
+    """
+    if "Срок твоего лота истёк" in text:
+        return MAIL_EXPIRED
+    text_lower = text.lower()
+    # Проверка продажи: "продан" + "аукцион" (case-insensitive)
+    if ("продан" in text_lower or "продажа" in text_lower) and "аукцион" in text_lower:
+        return MAIL_SOLD
+    if sender == "Администрация":
+        return MAIL_ADMIN
+    return MAIL_MONEY
+
 
 class MailClient:
     """Клиент для работы с почтой"""
@@ -51,11 +80,15 @@ class MailClient:
         resp = self.client.get("/message/list")
         return resp.status_code == 200
 
-    def find_active_messages(self):
+    def find_active_messages(self, include_read=False):
         """
         Находит активные (непрочитанные) письма.
         Пропускает письма от Администрации если admin_mail_enabled=False.
 
+        Args:
+            include_read: вернуть и прочитанные (c-verygray) — например,
+                          открытые, но не собранные из-за полного рюкзака
+
         Returns:
             list: Список словарей с информацией о письмах
         """
@@ -70,7 +103,7 @@ class MailClient:
         for link in soup.select("a.task-section._label.brass"):
             # Пропускаем прочитанные (с классом c-verygray)
             classes = link.get("class", [])
-            if "c-verygray" in classes:
+            if "c-verygray" in classes and not include_read:
                 continue
 
             href = link.get("href")
@@ -79,17 +112,18 @@ class MailClient:
 
             # Проверяем отправителя - первый span содержит имя
             sender_span = link.select_one("span")
-            if sender_span and skip_admin:
-                sender = sender_span.get_text(strip=True)
-                if sender == "Администрация":
-                    print(f"[MAIL] Пропускаю письмо от '{sender}'")
-                    continue
+            sender = sender_span.get_text(strip=True) if sender_span else ""
+            if skip_admin and sender == "Администрация":
+                print(f"[MAIL] Пропускаю письмо от '{sender}'")
+                continue
 
             # Получаем текст письма
             text = link.get_text(strip=True)
             messages.append({
                 "text": text,
                 "url": urljoin(BASE_URL, href),
+                "sender": sender,
+                "kind": classify_message(text, sender),
             })
 
         return messages
@@ -147,11 +181,8 @@ class MailClient:
             return False
 
         # Проверяем попап о переполнении
-        notice = soup.select_one("div.notice-rich3")
-        if notice:
-            text = notice.get_text()
-            if "рюкзаке нет места" in text or "нет места" in text.lower():
-                return True
+        if self._has_backpack_full_notice(soup):
+            return True
 
         # Проверяем счетчик рюкзака (28/28)
         counter = soup.select_one("span.sp_rack_count")
@@ -165,10 +196,30 @@ class MailClient:
 
         return False
 
-    def collect_message_items(self):
+    def _has_backpack_full_notice(self, soup=None):
+        """
+        Есть ли на текущей странице попап "в рюкзаке нет места".
+
+        В отличие от счётчика 28/28 попап значит, что ПОСЛЕДНИЙ сбор не
+        прошёл (при счётчике 28/28 письмо могло собраться последним слотом).
+        """
+        soup = soup or self.client.soup()
+        if not soup:
+            return False
+        notice = soup.select_one("div.notice-rich3")
+        if not notice:
+            return False
+        text = notice.get_text()
+        return "рюкзаке нет места" in text or "нет места" in text.lower()
+
+    def collect_message_items(self, check_full=True):
         """
         Забирает предметы из текущего открытого письма.
 
+        Args:
+            check_full: проверить рюкзак сразу после сбора (в пакетном
+                        режиме проверка одна на пачку — см. _collect_batch)
+
         Returns:
             str: "success", "backpack_full", или "error"
         """
@@ -205,7 +256,7 @@ class MailClient:
         self.client.get(url)
 
         # Проверяем результат
-        if self.check_backpack_full():
+        if check_full and self.check_backpack_full():
             return "backpack_full"
 
         return "success"
@@ -273,16 +324,22 @@ class MailClient:
 
         return None, None
 
-    def process_mailbox(self, on_backpack_full=None):
+    def process_mailbox(self, on_backpack_full=None, batch=True):
         """
         Обрабатывает все письма в почте.
 
         Args:
             on_backpack_full: Callback при переполнении рюкзака
+            batch: пакетный режим (список парсится один раз, письма собираются
+                   подряд, одна проверка рюкзака и одна запись в ledger на
+                   пачку). False — старый режим по одному письму.
 
         Returns:
             dict: Статистика {messages, gold, silver, expired_items}
         """
+        if batch:
+            return self.process_mailbox_batch(on_backpack_full)
+
         stats = {
             "messages": 0,
             "gold": 0,
@@ -316,11 +373,9 @@ class MailClient:
             processed_urls.add(msg["url"])
             print(f"[MAIL] Открываю: {msg['text'][:50]}...")
 
-            # Проверяем истекший лот
-            is_expired = "Срок твоего лота истёк" in msg["text"]
-            # Проверка продажи: "продан" + "аукцион" (case-insensitive)
+            is_expired = msg["kind"] == MAIL_EXPIRED
+            is_sold = msg["kind"] == MAIL_SOLD
             msg_lower = msg["text"].lower()
-            is_sold = ("продан" in msg_lower or "продажа" in msg_lower) and "аукцион" in msg_lower
 
             # DEBUG: логируем ВСЕ письма с деньгами или аукционные
             if "аукцион" in msg_lower or "продан" in msg_lower or "истёк" in msg_lower:
@@ -410,6 +465,176 @@ class MailClient:
             print(f"[MAIL] Готово: {stats['messages']} писем, {stats['gold']}g {stats['silver']}s")
         return stats
 
+    # ============================================
+    # Пакетный режим
+    # ============================================
+
+    def _read_message(self, msg):
+        """
+        Открывает письмо и разбирает его (без сбора).
+
+        Returns:
+            dict: {"msg", "gold", "silver", "sold": (name, count) или None,
+                   "expired": name или None}
+        """
+        entry = {"msg": msg, "gold": 0, "silver": 0, "sold": None, "expired": None}
+        kind = msg["kind"]
+
+        if kind == MAIL_EXPIRED:
+            entry["expired"] = self.extract_expired_item_name(msg["text"])
+
+        sold_name, sold_count = None, None
+        if kind == MAIL_SOLD:
+            sold_name, sold_count = self.extract_sold_item_info(msg["text"])
+
+        self.client.get(msg["url"])
+
+        if kind == MAIL_SOLD and not sold_name:
+            sold_name, sold_count = self.extract_sold_item_from_opened_mail()
+
+        gold, silver = self.parse_mail_money()
+        entry["gold"], entry["silver"] = gold, silver
+        if kind == MAIL_SOLD and (gold or silver):
+            entry["sold"] = (sold_name, sold_count or 1)
+        return entry
+
+    def _collect_batch(self, messages):
+        """
+        Открывает и собирает письма подряд, без перечитывания списка после
+        каждого. Результат сбора смотрим по странице после клика: попап
+        "нет места" — письмо не собрано, дальше пачку не открываем.
+
+        Returns:
+            tuple: (entries, stuck, errors) — разобранные письма, по которым
+                   сбор прошёл; письма, упёршиеся в полный рюкзак; url писем
+                   без кнопки сбора
+        """
+        entries = []
+        stuck = []
+        errors = set()
+        for msg in messages:
+            print(f"[MAIL] Открываю: {msg['text'][:50]}...")
+            entry = self._read_message(msg)
+            if self.collect_message_items(check_full=False) != "success":
+                errors.add(msg["url"])
+            elif self._has_backpack_full_notice():
+                stuck.append(entry)
+                break
+            else:
+                entries.append(entry)
+        return entries, stuck, errors
+
+    def _commit_batch(self, entries, stats):
+        """Учитывает собранные письма: статистика, ledger, blacklist."""
+        sales = []
+        expired = []
+        for entry in entries:
+            stats["messages"] += 1
+            gold, silver = entry["gold"], entry["silver"]
+            if gold or silver:
+                stats["gold"] += gold
+                stats["silver"] += silver
+                print(f"[MAIL] Деньги: {gold}g {silver}s")
+            if entry["sold"]:
+                name, count = entry["sold"]
+                if not name:
+                    print("[MAIL] Имя проданного лота не извлечено — записан как '(неизвестно)'")
+                sales.append((name, count, gold, silver))
+            if entry["expired"]:
+                expired.append((entry["expired"], 1))
+
+        record_mail_batch(sales, expired, profile=self.profile)
+
+        for name, _ in expired:
+            stats["expired_items"].append(name)
+            if not is_blacklist_exempt(name):
+                add_to_auction_blacklist(name)
+                print(f"[MAIL] '{name}' добавлен в blacklist (не продался)")
+
+    def process_mailbox_batch(self, on_backpack_full=None, batch_size=MAIL_BATCH_SIZE):
+        """
+        Пакетная обработка почты.
+
+        Список писем парсится один раз, письма пачкой открываются и
+        собираются подряд. Письмо, после сбора которого игра показала
+        "нет места", не собрано (и пачка на нём обрывается). После пачки —
+        один раз перечитываем ПОЛНЫЙ список (с прочитанными): письмо собрано,
+        только если его там больше нет. Продажи и истекшие лоты собранных
+        писем пишутся в ledger одной транзакцией. Письмо, которое не удалось
+        собрать, в статистику не попадает — запишется, когда реально будет
+        удалено (после очистки рюкзака оно пробуется снова, хотя уже прочитано).
+
+        Args:
+            on_backpack_full: Callback при переполнении рюкзака
+            batch_size: писем в пачке
+
+        Returns:
+            dict: Статистика {messages, gold, silver, expired_items}
+        """
+        stats = {
+            "messages": 0,
+            "gold": 0,
+            "silver": 0,
+            "expired_items": [],
+        }
+
+        if not self.open_mailbox():
+            print("[MAIL] Не удалось открыть почту")
+            return stats
+
+        messages = self.find_active_messages()
+        # Письма без кнопки сбора — не трогаем повторно в этой сессии
+        failed_urls = set()
+        # Открытые (уже прочитанные), но не собранные — пробуем снова первыми
+        retry = []
+        cleaned = False
+
+        for _ in range(MAIL_MAX_BATCHES):
+            pending = []
+            seen = set()
+            for m in retry + messages:
+                if m["url"] not in failed_urls and m["url"] not in seen:
+                    seen.add(m["url"])
+                    pending.append(m)
+            pending = pending[:batch_size]
+            if not pending:
+                break
+
+            entries, stuck_entries, errors = self._collect_batch(pending)
+            failed_urls |= errors
+
+            # Одна проверка на пачку: свежий полный список + счётчик рюкзака
+            self.open_mailbox()
+            messages = self.find_active_messages()
+            remaining = {m["url"] for m in self.find_active_messages(include_read=True)}
+            collected = [e for e in entries if e["msg"]["url"] not in remaining]
+            not_collected = stuck_entries + [e for e in entries if e["msg"]["url"] in remaining]
+            stuck = len(not_collected)
+            retry = [e["msg"] for e in not_collected]
+            self._commit_batch(collected, stats)
+
+            if errors:
+                print(f"[MAIL] Ошибка сбора писем: {len(errors)}")
+
+            if stuck or self.check_backpack_full():
+                print(f"[MAIL] Рюкзак полон! (не собрано писем: {stuck})")
+                # Если после прошлой очистки не влезло ни одно письмо —
+                # дальше крутиться бессмысленно
+                if not on_backpack_full or (cleaned and not collected):
+                    break
+                on_backpack_full()
+                cleaned = True
+                self.open_mailbox()
+                messages = self.find_active_messages()
+
+        self.collected_gold += stats["gold"]
+        self.collected_silver += stats["silver"]
+        self.messages_processed += stats["messages"]
+
+        if stats["messages"] > 0:
+            print(f"[MAIL] Готово: {stats['messages']} писем, {stats['gold']}g {stats['silver']}s")
+        return stats
+
     def check_and_collect(self, on_backpack_full=None):
         """
         Основная функция - проверяет почту и собирает всё.
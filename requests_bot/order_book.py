@@ -0,0 +1,155 @@
+# ============================================
+# VMMO Order Book - общий стакан аукциона для всех ботов
+# ============================================
+# 22 бота продают одни и те же предметы и по очереди открывают одни и те
+# же страницы аукциона. Стакан — последний увиденный список лотов по
+# предмету — теперь общий: кто загрузил страницу, тот публикует лоты,
+# остальные берут их вместо нового поиска, если стакан свежее max_age.
+#
+# Хранится в price_history.db (таблица order_book) — одна строка на
+# предмет, лоты JSON-списком [{"qty", "total", "seller"}]. seller —
+# профиль бота для лотов, которые он видел своими (span.go-btn) или
+# выставил сам; для чужих лотов пусто.
+#
+# Оптимистичные обновления: выставили лот — добавляем его в стакан,
+# выкупили — убираем. Время стакана при этом не меняется (свежесть —
+# только от реально загруженной страницы), так что устаревший стакан
+# не "оживает" от наших правок.
+#
+# publish() заодно пишет снимок в историю цен (price_history.record_lots).
+# ============================================
+
+import json
+import time
+
+from requests_bot import price_history
+
+# По умолчанию стакан старше этого (сек) не используется
+ORDER_BOOK_TTL = 120
+
+
+def _ppu(lot):
+    return lot["total"] / lot["qty"]
+
+
+def _load(conn, item):
+    row = conn.execute(
+        "SELECT ts, lots FROM order_book WHERE item=?", (item,)).fetchone()
+    if not row:
+        return None, []
+    try:
+        return row["ts"], json.loads(row["lots"])
+    except ValueError:
+        return None, []
+
+
+def _save(conn, item, ts, lots, source, profile):
+    lots = sorted(lots, key=_ppu)
+    conn.execute(
+        "INSERT INTO order_book (item, ts, lots, source, profile) VALUES (?,?,?,?,?) "
+        "ON CONFLICT(item) DO UPDATE SET ts=excluded.ts, lots=excluded.lots, "
+        "source=excluded.source, profile=excluded.profile",
+        (item, ts, json.dumps(lots, ensure_ascii=False), source, profile))
+
+
+def publish(item: str, lots, source: str = "", profile: str = "") -> bool:
+    """
+    Публикует все лоты со свежезагруженной страницы.
+
+    Args:
+        item: название предмета
+        lots: [(qty, total_silver, ours), ...]
+        source: кто видел (auction/resources/transfer)
+        profile: профиль бота (им помечаются лоты с ours=True)
+
+    Returns:
+        bool: стакан записан
+    """
+    book = [{"qty": int(qty), "total": int(total), "seller": profile if ours else ""}
+            for qty, total, ours in lots if qty and qty > 0 and total and total > 0]
+    if not item or not book:
+        return False
+
+    now = time.time()
+    price_history.record_lots(item, [(l["qty"], l["total"], bool(l["seller"])) for l in book],
+                              source=source, profile=profile, ts=now)
+    try:
+        with price_history.Transaction() as conn:
+            _save(conn, item, now, book, source, profile)
+        return True
+    except Exception as e:
+        print(f"[ORDER_BOOK] Ошибка записи стакана '{item}': {e}")
+        return False
+
+
+def get(item: str, max_age: float = ORDER_BOOK_TTL):
+    """
+    Стакан предмета, если он свежее max_age.
+
+    Returns:
+        list: [{"qty", "total", "seller"}, ...] по возрастанию цены за шт,
+              или None (нужен свежий поиск)
+    """
+    try:
+        with price_history._lock:
+            ts, lots = _load(price_history.get_connection(), item)
+    except Exception as e:
+        print(f"[ORDER_BOOK] Ошибка чтения стакана '{item}': {e}")
+        return None
+    if ts is None or time.time() - ts > max_age:
+        return None
+    return lots
+
+
+def min_lot(item: str, profile: str = None, max_age: float = ORDER_BOOK_TTL):
+    """
+    Самый дешёвый (за шт) лот из свежего стакана.
+
+    Args:
+        item: название предмета
+        profile: исключить лоты этого профиля (минималка конкурентов для него);
+                 None — учитывать все лоты
+        max_age: допустимый возраст стакана
+
+    Returns:
+        tuple: (gold, silver, qty) или None если стакана нет или лотов нет
+    """
+    lots = get(item, max_age)
+    if lots is None:
+        return None
+    for lot in lots:
+        if profile is not None and lot.get("seller") == profile:
+            continue
+        return lot["total"] // 100, lot["total"] % 100, lot["qty"]
+    return None
+
+
+def add_own_lot(item: str, qty: int, total_silver: int, profile: str):
+    """Оптимистично добавляет только что выставленный нами лот."""
+    if not item or qty <= 0 or total_silver <= 0:
+        return
+    try:
+        with price_history.Transaction() as conn:
+            ts, lots = _load(conn, item)
+            if ts is None:
+                return  # стакана ещё нет — придумывать его не будем
+            lots.append({"qty": int(qty), "total": int(total_silver), "seller": profile})
+            _save(conn, item, ts, lots, "own", profile)
+    except Exception as e:
+        print(f"[ORDER_BOOK] Ошибка обновления стакана '{item}': {e}")
+
+
+def remove_lot(item: str, total_silver: int, qty: int = None):
+    """Оптимистично убирает выкупленный лот (первый с такой ценой/кол-вом)."""
+    try:
+        with price_history.Transaction() as conn:
+            ts, lots = _load(conn, item)
+            if ts is None:
+                return
+            for i, lot in enumerate(lots):
+                if lot["total"] == total_silver and (qty is None or lot["qty"] == qty):
+                    del lots[i]
+                    _save(conn, item, ts, lots, "own", "")
+                    return
+    except Exception as e:
+        print(f"[ORDER_BOOK] Ошибка обновления стакана '{item}': {e}")
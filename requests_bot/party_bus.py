@@ -0,0 +1,166 @@
+# ============================================
+# VMMO Party Bus (локальный pub/sub)
+# ============================================
+# Push-уведомления между ботами на одной машине для пати-данжей.
+# Каждый процесс, который ждёт событие, поднимает свой Unix datagram
+# сокет в BUS_DIR. publish() рассылает событие во все живые сокеты.
+#
+# shared_party_state.json остаётся источником правды: событие — только
+# "проснись и перечитай файл". Если сокеты недоступны (Windows, нет прав)
+# или событие потерялось — ожидающий просто спит до таймаута, как раньше
+# при опросе раз в POLL_INTERVAL.
+# ============================================
+
+import os
+import json
+import atexit
+import time
+import select
+import socket
+
+from requests_bot.logger import log_debug
+
+SCRIPT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUS_DIR = os.path.join(SCRIPT_DIR, "party_bus")
+
+# Топики пати
+PARTY_CREATED = "party_created"
+MEMBER_JOINED = "member_joined"
+MEMBER_READY = "member_ready"
+INVITE_SENT = "invite_sent"
+IN_LOBBY = "in_lobby"
+COMBAT_STARTED = "combat_started"
+PARTY_COMPLETED = "party_completed"
+
+MAX_DATAGRAM = 4096
+
+_listener = None  # Сокет текущего процесса (создаётся лениво)
+
+
+def _bus_available():
+    return hasattr(socket, "AF_UNIX")
+
+
+def _socket_path():
+    return os.path.join(BUS_DIR, f"{os.getpid()}.sock")
+
+
+def _get_listener():
+    """Возвращает сокет текущего процесса, создаёт при первом вызове."""
+    global _listener
+    if _listener is not None or not _bus_available():
+        return _listener
+    try:
+        os.makedirs(BUS_DIR, exist_ok=True)
+        path = _socket_path()
+        if os.path.exists(path):
+            os.unlink(path)  # остался от процесса с тем же pid
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sock.bind(path)
+        sock.setblocking(False)
+        _listener = sock
+        atexit.register(close)
+    except OSError as e:
+        log_debug(f"[PARTY-BUS] Не удалось поднять сокет: {e}")
+        _listener = None
+    return _listener
+
+
+def close():
+    """Закрывает сокет процесса и удаляет файл."""
+    global _listener
+    if _listener is None:
+        return
+    try:
+        _listener.close()
+        os.unlink(_socket_path())
+    except OSError:
+        pass
+    _listener = None
+
+
+def publish(topic, party_id, **data):
+    """Рассылает событие всем подписчикам.
+
+    Ошибки не пробрасываются — шина best-effort, вызывающий уже записал
+    изменение в shared_party_state.json.
+    """
+    if not _bus_available() or not os.path.isdir(BUS_DIR):
+        return
+    payload = json.dumps(
+        {"topic": topic, "party_id": party_id, "ts": time.time(), **data},
+        ensure_ascii=False,
+    ).encode("utf-8")
+
+    own = _socket_path()
+    try:
+        names = os.listdir(BUS_DIR)
+    except OSError:
+        return
+
+    sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    try:
+        for name in names:
+            if not name.endswith(".sock"):
+                continue
+            path = os.path.join(BUS_DIR, name)
+            if path == own:
+                continue
+            try:
+                sender.sendto(payload, path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                # Процесс умер, сокет остался — чистим
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+            except OSError as e:
+                # Переполнен буфер получателя и т.п. — он всё равно перечитает файл
+                log_debug(f"[PARTY-BUS] sendto {name}: {e}")
+    finally:
+        sender.close()
+
+
+def wait_event(party_id, timeout, topics=None):
+    """Ждёт событие по пати не дольше timeout секунд.
+
+    Args:
+        party_id: ID пати (события других пати игнорируются)
+        timeout: максимальное время ожидания
+        topics: набор интересующих топиков (None — любой)
+
+    Returns:
+        dict события или None по таймауту / без шины
+    """
+    sock = _get_listener()
+    if sock is None:
+        time.sleep(timeout)
+        return None
+
+    deadline = time.time() + timeout
+    while True:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return None
+        try:
+            ready, _, _ = select.select([sock], [], [], remaining)
+        except (OSError, ValueError):
+            time.sleep(max(0, deadline - time.time()))
+            return None
+        if not ready:
+            return None
+        try:
+            raw = sock.recv(MAX_DATAGRAM)
+            event = json.loads(raw.decode("utf-8"))
+        except (OSError, ValueError):
+            continue
+        if event.get("party_id") != party_id:
+            continue
+        if topics and event.get("topic") not in topics:
+            continue
+        return event
+
+
+def subscribe():
+    """Поднимает сокет заранее, чтобы не пропустить события до первого wait_event."""
+    return _get_listener() is not None
@@ -12,6 +12,7 @@ import time
 from urllib.parse import urljoin
 
 from requests_bot.craft_prices import FileLock
+from requests_bot import party_bus
 from requests_bot.config import get_profile_name, get_profile_username, get_game_nickname, get_party_dungeon_config
 from requests_bot.logger import log_info, log_debug, log_warning, log_error
 
@@ -27,7 +28,7 @@ FORMING_TIMEOUT = 180      # 3 мин на сбор пати — даёт зап
 INVITE_TIMEOUT = 60        # 60с на accept инвайта
 LOBBY_TIMEOUT = 90         # 90с ожидание в лобби
 COMBAT_TIMEOUT = 600       # 10 мин на бой
-POLL_INTERVAL = 5          # Интервал проверки файла
+POLL_INTERVAL = 5          # Интервал проверки файла (fallback если событие с party_bus не пришло)
 
 # Пати-данжены
 PARTY_DUNGEONS = {
@@ -303,6 +304,7 @@ def try_join_or_create_party(profile, username, dungeon_id, difficulty="impossib
                     }
                     p["updated_at"] = time.time()
                     _save_state(state)
+                    party_bus.publish(party_bus.MEMBER_JOINED, p["id"], profile=profile)
                     return {"id": p["id"], "role": "member", "party": p}
 
             # only_join=True: мембер пришёл присоединиться, но forming уже нет — выходим
@@ -332,12 +334,26 @@ def try_join_or_create_party(profile, username, dungeon_id, difficulty="impossib
             }
             state["parties"].append(new_party)
             _save_state(state)
+            party_bus.publish(party_bus.PARTY_CREATED, party_id, dungeon_id=dungeon_id)
             return {"id": party_id, "role": "leader", "party": new_party}
     except Exception as e:
         log_error(f"[PARTY] Ошибка координации: {e}")
         return None
 
 
+# Статус мембера → топик party_bus
+_STATUS_TOPICS = {
+    "ready": party_bus.MEMBER_READY,
+    "in_lobby": party_bus.IN_LOBBY,
+}
+
+# Состояние пати → топик party_bus
+_STATE_TOPICS = {
+    "in_combat": party_bus.COMBAT_STARTED,
+    "completed": party_bus.PARTY_COMPLETED,
+}
+
+
 def update_member_status(profile, party_id, status):
     """Обновляет статус бота в пати."""
     try:
@@ -350,6 +366,10 @@ def update_member_status(profile, party_id, status):
                 _save_state(state)
     except Exception as e:
         log_error(f"[PARTY] Ошибка update_member_status: {e}")
+        return
+    topic = _STATUS_TOPICS.get(status)
+    if topic:
+        party_bus.publish(topic, party_id, profile=profile)
 
 
 def update_party_state(party_id, new_state):
@@ -364,6 +384,10 @@ def update_party_state(party_id, new_state):
                 _save_state(state)
     except Exception as e:
         log_error(f"[PARTY] Ошибка update_party_state: {e}")
+        return
+    topic = _STATE_TOPICS.get(new_state)
+    if topic:
+        party_bus.publish(topic, party_id)
 
 
 def get_party_members(party_id):
@@ -392,6 +416,7 @@ def wait_for_members(party_id, target_count, timeout=FORMING_TIMEOUT, require_re
         "ready" — все собрались (и готовы, если require_ready)
         "timeout" — не набрали за таймаут
     """
+    party_bus.subscribe()
     deadline = time.time() + timeout
     while time.time() < deadline:
         members = get_party_members(party_id)
@@ -405,7 +430,7 @@ def wait_for_members(party_id, target_count, timeout=FORMING_TIMEOUT, require_re
         if remaining % 15 == 0 and remaining > 0:
             statuses = [v.get("status") for v in members.values() if v.get("role") != "leader"]
             log_debug(f"[PARTY] Лидер: жду мемберов ({len(members)}/{target_count}), статусы={statuses}, осталось {remaining}с")
-        time.sleep(POLL_INTERVAL)
+        party_bus.wait_event(party_id, min(POLL_INTERVAL, max(0, deadline - time.time())))
     return "timeout"
 
 
@@ -416,12 +441,13 @@ def wait_for_all_in_lobby(party_id, timeout=LOBBY_TIMEOUT):
         "ready" — все в лобби
         "timeout" — не все зашли
     """
+    party_bus.subscribe()
     deadline = time.time() + timeout
     while time.time() < deadline:
         members = get_party_members(party_id)
         if members and all(m.get("status") == "in_lobby" for m in members.values()):
             return "ready"
-        time.sleep(POLL_INTERVAL)
+        party_bus.wait_event(party_id, min(POLL_INTERVAL, max(0, deadline - time.time())))
     return "timeout"
 
 
@@ -1116,9 +1142,13 @@ class PartyDungeonClient:
                 time.sleep(1.0)
                 continue
 
-            # Пустая очередь — сервер отдаёт "{}" (len 2)
+            # Пустая очередь — сервер отдаёт "{}" (len 2).
+            # С party_id просыпаемся сразу по invite_sent от лидера.
             if len(body.strip()) <= 3:
-                time.sleep(1.0)
+                if party_id:
+                    party_bus.wait_event(party_id, 1.0, topics={party_bus.INVITE_SENT})
+                else:
+                    time.sleep(1.0)
                 continue
 
             # В очереди есть notice — извлекаем id и СРАЗУ продвигаем очередь,
@@ -1267,6 +1297,7 @@ def _run_as_leader(profile, username, party_id, party_client, dungeon_runner, du
         несуществующий pageId, и сервер создаёт orphan-pending который
         потом блочит все последующие invite этому нику.
     """
+    party_bus.subscribe()
 
     # 1. Входим в данж (создаём пати в игре)
     if not party_client.enter_as_leader(difficulty):
@@ -1324,6 +1355,8 @@ def _run_as_leader(profile, username, party_id, party_client, dungeon_runner, du
         if not invite_result:
             log_warning(f"[PARTY] Лидер: не удалось пригласить {mem_username}")
             # Продолжаем с остальными
+        else:
+            party_bus.publish(party_bus.INVITE_SENT, party_id, profile=mem_profile)
 
     # 4. Ждём пока все мемберы зайдут в лобби (status=in_lobby).
     #    БЕЗ повторного invite: reinvite через 30с натыкался на ещё живой
@@ -1343,7 +1376,7 @@ def _run_as_leader(profile, username, party_id, party_client, dungeon_runner, du
         if len(members) >= target_members and all(m.get("status") == "in_lobby" for m in members.values()):
             break
 
-        time.sleep(POLL_INTERVAL)
+        party_bus.wait_event(party_id, min(POLL_INTERVAL, max(0, lobby_deadline - time.time())))
     else:
         log_warning("[PARTY] Лидер: не все зашли в лобби, отменяю")
         party_client.leave_lobby()
@@ -1371,6 +1404,8 @@ def _run_as_leader(profile, username, party_id, party_client, dungeon_runner, du
 
 def _run_as_member(profile, username, party_id, party_client, dungeon_runner, dungeon_id, leader_username):
     """Логика мембера."""
+    # Сокет шины поднимаем сразу — чтобы не пропустить invite_sent/combat_started
+    party_bus.subscribe()
 
     # 1. Ждём приглашение и принимаем.
     # profile/party_id нужны мемберу чтобы выставить status="ready" ПОСЛЕ
@@ -1394,9 +1429,13 @@ def _run_as_member(profile, username, party_id, party_client, dungeon_runner, du
         if "/combat" in current_url:
             break
 
+        # Ждём push от лидера (combat_started), без него — обычный интервал
+        party_bus.wait_event(
+            party_id, min(POLL_INTERVAL, max(0, deadline - time.time())),
+            topics={party_bus.COMBAT_STARTED},
+        )
         # Обновляем страницу
         party_client.client.get(party_client.client.current_url)
-        time.sleep(POLL_INTERVAL)
     else:
         log_warning("[PARTY] Мембер: таймаут ожидания боя")
         party_client.leave_lobby()
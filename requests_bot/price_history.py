@@ -0,0 +1,401 @@
+# ============================================
+# VMMO Price History - временной ряд наблюдений аукциона
+# ============================================
+# Каждая загруженная страница аукциона — это снимок рынка: все лоты с
+# количеством и ценой. Раньше от снимка оставалось одно число (минималка
+# конкурента) в shared_prices.json или вообще ничего.
+#
+# Теперь снимок целиком пишется в SQLite (profiles/price_history.db):
+#   observations — сырые лоты (ts, item, qty, total_silver, ppu, ours)
+#   rollup_hourly / rollup_daily — даунсэмплинг минималки конкурентов
+#   (снимков в бакете, min/max, сумма для среднего, последняя цена)
+# Роллапы обновляются сразу при записи (как agg_hourly в sales_ledger),
+# сырые лоты живут RAW_KEEP_DAYS, часовые — HOURLY_KEEP_DAYS.
+#
+# API для остального кода:
+#   record_lots(item, lots, source, profile) — записать снимок
+#   price_at(item, t) — минималка конкурента (серебро/шт) на момент t
+#   price_trend(item, window) — относительный наклон цены за окно
+#   recent_price(item, max_age, ...) — свежая цена без нового поиска
+# ============================================
+
+import os
+import math
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+PROFILES_DIR = Path(__file__).parent.parent / "profiles"
+HISTORY_DB = PROFILES_DIR / "price_history.db"
+
+# Сырые лоты — для разбора конкретных снимков, дальше хватает роллапов
+RAW_KEEP_DAYS = 14
+# Часовые роллапы — для трендов и графиков
+HOURLY_KEEP_DAYS = 90
+# Дневные — компактные, держим два года
+DAILY_KEEP_DAYS = 730
+
+# Снимок старше этого на момент t не считается "ценой в момент t"
+DEFAULT_MAX_GAP = 6 * 3600
+# Меньше точек — тренд не считаем
+TREND_MIN_POINTS = 3
+
+HOUR = 3600
+DAY = 24 * 3600
+
+_conn = None
+_conn_pid = None
+# Подключение общее для потоков процесса (параллельный refresh крафт-цен)
+_lock = threading.RLock()
+
+
+def get_connection() -> sqlite3.Connection:
+    """Долгоживущее подключение процесса (пересоздаётся после fork)."""
+    global _conn, _conn_pid
+    if _conn is not None and _conn_pid == os.getpid():
+        return _conn
+    PROFILES_DIR.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(HISTORY_DB), timeout=30, isolation_level=None,
+                           check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    _init_schema(conn)
+    _conn, _conn_pid = conn, os.getpid()
+    return conn
+
+
+def _init_schema(conn: sqlite3.Connection):
+    conn.executescript('''
+        CREATE TABLE IF NOT EXISTS observations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ts REAL NOT NULL,
+            item TEXT NOT NULL,
+            qty INTEGER NOT NULL DEFAULT 1,
+            total_silver INTEGER NOT NULL DEFAULT 0,
+            ppu REAL NOT NULL DEFAULT 0,
+            ours INTEGER NOT NULL DEFAULT 0,
+            source TEXT NOT NULL DEFAULT '',
+            profile TEXT NOT NULL DEFAULT ''
+        );
+        CREATE INDEX IF NOT EXISTS idx_obs_item_ts ON observations(item, ts);
+        CREATE INDEX IF NOT EXISTS idx_obs_ts ON observations(ts);
+
+        CREATE TABLE IF NOT EXISTS rollup_hourly (
+            item TEXT NOT NULL,
+            bucket INTEGER NOT NULL,
+            n INTEGER NOT NULL DEFAULT 0,
+            min_ppu REAL NOT NULL,
+            max_ppu REAL NOT NULL,
+            sum_ppu REAL NOT NULL DEFAULT 0,
+            last_ppu REAL NOT NULL,
+            last_ts REAL NOT NULL,
+            PRIMARY KEY (item, bucket)
+        );
+
+        CREATE TABLE IF NOT EXISTS rollup_daily (
+            item TEXT NOT NULL,
+            bucket INTEGER NOT NULL,
+            n INTEGER NOT NULL DEFAULT 0,
+            min_ppu REAL NOT NULL,
+            max_ppu REAL NOT NULL,
+            sum_ppu REAL NOT NULL DEFAULT 0,
+            last_ppu REAL NOT NULL,
+            last_ts REAL NOT NULL,
+            PRIMARY KEY (item, bucket)
+        );
+
+        -- Текущий стакан по предмету (см. order_book.py)
+        CREATE TABLE IF NOT EXISTS order_book (
+            item TEXT PRIMARY KEY,
+            ts REAL NOT NULL,
+            lots TEXT NOT NULL,
+            source TEXT NOT NULL DEFAULT '',
+            profile TEXT NOT NULL DEFAULT ''
+        );
+
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+    ''')
+
+
+class Transaction:
+    """BEGIN IMMEDIATE ... COMMIT: снимок пишется целиком или не пишется."""
+
+    def __enter__(self):
+        _lock.acquire()
+        try:
+            self.conn = get_connection()
+            self.conn.execute("BEGIN IMMEDIATE")
+        except Exception:
+            _lock.release()
+            raise
+        return self.conn
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        try:
+            self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        finally:
+            _lock.release()
+        return False
+
+
+# ============================================
+# Запись
+# ============================================
+
+def _add_rollup(conn, table, bucket_sec, ts, item, ppu):
+    conn.execute(
+        f"INSERT INTO {table} (item, bucket, n, min_ppu, max_ppu, sum_ppu, last_ppu, last_ts) "
+        f"VALUES (?, ?, 1, ?, ?, ?, ?, ?) "
+        f"ON CONFLICT(item, bucket) DO UPDATE SET "
+        f"n=n+1, min_ppu=MIN(min_ppu, excluded.min_ppu), max_ppu=MAX(max_ppu, excluded.max_ppu), "
+        f"sum_ppu=sum_ppu+excluded.sum_ppu, "
+        f"last_ppu=CASE WHEN excluded.last_ts>=last_ts THEN excluded.last_ppu ELSE last_ppu END, "
+        f"last_ts=MAX(last_ts, excluded.last_ts)",
+        (item, int(ts // bucket_sec), ppu, ppu, ppu, ppu, ts))
+
+
+def record_lots(item: str, lots, source: str = "", profile: str = "", ts: float = None) -> int:
+    """
+    Записывает снимок лотов одного предмета.
+
+    Args:
+        item: название предмета
+        lots: [(qty, total_silver, ours), ...] — все лоты со страницы
+        source: кто видел (auction/craft/resources/transfer)
+        profile: профиль бота
+        ts: время снимка (по умолчанию — сейчас)
+
+    Returns:
+        int: сколько лотов записано (0 при ошибке)
+    """
+    ts = time.time() if ts is None else ts
+    rows = [(int(qty), int(total), bool(ours)) for qty, total, ours in lots
+            if qty and qty > 0 and total and total > 0]
+    if not item or not rows:
+        return 0
+
+    competitor = [total / qty for qty, total, ours in rows if not ours]
+    try:
+        with Transaction() as conn:
+            conn.executemany(
+                "INSERT INTO observations (ts, item, qty, total_silver, ppu, ours, source, profile) "
+                "VALUES (?,?,?,?,?,?,?,?)",
+                [(ts, item, qty, total, total / qty, int(ours), source, profile)
+                 for qty, total, ours in rows])
+            # Роллапы — по минималке конкурентов в снимке (наши лоты не рынок)
+            if competitor:
+                snapshot_min = min(competitor)
+                _add_rollup(conn, "rollup_hourly", HOUR, ts, item, snapshot_min)
+                _add_rollup(conn, "rollup_daily", DAY, ts, item, snapshot_min)
+    except Exception as e:
+        print(f"[PRICE_HISTORY] Ошибка записи снимка '{item}': {e}")
+        return 0
+
+    maybe_compact()
+    return len(rows)
+
+
+# ============================================
+# Чтение
+# ============================================
+
+def price_at(item: str, t: float = None, max_gap: float = DEFAULT_MAX_GAP,
+             include_ours: bool = False):
+    """
+    Минимальная цена за 1 шт (серебро) в последнем снимке не позже t.
+
+    Сначала сырые снимки, для старых моментов — часовые, затем дневные
+    роллапы (там только конкуренты, include_ours не влияет).
+
+    Args:
+        item: название предмета
+        t: момент времени (None — сейчас)
+        max_gap: насколько снимок может быть старше t
+        include_ours: учитывать и наши лоты (минималка рынка целиком)
+
+    Returns:
+        float или None если снимков в окне нет
+    """
+    t = time.time() if t is None else t
+    ours_filter = "" if include_ours else " AND ours=0"
+    try:
+        with _lock:
+            return _price_at(get_connection(), item, t, max_gap, ours_filter)
+    except Exception as e:
+        print(f"[PRICE_HISTORY] Ошибка чтения '{item}': {e}")
+    return None
+
+
+def _price_at(conn, item, t, max_gap, ours_filter):
+    row = conn.execute(
+        f"SELECT MAX(ts) AS ts FROM observations "
+        f"WHERE item=? AND ts<=? AND ts>=?{ours_filter}",
+        (item, t, t - max_gap)).fetchone()
+    if row and row["ts"] is not None:
+        return conn.execute(
+            f"SELECT MIN(ppu) AS p FROM observations WHERE item=? AND ts=?{ours_filter}",
+            (item, row["ts"])).fetchone()["p"]
+
+    for table in ("rollup_hourly", "rollup_daily"):
+        row = conn.execute(
+            f"SELECT last_ppu FROM {table} WHERE item=? AND last_ts<=? AND last_ts>=? "
+            f"ORDER BY bucket DESC LIMIT 1",
+            (item, t, t - max_gap)).fetchone()
+        if row:
+            return row["last_ppu"]
+    return None
+
+
+def price_series(item: str, since: float, until: float = None, daily: bool = False):
+    """
+    Ряд средних минималок по бакетам.
+
+    Returns:
+        list: [(ts начала бакета, средняя, min, max), ...] по возрастанию
+    """
+    until = time.time() if until is None else until
+    table, size = ("rollup_daily", DAY) if daily else ("rollup_hourly", HOUR)
+    try:
+        with _lock:
+            rows = get_connection().execute(
+                f"SELECT bucket, n, min_ppu, max_ppu, sum_ppu FROM {table} "
+                f"WHERE item=? AND bucket>=? AND bucket<=? ORDER BY bucket",
+                (item, int(since // size), int(until // size))).fetchall()
+    except Exception as e:
+        print(f"[PRICE_HISTORY] Ошибка чтения ряда '{item}': {e}")
+        return []
+    return [(r["bucket"] * size, r["sum_ppu"] / r["n"], r["min_ppu"], r["max_ppu"])
+            for r in rows if r["n"]]
+
+
+def price_trend(item: str, window: float, now: float = None):
+    """
+    Тренд цены за окно: МНК-наклон ln(цены) по часовым средним.
+
+    Args:
+        item: название предмета
+        window: окно в секундах (больше HOURLY_KEEP_DAYS — по дневным)
+        now: конец окна (None — сейчас)
+
+    Returns:
+        dict: {"slope_per_hour": относительное изменение за час,
+               "first", "last": средние первого/последнего бакета,
+               "change": last/first - 1, "n": точек}
+        или None если точек меньше TREND_MIN_POINTS
+    """
+    now = time.time() if now is None else now
+    daily = window > HOURLY_KEEP_DAYS * DAY
+    series = [(ts, mean) for ts, mean, _, _ in price_series(item, now - window, now, daily=daily)
+              if mean > 0]
+    if len(series) < TREND_MIN_POINTS:
+        return None
+
+    xs = [(ts - series[0][0]) / HOUR for ts, _ in series]
+    ys = [math.log(mean) for _, mean in series]
+    n = len(series)
+    mx, my = sum(xs) / n, sum(ys) / n
+    sxx = sum((x - mx) ** 2 for x in xs)
+    slope = sum((x - mx) * (y - my) for x, y in zip(xs, ys)) / sxx if sxx else 0.0
+
+    first, last = series[0][1], series[-1][1]
+    return {
+        "slope_per_hour": math.exp(slope) - 1,
+        "first": first,
+        "last": last,
+        "change": last / first - 1,
+        "n": n,
+    }
+
+
+def recent_price(item: str, max_age: float, trend_window: float = 6 * HOUR,
+                 max_slope: float = 0.02, include_ours: bool = False):
+    """
+    Цена из истории, если её можно использовать вместо нового поиска.
+
+    Снимок должен быть не старше max_age, а рынок — спокойным: |наклон|
+    за trend_window не больше max_slope в час (нет данных для тренда —
+    считаем спокойным, возраст уже ограничен). Цена экстраполируется
+    по тренду на возраст снимка.
+
+    Returns:
+        float: серебро/шт или None (нужен свежий поиск)
+    """
+    now = time.time()
+    price = price_at(item, now, max_gap=max_age, include_ours=include_ours)
+    if price is None:
+        return None
+    trend = price_trend(item, trend_window, now)
+    if trend is None:
+        return price
+    if abs(trend["slope_per_hour"]) > max_slope:
+        return None
+    ts = _last_snapshot_ts(item, now)
+    age_hours = (now - ts) / HOUR if ts else 0
+    return price * (1 + trend["slope_per_hour"]) ** age_hours
+
+
+def _last_snapshot_ts(item: str, t: float):
+    try:
+        with _lock:
+            row = get_connection().execute(
+                "SELECT MAX(ts) AS ts FROM observations WHERE item=? AND ts<=?",
+                (item, t)).fetchone()
+        return row["ts"] if row else None
+    except Exception:
+        return None
+
+
+# ============================================
+# Компакция
+# ============================================
+
+def compact():
+    """
+    Чистит историю: сырые лоты старше RAW_KEEP_DAYS, часовые роллапы
+    старше HOURLY_KEEP_DAYS, дневные старше DAILY_KEEP_DAYS.
+
+    Returns:
+        int: удалено строк
+    """
+    now = time.time()
+    with Transaction() as conn:
+        deleted = conn.execute("DELETE FROM observations WHERE ts<?",
+                               (now - RAW_KEEP_DAYS * DAY,)).rowcount
+        deleted += conn.execute("DELETE FROM rollup_hourly WHERE bucket<?",
+                                (int((now - HOURLY_KEEP_DAYS * DAY) // HOUR),)).rowcount
+        deleted += conn.execute("DELETE FROM rollup_daily WHERE bucket<?",
+                                (int((now - DAILY_KEEP_DAYS * DAY) // DAY),)).rowcount
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('last_compact', ?)",
+                     (str(now),))
+    if deleted:
+        with _lock:
+            get_connection().execute("VACUUM")
+    return deleted
+
+
+def maybe_compact(interval_sec: int = 24 * 3600):
+    """Компакция не чаще раза в interval_sec (дёргается из record_lots дёшево)."""
+    try:
+        with _lock:
+            row = get_connection().execute(
+                "SELECT value FROM meta WHERE key='last_compact'").fetchone()
+            if row is None:
+                # Первая запись в новой БД — чистить нечего, просто ставим отметку
+                get_connection().execute(
+                    "INSERT OR IGNORE INTO meta (key, value) VALUES ('last_compact', ?)",
+                    (str(time.time()),))
+                return 0
+        if time.time() - float(row["value"]) < interval_sec:
+            return 0
+        deleted = compact()
+        if deleted:
+            print(f"[PRICE_HISTORY] Компакция: удалено {deleted} строк")
+        return deleted
+    except Exception as e:
+        print(f"[PRICE_HISTORY] Ошибка компакции: {e}")
+        return 0
@@ -0,0 +1,239 @@
+# ============================================
+# VMMO Price Service - единый кэш цен аукциона
+# ============================================
+# Раньше цены жили в четырёх файлах со своими TTL и форматами:
+#   auction_price_cache.json (auction.py), price_cache.json (sell_resources.py),
+#   shared_auction_cache.json (craft_prices.py, цены в золоте),
+#   а рубин для gold_transfer вообще не кэшировался.
+#
+# Теперь один файл shared_prices.json:
+#   {"items": {name: {"silver": float, "ts": float, "source": str, "profile": str,
+#                     "vol": float}},
+#    "markers": {key: ts}}
+# Цена — ВСЕГДА серебро за 1 шт. Модули со своими единицами (крафт считает
+# в золоте) конвертируют на своей стороне.
+#
+# В процессе файл кэшируется и перечитывается только при смене mtime/size —
+# get() на горячем пути не трогает диск кроме stat(). Запись — write-through
+# под file lock через temp-файл + rename, её сразу видят все боты.
+#
+# Волатильность: при каждом новом наблюдении цены обновляется EWMA
+# |ln(p_new/p_old)| / sqrt(часов между наблюдениями) — ожидаемый
+# относительный уход цены за час. expected_drift(item) масштабирует его
+# на возраст цены (как у случайного блуждания).
+# ============================================
+
+import os
+import json
+import math
+import time
+
+SCRIPT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SHARED_PRICES_FILE = os.path.join(SCRIPT_DIR, "shared_prices.json")
+SHARED_PRICES_LOCKFILE = os.path.join(SCRIPT_DIR, "shared_prices.lock")
+
+# TTL по умолчанию (сек), если вызывающий не передал max_age
+DEFAULT_TTL = 4 * 3600
+
+# TTL по предметам: ресурсы дёргаются чаще крафта
+ITEM_TTLS = {
+    "Минерал": 30 * 60,
+    "Череп": 30 * 60,
+    "Сапфир": 30 * 60,
+    "Рубин": 30 * 60,
+}
+
+
+# Сглаживание EWMA волатильности (вес нового наблюдения)
+VOLATILITY_ALPHA = 0.3
+# Наблюдения чаще этого (часы) не обновляют волатильность — шум
+VOLATILITY_MIN_DT_HOURS = 0.25
+
+
+def _update_volatility(old: dict, new_silver: float, now: float):
+    """Новая EWMA-волатильность по предыдущей записи (или старая, если нечего считать)."""
+    old_vol = old.get("vol")
+    old_silver = old.get("silver")
+    dt_hours = (now - old.get("ts", now)) / 3600
+    if not old_silver or not new_silver or old_silver <= 0 or new_silver <= 0:
+        return old_vol
+    if dt_hours < VOLATILITY_MIN_DT_HOURS:
+        return old_vol
+    sample = abs(math.log(new_silver / old_silver)) / math.sqrt(dt_hours)
+    if old_vol is None:
+        return round(sample, 5)
+    return round(VOLATILITY_ALPHA * sample + (1 - VOLATILITY_ALPHA) * old_vol, 5)
+
+
+class PriceService:
+    """
+    Цены аукциона (серебро/шт) с in-process кэшем, валидируемым по mtime.
+
+    Attributes:
+        path: JSON-файл с ценами
+        lockfile: файл лока для записи
+    """
+
+    def __init__(self, path: str = SHARED_PRICES_FILE, lockfile: str = SHARED_PRICES_LOCKFILE):
+        self.path = path
+        self.lockfile = lockfile
+        self._data = {"items": {}, "markers": {}}
+        self._sig = None  # (mtime_ns, size) последней загрузки
+
+    # ---------- чтение ----------
+
+    def _stat_sig(self):
+        try:
+            st = os.stat(self.path)
+            return st.st_mtime_ns, st.st_size
+        except OSError:
+            return None
+
+    def _read_file(self) -> dict:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            data.setdefault("items", {})
+            data.setdefault("markers", {})
+            return data
+        except (OSError, ValueError):
+            return {"items": {}, "markers": {}}
+
+    def _refresh(self):
+        """Перечитывает файл только если он изменился."""
+        sig = self._stat_sig()
+        if sig == self._sig:
+            return
+        self._data = self._read_file() if sig else {"items": {}, "markers": {}}
+        self._sig = sig
+
+    def ttl_for(self, item: str) -> int:
+        return ITEM_TTLS.get(item, DEFAULT_TTL)
+
+    def get_entry(self, item: str):
+        """Сырая запись {silver, ts, source, profile} или None."""
+        self._refresh()
+        return self._data["items"].get(item)
+
+    def age(self, item: str) -> float:
+        """Возраст цены в секундах (inf если нет)."""
+        entry = self.get_entry(item)
+        if not entry:
+            return float("inf")
+        return time.time() - entry.get("ts", 0)
+
+    def get(self, item: str, max_age: float = None):
+        """
+        Цена за 1 шт в серебре, если она свежее max_age.
+
+        Args:
+            item: название предмета
+            max_age: допустимый возраст (None — TTL предмета)
+
+        Returns:
+            float или None
+        """
+        entry = self.get_entry(item)
+        if not entry:
+            return None
+        limit = max_age if max_age is not None else self.ttl_for(item)
+        if time.time() - entry.get("ts", 0) > limit:
+            return None
+        return entry.get("silver")
+
+    def get_many(self, max_age: float = None) -> dict:
+        """{item: серебро/шт} для всех свежих цен."""
+        self._refresh()
+        now = time.time()
+        result = {}
+        for item, entry in self._data["items"].items():
+            limit = max_age if max_age is not None else self.ttl_for(item)
+            if now - entry.get("ts", 0) <= limit:
+                result[item] = entry.get("silver")
+        return result
+
+    def volatility(self, item: str):
+        """EWMA относительного ухода цены за час (None — мало наблюдений)."""
+        entry = self.get_entry(item)
+        return entry.get("vol") if entry else None
+
+    def expected_drift(self, item: str, default_vol: float) -> float:
+        """
+        Ожидаемый относительный уход цены с момента наблюдения:
+        vol * sqrt(возраст в часах). Нет цены — inf.
+        """
+        entry = self.get_entry(item)
+        if not entry:
+            return float("inf")
+        vol = entry.get("vol")
+        if vol is None:
+            vol = default_vol
+        age_hours = max(0.0, time.time() - entry.get("ts", 0)) / 3600
+        return vol * math.sqrt(age_hours)
+
+    def marker_age(self, key: str) -> float:
+        """Возраст маркера (например, время полного обновления крафт-цен)."""
+        self._refresh()
+        ts = self._data["markers"].get(key)
+        if ts is None:
+            return float("inf")
+        return time.time() - ts
+
+    # ---------- запись ----------
+
+    def _lock(self):
+        # FileLock живёт в craft_prices (как и для остальных shared-файлов)
+        from requests_bot.craft_prices import FileLock
+        return FileLock(self.lockfile)
+
+    def _write(self, data: dict):
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.path)
+        self._data = data
+        self._sig = self._stat_sig()
+
+    def update(self, prices: dict, source: str = "", profile: str = "", marker: str = None):
+        """
+        Записывает несколько цен одной транзакцией.
+
+        Args:
+            prices: {item: серебро/шт}
+            source: кто записал (auction/resources/craft/transfer)
+            profile: профиль бота
+            marker: ключ маркера, который выставить в текущее время
+        """
+        now = time.time()
+        try:
+            with self._lock():
+                data = self._read_file()  # свежая версия с диска под локом
+                for item, silver in prices.items():
+                    old = data["items"].get(item) or {}
+                    data["items"][item] = {
+                        "silver": silver,
+                        "ts": now,
+                        "source": source,
+                        "profile": profile,
+                        "vol": _update_volatility(old, silver, now),
+                    }
+                if marker:
+                    data["markers"][marker] = now
+                self._write(data)
+        except Exception as e:
+            print(f"[PRICES] Ошибка записи {self.path}: {e}")
+
+    def set(self, item: str, silver_per_unit: float, source: str = "", profile: str = ""):
+        """Записывает одну цену (серебро/шт)."""
+        self.update({item: silver_per_unit}, source=source, profile=profile)
+
+
+_service = None
+
+
+def get_price_service() -> PriceService:
+    """Общий экземпляр на процесс."""
+    global _service
+    if _service is None:
+        _service = PriceService()
+    return _service
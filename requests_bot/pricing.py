@@ -4,7 +4,7 @@
 # Проблема: боты всегда продают по цене конкурента (или -1с), даже когда
 # товар улетает за час при суточном лоте — то есть системно недооценивают.
 #
-# Решение: контроллер множителя цены на данных sales_stats:
+# Решение: контроллер множителя цены на данных sales ledger:
 #   - товар продаётся быстро и почти весь (медиана tts < 4ч, sell-through
 #     >= 85%) → поднимаем множитель на шаг (+5%)
 #   - товар протухает (sell-through < 60%) → опускаем на шаг
@@ -19,7 +19,7 @@ import fcntl
 from datetime import datetime, timedelta
 from pathlib import Path
 
-from .sales_tracker import SALES_FILE
+from . import sales_ledger
 
 POLICY_FILE = Path(__file__).parent.parent / "profiles" / "price_policy.json"
 POLICY_LOCK = Path(__file__).parent.parent / "profiles" / ".price_policy_lock"
@@ -70,51 +70,25 @@ def _norm(name: str) -> str:
 
 
 def _recompute_policy():
-    """Пересчитывает множители по свежим sales_stats (вызывается редко, под локом)."""
-    import statistics
+    """Пересчитывает множители по продажам из sales ledger за окно (вызывается редко, под локом)."""
     import time as _time
 
+    cutoff = (datetime.now() - timedelta(hours=WINDOW_HOURS)).timestamp()
     try:
-        with open(SALES_FILE, "r", encoding="utf-8") as f:
-            stats = json.load(f)
+        window = sales_ledger.window_aggregates(cutoff, normalize=_norm)
     except Exception as e:
-        print(f"[PRICING] Не смог прочитать sales_stats: {e}")
+        print(f"[PRICING] Не смог прочитать sales ledger: {e}")
         return
-
-    cutoff = (datetime.now() - timedelta(hours=WINDOW_HOURS)).timestamp()
-
-    def ts(x):
-        try:
-            return datetime.fromisoformat(x["timestamp"]).timestamp()
-        except Exception:
-            return 0
-
-    sold = {}   # item -> {"count": n, "tts": [...]}
-    expired = {}
-    for x in stats.get("sold", []):
-        if ts(x) < cutoff or x.get("transfer"):
-            continue
-        n = _norm(x.get("item", ""))
-        if n in ("(неизвестно)", ""):
-            continue
-        rec = sold.setdefault(n, {"count": 0, "tts": []})
-        rec["count"] += 1
-        if x.get("time_to_sell") is not None:
-            rec["tts"].append(x["time_to_sell"])
-    for x in stats.get("expired", []):
-        if ts(x) < cutoff:
-            continue
-        n = _norm(x.get("item", ""))
-        expired[n] = expired.get(n, 0) + 1
+    window.pop("(неизвестно)", None)
+    window.pop("", None)
 
     policy = _load_policy()
     items = policy.setdefault("items", {})
     now = _time.time()
 
-    for name in set(sold) | set(expired):
-        s = sold.get(name, {"count": 0, "tts": []})
-        e = expired.get(name, 0)
-        total = s["count"] + e
+    for name, agg in window.items():
+        sold = agg["sold_lots"]
+        total = sold + agg["expired_lots"]
         if total < MIN_SAMPLE:
             continue
 
@@ -123,8 +97,8 @@ def _recompute_policy():
         if now - entry.get("updated", 0) < UPDATE_INTERVAL:
             continue
 
-        sell_through = s["count"] / total
-        med_tts = statistics.median(s["tts"]) if s["tts"] else None
+        sell_through = sold / total
+        med_tts = sales_ledger.tts_quantile(agg["tts_bins"], 0.5)
         old = entry["mult"]
 
         if (sell_through >= PROMOTE_SELL_THROUGH
@@ -3,12 +3,24 @@
 # ============================================
 # Долгосрочное хранение истории ресурсов
 # SQLite для графиков за день/неделю/месяц
+#
+# Одно долгоживущее подключение на БД профиля в процессе (WAL: бот пишет,
+# панель читает параллельно). Время — целые epoch-секунды (раньше ISO
+# TEXT; старые БД мигрируются при первом открытии, см. _migrate).
+#
+# Снэпшоты сразу раскладываются в роллапы:
+#   snapshots_hourly — бакет = начало часа
+#   snapshots_daily  — бакет = локальная полночь
+# В бакете: n, время первого/последнего снэпшота и значения ресурсов на
+# оба момента (<col>_first / <col>). Графики читают роллап под период,
+# а не все сырые строки за 720 часов.
 # ============================================
 
 import os
 import sqlite3
-import json
-from datetime import datetime, timedelta
+import threading
+import time
+from datetime import datetime
 from typing import Dict, List, Optional, Tuple
 
 from requests_bot.config import PROFILES_DIR, get_profile_name
@@ -16,6 +28,33 @@ from requests_bot.config import PROFILES_DIR, get_profile_name
 # Интервал записи в историю (в секундах)
 HISTORY_INTERVAL = 3600  # 1 час
 
+HOUR = 3600
+DAY = 24 * 3600
+
+# Версия схемы (PRAGMA user_version): 1 — epoch-время + роллапы
+SCHEMA_VERSION = 1
+
+# Колонки ресурсов в БД и их русские названия
+RESOURCE_COLUMNS = {
+    'gold': 'золото',
+    'silver': 'серебро',
+    'skulls': 'черепа',
+    'minerals': 'минералы',
+    'sapphires': 'сапфиры',
+    'rubies': 'рубины',
+    'stamps': 'марки',
+}
+
+# Какой роллап читать для периода графика
+PERIOD_HOURS = {'day': 24, 'week': 168, 'month': 720}
+PERIOD_ROLLUP = {'day': 'hourly', 'week': 'hourly', 'month': 'daily'}
+
+_ROLLUP_TABLES = {'hourly': 'snapshots_hourly', 'daily': 'snapshots_daily'}
+
+_connections = {}  # db_path -> (pid, conn)
+# Подключения общие для потоков процесса (flask отвечает из нескольких потоков)
+_lock = threading.RLock()
+
 
 def _get_db_path(profile: str = None) -> str:
     """Возвращает путь к БД истории ресурсов"""
@@ -27,139 +66,334 @@ def _get_db_path(profile: str = None) -> str:
 
 
 def _get_connection(profile: str = None) -> sqlite3.Connection:
-    """Создаёт подключение к БД"""
+    """Долгоживущее подключение к БД профиля (пересоздаётся после fork)"""
     db_path = _get_db_path(profile)
     if not db_path:
         return None
 
-    # Создаём директорию если нет
-    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    with _lock:
+        cached = _connections.get(db_path)
+        if cached and cached[0] == os.getpid():
+            return cached[1]
 
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
-    return conn
+        # Создаём директорию если нет
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
 
+        conn = sqlite3.connect(db_path, timeout=30, isolation_level=None,
+                               check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        _init_schema(conn)
+        _connections[db_path] = (os.getpid(), conn)
+        return conn
+
+
+def close_connections():
+    """Закрывает подключения процесса (тесты, выход)"""
+    with _lock:
+        for pid, conn in _connections.values():
+            if pid == os.getpid():
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+        _connections.clear()
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT под блокировкой процесса."""
+
+    def __init__(self, profile: str = None):
+        self.profile = profile
+
+    def __enter__(self):
+        _lock.acquire()
+        try:
+            self.conn = _get_connection(self.profile)
+            if self.conn is not None:
+                self.conn.execute("BEGIN IMMEDIATE")
+        except Exception:
+            _lock.release()
+            raise
+        return self.conn
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        try:
+            if self.conn is not None:
+                self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        finally:
+            _lock.release()
+        return False
+
+
+def _rollup_ddl(table: str) -> str:
+    cols = ",\n".join(f"    {c}_first INTEGER DEFAULT 0,\n    {c} INTEGER DEFAULT 0"
+                      for c in RESOURCE_COLUMNS)
+    return f'''
+        CREATE TABLE IF NOT EXISTS {table} (
+            bucket INTEGER PRIMARY KEY,
+            n INTEGER NOT NULL DEFAULT 0,
+            first_ts INTEGER NOT NULL,
+            last_ts INTEGER NOT NULL,
+{cols}
+        );
+    '''
+
+
+def _init_schema(conn: sqlite3.Connection):
+    """Создаёт таблицы и мигрирует старую схему"""
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    legacy = version < SCHEMA_VERSION and conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='resource_snapshots'"
+    ).fetchone() is not None
+
+    if legacy:
+        _migrate(conn)
+    else:
+        conn.executescript(_TABLES_DDL)
+
+    conn.executescript(_rollup_ddl('snapshots_hourly') + _rollup_ddl('snapshots_daily'))
+    conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+
+    if legacy:
+        _rebuild_rollups(conn)
+
+
+_TABLES_DDL = '''
+    -- История ресурсов (почасовые снэпшоты), ts — epoch секунды
+    CREATE TABLE IF NOT EXISTS resource_snapshots (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        ts INTEGER NOT NULL,
+        gold INTEGER DEFAULT 0,
+        silver INTEGER DEFAULT 0,
+        skulls INTEGER DEFAULT 0,
+        minerals INTEGER DEFAULT 0,
+        sapphires INTEGER DEFAULT 0,
+        rubies INTEGER DEFAULT 0,
+        stamps INTEGER DEFAULT 0,
+        source TEXT DEFAULT 'auto'
+    );
+    CREATE INDEX IF NOT EXISTS idx_snapshots_ts ON resource_snapshots(ts);
+
+    -- Сессии бота (start/stop события)
+    CREATE TABLE IF NOT EXISTS bot_sessions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        start_ts INTEGER NOT NULL,
+        end_ts INTEGER,
+        gold_start INTEGER DEFAULT 0,
+        gold_end INTEGER DEFAULT 0,
+        silver_start INTEGER DEFAULT 0,
+        silver_end INTEGER DEFAULT 0,
+        skulls_start INTEGER DEFAULT 0,
+        skulls_end INTEGER DEFAULT 0,
+        minerals_start INTEGER DEFAULT 0,
+        minerals_end INTEGER DEFAULT 0,
+        sapphires_start INTEGER DEFAULT 0,
+        sapphires_end INTEGER DEFAULT 0,
+        rubies_start INTEGER DEFAULT 0,
+        rubies_end INTEGER DEFAULT 0,
+        stamps_start INTEGER DEFAULT 0,
+        stamps_end INTEGER DEFAULT 0
+    );
+    CREATE INDEX IF NOT EXISTS idx_sessions_end ON bot_sessions(end_ts);
+
+    -- Изменения между сессиями
+    CREATE TABLE IF NOT EXISTS offline_changes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        detected_ts INTEGER NOT NULL,
+        prev_session_end_ts INTEGER,
+        gold_change INTEGER DEFAULT 0,
+        silver_change INTEGER DEFAULT 0,
+        skulls_change INTEGER DEFAULT 0,
+        minerals_change INTEGER DEFAULT 0,
+        sapphires_change INTEGER DEFAULT 0,
+        rubies_change INTEGER DEFAULT 0,
+        stamps_change INTEGER DEFAULT 0
+    );
+'''
+
+
+def _iso_to_epoch(value) -> Optional[int]:
+    """ISO-строка старой схемы -> epoch (наивное время — локальное)"""
+    if value is None:
+        return None
+    try:
+        return int(datetime.fromisoformat(str(value).replace('Z', '')).timestamp())
+    except ValueError:
+        return None
+
+
+def _epoch_to_iso(ts) -> Optional[str]:
+    if ts is None:
+        return None
+    return datetime.fromtimestamp(ts).isoformat()
 
-def init_db(profile: str = None):
-    """Инициализирует таблицы БД"""
-    conn = _get_connection(profile)
-    if not conn:
-        return
 
+def _migrate(conn: sqlite3.Connection):
+    """
+    Старая схема (ISO TEXT) -> epoch INTEGER.
+
+    Таблицы переименовываются в *_legacy, создаются новые, строки
+    копируются с конвертацией времени, legacy удаляются — всё в одной
+    транзакции (упали посередине — откат, попробуем при следующем открытии).
+    """
+    print("[HISTORY] Миграция resource_history.db: ISO-время -> epoch")
+    columns = list(RESOURCE_COLUMNS)
+    conn.execute("BEGIN IMMEDIATE")
     try:
-        cursor = conn.cursor()
-
-        # Таблица истории ресурсов (почасовые снэпшоты)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS resource_snapshots (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp TEXT NOT NULL,
-                gold INTEGER DEFAULT 0,
-                silver INTEGER DEFAULT 0,
-                skulls INTEGER DEFAULT 0,
-                minerals INTEGER DEFAULT 0,
-                sapphires INTEGER DEFAULT 0,
-                rubies INTEGER DEFAULT 0,
-                stamps INTEGER DEFAULT 0,
-                source TEXT DEFAULT 'auto'
-            )
-        ''')
-
-        # Индекс по времени
-        cursor.execute('''
-            CREATE INDEX IF NOT EXISTS idx_snapshots_timestamp
-            ON resource_snapshots(timestamp)
-        ''')
-
-        # Таблица сессий бота (start/stop события)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS bot_sessions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                start_time TEXT NOT NULL,
-                end_time TEXT,
-                gold_start INTEGER DEFAULT 0,
-                gold_end INTEGER DEFAULT 0,
-                silver_start INTEGER DEFAULT 0,
-                silver_end INTEGER DEFAULT 0,
-                skulls_start INTEGER DEFAULT 0,
-                skulls_end INTEGER DEFAULT 0,
-                minerals_start INTEGER DEFAULT 0,
-                minerals_end INTEGER DEFAULT 0,
-                sapphires_start INTEGER DEFAULT 0,
-                sapphires_end INTEGER DEFAULT 0,
-                rubies_start INTEGER DEFAULT 0,
-                rubies_end INTEGER DEFAULT 0,
-                stamps_start INTEGER DEFAULT 0,
-                stamps_end INTEGER DEFAULT 0
-            )
-        ''')
-
-        # Таблица изменений между сессиями
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS offline_changes (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                detected_at TEXT NOT NULL,
-                prev_session_end TEXT,
-                gold_change INTEGER DEFAULT 0,
-                silver_change INTEGER DEFAULT 0,
-                skulls_change INTEGER DEFAULT 0,
-                minerals_change INTEGER DEFAULT 0,
-                sapphires_change INTEGER DEFAULT 0,
-                rubies_change INTEGER DEFAULT 0,
-                stamps_change INTEGER DEFAULT 0
-            )
-        ''')
-
-        conn.commit()
-    finally:
-        conn.close()
+        for table in ("resource_snapshots", "bot_sessions", "offline_changes"):
+            conn.execute(f"ALTER TABLE {table} RENAME TO {table}_legacy")
+        conn.execute("DROP INDEX IF EXISTS idx_snapshots_timestamp")
+        for statement in _TABLES_DDL.split(";"):
+            if statement.strip():
+                conn.execute(statement)
+
+        rows = conn.execute(
+            f"SELECT timestamp, {', '.join(columns)}, source FROM resource_snapshots_legacy "
+            f"ORDER BY id").fetchall()
+        conn.executemany(
+            f"INSERT INTO resource_snapshots (ts, {', '.join(columns)}, source) "
+            f"VALUES ({', '.join('?' * (len(columns) + 2))})",
+            [(_iso_to_epoch(r['timestamp']), *[r[c] for c in columns], r['source'])
+             for r in rows if _iso_to_epoch(r['timestamp']) is not None])
+
+        se_cols = [f"{c}_{edge}" for c in columns for edge in ("start", "end")]
+        rows = conn.execute(
+            f"SELECT start_time, end_time, {', '.join(se_cols)} FROM bot_sessions_legacy "
+            f"ORDER BY id").fetchall()
+        conn.executemany(
+            f"INSERT INTO bot_sessions (start_ts, end_ts, {', '.join(se_cols)}) "
+            f"VALUES ({', '.join('?' * (len(se_cols) + 2))})",
+            [(_iso_to_epoch(r['start_time']), _iso_to_epoch(r['end_time']),
+              *[r[c] for c in se_cols])
+             for r in rows if _iso_to_epoch(r['start_time']) is not None])
+
+        ch_cols = [f"{c}_change" for c in columns]
+        rows = conn.execute(
+            f"SELECT detected_at, prev_session_end, {', '.join(ch_cols)} "
+            f"FROM offline_changes_legacy ORDER BY id").fetchall()
+        conn.executemany(
+            f"INSERT INTO offline_changes (detected_ts, prev_session_end_ts, {', '.join(ch_cols)}) "
+            f"VALUES ({', '.join('?' * (len(ch_cols) + 2))})",
+            [(_iso_to_epoch(r['detected_at']), _iso_to_epoch(r['prev_session_end']),
+              *[r[c] for c in ch_cols])
+             for r in rows if _iso_to_epoch(r['detected_at']) is not None])
+
+        for table in ("resource_snapshots", "bot_sessions", "offline_changes"):
+            conn.execute(f"DROP TABLE {table}_legacy")
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def init_db(profile: str = None):
+    """Инициализирует таблицы БД (схема создаётся при открытии подключения)"""
+    _get_connection(profile)
 
 
 def _resources_to_db_columns(resources: Dict) -> Dict:
     """Конвертирует русские названия в колонки БД"""
-    mapping = {
-        'золото': 'gold',
-        'серебро': 'silver',
-        'черепа': 'skulls',
-        'минералы': 'minerals',
-        'сапфиры': 'sapphires',
-        'рубины': 'rubies',
-        'марки': 'stamps',
-    }
+    return {eng: resources.get(rus, 0) for eng, rus in RESOURCE_COLUMNS.items()}
 
-    result = {}
-    for rus, eng in mapping.items():
-        result[eng] = resources.get(rus, 0)
-    return result
 
-
-def _db_columns_to_resources(row: sqlite3.Row) -> Dict:
+def _db_columns_to_resources(row: sqlite3.Row, suffix: str = '') -> Dict:
     """Конвертирует колонки БД в русские названия"""
-    mapping = {
-        'gold': 'золото',
-        'silver': 'серебро',
-        'skulls': 'черепа',
-        'minerals': 'минералы',
-        'sapphires': 'сапфиры',
-        'rubies': 'рубины',
-        'stamps': 'марки',
-    }
-
+    keys = row.keys()
     result = {}
-    for eng, rus in mapping.items():
-        val = row[eng] if eng in row.keys() else 0
+    for eng, rus in RESOURCE_COLUMNS.items():
+        val = row[eng + suffix] if eng + suffix in keys else 0
         if val:
             result[rus] = val
     return result
 
 
+# ═══════════════════════════════════════════════════════════════════
+# ROLLUPS (часовые/дневные бакеты)
+# ═══════════════════════════════════════════════════════════════════
+
+def _day_bucket(ts: int) -> int:
+    """Epoch локальной полуночи дня, в который попадает ts"""
+    lt = time.localtime(ts)
+    return int(time.mktime((lt.tm_year, lt.tm_mon, lt.tm_mday, 0, 0, 0, 0, 0, -1)))
+
+
+def _add_rollup(conn, table: str, bucket: int, ts: int, db_res: Dict):
+    columns = list(RESOURCE_COLUMNS)
+    names = ", ".join(f"{c}_first, {c}" for c in columns)
+    values = [v for c in columns for v in (db_res[c], db_res[c])]
+    updates = ", ".join(
+        f"{c}_first=CASE WHEN excluded.first_ts<first_ts THEN excluded.{c}_first ELSE {c}_first END, "
+        f"{c}=CASE WHEN excluded.last_ts>=last_ts THEN excluded.{c} ELSE {c} END"
+        for c in columns)
+    conn.execute(
+        f"INSERT INTO {table} (bucket, n, first_ts, last_ts, {names}) "
+        f"VALUES (?, 1, ?, ?, {', '.join('?' * len(values))}) "
+        f"ON CONFLICT(bucket) DO UPDATE SET n=n+1, {updates}, "
+        f"first_ts=MIN(first_ts, excluded.first_ts), last_ts=MAX(last_ts, excluded.last_ts)",
+        (bucket, ts, ts, *values))
+
+
+def _add_to_rollups(conn, ts: int, db_res: Dict):
+    _add_rollup(conn, 'snapshots_hourly', ts // HOUR * HOUR, ts, db_res)
+    _add_rollup(conn, 'snapshots_daily', _day_bucket(ts), ts, db_res)
+
+
+def _rebuild_rollups(conn: sqlite3.Connection):
+    """Пересчитывает роллапы из сырых снэпшотов (после миграции)"""
+    columns = list(RESOURCE_COLUMNS)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute("DELETE FROM snapshots_hourly")
+        conn.execute("DELETE FROM snapshots_daily")
+        for row in conn.execute(
+                f"SELECT ts, {', '.join(columns)} FROM resource_snapshots ORDER BY ts").fetchall():
+            _add_to_rollups(conn, row['ts'], {c: row[c] or 0 for c in columns})
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def get_rollup(hours: int = 24, granularity: str = 'hourly', profile: str = None) -> List[Dict]:
+    """
+    Бакеты роллапа за последние hours часов.
+
+    Args:
+        hours: глубина
+        granularity: 'hourly' или 'daily'
+        profile: имя профиля
+
+    Returns:
+        list: [{'ts': начало бакета, 'first_ts', 'last_ts', 'n',
+                'first': {...}, 'last': {...}}, ...] по возрастанию
+    """
+    table = _ROLLUP_TABLES.get(granularity, 'snapshots_hourly')
+    since = int(time.time()) - hours * HOUR
+    with _lock:
+        conn = _get_connection(profile)
+        if not conn:
+            return []
+        rows = conn.execute(
+            f"SELECT * FROM {table} WHERE last_ts >= ? ORDER BY bucket", (since,)).fetchall()
+    return [{
+        'ts': row['bucket'],
+        'first_ts': row['first_ts'],
+        'last_ts': row['last_ts'],
+        'n': row['n'],
+        'first': _db_columns_to_resources(row, '_first'),
+        'last': _db_columns_to_resources(row),
+    } for row in rows]
+
+
 # ═══════════════════════════════════════════════════════════════════
 # SNAPSHOT FUNCTIONS (почасовая история)
 # ═══════════════════════════════════════════════════════════════════
 
 def save_snapshot(resources: Dict, source: str = 'auto', profile: str = None):
     """
-    Сохраняет снэпшот ресурсов в историю.
+    Сохраняет снэпшот ресурсов в историю (и в роллапы).
 
     Args:
         resources: dict с ресурсами (русские названия)
@@ -169,103 +403,71 @@ def save_snapshot(resources: Dict, source: str = 'auto', profile: str = None):
     if not resources:
         return
 
-    init_db(profile)
-    conn = _get_connection(profile)
-    if not conn:
-        return
-
-    try:
-        cursor = conn.cursor()
+    with _Transaction(profile) as conn:
+        if conn is None:
+            return
         db_res = _resources_to_db_columns(resources)
+        ts = int(time.time())
+        columns = list(RESOURCE_COLUMNS)
 
-        cursor.execute('''
-            INSERT INTO resource_snapshots
-            (timestamp, gold, silver, skulls, minerals, sapphires, rubies, stamps, source)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            datetime.now().isoformat(),
-            db_res['gold'], db_res['silver'], db_res['skulls'],
-            db_res['minerals'], db_res['sapphires'], db_res['rubies'],
-            db_res['stamps'], source
-        ))
+        conn.execute(
+            f"INSERT INTO resource_snapshots (ts, {', '.join(columns)}, source) "
+            f"VALUES ({', '.join('?' * (len(columns) + 2))})",
+            (ts, *[db_res[c] for c in columns], source))
+        _add_to_rollups(conn, ts, db_res)
 
-        conn.commit()
-    finally:
-        conn.close()
+
+def _snapshot_dict(row) -> Dict:
+    return {
+        'ts': row['ts'],
+        'timestamp': _epoch_to_iso(row['ts']),
+        'resources': _db_columns_to_resources(row),
+        'source': row['source']
+    }
 
 
 def get_last_snapshot(profile: str = None) -> Optional[Dict]:
     """Возвращает последний снэпшот"""
-    conn = _get_connection(profile)
-    if not conn:
-        return None
-
-    try:
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT * FROM resource_snapshots
-            ORDER BY timestamp DESC LIMIT 1
-        ''')
-        row = cursor.fetchone()
-        if row:
-            return {
-                'timestamp': row['timestamp'],
-                'resources': _db_columns_to_resources(row),
-                'source': row['source']
-            }
-        return None
-    finally:
-        conn.close()
+    with _lock:
+        conn = _get_connection(profile)
+        if not conn:
+            return None
+        row = conn.execute(
+            "SELECT * FROM resource_snapshots ORDER BY ts DESC LIMIT 1").fetchone()
+    return _snapshot_dict(row) if row else None
 
 
 def should_save_snapshot(profile: str = None) -> bool:
     """Проверяет, нужно ли сохранять новый снэпшот (раз в час)"""
-    last = get_last_snapshot(profile)
-    if not last:
-        return True
-
-    try:
-        last_time = datetime.fromisoformat(last['timestamp'])
-        return (datetime.now() - last_time).total_seconds() >= HISTORY_INTERVAL
-    except Exception:
-        return True
+    with _lock:
+        conn = _get_connection(profile)
+        if not conn:
+            return True
+        last_ts = conn.execute("SELECT MAX(ts) FROM resource_snapshots").fetchone()[0]
+    return last_ts is None or time.time() - last_ts >= HISTORY_INTERVAL
 
 
 def get_history(hours: int = 24, profile: str = None) -> List[Dict]:
     """
-    Получает историю снэпшотов за указанный период.
+    Получает историю снэпшотов за указанный период (сырые строки).
+
+    Для графиков — get_rollup()/get_chart_data(), они не тянут все строки.
 
     Args:
         hours: сколько часов назад (24 = день, 168 = неделя, 720 = месяц)
         profile: имя профиля
 
     Returns:
-        list: [{'timestamp': ..., 'resources': {...}}, ...]
+        list: [{'ts': epoch, 'timestamp': ISO, 'resources': {...}, 'source'}, ...]
     """
-    conn = _get_connection(profile)
-    if not conn:
-        return []
-
-    try:
-        cursor = conn.cursor()
-        since = (datetime.now() - timedelta(hours=hours)).isoformat()
-
-        cursor.execute('''
-            SELECT * FROM resource_snapshots
-            WHERE timestamp >= ?
-            ORDER BY timestamp ASC
-        ''', (since,))
-
-        result = []
-        for row in cursor.fetchall():
-            result.append({
-                'timestamp': row['timestamp'],
-                'resources': _db_columns_to_resources(row),
-                'source': row['source']
-            })
-        return result
-    finally:
-        conn.close()
+    since = int(time.time()) - hours * HOUR
+    with _lock:
+        conn = _get_connection(profile)
+        if not conn:
+            return []
+        rows = conn.execute(
+            "SELECT * FROM resource_snapshots WHERE ts >= ? ORDER BY ts ASC", (since,)).fetchall()
+    return [_snapshot_dict(row) for row in rows]
 
 
 # ═══════════════════════════════════════════════════════════════════
@@ -287,35 +489,26 @@ def start_bot_session(resources: Dict, profile: str = None) -> Tuple[int, Option
     if not resources:
         return None, None
 
-    init_db(profile)
-    conn = _get_connection(profile)
-    if not conn:
-        return None, None
-
-    try:
-        cursor = conn.cursor()
+    with _Transaction(profile) as conn:
+        if conn is None:
+            return None, None
         db_res = _resources_to_db_columns(resources)
+        now = int(time.time())
 
         # Получаем последнюю завершённую сессию
-        cursor.execute('''
+        last_session = conn.execute('''
             SELECT * FROM bot_sessions
-            WHERE end_time IS NOT NULL
-            ORDER BY end_time DESC LIMIT 1
-        ''')
-        last_session = cursor.fetchone()
+            WHERE end_ts IS NOT NULL
+            ORDER BY end_ts DESC LIMIT 1
+        ''').fetchone()
 
         offline_changes = None
 
         # Сравниваем с концом прошлой сессии
         if last_session:
             changes = {
-                'золото': db_res['gold'] - (last_session['gold_end'] or 0),
-                'серебро': db_res['silver'] - (last_session['silver_end'] or 0),
-                'черепа': db_res['skulls'] - (last_session['skulls_end'] or 0),
-                'минералы': db_res['minerals'] - (last_session['minerals_end'] or 0),
-                'сапфиры': db_res['sapphires'] - (last_session['sapphires_end'] or 0),
-                'рубины': db_res['rubies'] - (last_session['rubies_end'] or 0),
-                'марки': db_res['stamps'] - (last_session['stamps_end'] or 0),
+                rus: db_res[eng] - (last_session[f'{eng}_end'] or 0)
+                for eng, rus in RESOURCE_COLUMNS.items()
             }
 
             # Убираем нули
@@ -323,50 +516,31 @@ def start_bot_session(resources: Dict, profile: str = None) -> Tuple[int, Option
 
             if changes:
                 offline_changes = {
-                    'prev_session_end': last_session['end_time'],
+                    'prev_session_end': _epoch_to_iso(last_session['end_ts']),
                     'changes': changes
                 }
 
                 # Сохраняем в таблицу offline_changes
-                cursor.execute('''
-                    INSERT INTO offline_changes
-                    (detected_at, prev_session_end, gold_change, silver_change,
-                     skulls_change, minerals_change, sapphires_change, rubies_change, stamps_change)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    datetime.now().isoformat(),
-                    last_session['end_time'],
-                    changes.get('золото', 0),
-                    changes.get('серебро', 0),
-                    changes.get('черепа', 0),
-                    changes.get('минералы', 0),
-                    changes.get('сапфиры', 0),
-                    changes.get('рубины', 0),
-                    changes.get('марки', 0),
-                ))
+                columns = list(RESOURCE_COLUMNS)
+                conn.execute(
+                    f"INSERT INTO offline_changes (detected_ts, prev_session_end_ts, "
+                    f"{', '.join(c + '_change' for c in columns)}) "
+                    f"VALUES ({', '.join('?' * (len(columns) + 2))})",
+                    (now, last_session['end_ts'],
+                     *[changes.get(RESOURCE_COLUMNS[c], 0) for c in columns]))
 
         # Создаём новую сессию
-        cursor.execute('''
-            INSERT INTO bot_sessions
-            (start_time, gold_start, silver_start, skulls_start,
-             minerals_start, sapphires_start, rubies_start, stamps_start)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            datetime.now().isoformat(),
-            db_res['gold'], db_res['silver'], db_res['skulls'],
-            db_res['minerals'], db_res['sapphires'], db_res['rubies'],
-            db_res['stamps']
-        ))
-
+        columns = list(RESOURCE_COLUMNS)
+        cursor = conn.execute(
+            f"INSERT INTO bot_sessions (start_ts, {', '.join(c + '_start' for c in columns)}) "
+            f"VALUES ({', '.join('?' * (len(columns) + 1))})",
+            (now, *[db_res[c] for c in columns]))
         session_id = cursor.lastrowid
-        conn.commit()
 
-        # Сохраняем снэпшот с пометкой 'start'
-        save_snapshot(resources, 'start', profile)
+    # Сохраняем снэпшот с пометкой 'start'
+    save_snapshot(resources, 'start', profile)
 
-        return session_id, offline_changes
-    finally:
-        conn.close()
+    return session_id, offline_changes
 
 
 def end_bot_session(resources: Dict, session_id: int = None, profile: str = None):
@@ -381,50 +555,30 @@ def end_bot_session(resources: Dict, session_id: int = None, profile: str = None
     if not resources:
         return
 
-    conn = _get_connection(profile)
-    if not conn:
-        return
-
-    try:
-        cursor = conn.cursor()
+    with _Transaction(profile) as conn:
+        if conn is None:
+            return
         db_res = _resources_to_db_columns(resources)
 
         # Если session_id не указан - берём последнюю незавершённую
         if session_id is None:
-            cursor.execute('''
+            row = conn.execute('''
                 SELECT id FROM bot_sessions
-                WHERE end_time IS NULL
-                ORDER BY start_time DESC LIMIT 1
-            ''')
-            row = cursor.fetchone()
+                WHERE end_ts IS NULL
+                ORDER BY start_ts DESC LIMIT 1
+            ''').fetchone()
             if row:
                 session_id = row['id']
 
         if session_id:
-            cursor.execute('''
-                UPDATE bot_sessions SET
-                    end_time = ?,
-                    gold_end = ?,
-                    silver_end = ?,
-                    skulls_end = ?,
-                    minerals_end = ?,
-                    sapphires_end = ?,
-                    rubies_end = ?,
-                    stamps_end = ?
-                WHERE id = ?
-            ''', (
-                datetime.now().isoformat(),
-                db_res['gold'], db_res['silver'], db_res['skulls'],
-                db_res['minerals'], db_res['sapphires'], db_res['rubies'],
-                db_res['stamps'],
-                session_id
-            ))
-            conn.commit()
-
-        # Сохраняем снэпшот с пометкой 'stop'
-        save_snapshot(resources, 'stop', profile)
-    finally:
-        conn.close()
+            columns = list(RESOURCE_COLUMNS)
+            conn.execute(
+                f"UPDATE bot_sessions SET end_ts = ?, "
+                f"{', '.join(c + '_end = ?' for c in columns)} WHERE id = ?",
+                (int(time.time()), *[db_res[c] for c in columns], session_id))
+
+    # Сохраняем снэпшот с пометкой 'stop'
+    save_snapshot(resources, 'stop', profile)
 
 
 def get_sessions(limit: int = 10, profile: str = None) -> List[Dict]:
@@ -434,50 +588,33 @@ def get_sessions(limit: int = 10, profile: str = None) -> List[Dict]:
     Returns:
         list: [{'start_time': ..., 'end_time': ..., 'earned': {...}}, ...]
     """
-    conn = _get_connection(profile)
-    if not conn:
-        return []
-
-    try:
-        cursor = conn.cursor()
-        cursor.execute('''
+    with _lock:
+        conn = _get_connection(profile)
+        if not conn:
+            return []
+        rows = conn.execute('''
             SELECT * FROM bot_sessions
-            WHERE end_time IS NOT NULL
-            ORDER BY end_time DESC LIMIT ?
-        ''', (limit,))
-
-        result = []
-        for row in cursor.fetchall():
-            earned = {
-                'золото': (row['gold_end'] or 0) - (row['gold_start'] or 0),
-                'серебро': (row['silver_end'] or 0) - (row['silver_start'] or 0),
-                'черепа': (row['skulls_end'] or 0) - (row['skulls_start'] or 0),
-                'минералы': (row['minerals_end'] or 0) - (row['minerals_start'] or 0),
-                'сапфиры': (row['sapphires_end'] or 0) - (row['sapphires_start'] or 0),
-                'рубины': (row['rubies_end'] or 0) - (row['rubies_start'] or 0),
-                'марки': (row['stamps_end'] or 0) - (row['stamps_start'] or 0),
-            }
-            # Убираем нули
-            earned = {k: v for k, v in earned.items() if v != 0}
-
-            # Длительность
-            try:
-                start = datetime.fromisoformat(row['start_time'])
-                end = datetime.fromisoformat(row['end_time'])
-                duration_hours = round((end - start).total_seconds() / 3600, 1)
-            except Exception:
-                duration_hours = 0
+            WHERE end_ts IS NOT NULL
+            ORDER BY end_ts DESC LIMIT ?
+        ''', (limit,)).fetchall()
+
+    result = []
+    for row in rows:
+        earned = {
+            rus: (row[f'{eng}_end'] or 0) - (row[f'{eng}_start'] or 0)
+            for eng, rus in RESOURCE_COLUMNS.items()
+        }
+        # Убираем нули
+        earned = {k: v for k, v in earned.items() if v != 0}
 
-            result.append({
-                'start_time': row['start_time'],
-                'end_time': row['end_time'],
-                'duration_hours': duration_hours,
-                'earned': earned
-            })
+        result.append({
+            'start_time': _epoch_to_iso(row['start_ts']),
+            'end_time': _epoch_to_iso(row['end_ts']),
+            'duration_hours': round((row['end_ts'] - row['start_ts']) / 3600, 1),
+            'earned': earned
+        })
 
-        return result
-    finally:
-        conn.close()
+    return result
 
 
 def get_offline_changes(limit: int = 10, profile: str = None) -> List[Dict]:
@@ -487,50 +624,69 @@ def get_offline_changes(limit: int = 10, profile: str = None) -> List[Dict]:
     Returns:
         list: [{'detected_at': ..., 'changes': {...}}, ...]
     """
-    conn = _get_connection(profile)
-    if not conn:
-        return []
-
-    try:
-        cursor = conn.cursor()
-        cursor.execute('''
+    with _lock:
+        conn = _get_connection(profile)
+        if not conn:
+            return []
+        rows = conn.execute('''
             SELECT * FROM offline_changes
-            ORDER BY detected_at DESC LIMIT ?
-        ''', (limit,))
+            ORDER BY detected_ts DESC LIMIT ?
+        ''', (limit,)).fetchall()
 
-        result = []
-        for row in cursor.fetchall():
-            changes = {
-                'золото': row['gold_change'],
-                'серебро': row['silver_change'],
-                'черепа': row['skulls_change'],
-                'минералы': row['minerals_change'],
-                'сапфиры': row['sapphires_change'],
-                'рубины': row['rubies_change'],
-                'марки': row['stamps_change'],
-            }
-            # Убираем нули
-            changes = {k: v for k, v in changes.items() if v != 0}
+    result = []
+    for row in rows:
+        changes = {rus: row[f'{eng}_change'] for eng, rus in RESOURCE_COLUMNS.items()}
+        # Убираем нули
+        changes = {k: v for k, v in changes.items() if v}
 
-            result.append({
-                'detected_at': row['detected_at'],
-                'prev_session_end': row['prev_session_end'],
-                'changes': changes
-            })
+        result.append({
+            'detected_at': _epoch_to_iso(row['detected_ts']),
+            'prev_session_end': _epoch_to_iso(row['prev_session_end_ts']),
+            'changes': changes
+        })
 
-        return result
-    finally:
-        conn.close()
+    return result
 
 
 # ═══════════════════════════════════════════════════════════════════
 # AGGREGATION (для графиков)
 # ═══════════════════════════════════════════════════════════════════
 
+def _format_label(ts: int, period: str) -> str:
+    dt = datetime.fromtimestamp(ts)
+    if period == 'day':
+        return dt.strftime('%H:%M')
+    if period == 'week':
+        return dt.strftime('%a %H:%M')
+    return dt.strftime('%d.%m')
+
+
+def _period_rollup(period: str, profile: str = None) -> List[Dict]:
+    """Роллап под период графика: день/неделя — часовой, месяц — дневной"""
+    return get_rollup(PERIOD_HOURS.get(period, 24), PERIOD_ROLLUP.get(period, 'hourly'), profile)
+
+
+def _chart_series(buckets: List[Dict], names: Dict[str, str]) -> Tuple[List[int], Dict]:
+    """
+    Ряды графика по бакетам, прореженные LTTB (chart_analytics).
+
+    Args:
+        names: {ключ ряда: русское название ресурса}
+    """
+    # Импорт здесь: chart_analytics сам импортирует этот модуль
+    from requests_bot import chart_analytics
+
+    timestamps = [b['ts'] for b in buckets]
+    datasets = {key: [b['last'].get(rus, 0) for b in buckets] for key, rus in names.items()}
+    return chart_analytics.downsample(timestamps, datasets)
+
+
 def get_chart_data(resource: str, period: str = 'day', profile: str = None) -> Dict:
     """
     Получает данные для графика конкретного ресурса.
 
+    Точка = бакет роллапа (значение на конец бакета).
+
     Args:
         resource: 'gold', 'skulls', 'minerals', etc.
         period: 'day' (24h), 'week' (7d), 'month' (30d)
@@ -539,54 +695,22 @@ def get_chart_data(resource: str, period: str = 'day', profile: str = None) -> D
     Returns:
         dict: {'labels': [...], 'values': [...], 'min': N, 'max': N}
     """
-    hours_map = {
-        'day': 24,
-        'week': 168,
-        'month': 720
-    }
-    hours = hours_map.get(period, 24)
+    buckets = _period_rollup(period, profile)
 
-    history = get_history(hours, profile)
-
-    if not history:
+    if not buckets:
         return {'labels': [], 'values': [], 'min': 0, 'max': 0}
 
-    # Маппинг английских в русские
-    eng_to_rus = {
-        'gold': 'золото',
-        'silver': 'серебро',
-        'skulls': 'черепа',
-        'minerals': 'минералы',
-        'sapphires': 'сапфиры',
-        'rubies': 'рубины',
-        'stamps': 'марки',
-    }
-
-    rus_name = eng_to_rus.get(resource, resource)
-
-    labels = []
-    values = []
+    rus_name = RESOURCE_COLUMNS.get(resource, resource)
 
-    for snapshot in history:
-        try:
-            dt = datetime.fromisoformat(snapshot['timestamp'])
-            if period == 'day':
-                label = dt.strftime('%H:%M')
-            elif period == 'week':
-                label = dt.strftime('%a %H:%M')
-            else:
-                label = dt.strftime('%d.%m')
-
-            labels.append(label)
-            values.append(snapshot['resources'].get(rus_name, 0))
-        except Exception:
-            continue
+    all_values = [b['last'].get(rus_name, 0) for b in buckets]
+    timestamps, datasets = _chart_series(buckets, {resource: rus_name})
+    values = datasets[resource]
 
     return {
-        'labels': labels,
+        'labels': [_format_label(ts, period) for ts in timestamps],
         'values': values,
-        'min': min(values) if values else 0,
-        'max': max(values) if values else 0
+        'min': min(all_values) if all_values else 0,
+        'max': max(all_values) if all_values else 0
     }
 
 
@@ -604,56 +728,17 @@ def get_all_chart_data(period: str = 'day', profile: str = None) -> Dict:
             }
         }
     """
-    hours_map = {
-        'day': 24,
-        'week': 168,
-        'month': 720
-    }
-    hours = hours_map.get(period, 24)
-
-    history = get_history(hours, profile)
+    buckets = _period_rollup(period, profile)
 
-    if not history:
+    if not buckets:
         return {'labels': [], 'datasets': {}}
 
-    labels = []
-    datasets = {
-        'gold': [],
-        'silver': [],
-        'skulls': [],
-        'minerals': [],
-        'sapphires': [],
-        'rubies': [],
-    }
-
-    eng_to_rus = {
-        'gold': 'золото',
-        'silver': 'серебро',
-        'skulls': 'черепа',
-        'minerals': 'минералы',
-        'sapphires': 'сапфиры',
-        'rubies': 'рубины',
-    }
-
-    for snapshot in history:
-        try:
-            dt = datetime.fromisoformat(snapshot['timestamp'])
-            if period == 'day':
-                label = dt.strftime('%H:%M')
-            elif period == 'week':
-                label = dt.strftime('%a %H:%M')
-            else:
-                label = dt.strftime('%d.%m')
-
-            labels.append(label)
-
-            for eng, rus in eng_to_rus.items():
-                datasets[eng].append(snapshot['resources'].get(rus, 0))
-        except Exception:
-            continue
+    chart_columns = [c for c in RESOURCE_COLUMNS if c != 'stamps']
+    timestamps, datasets = _chart_series(
+        buckets, {eng: RESOURCE_COLUMNS[eng] for eng in chart_columns})
 
     return {
-        'labels': labels,
+        'labels': [_format_label(ts, period) for ts in timestamps],
         'datasets': datasets
     }
 
@@ -663,22 +748,20 @@ def get_all_chart_data(period: str = 'day', profile: str = None) -> Dict:
 # ═══════════════════════════════════════════════════════════════════
 
 def cleanup_old_data(days: int = 90, profile: str = None):
-    """Удаляет данные старше указанного количества дней"""
-    conn = _get_connection(profile)
-    if not conn:
-        return
-
-    try:
-        cursor = conn.cursor()
-        cutoff = (datetime.now() - timedelta(days=days)).isoformat()
-
-        cursor.execute('DELETE FROM resource_snapshots WHERE timestamp < ?', (cutoff,))
-        cursor.execute('DELETE FROM bot_sessions WHERE end_time < ?', (cutoff,))
-        cursor.execute('DELETE FROM offline_changes WHERE detected_at < ?', (cutoff,))
-
-        conn.commit()
+    """
+    Удаляет данные старше указанного количества дней.
 
-        # Оптимизация БД
-        cursor.execute('VACUUM')
-    finally:
-        conn.close()
+    Дневной роллап не трогаем — он компактный и нужен для длинных графиков.
+    """
+    cutoff = int(time.time()) - days * DAY
+    with _Transaction(profile) as conn:
+        if conn is None:
+            return
+        conn.execute('DELETE FROM resource_snapshots WHERE ts < ?', (cutoff,))
+        conn.execute('DELETE FROM snapshots_hourly WHERE last_ts < ?', (cutoff,))
+        conn.execute('DELETE FROM bot_sessions WHERE end_ts < ?', (cutoff,))
+        conn.execute('DELETE FROM offline_changes WHERE detected_ts < ?', (cutoff,))
+
+    # Оптимизация БД
+    with _lock:
+        _get_connection(profile).execute('VACUUM')
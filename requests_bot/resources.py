@@ -2,6 +2,11 @@
 # VMMO Resources Tracker
 # ============================================
 # Отслеживание ресурсов персонажа по сессиям
+#
+# resources.json бота держится в памяти (write_behind) и пишется раз в
+# FLUSH_INTERVAL / на выходе, а не на каждый update_resources. Панель/TG
+# правят файл снаружи (compensate_transfer) — эти правки подмешиваются
+# через _merge_external.
 # ============================================
 
 import os
@@ -10,6 +15,8 @@ import re
 from datetime import datetime
 from bs4 import BeautifulSoup
 
+from requests_bot import write_behind
+from requests_bot.cache.file_cache import atomic_write_json
 from requests_bot.config import PROFILES_DIR, get_profile_name
 
 # Маппинг иконок на названия ресурсов
@@ -35,30 +42,72 @@ def _get_resources_file():
     return None
 
 
-def _load_resources_data():
-    """Загружает данные о ресурсах из файла"""
-    filepath = _get_resources_file()
-    if not filepath or not os.path.exists(filepath):
-        return {"current_session": None, "history": []}
+# Ключи сессии, которые пишет НЕ бот (compensate_transfer из панели/TG)
+EXTERNAL_SESSION_KEYS = ("start", "transfers_out_silver", "transfers_in_silver")
 
-    try:
-        with open(filepath, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except (json.JSONDecodeError, Exception):
-        return {"current_session": None, "history": []}
+
+def _empty_resources():
+    return {"current_session": None, "history": []}
 
 
-def _save_resources_data(data):
-    """Сохраняет данные о ресурсах в файл"""
+def _merge_external(disk, mem):
+    """
+    resources.json изменён снаружи, пока у бота были несохранённые правки.
+
+    Снаружи меняют только EXTERNAL_SESSION_KEYS той же сессии — берём их
+    с диска, остальное (current, last_update, история) — из памяти бота.
+    """
+    disk_session = disk.get("current_session") or {}
+    mem_session = mem.get("current_session") or {}
+    if not disk_session or disk_session.get("start_time") != mem_session.get("start_time"):
+        return mem  # бот уже начал новую сессию — правка относилась к старой
+    session = dict(mem_session)
+    for key in EXTERNAL_SESSION_KEYS:
+        if key in disk_session:
+            session[key] = disk_session[key]
+    merged = dict(mem)
+    merged["current_session"] = session
+    return merged
+
+
+def _resources_doc():
     filepath = _get_resources_file()
     if not filepath:
+        return None
+    return write_behind.document(filepath, default=_empty_resources,
+                                 merge=_merge_external, name="RESOURCES")
+
+
+def _load_resources_data():
+    """Данные о ресурсах (из памяти; файл читается при первом обращении/смене снаружи)"""
+    doc = _resources_doc()
+    if doc is None:
+        return _empty_resources()
+    data = doc.data
+    if not isinstance(data, dict):
+        return _empty_resources()
+    return json.loads(json.dumps(data))  # копия: вызывающие правят и сохраняют
+
+
+def _save_resources_data(data, flush=False):
+    """
+    Сохраняет данные о ресурсах (отложенно; flush=True — сразу на диск).
+    """
+    doc = _resources_doc()
+    if doc is None:
         return
+    doc.replace(data)
+    if flush:
+        doc.flush()
 
-    try:
-        with open(filepath, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-    except Exception as e:
-        print(f"[RESOURCES] Ошибка сохранения: {e}")
+
+def get_current_resources():
+    """Текущие ресурсы сессии ({'минералы': N, ...}) без чтения файла."""
+    doc = _resources_doc()
+    data = doc.data if doc is not None else None
+    if not isinstance(data, dict):
+        return {}
+    return dict((data.get("current_session") or {}).get("current") or {})
 
 
 def parse_resources(html):
@@ -162,7 +211,7 @@ def reset_session_time():
             "current": {},
         }
 
-    _save_resources_data(data)
+    _save_resources_data(data, flush=True)
     print(f"[RESOURCES] Сессия сброшена: {now}")
 
 
@@ -217,7 +266,7 @@ def start_session(resources):
         "current": resources.copy(),
     }
 
-    _save_resources_data(data)
+    _save_resources_data(data, flush=True)
     print(f"[RESOURCES] Новая сессия: {resources}")
 
 
@@ -231,10 +280,12 @@ def update_resources(resources):
     if not resources:
         return
 
-    data = _load_resources_data()
+    doc = _resources_doc()
+    if doc is None:
+        return
 
     # Если нет текущей сессии - создаём
-    if not data.get("current_session"):
+    if not isinstance(doc.data, dict) or not doc.data.get("current_session"):
         start_session(resources)
         return
 
@@ -242,11 +293,10 @@ def update_resources(resources):
     if len(resources) < 5:
         return
 
-    # Обновляем текущие значения
-    data["current_session"]["current"] = resources.copy()
-    data["current_session"]["last_update"] = datetime.now().isoformat()
-
-    _save_resources_data(data)
+    # Обновляем текущие значения (на диск — отложенно, см. write_behind)
+    with doc.edit() as data:
+        data["current_session"]["current"] = resources.copy()
+        data["current_session"]["last_update"] = datetime.now().isoformat()
 
 
 def compensate_transfer(profile, silver_amount, direction):
@@ -284,8 +334,7 @@ def compensate_transfer(profile, silver_amount, direction):
         start["money_silver"] = start.get("money_silver", 0) + sign * (silver_amount % 100)
         key = "transfers_out_silver" if direction == "out" else "transfers_in_silver"
         session[key] = session.get(key, 0) + silver_amount
-        with open(filepath, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        atomic_write_json(filepath, data)  # бот подмешает правку (_merge_external)
         arrow = "→ мейну" if direction == "out" else "← с альтов"
         print(f"[RESOURCES] {profile}: перегон {silver_amount // 100}з {arrow} учтён, з/час не пострадает")
     except Exception as e:
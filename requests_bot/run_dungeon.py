@@ -18,7 +18,7 @@ from requests_bot.watchdog import reset_watchdog, is_watchdog_triggered, check_w
 from requests_bot.config import (
     BASE_URL, SKIP_DUNGEONS, DUNGEON_ACTION_LIMITS, SCRIPT_DIR,
     get_skill_cooldowns, get_dungeon_difficulty, get_skill_hp_threshold,
-    load_deaths, get_extra_dungeons,
+    get_dungeon_difficulties, get_extra_dungeons,
     GCD, ATTACK_CD, LOOT_COLLECT_INTERVAL,
     is_party_dungeon_enabled, get_party_dungeon_config,
 )
@@ -373,11 +373,11 @@ class DungeonRunner:
 
             # Скипы считаем через ЭФФЕКТИВНУЮ сложность (decay смертей +
             # авто-ретест + TTL game-lock), а не по устаревшему кэшу в файле —
-            # иначе данжи навсегда оставались бы в skip.
-            deaths = load_deaths()
+            # иначе данжи навсегда оставались бы в skip. Таблица считается
+            # одним проходом и кэшируется до смены deaths.json.
             skipped_ids = set(SKIP_DUNGEONS)  # Ручной список из конфига
-            for dungeon_id in deaths:
-                if get_dungeon_difficulty(dungeon_id) == "skip":
+            for dungeon_id, difficulty in get_dungeon_difficulties().items():
+                if difficulty == "skip":
                     skipped_ids.add(dungeon_id)
 
             # Если пати-данж включён — скипаем его в соло (пройдём через party_dungeon)
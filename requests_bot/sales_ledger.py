@@ -0,0 +1,556 @@
+# ============================================
+# VMMO Sales Ledger - хранилище статистики продаж
+# ============================================
+# SQLite вместо sales_stats.json: запись одного события — один INSERT
+# (раньше — чтение и перезапись всего файла), матчинг продаж с лотами —
+# по индексу (profile, total_silver, ts), выборки — по окну времени.
+#
+# Старый sales_stats.json импортируется один раз при первом открытии
+# и переименовывается в sales_stats.json.migrated.
+#
+# Агрегаты: каждая запись sold/expired сразу добавляется в почасовые
+# бакеты agg_hourly (лоты, штуки, серебро) и гистограмму времени до
+# продажи tts_hist. Запросы за окно суммируют бакеты — O(часов в окне)
+# вместо O(всех продаж).
+# ============================================
+
+import os
+import json
+import math
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+PROFILES_DIR = Path(__file__).parent.parent / "profiles"
+LEDGER_DB = PROFILES_DIR / "sales_ledger.db"
+LEGACY_JSON = PROFILES_DIR / "sales_stats.json"
+
+# Сколько держать сырые события sold/expired (для графиков и ребаланса
+# хватает недель, дальше — только шум)
+KEEP_DAYS = 90
+# Агрегаты компактные — держим год
+AGG_KEEP_DAYS = 365
+
+# Гистограмма времени до продажи: логарифмические бины шириной 2^(1/4)
+# (~19%) от 1 минуты — погрешность квантиля в пределах ширины бина
+TTS_BINS_PER_OCTAVE = 4
+TTS_MIN_SEC = 60
+
+_conn = None
+_conn_pid = None
+# Подключение общее для потоков процесса (параллельная продажа крафтов,
+# перегоны золота из панели)
+_lock = threading.RLock()
+
+
+def _ts(iso: str) -> float:
+    try:
+        return datetime.fromisoformat(iso).timestamp()
+    except Exception:
+        return 0.0
+
+
+def _iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts).isoformat()
+
+
+def get_connection() -> sqlite3.Connection:
+    """Долгоживущее подключение процесса (пересоздаётся после fork)."""
+    global _conn, _conn_pid
+    if _conn is not None and _conn_pid == os.getpid():
+        return _conn
+
+    with _lock:
+        if _conn is not None and _conn_pid == os.getpid():
+            return _conn
+        PROFILES_DIR.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(LEDGER_DB), timeout=30, isolation_level=None,
+                               check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        _init_schema(conn)
+        _migrate_legacy_json(conn)
+        _ensure_aggregates(conn)
+        _conn, _conn_pid = conn, os.getpid()
+        return conn
+
+
+def _init_schema(conn: sqlite3.Connection):
+    conn.executescript('''
+        CREATE TABLE IF NOT EXISTS sold (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ts REAL NOT NULL,
+            profile TEXT NOT NULL,
+            item TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 1,
+            gold INTEGER NOT NULL DEFAULT 0,
+            silver INTEGER NOT NULL DEFAULT 0,
+            total_silver INTEGER NOT NULL DEFAULT 0,
+            price_per_unit INTEGER NOT NULL DEFAULT 0,
+            guessed INTEGER NOT NULL DEFAULT 0,
+            transfer INTEGER NOT NULL DEFAULT 0,
+            time_to_sell INTEGER
+        );
+        CREATE INDEX IF NOT EXISTS idx_sold_ts ON sold(ts);
+
+        CREATE TABLE IF NOT EXISTS expired (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ts REAL NOT NULL,
+            profile TEXT NOT NULL,
+            item TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 1
+        );
+        CREATE INDEX IF NOT EXISTS idx_expired_ts ON expired(ts);
+
+        CREATE TABLE IF NOT EXISTS listed (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ts REAL NOT NULL,
+            profile TEXT NOT NULL,
+            item TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 1,
+            gold INTEGER NOT NULL DEFAULT 0,
+            silver INTEGER NOT NULL DEFAULT 0,
+            total_silver INTEGER NOT NULL DEFAULT 0,
+            price_per_unit INTEGER NOT NULL DEFAULT 0,
+            consumed INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS idx_listed_match
+            ON listed(profile, consumed, total_silver, ts);
+        CREATE INDEX IF NOT EXISTS idx_listed_ts ON listed(ts);
+
+        CREATE TABLE IF NOT EXISTS transfers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ts REAL NOT NULL,
+            profile TEXT NOT NULL,
+            gold INTEGER NOT NULL DEFAULT 0,
+            silver INTEGER NOT NULL DEFAULT 0,
+            total_silver INTEGER NOT NULL DEFAULT 0,
+            consumed INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS idx_transfers_match
+            ON transfers(consumed, total_silver, ts);
+
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+
+        CREATE TABLE IF NOT EXISTS agg_hourly (
+            item TEXT NOT NULL,
+            hour INTEGER NOT NULL,
+            sold_lots INTEGER NOT NULL DEFAULT 0,
+            sold_units INTEGER NOT NULL DEFAULT 0,
+            sold_silver INTEGER NOT NULL DEFAULT 0,
+            transfer_lots INTEGER NOT NULL DEFAULT 0,
+            transfer_units INTEGER NOT NULL DEFAULT 0,
+            transfer_silver INTEGER NOT NULL DEFAULT 0,
+            expired_lots INTEGER NOT NULL DEFAULT 0,
+            expired_units INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (hour, item)
+        );
+
+        CREATE TABLE IF NOT EXISTS tts_hist (
+            item TEXT NOT NULL,
+            hour INTEGER NOT NULL,
+            bin INTEGER NOT NULL,
+            n INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (hour, item, bin)
+        );
+    ''')
+
+
+def _migrate_legacy_json(conn: sqlite3.Connection):
+    """Разовый импорт sales_stats.json в БД."""
+    if not LEGACY_JSON.exists():
+        return
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        done = conn.execute("SELECT value FROM meta WHERE key='legacy_imported'").fetchone()
+        if done or not LEGACY_JSON.exists():
+            conn.execute("COMMIT")
+            return
+        with open(LEGACY_JSON, "r", encoding="utf-8") as f:
+            data = json.load(f)
+
+        for r in data.get("sold", []):
+            total = r.get("gold", 0) * 100 + r.get("silver", 0)
+            conn.execute(
+                "INSERT INTO sold (ts, profile, item, count, gold, silver, total_silver, "
+                "price_per_unit, guessed, transfer, time_to_sell) VALUES (?,?,?,?,?,?,?,?,?,?,?)",
+                (_ts(r.get("timestamp", "")), r.get("profile", "unknown"), r.get("item") or "",
+                 r.get("count", 1), r.get("gold", 0), r.get("silver", 0), total,
+                 r.get("price_per_unit", total), int(bool(r.get("guessed"))),
+                 int(bool(r.get("transfer"))), r.get("time_to_sell")))
+        for r in data.get("expired", []):
+            conn.execute(
+                "INSERT INTO expired (ts, profile, item, count) VALUES (?,?,?,?)",
+                (_ts(r.get("timestamp", "")), r.get("profile", "unknown"),
+                 r.get("item") or "", r.get("count", 1)))
+        for r in data.get("listed", []):
+            total = r.get("gold", 0) * 100 + r.get("silver", 0)
+            conn.execute(
+                "INSERT INTO listed (ts, profile, item, count, gold, silver, total_silver, "
+                "price_per_unit, consumed) VALUES (?,?,?,?,?,?,?,?,?)",
+                (_ts(r.get("timestamp", "")), r.get("profile", "unknown"), r.get("item") or "",
+                 r.get("count", 1), r.get("gold", 0), r.get("silver", 0), total,
+                 r.get("price_per_unit", total), int(bool(r.get("consumed")))))
+        for r in data.get("transfers", []):
+            conn.execute(
+                "INSERT INTO transfers (ts, profile, gold, silver, total_silver, consumed) "
+                "VALUES (?,?,?,?,?,?)",
+                (_ts(r.get("timestamp", "")), r.get("profile", "unknown"), r.get("gold", 0),
+                 r.get("silver", 0), r.get("total_silver", 0), int(bool(r.get("consumed")))))
+
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('legacy_imported', ?)",
+                     (_iso(time.time()),))
+        rebuild_aggregates(conn)
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('agg_built', '1')")
+        conn.execute("COMMIT")
+    except Exception as e:
+        conn.execute("ROLLBACK")
+        print(f"[SALES] Ошибка импорта sales_stats.json: {e}")
+        return
+
+    try:
+        os.replace(LEGACY_JSON, str(LEGACY_JSON) + ".migrated")
+    except OSError:
+        pass
+    print("[SALES] sales_stats.json импортирован в sales_ledger.db")
+
+
+class Transaction:
+    """BEGIN IMMEDIATE ... COMMIT: матчинг и запись атомарны между ботами."""
+
+    def __enter__(self):
+        _lock.acquire()
+        try:
+            self.conn = get_connection()
+            self.conn.execute("BEGIN IMMEDIATE")
+        except Exception:
+            _lock.release()
+            raise
+        return self.conn
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        try:
+            self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        finally:
+            _lock.release()
+        return False
+
+
+# ============================================
+# Агрегаты
+# ============================================
+
+_AGG_COLUMNS = ("sold_lots", "sold_units", "sold_silver", "transfer_lots",
+                "transfer_units", "transfer_silver", "expired_lots", "expired_units")
+
+
+def _hour(ts: float) -> int:
+    return int(ts // 3600)
+
+
+def tts_bin(seconds: int) -> int:
+    """Номер бина гистограммы для времени до продажи."""
+    return int(TTS_BINS_PER_OCTAVE * math.log2(max(seconds, TTS_MIN_SEC) / TTS_MIN_SEC))
+
+
+def tts_bin_value(b: int) -> float:
+    """Представитель бина (геометрическая середина), секунды."""
+    return TTS_MIN_SEC * 2 ** ((b + 0.5) / TTS_BINS_PER_OCTAVE)
+
+
+def _add_agg(conn, ts, item, **deltas):
+    cols = ", ".join(deltas)
+    marks = ", ".join("?" for _ in deltas)
+    updates = ", ".join(f"{c}={c}+excluded.{c}" for c in deltas)
+    conn.execute(
+        f"INSERT INTO agg_hourly (item, hour, {cols}) VALUES (?, ?, {marks}) "
+        f"ON CONFLICT(hour, item) DO UPDATE SET {updates}",
+        (item, _hour(ts), *deltas.values()))
+
+
+def _add_tts(conn, ts, item, seconds):
+    conn.execute(
+        "INSERT INTO tts_hist (item, hour, bin, n) VALUES (?, ?, ?, 1) "
+        "ON CONFLICT(hour, item, bin) DO UPDATE SET n=n+1",
+        (item, _hour(ts), tts_bin(seconds)))
+
+
+def rebuild_aggregates(conn):
+    """Пересобирает agg_hourly/tts_hist из сырых таблиц (после импорта)."""
+    conn.execute("DELETE FROM agg_hourly")
+    conn.execute("DELETE FROM tts_hist")
+    for r in conn.execute("SELECT ts, item, count, total_silver, transfer, time_to_sell FROM sold"):
+        _agg_sold(conn, r["ts"], r["item"], r["count"], r["total_silver"],
+                  bool(r["transfer"]), r["time_to_sell"])
+    for r in conn.execute("SELECT ts, item, count FROM expired"):
+        _add_agg(conn, r["ts"], r["item"], expired_lots=1, expired_units=r["count"])
+
+
+def _ensure_aggregates(conn):
+    """Строит агрегаты для БД, созданной до их появления."""
+    if conn.execute("SELECT 1 FROM meta WHERE key='agg_built'").fetchone():
+        return
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if not conn.execute("SELECT 1 FROM meta WHERE key='agg_built'").fetchone():
+            rebuild_aggregates(conn)
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('agg_built', '1')")
+        conn.execute("COMMIT")
+    except Exception as e:
+        conn.execute("ROLLBACK")
+        print(f"[SALES] Ошибка построения агрегатов: {e}")
+
+
+def _agg_sold(conn, ts, item, count, total_silver, transfer, time_to_sell):
+    if transfer:
+        _add_agg(conn, ts, item, transfer_lots=1, transfer_units=count,
+                 transfer_silver=total_silver)
+        return
+    _add_agg(conn, ts, item, sold_lots=1, sold_units=count, sold_silver=total_silver)
+    if time_to_sell is not None:
+        _add_tts(conn, ts, item, time_to_sell)
+
+
+def window_aggregates(since_ts: float, until_ts: float = None, normalize=None) -> dict:
+    """
+    Суммы по предметам за окно (гранулярность — час).
+
+    Args:
+        since_ts: начало окна (округляется вниз до часа)
+        until_ts: конец окна (None — до сейчас)
+        normalize: функция имени (например, 'Железо x10' -> 'Железо'),
+                   совпавшие после нормализации предметы суммируются
+
+    Returns:
+        {item: {sold_lots, sold_units, sold_silver, transfer_*, expired_*,
+                "tts_bins": {bin: n}}}
+    """
+    lo = _hour(since_ts)
+    hi = _hour(until_ts) if until_ts is not None else _hour(time.time()) + 1
+    sums = ", ".join(f"SUM({c}) AS {c}" for c in _AGG_COLUMNS)
+
+    result = {}
+
+    def entry(name):
+        key = normalize(name) if normalize else name
+        if key not in result:
+            result[key] = {c: 0 for c in _AGG_COLUMNS}
+            result[key]["tts_bins"] = {}
+        return result[key]
+
+    with _lock:
+        conn = get_connection()
+        agg_rows = conn.execute(
+            f"SELECT item, {sums} FROM agg_hourly WHERE hour>=? AND hour<? GROUP BY item",
+            (lo, hi)).fetchall()
+        tts_rows = conn.execute(
+            "SELECT item, bin, SUM(n) AS n FROM tts_hist WHERE hour>=? AND hour<? "
+            "GROUP BY item, bin", (lo, hi)).fetchall()
+
+    for r in agg_rows:
+        e = entry(r["item"])
+        for c in _AGG_COLUMNS:
+            e[c] += r[c] or 0
+    for r in tts_rows:
+        bins = entry(r["item"])["tts_bins"]
+        bins[r["bin"]] = bins.get(r["bin"], 0) + r["n"]
+    return result
+
+
+def tts_quantile(bins: dict, q: float = 0.5):
+    """Квантиль времени до продажи по гистограмме (None если пусто)."""
+    total = sum(bins.values())
+    if not total:
+        return None
+    target = q * total
+    acc = 0
+    for b in sorted(bins):
+        acc += bins[b]
+        if acc >= target:
+            return tts_bin_value(b)
+    return tts_bin_value(max(bins))
+
+
+# ============================================
+# Запись
+# ============================================
+
+def insert_sold(conn, ts, profile, item, count, gold, silver, price_per_unit,
+                guessed=False, transfer=False, time_to_sell=None):
+    total_silver = gold * 100 + silver
+    conn.execute(
+        "INSERT INTO sold (ts, profile, item, count, gold, silver, total_silver, "
+        "price_per_unit, guessed, transfer, time_to_sell) VALUES (?,?,?,?,?,?,?,?,?,?,?)",
+        (ts, profile, item, count, gold, silver, total_silver, price_per_unit,
+         int(guessed), int(transfer), time_to_sell))
+    _agg_sold(conn, ts, item, count, total_silver, transfer, time_to_sell)
+
+
+def insert_expired(conn, ts, profile, item, count):
+    conn.execute("INSERT INTO expired (ts, profile, item, count) VALUES (?,?,?,?)",
+                 (ts, profile, item, count))
+    _add_agg(conn, ts, item, expired_lots=1, expired_units=count)
+
+
+def insert_listed(conn, ts, profile, item, count, gold, silver, price_per_unit):
+    conn.execute(
+        "INSERT INTO listed (ts, profile, item, count, gold, silver, total_silver, "
+        "price_per_unit) VALUES (?,?,?,?,?,?,?,?)",
+        (ts, profile, item, count, gold, silver, gold * 100 + silver, price_per_unit))
+
+
+def insert_transfer(conn, ts, profile, gold, silver):
+    conn.execute(
+        "INSERT INTO transfers (ts, profile, gold, silver, total_silver) VALUES (?,?,?,?,?)",
+        (ts, profile, gold, silver, gold * 100 + silver))
+
+
+# ============================================
+# Матчинг
+# ============================================
+
+def _gross_range(total_silver: int, fee: float):
+    """Диапазон цен лота, у которых gross или net (−fee) в пределах ±1с от прихода."""
+    lo = int((total_silver - 1.5) / (1 - fee))
+    hi = int((total_silver + 1.5) / (1 - fee)) + 1
+    return min(lo, total_silver - 1), max(hi, total_silver + 1)
+
+
+def _price_matches(lot_total: int, total_silver: int, fee: float) -> bool:
+    net = round(lot_total * (1 - fee))
+    return abs(lot_total - total_silver) <= 1 or abs(net - total_silver) <= 1
+
+
+def consume_listed(conn, profile, total_silver, since_ts, fee):
+    """Самый старый непогашенный лот профиля с подходящей ценой (FIFO).
+
+    Returns:
+        sqlite3.Row лота (уже помеченного consumed) или None
+    """
+    lo, hi = _gross_range(total_silver, fee)
+    rows = conn.execute(
+        "SELECT * FROM listed WHERE profile=? AND consumed=0 "
+        "AND total_silver BETWEEN ? AND ? AND ts>=? ORDER BY ts, id",
+        (profile, lo, hi, since_ts)).fetchall()
+    for lot in rows:
+        if _price_matches(lot["total_silver"], total_silver, fee):
+            conn.execute("UPDATE listed SET consumed=1 WHERE id=?", (lot["id"],))
+            return lot
+    return None
+
+
+def consume_transfer(conn, total_silver, since_ts, fee) -> bool:
+    """Самый свежий непогашенный лот перегона с подходящей суммой."""
+    lo, hi = _gross_range(total_silver, fee)
+    rows = conn.execute(
+        "SELECT id, total_silver FROM transfers WHERE consumed=0 "
+        "AND total_silver BETWEEN ? AND ? AND ts>=? ORDER BY ts DESC, id DESC",
+        (lo, hi, since_ts)).fetchall()
+    for t in rows:
+        if _price_matches(t["total_silver"], total_silver, fee):
+            conn.execute("UPDATE transfers SET consumed=1 WHERE id=?", (t["id"],))
+            return True
+    return False
+
+
+# ============================================
+# Выборки
+# ============================================
+
+def query_sold(since_ts: float = 0, until_ts: float = None, include_transfers: bool = False):
+    """Продажи за окно [since_ts, until_ts) — список dict в формате sales_stats.json."""
+    sql = "SELECT * FROM sold WHERE ts>=?"
+    args = [since_ts]
+    if until_ts is not None:
+        sql += " AND ts<?"
+        args.append(until_ts)
+    if not include_transfers:
+        sql += " AND transfer=0"
+    with _lock:
+        rows = get_connection().execute(sql + " ORDER BY ts", args).fetchall()
+    return [{
+        "item": r["item"],
+        "count": r["count"],
+        "gold": r["gold"],
+        "silver": r["silver"],
+        "price_per_unit": r["price_per_unit"],
+        "profile": r["profile"],
+        "guessed": bool(r["guessed"]),
+        "transfer": bool(r["transfer"]),
+        "time_to_sell": r["time_to_sell"],
+        "timestamp": _iso(r["ts"]),
+    } for r in rows]
+
+
+def query_expired(since_ts: float = 0, until_ts: float = None):
+    """Истёкшие лоты за окно — список dict в формате sales_stats.json."""
+    sql = "SELECT * FROM expired WHERE ts>=?"
+    args = [since_ts]
+    if until_ts is not None:
+        sql += " AND ts<?"
+        args.append(until_ts)
+    with _lock:
+        rows = get_connection().execute(sql + " ORDER BY ts", args).fetchall()
+    return [{
+        "item": r["item"],
+        "count": r["count"],
+        "profile": r["profile"],
+        "timestamp": _iso(r["ts"]),
+    } for r in rows]
+
+
+# ============================================
+# Компакция
+# ============================================
+
+def compact(keep_days: int = KEEP_DAYS, match_window_sec: int = 3 * 24 * 3600):
+    """
+    Чистит ledger:
+    - listed/transfers старше окна матчинга (больше не нужны для матчинга)
+    - sold/expired старше keep_days
+    - агрегаты старше AGG_KEEP_DAYS
+    Затем VACUUM (только если что-то удалили).
+
+    Returns:
+        int: удалено строк
+    """
+    now = time.time()
+    match_cutoff = now - match_window_sec
+    keep_cutoff = now - keep_days * 24 * 3600
+    with Transaction() as conn:
+        deleted = conn.execute("DELETE FROM listed WHERE ts<?", (match_cutoff,)).rowcount
+        deleted += conn.execute("DELETE FROM transfers WHERE ts<?", (match_cutoff,)).rowcount
+        deleted += conn.execute("DELETE FROM sold WHERE ts<?", (keep_cutoff,)).rowcount
+        deleted += conn.execute("DELETE FROM expired WHERE ts<?", (keep_cutoff,)).rowcount
+        agg_cutoff = _hour(now - AGG_KEEP_DAYS * 24 * 3600)
+        deleted += conn.execute("DELETE FROM agg_hourly WHERE hour<?", (agg_cutoff,)).rowcount
+        deleted += conn.execute("DELETE FROM tts_hist WHERE hour<?", (agg_cutoff,)).rowcount
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('last_compact', ?)",
+                     (str(now),))
+    if deleted:
+        with _lock:
+            get_connection().execute("VACUUM")
+    return deleted
+
+
+def maybe_compact(interval_sec: int = 24 * 3600):
+    """Компакция не чаще раза в interval_sec (дёргается из record_* дёшево)."""
+    try:
+        with _lock:
+            row = get_connection().execute(
+                "SELECT value FROM meta WHERE key='last_compact'").fetchone()
+        if row and time.time() - float(row["value"]) < interval_sec:
+            return 0
+        deleted = compact()
+        if deleted:
+            print(f"[SALES] Компакция ledger: удалено {deleted} строк")
+        return deleted
+    except Exception as e:
+        print(f"[SALES] Ошибка компакции: {e}")
+        return 0
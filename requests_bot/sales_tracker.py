@@ -5,59 +5,31 @@
 # Данные для анализа спроса на крафт
 # ============================================
 
-import json
-import os
 import time
-import fcntl
-from datetime import datetime
-from pathlib import Path
-
-# Файл статистики (общий для всех ботов)
-SALES_FILE = Path(__file__).parent.parent / "profiles" / "sales_stats.json"
-LOCK_FILE = Path(__file__).parent.parent / "profiles" / ".sales_lock"
-
-
-def _with_file_lock(func):
-    """Декоратор для блокировки файла при записи"""
-    def wrapper(*args, **kwargs):
-        LOCK_FILE.parent.mkdir(parents=True, exist_ok=True)
-        with open(LOCK_FILE, "w") as lock:
-            try:
-                fcntl.flock(lock.fileno(), fcntl.LOCK_EX)  # Эксклюзивная блокировка
-                return func(*args, **kwargs)
-            finally:
-                fcntl.flock(lock.fileno(), fcntl.LOCK_UN)  # Снимаем блокировку
-    return wrapper
-
-
-def load_sales_stats() -> dict:
-    """Загружает статистику продаж"""
-    if not SALES_FILE.exists():
-        return {
-            "sold": [],       # Проданные лоты
-            "expired": [],    # Истекшие (не проданные)
-            "listed": [],     # Выставленные на аукцион
-            "transfers": [],  # Лоты перегона золота (gold_transfer, не доход)
-        }
 
-    try:
-        with open(SALES_FILE, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            data.setdefault("transfers", [])
-            return data
-    except Exception as e:
-        print(f"[SALES] Ошибка загрузки: {e}")
-        return {"sold": [], "expired": [], "listed": [], "transfers": []}
+from requests_bot import sales_ledger
 
+# Хранилище — SQLite ledger (profiles/sales_ledger.db), см. sales_ledger.py.
+# Раньше — profiles/sales_stats.json, который перечитывался и
+# перезаписывался целиком на каждое событие.
 
-def save_sales_stats(stats: dict):
-    """Сохраняет статистику"""
+
+def load_sales_stats(days: int = None) -> dict:
+    """
+    Загружает статистику продаж в старом формате sales_stats.json.
+
+    Args:
+        days: окно в днях (None — вся история ledger)
+    """
+    since = time.time() - days * 24 * 3600 if days else 0
     try:
-        SALES_FILE.parent.mkdir(parents=True, exist_ok=True)
-        with open(SALES_FILE, "w", encoding="utf-8") as f:
-            json.dump(stats, f, ensure_ascii=False, indent=2)
+        return {
+            "sold": sales_ledger.query_sold(since, include_transfers=True),
+            "expired": sales_ledger.query_expired(since),
+        }
     except Exception as e:
-        print(f"[SALES] Ошибка сохранения: {e}")
+        print(f"[SALES] Ошибка загрузки: {e}")
+        return {"sold": [], "expired": []}
 
 
 # Комиссия аукциона (продавец получает меньше выставленной цены)
@@ -71,60 +43,40 @@ UNKNOWN_ITEM = "(неизвестно)"
 TRANSFER_MATCH_WINDOW_SEC = 24 * 3600
 
 
-@_with_file_lock
 def record_transfer(gold: int, silver: int, profile: str = "unknown"):
     """
     Записывает лот ПЕРЕГОНА золота (gold_transfer): мейн продал рубины альту
     по завышенной цене. Это НЕ доход — деньги перекладываются между своими
     чарами. Позже record_sale сматчит приход и пометит продажу как transfer.
     """
-    stats = load_sales_stats()
-    stats["transfers"].append({
-        "gold": gold,
-        "silver": silver,
-        "total_silver": gold * 100 + silver,
-        "profile": profile,
-        "consumed": False,
-        "timestamp": datetime.now().isoformat(),
-    })
-    save_sales_stats(stats)
+    try:
+        with sales_ledger.Transaction() as conn:
+            sales_ledger.insert_transfer(conn, time.time(), profile, gold, silver)
+    except Exception as e:
+        print(f"[SALES] Ошибка сохранения: {e}")
+        return
     print(f"[SALES] Записан лот перегона: {gold}g {silver}s")
 
 
-def _match_and_consume_transfer(stats: dict, total_silver: int) -> bool:
+def _match_and_consume_transfer(conn, total_silver: int) -> bool:
     """
     Проверяет, не является ли пришедшая сумма выкупом лота перегона.
-    Перегонные лоты дорогие (Рубин 49-70g) и записаны в stats["transfers"];
+    Перегонные лоты дорогие (Рубин 49-70g) и записаны в таблице transfers;
     продавец получает цену за вычетом 5% комиссии. Матчим по сумме (gross или
     net) в пределах окна, помечаем лот consumed (чтобы не сматчить дважды).
 
     Returns:
         True, если приход — это перегон (не реальный доход).
     """
-    from datetime import datetime as _dt
-    now = _dt.now().timestamp()
-    for t in reversed(stats.get("transfers", [])):
-        if t.get("consumed"):
-            continue
-        try:
-            ts = _dt.fromisoformat(t["timestamp"]).timestamp()
-        except Exception:
-            ts = now
-        if now - ts > TRANSFER_MATCH_WINDOW_SEC:
-            continue
-        gross = t.get("total_silver", 0)
-        net = round(gross * (1 - AUCTION_FEE))
-        if abs(gross - total_silver) <= 1 or abs(net - total_silver) <= 1:
-            t["consumed"] = True
-            return True
-    return False
+    since = time.time() - TRANSFER_MATCH_WINDOW_SEC
+    return sales_ledger.consume_transfer(conn, total_silver, since, AUCTION_FEE)
 
 
 # Окно, в пределах которого продажу можно сматчить с выставленным лотом
 MATCH_WINDOW_SEC = 3 * 24 * 3600
 
 
-def _match_listed_lot(stats: dict, profile: str, total_silver: int):
+def _match_listed_lot(conn, profile: str, total_silver: int):
     """
     Матчит продажу с ранее выставленным лотом (FIFO — самый старый непогашенный
     первым) по профилю + цене (gross или net −5%). Помечает лот consumed,
@@ -134,91 +86,85 @@ def _match_listed_lot(stats: dict, profile: str, total_silver: int):
     Returns:
         (item_name, count, listed_ts) или (None, None, None).
     """
-    now = datetime.now().timestamp()
-    for lot in stats.get("listed", []):  # forward = от старых к свежим (FIFO)
-        if lot.get("consumed"):
-            continue
-        if lot.get("profile") != profile:
-            continue
-        ts_str = lot.get("timestamp", "")
-        try:
-            ts = datetime.fromisoformat(ts_str).timestamp()
-        except Exception:
-            continue
-        if now - ts > MATCH_WINDOW_SEC:
-            continue
-        lot_total = lot.get("gold", 0) * 100 + lot.get("silver", 0)
-        net = round(lot_total * (1 - AUCTION_FEE))
-        if abs(lot_total - total_silver) <= 1 or abs(net - total_silver) <= 1:
-            lot["consumed"] = True
-            return lot.get("item"), lot.get("count", 1), ts_str
-    return None, None, None
-
-
-@_with_file_lock
-def record_sale(item_name: str, count: int, gold: int, silver: int, profile: str = "unknown"):
-    """
-    Записывает успешную продажу.
+    since = time.time() - MATCH_WINDOW_SEC
+    lot = sales_ledger.consume_listed(conn, profile, total_silver, since, AUCTION_FEE)
+    if lot is None:
+        return None, None, None
+    return lot["item"], lot["count"], lot["ts"]
 
-    Args:
-        item_name: Название предмета (может быть UNKNOWN_ITEM/None — тогда
-                   попытаемся восстановить по цене из stats["listed"])
-        count: Количество
-        gold: Золото
-        silver: Серебро
-        profile: Профиль бота
+
+def _insert_sale(conn, item_name: str, count: int, gold: int, silver: int, profile: str):
     """
-    stats = load_sales_stats()
+    Матчинг и запись одной продажи внутри открытой транзакции ledger.
 
+    Returns:
+        tuple: (item_name, count, guessed, is_transfer) — что в итоге записано
+    """
     total_silver = gold * 100 + silver
     price_per_unit = total_silver // count if count > 0 else total_silver
+    guessed = False
+    time_to_sell = None  # секунд от выставления до продажи
 
     # 1. Сначала проверяем — не выкуп ли это лота перегона золота.
     #    Это НЕ доход (деньги перекладываются между своими чарами).
-    is_transfer = _match_and_consume_transfer(stats, total_silver)
+    is_transfer = _match_and_consume_transfer(conn, total_silver)
 
     # 2. Если имя не извлеклось из письма — матчим по сумме прихода с ранее
     #    выставленным лотом (даёт и имя, и время до продажи = спрос).
-    guessed = False
-    time_to_sell = None  # секунд от выставления до продажи
     if not is_transfer and (not item_name or item_name == UNKNOWN_ITEM):
-        g_name, g_count, listed_ts = _match_listed_lot(stats, profile, total_silver)
+        g_name, g_count, listed_ts = _match_listed_lot(conn, profile, total_silver)
         if g_name:
             item_name = g_name
             if count <= 1 and g_count:
                 count = g_count
             price_per_unit = total_silver // count if count > 0 else total_silver
             guessed = True
-            if listed_ts:
-                try:
-                    delta = datetime.now().timestamp() - datetime.fromisoformat(listed_ts).timestamp()
-                    if delta >= 0:
-                        time_to_sell = int(delta)
-                except Exception:
-                    pass
-
-    stats["sold"].append({
-        "item": item_name or UNKNOWN_ITEM,
-        "count": count,
-        "gold": gold,
-        "silver": silver,
-        "price_per_unit": price_per_unit,
-        "profile": profile,
-        "guessed": guessed,           # имя восстановлено по цене, а не из письма
-        "transfer": is_transfer,       # перегон золота, не считать доходом
-        "time_to_sell": time_to_sell,  # секунд от выставления до продажи (спрос)
-        "timestamp": datetime.now().isoformat(),
-    })
-
-    save_sales_stats(stats)
+            delta = time.time() - listed_ts
+            if delta >= 0:
+                time_to_sell = int(delta)
+
+    item_name = item_name or UNKNOWN_ITEM
+    sales_ledger.insert_sold(
+        conn, time.time(), profile, item_name, count, gold, silver,
+        price_per_unit,
+        guessed=guessed,            # имя восстановлено по цене, а не из письма
+        transfer=is_transfer,       # перегон золота, не считать доходом
+        time_to_sell=time_to_sell,  # секунд от выставления до продажи (спрос)
+    )
+    return item_name, count, guessed, is_transfer
+
+
+def _print_sale(item_name, count, gold, silver, guessed, is_transfer):
     if is_transfer:
         print(f"[SALES] Перегон золота (не доход): {gold}g {silver}s")
     else:
         suffix = " (по цене)" if guessed else ""
-        print(f"[SALES] Записана продажа: {item_name or UNKNOWN_ITEM}{suffix} x{count} за {gold}g {silver}s")
+        print(f"[SALES] Записана продажа: {item_name}{suffix} x{count} за {gold}g {silver}s")
+
+
+def record_sale(item_name: str, count: int, gold: int, silver: int, profile: str = "unknown"):
+    """
+    Записывает успешную продажу.
+
+    Args:
+        item_name: Название предмета (может быть UNKNOWN_ITEM/None — тогда
+                   попытаемся восстановить по цене из выставленных лотов)
+        count: Количество
+        gold: Золото
+        silver: Серебро
+        profile: Профиль бота
+    """
+    try:
+        with sales_ledger.Transaction() as conn:
+            item_name, count, guessed, is_transfer = _insert_sale(
+                conn, item_name, count, gold, silver, profile)
+    except Exception as e:
+        print(f"[SALES] Ошибка сохранения: {e}")
+        return
+
+    _print_sale(item_name, count, gold, silver, guessed, is_transfer)
 
 
-@_with_file_lock
 def record_expired(item_name: str, count: int = 1, profile: str = "unknown"):
     """
     Записывает истекший (не проданный) лот.
@@ -228,20 +174,52 @@ def record_expired(item_name: str, count: int = 1, profile: str = "unknown"):
         count: Количество
         profile: Профиль бота
     """
-    stats = load_sales_stats()
+    try:
+        with sales_ledger.Transaction() as conn:
+            sales_ledger.insert_expired(conn, time.time(), profile, item_name, count)
+    except Exception as e:
+        print(f"[SALES] Ошибка сохранения: {e}")
+        return
+    print(f"[SALES] Записан истекший лот: {item_name} x{count}")
 
-    stats["expired"].append({
-        "item": item_name,
-        "count": count,
-        "profile": profile,
-        "timestamp": datetime.now().isoformat(),
-    })
 
-    save_sales_stats(stats)
-    print(f"[SALES] Записан истекший лот: {item_name} x{count}")
+def record_mail_batch(sales, expired, profile: str = "unknown") -> bool:
+    """
+    Записывает продажи и истекшие лоты из одной пачки писем ОДНОЙ транзакцией.
+
+    Матчинг (перегон / выставленные лоты) тот же, что в record_sale, и идёт
+    по порядку писем — FIFO погашения лотов не меняется.
+
+    Args:
+        sales: [(item_name, count, gold, silver), ...]
+        expired: [(item_name, count), ...]
+        profile: Профиль бота
+
+    Returns:
+        bool: True если пачка записана (при ошибке не записано ничего)
+    """
+    if not sales and not expired:
+        return True
+    written = []
+    try:
+        with sales_ledger.Transaction() as conn:
+            for item_name, count, gold, silver in sales:
+                written.append(_insert_sale(conn, item_name, count, gold, silver, profile)
+                               + (gold, silver))
+            now = time.time()
+            for item_name, count in expired:
+                sales_ledger.insert_expired(conn, now, profile, item_name, count)
+    except Exception as e:
+        print(f"[SALES] Ошибка сохранения пачки: {e}")
+        return False
+
+    for item_name, count, guessed, is_transfer, gold, silver in written:
+        _print_sale(item_name, count, gold, silver, guessed, is_transfer)
+    for item_name, count in expired:
+        print(f"[SALES] Записан истекший лот: {item_name} x{count}")
+    return True
 
 
-@_with_file_lock
 def record_listed(item_name: str, count: int, gold: int, silver: int, profile: str = "unknown"):
     """
     Записывает выставленный на аукцион лот.
@@ -253,78 +231,40 @@ def record_listed(item_name: str, count: int, gold: int, silver: int, profile: s
         silver: Цена (серебро)
         profile: Профиль бота
     """
-    stats = load_sales_stats()
-
     total_silver = gold * 100 + silver
     price_per_unit = total_silver // count if count > 0 else total_silver
 
-    stats["listed"].append({
-        "item": item_name,
-        "count": count,
-        "gold": gold,
-        "silver": silver,
-        "price_per_unit": price_per_unit,
-        "profile": profile,
-        "timestamp": datetime.now().isoformat(),
-    })
-
-    save_sales_stats(stats)
+    try:
+        with sales_ledger.Transaction() as conn:
+            sales_ledger.insert_listed(conn, time.time(), profile, item_name, count,
+                                       gold, silver, price_per_unit)
+    except Exception as e:
+        print(f"[SALES] Ошибка сохранения: {e}")
+        return
+    # Выставление — самое частое событие, заодно раз в сутки чистим ledger
+    sales_ledger.maybe_compact()
 
 
 def get_sales_summary(days: int = 7) -> dict:
     """
-    Получает сводку по продажам за N дней.
+    Получает сводку по продажам за N дней (из почасовых агрегатов ledger).
 
     Returns:
         dict: {item_name: {sold: X, expired: Y, sell_rate: Z%}}
     """
-    stats = load_sales_stats()
-    cutoff = datetime.now().timestamp() - (days * 24 * 3600)
-
+    cutoff = time.time() - (days * 24 * 3600)
     summary = {}
 
-    # Считаем продажи
-    for sale in stats.get("sold", []):
-        try:
-            ts = datetime.fromisoformat(sale["timestamp"]).timestamp()
-            if ts < cutoff:
-                continue
-        except Exception:
-            continue
-
-        item = sale["item"]
-        count = sale.get("count", 1)
-
-        if item not in summary:
-            summary[item] = {"sold": 0, "expired": 0, "total_gold": 0}
-
-        summary[item]["sold"] += count
-        summary[item]["total_gold"] += sale.get("gold", 0) + sale.get("silver", 0) / 100
-
-    # Считаем истекшие
-    for expired in stats.get("expired", []):
-        try:
-            ts = datetime.fromisoformat(expired["timestamp"]).timestamp()
-            if ts < cutoff:
-                continue
-        except Exception:
-            continue
-
-        item = expired["item"]
-        count = expired.get("count", 1)
-
-        if item not in summary:
-            summary[item] = {"sold": 0, "expired": 0, "total_gold": 0}
-
-        summary[item]["expired"] += count
-
-    # Считаем процент продаж
-    for item, data in summary.items():
-        total = data["sold"] + data["expired"]
-        if total > 0:
-            data["sell_rate"] = round(data["sold"] / total * 100, 1)
-        else:
-            data["sell_rate"] = 0
+    for item, agg in sales_ledger.window_aggregates(cutoff).items():
+        sold = agg["sold_units"] + agg["transfer_units"]
+        expired = agg["expired_units"]
+        total = sold + expired
+        summary[item] = {
+            "sold": sold,
+            "expired": expired,
+            "total_gold": (agg["sold_silver"] + agg["transfer_silver"]) / 100,
+            "sell_rate": round(sold / total * 100, 1) if total > 0 else 0,
+        }
 
     return summary
 
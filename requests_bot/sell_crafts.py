@@ -1,7 +1,16 @@
 #!/usr/bin/env python3
 """
 Скрипт для продажи всех крафтов на аукционе у всех персонажей.
-Запускается как: python -m requests_bot.sell_crafts [--telegram]
+Запускается как: python -m requests_bot.sell_crafts [--telegram] [--stream] [--workers N]
+
+Профили обрабатываются параллельно (пул из --workers потоков, у каждого
+свой ProfileContext). Вывод каждого профиля пишется в
+profiles/<profile>/logs/sell_crafts.log, наружу идёт поток событий:
+    start     {"total"}
+    started   {"profile", "name"}
+    listed    {"profile", "name", "item", "count", "gold", "silver", "listed"}
+    finished  {"profile", "name", "sold", "skipped", "error", "done", "total"}
+    error     {"profile", "name", "error", "done", "total"}
 """
 
 import os
@@ -10,6 +19,10 @@ import json
 import argparse
 import io
 import logging
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
 
 # Добавляем родительскую папку в путь
@@ -51,11 +64,53 @@ class SuppressOutput:
 # Импортируем с подавлением вывода
 with SuppressOutput():
     from requests_bot.client import VMMOClient
-    from requests_bot.config import set_profile, get_credentials
+    from requests_bot.config import use_profile, get_setting
 
 # Пути (SCRIPT_DIR уже определён выше для логов)
 PROFILES_DIR = os.path.join(SCRIPT_DIR, "profiles")
 
+# Сколько профилей продаём одновременно (settings.json: sell_crafts_workers)
+DEFAULT_WORKERS = 4
+
+
+class ThreadOutput(io.TextIOBase):
+    """
+    stdout, раскладывающий вывод по потокам.
+
+    Поток, зарегистрированный через capture(), пишет в свой файл; остальные
+    (главный поток с событиями) — в исходный stdout. Ставится один раз, так
+    что профили не подменяют sys.stdout друг у друга.
+    """
+
+    def __init__(self, fallback):
+        self.fallback = fallback
+        self._sinks = {}
+
+    def write(self, text):
+        sink = self._sinks.get(threading.get_ident())
+        (sink or self.fallback).write(text)
+        return len(text)
+
+    def flush(self):
+        sink = self._sinks.get(threading.get_ident())
+        (sink or self.fallback).flush()
+
+    @contextmanager
+    def capture(self, path):
+        ident = threading.get_ident()
+        with open(path, "w", encoding="utf-8") as f:
+            self._sinks[ident] = f
+            try:
+                yield f
+            finally:
+                self._sinks.pop(ident, None)
+
+
+def _thread_output() -> ThreadOutput:
+    if not isinstance(sys.stdout, ThreadOutput):
+        sys.stdout = ThreadOutput(sys.stdout)
+    return sys.stdout
+
 
 def get_all_profiles() -> dict:
     """Динамически определяет все профили из папки profiles/"""
@@ -109,13 +164,15 @@ def is_bot_running(profile: str) -> bool:
         return False
 
 
-def sell_crafts_for_profile(profile: str, suppress_stdout: bool = False) -> dict:
+def sell_crafts_for_profile(profile: str, emit=None) -> dict:
     """
     Продаёт все крафты на аукцион для одного профиля.
 
+    Работает в своём ProfileContext — можно вызывать из нескольких потоков.
+
     Args:
         profile: Имя профиля
-        suppress_stdout: Подавлять stdout (для SSE режима)
+        emit: callback(event: dict) для событий прогресса (started/listed)
 
     Returns:
         dict: {"profile": str, "name": str, "sold": int, "errors": int, "error": str|None, "skipped": bool}
@@ -129,6 +186,7 @@ def sell_crafts_for_profile(profile: str, suppress_stdout: bool = False) -> dict
         "error": None,
         "skipped": False
     }
+    emit = emit or (lambda event: None)
 
     logger.info(f"=== Начинаю обработку {profile} ({name}) ===")
 
@@ -139,20 +197,16 @@ def sell_crafts_for_profile(profile: str, suppress_stdout: bool = False) -> dict
         logger.info(f"{profile}: пропущен - бот работает")
         return result
 
-    try:
-        # В stream-режиме подавляем весь stdout чтобы не мешать SSE
-        if suppress_stdout:
-            original_stdout = sys.stdout
-            sys.stdout = io.StringIO()
+    emit({"type": "started", "profile": profile, "name": name})
 
-        try:
-            logger.info(f"{profile}: устанавливаю профиль...")
-            set_profile(profile)
-            username, password = get_credentials()
+    try:
+        logger.info(f"{profile}: устанавливаю профиль...")
+        with use_profile(profile) as ctx:
+            username, password = ctx.get_credentials()
             logger.info(f"{profile}: username={username}")
 
             logger.info(f"{profile}: создаю клиент...")
-            client = VMMOClient()
+            client = VMMOClient(profile=ctx)
 
             logger.info(f"{profile}: логинюсь...")
             if not client.login(username, password):
@@ -164,17 +218,22 @@ def sell_crafts_for_profile(profile: str, suppress_stdout: bool = False) -> dict
 
             # Импортируем IronCraftClient для sell_all_mining
             from requests_bot.craft import IronCraftClient
-            craft = IronCraftClient(client)
+            craft = IronCraftClient(client, profile=profile)
+
+            listed = 0
+
+            def on_listed(item, count, gold, silver):
+                nonlocal listed
+                listed += 1
+                emit({"type": "listed", "profile": profile, "name": name, "item": item,
+                      "count": count, "gold": gold, "silver": silver, "listed": listed})
 
             logger.info(f"{profile}: запускаю sell_all_mining(mode='all', force_min_stack=1)...")
             # Продаём все крафты на аукцион (force_min_stack=1 - продаём всё, игнорируя лимиты)
-            sold_count = craft.sell_all_mining(mode="all", force_min_stack=1)
+            sold_count = craft.sell_all_mining(mode="all", force_min_stack=1, on_listed=on_listed)
             result["sold"] = sold_count or 0
 
             logger.info(f"{profile}: завершено, продано: {sold_count}")
-        finally:
-            if suppress_stdout:
-                sys.stdout = original_stdout
 
     except Exception as e:
         result["error"] = str(e)
@@ -183,11 +242,73 @@ def sell_crafts_for_profile(profile: str, suppress_stdout: bool = False) -> dict
     return result
 
 
+def run_sell_crafts(profiles, workers: int = None):
+    """
+    Продаёт крафты у нескольких профилей параллельно.
+
+    Вывод каждого профиля (print/логгер бота) уходит в его
+    logs/sell_crafts.log, а не в общий stdout.
+
+    Args:
+        profiles: список профилей
+        workers: размер пула (None — настройка sell_crafts_workers)
+
+    Yields:
+        dict: события прогресса (см. описание модуля); результат профиля —
+              в событии finished/error под ключом "result"
+    """
+    profiles = list(profiles)
+    if workers is None:
+        workers = get_setting("sell_crafts_workers", DEFAULT_WORKERS)
+    workers = max(1, min(int(workers), len(profiles) or 1))
+    total = len(profiles)
+    output = _thread_output()
+    events = queue.Queue()
+
+    def worker(profile):
+        log_path = os.path.join(PROFILES_DIR, profile, "logs", "sell_crafts.log")
+        try:
+            os.makedirs(os.path.dirname(log_path), exist_ok=True)
+            with output.capture(log_path):
+                result = sell_crafts_for_profile(profile, emit=events.put)
+        except Exception as e:
+            logger.exception(f"{profile}: ИСКЛЮЧЕНИЕ: {e}")
+            result = {"profile": profile, "name": PROFILE_NAMES.get(profile, profile),
+                      "sold": 0, "errors": 0, "error": str(e), "skipped": False}
+        events.put({"type": "_result", "result": result})
+
+    yield {"type": "start", "total": total}
+    if not profiles:
+        return
+
+    done = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for profile in profiles:
+            pool.submit(worker, profile)
+
+        while done < total:
+            event = events.get()
+            if event["type"] != "_result":
+                yield event
+                continue
+
+            done += 1
+            r = event["result"]
+            if r["error"] and not r["skipped"]:
+                yield {"type": "error", "profile": r["profile"], "name": r["name"],
+                       "error": r["error"], "done": done, "total": total, "result": r}
+            else:
+                yield {"type": "finished", "profile": r["profile"], "name": r["name"],
+                       "sold": r["sold"], "skipped": r["skipped"], "error": r["error"],
+                       "done": done, "total": total, "result": r}
+
+
 def main():
     parser = argparse.ArgumentParser(description="Продажа крафтов на аукционе")
     parser.add_argument("--telegram", action="store_true", help="Формат вывода для Telegram")
     parser.add_argument("--stream", action="store_true", help="Стриминг прогресса (для SSE)")
     parser.add_argument("--profile", type=str, help="Конкретный профиль")
+    parser.add_argument("--workers", type=int, help="Сколько профилей продавать одновременно")
     args = parser.parse_args()
 
     logger.info("=" * 50)
@@ -207,43 +328,19 @@ def main():
 
     logger.info(f"Будут обработаны: {profiles}")
 
-    # Режим стриминга - выводим JSON для каждого профиля отдельно
-    if args.stream:
-        total = len(profiles)
-        # Начальное событие
-        print(json.dumps({"type": "start", "total": total}, ensure_ascii=False), flush=True)
-
-        for i, profile in enumerate(profiles):
-            # Событие "начал обработку"
-            name = PROFILE_NAMES.get(profile, profile)
-            print(json.dumps({
-                "type": "processing",
-                "profile": profile,
-                "name": name,
-                "current": i + 1,
-                "total": total
-            }, ensure_ascii=False), flush=True)
-
-            result = sell_crafts_for_profile(profile, suppress_stdout=True)
-
-            # Событие "результат"
-            print(json.dumps({
-                "type": "result",
-                "profile": profile,
-                "name": name,
-                "sold": result.get("sold", 0),
-                "skipped": result.get("skipped", False),
-                "error": result.get("error"),
-                "current": i + 1,
-                "total": total
-            }, ensure_ascii=False), flush=True)
+    results = {}
+    for event in run_sell_crafts(profiles, args.workers):
+        if "result" in event:
+            results[event["profile"]] = event.pop("result")
+        # Режим стриминга - выводим JSON на каждое событие
+        if args.stream:
+            print(json.dumps(event, ensure_ascii=False), flush=True)
 
+    if args.stream:
         return
 
-    results = []
-    for profile in profiles:
-        result = sell_crafts_for_profile(profile)
-        results.append(result)
+    # Результаты в исходном порядке профилей
+    results = [results[p] for p in profiles if p in results]
 
     # Формат вывода
     if args.telegram:
@@ -7,9 +7,6 @@
 
 import re
 import time
-import json
-import os
-from datetime import datetime
 from bs4 import BeautifulSoup
 from urllib.parse import urljoin
 
@@ -18,35 +15,17 @@ from .config import (
     is_resource_selling_enabled,
     RESOURCE_NAMES,
     RESOURCE_IDS,
+    get_profile_name,
 )
+from .price_service import get_price_service
+from . import order_book
 
 BASE_URL = "https://vmmo.vten.ru"
 
-# Кэш цен для координации между ботами (30 минут TTL)
-PRICE_CACHE_FILE = "/home/claude/vmmo_bot/price_cache.json"
+# Кэш цен для координации между ботами (30 минут TTL) — общий PriceService
 PRICE_CACHE_TTL_MINUTES = 30
 
 
-def load_price_cache():
-    """Загружает кэш цен из файла"""
-    try:
-        if os.path.exists(PRICE_CACHE_FILE):
-            with open(PRICE_CACHE_FILE, "r", encoding="utf-8") as f:
-                return json.load(f)
-    except Exception as e:
-        print(f"[SELL] Ошибка загрузки кэша цен: {e}")
-    return {}
-
-
-def save_price_cache(cache):
-    """Сохраняет кэш цен в файл"""
-    try:
-        with open(PRICE_CACHE_FILE, "w", encoding="utf-8") as f:
-            json.dump(cache, f, ensure_ascii=False, indent=2)
-    except Exception as e:
-        print(f"[SELL] Ошибка сохранения кэша цен: {e}")
-
-
 def get_cached_price(resource_key):
     """
     Получает закэшированную цену для ресурса.
@@ -54,37 +33,24 @@ def get_cached_price(resource_key):
     Returns:
         float: цена за единицу в серебре, или 0 если кэш устарел/не существует
     """
-    cache = load_price_cache()
-    entry = cache.get(resource_key)
+    service = get_price_service()
+    res_name = RESOURCE_NAMES.get(resource_key, resource_key)
+    age_minutes = service.age(res_name) / 60
 
-    if not entry:
-        return 0
-
-    # Проверяем TTL
-    try:
-        cached_time = datetime.fromisoformat(entry.get("time", ""))
-        age_minutes = (datetime.now() - cached_time).total_seconds() / 60
-
-        if age_minutes > PRICE_CACHE_TTL_MINUTES:
+    price = service.get(res_name, max_age=PRICE_CACHE_TTL_MINUTES * 60)
+    if price is None:
+        if age_minutes != float("inf"):
             print(f"[SELL] Кэш цены {resource_key} устарел ({age_minutes:.0f} мин)")
-            return 0
-
-        price = entry.get("price", 0)
-        print(f"[SELL] Используем кэшированную цену {resource_key}: {price:.2f}с/шт (возраст {age_minutes:.0f} мин)")
-        return price
-    except Exception as e:
-        print(f"[SELL] Ошибка парсинга кэша: {e}")
         return 0
 
+    print(f"[SELL] Используем кэшированную цену {resource_key}: {price:.2f}с/шт (возраст {age_minutes:.0f} мин)")
+    return price
+
 
 def set_cached_price(resource_key, price):
     """Сохраняет цену в кэш"""
-    cache = load_price_cache()
-    cache[resource_key] = {
-        "price": price,
-        "time": datetime.now().isoformat()
-    }
-    save_price_cache(cache)
+    res_name = RESOURCE_NAMES.get(resource_key, resource_key)
+    get_price_service().set(res_name, price, source="resources")
     print(f"[SELL] Цена {resource_key} сохранена в кэш: {price:.2f}с/шт")
 
 
@@ -202,7 +168,7 @@ class ResourceSellerClient:
 
         if price_per_unit == 0:
             # Кэш пустой или устарел - парсим конкурента
-            price_per_unit = self._get_competitor_price_per_unit()
+            price_per_unit = self._get_competitor_price_per_unit(res_name)
 
             if price_per_unit == 0:
                 # Нет конкурентов - ставим дефолтную цену ~1с за минерал
@@ -247,6 +213,8 @@ class ResourceSellerClient:
                               profile=get_profile_name() or "unknown")
             except Exception:
                 pass
+            order_book.add_own_lot(res_name, amount, gold * 100 + silver,
+                                   get_profile_name() or "unknown")
             return True
         elif result == "low_price":
             print(f"[SELL] Цена слишком низкая для {res_name}")
@@ -255,10 +223,16 @@ class ResourceSellerClient:
 
         return False
 
-    def _get_competitor_price_per_unit(self):
+    def _get_competitor_price_per_unit(self, res_name=None):
         """
         Получает цену за единицу ресурса у конкурента.
 
+        Если передан res_name — все лоты страницы публикуются в общий
+        стакан (order_book) и историю цен.
+
+        Args:
+            res_name: Название ресурса (для стакана)
+
         Returns:
             float: цена в серебре за 1 единицу (0 если нет конкурентов)
         """
@@ -266,14 +240,18 @@ class ResourceSellerClient:
         if not soup:
             return 0
 
-        # Ищем лоты конкурентов - div.list-el с кнопкой покупки (a.go-btn)
+        # Все лоты - div.list-el; у конкурентов кнопка выкупа a.go-btn,
+        # у нашего лота - span.go-btn
         all_lots = soup.select("div.list-el")
+        parsed = []
 
         for lot in all_lots:
-            # Кнопка выкупа - только у конкурентов
             buy_btn = lot.select_one("a.go-btn._auction")
-            if not buy_btn:
-                continue
+            ours = buy_btn is None
+            if ours:
+                buy_btn = lot.select_one("span.go-btn._auction")
+                if not buy_btn:
+                    continue
 
             # Парсим количество в лоте (e-count -> potion-count -> x100)
             count_div = lot.select_one("div.e-count div.potion-count")
@@ -313,6 +291,18 @@ class ResourceSellerClient:
                     if text.isdigit():
                         silver = int(text)
 
+            parsed.append((lot_count, gold, silver, ours))
+
+        if res_name and parsed:
+            order_book.publish(res_name, [(count, gold * 100 + silver, ours)
+                                          for count, gold, silver, ours in parsed],
+                               source="resources", profile=get_profile_name() or "")
+
+        # Первый лот конкурента - минимальная цена (сортировка по цене)
+        for lot_count, gold, silver, ours in parsed:
+            if ours:
+                continue
+
             # Считаем цену за единицу в серебре
             total_silver = gold * 100 + silver
             price_per_unit = total_silver / lot_count
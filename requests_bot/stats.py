@@ -1,12 +1,18 @@
 # ============================================
 # VMMO Bot - Statistics Module (requests version)
 # ============================================
+# BotStats держит stats.json в памяти (write_behind): события только
+# меняют счётчики, файл пишется раз в FLUSH_INTERVAL / на выходе.
+# ============================================
 
 import json
 import os
 import time
 from datetime import datetime
 
+from requests_bot import write_behind
+from requests_bot.cache.file_cache import atomic_write_json
+
 SCRIPT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 PROFILES_DIR = os.path.join(SCRIPT_DIR, "profiles")
 
@@ -25,24 +31,14 @@ def set_stats_profile(profile_name):
 
 
 def get_stats_file():
-    """Возвращает путь к файлу статистики"""
-    global _stats_file
-    if _stats_file is None:
-        _stats_file = os.path.join(SCRIPT_DIR, "stats.json")
-    return _stats_file
+    """Возвращает путь к файлу статистики (по умолчанию — активного профиля)"""
+    if _stats_file is not None:
+        return _stats_file
+    from requests_bot.config import current_profile
+    return current_profile().stats_file
 
 
-def load_stats():
-    """Загружает статистику из файла"""
-    stats_file = get_stats_file()
-    if os.path.exists(stats_file):
-        try:
-            with open(stats_file, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except Exception:
-            pass
-
-    # Дефолтная структура
+def _default_stats():
     return {
         "total_dungeons_completed": 0,
         "total_stages_completed": 0,
@@ -59,12 +55,25 @@ def load_stats():
     }
 
 
+def load_stats():
+    """Загружает статистику из файла"""
+    stats_file = get_stats_file()
+    if os.path.exists(stats_file):
+        try:
+            with open(stats_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception:
+            pass
+
+    # Дефолтная структура
+    return _default_stats()
+
+
 def save_stats(stats):
-    """Сохраняет статистику в файл"""
+    """Сохраняет статистику в файл (сразу, атомарно)"""
     stats_file = get_stats_file()
     try:
-        with open(stats_file, "w", encoding="utf-8") as f:
-            json.dump(stats, f, ensure_ascii=False, indent=2)
+        atomic_write_json(stats_file, stats)
     except Exception as e:
         print(f"[STATS] Ошибка сохранения: {e}")
 
@@ -73,77 +82,85 @@ class BotStats:
     """Класс для отслеживания статистики бота"""
 
     def __init__(self):
-        self.stats = load_stats()
+        self._doc = write_behind.document(get_stats_file(), default=_default_stats, name="STATS")
         self.session_start = datetime.now()
         self.session_dungeons = 0
         self.session_stages = 0
         self.session_deaths = 0
         self.session_actions = 0
 
-        # Устанавливаем first_run если это первый запуск
-        if self.stats["first_run"] is None:
-            self.stats["first_run"] = self.session_start.isoformat()
+        with self._doc.edit() as stats:
+            # Устанавливаем first_run если это первый запуск
+            if stats["first_run"] is None:
+                stats["first_run"] = self.session_start.isoformat()
+            stats["last_run"] = self.session_start.isoformat()
+        self._doc.flush()
+
+    @property
+    def stats(self):
+        """Текущая статистика (только чтение)"""
+        return self._doc.data
 
-        self.stats["last_run"] = self.session_start.isoformat()
-        save_stats(self.stats)
+    def flush(self):
+        """Сбрасывает статистику на диск сейчас"""
+        return self._doc.flush()
 
     def dungeon_completed(self, dungeon_id, dungeon_name=None):
         """Записывает завершение данжена"""
-        self.stats["total_dungeons_completed"] += 1
         self.session_dungeons += 1
+        with self._doc.edit() as stats:
+            stats["total_dungeons_completed"] += 1
 
-        # Статистика по конкретному данжену
-        if dungeon_id not in self.stats["dungeons"]:
-            self.stats["dungeons"][dungeon_id] = {
-                "name": dungeon_name or dungeon_id,
-                "completed": 0,
-                "deaths": 0,
-                "last_completed": None,
-            }
+            # Статистика по конкретному данжену
+            if dungeon_id not in stats["dungeons"]:
+                stats["dungeons"][dungeon_id] = {
+                    "name": dungeon_name or dungeon_id,
+                    "completed": 0,
+                    "deaths": 0,
+                    "last_completed": None,
+                }
 
-        self.stats["dungeons"][dungeon_id]["completed"] += 1
-        self.stats["dungeons"][dungeon_id]["last_completed"] = datetime.now().isoformat()
+            stats["dungeons"][dungeon_id]["completed"] += 1
+            stats["dungeons"][dungeon_id]["last_completed"] = datetime.now().isoformat()
 
-        save_stats(self.stats)
         print(f"[STATS] Данжен пройден: {dungeon_name or dungeon_id}")
 
     def stage_completed(self):
         """Записывает завершение этапа"""
-        self.stats["total_stages_completed"] += 1
         self.session_stages += 1
-        save_stats(self.stats)
+        with self._doc.edit() as stats:
+            stats["total_stages_completed"] += 1
 
     def death_recorded(self, dungeon_id=None):
         """Записывает смерть"""
-        self.stats["total_deaths"] += 1
         self.session_deaths += 1
+        with self._doc.edit() as stats:
+            stats["total_deaths"] += 1
+            if dungeon_id and dungeon_id in stats["dungeons"]:
+                stats["dungeons"][dungeon_id]["deaths"] += 1
 
-        if dungeon_id and dungeon_id in self.stats["dungeons"]:
-            self.stats["dungeons"][dungeon_id]["deaths"] += 1
-
-        save_stats(self.stats)
         print(f"[STATS] Смерть записана")
 
     def items_auctioned(self, count):
         """Записывает выставленные на аукцион предметы"""
-        self.stats["total_items_auctioned"] += count
-        save_stats(self.stats)
+        with self._doc.edit() as stats:
+            stats["total_items_auctioned"] += count
 
     def items_disassembled(self, count):
         """Записывает разобранные предметы"""
-        self.stats["total_items_disassembled"] += count
-        save_stats(self.stats)
+        with self._doc.edit() as stats:
+            stats["total_items_disassembled"] += count
 
     def hell_games_time(self, seconds):
         """Записывает время в Адских Играх"""
-        self.stats["total_hell_games_time"] += seconds
-        save_stats(self.stats)
+        with self._doc.edit() as stats:
+            stats["total_hell_games_time"] += seconds
 
     def mail_money_collected(self, gold=0, silver=0):
         """Записывает деньги, собранные с почты"""
-        self.stats["total_mail_gold"] += gold
-        self.stats["total_mail_silver"] += silver
-        save_stats(self.stats)
+        with self._doc.edit() as stats:
+            stats["total_mail_gold"] += gold
+            stats["total_mail_silver"] += silver
 
     def add_actions(self, count):
         """Добавляет действия"""
@@ -165,11 +182,12 @@ class BotStats:
         }
 
         # Храним только последние 100 сессий
-        self.stats["sessions"].append(session_record)
-        if len(self.stats["sessions"]) > 100:
-            self.stats["sessions"] = self.stats["sessions"][-100:]
+        with self._doc.edit() as stats:
+            stats["sessions"].append(session_record)
+            if len(stats["sessions"]) > 100:
+                stats["sessions"] = stats["sessions"][-100:]
 
-        save_stats(self.stats)
+        self._doc.flush()
 
     def get_summary(self):
         """Возвращает текстовую сводку статистики"""
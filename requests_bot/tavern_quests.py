@@ -103,11 +103,10 @@ def _fetch_quests(client, urls):
 
 
 def _resource_counts():
-    """Текущие ресурсы из resources.json профиля ({'минералы': N, ...})."""
-    from requests_bot.config import PROFILE_DIR
+    """Текущие ресурсы профиля ({'минералы': N, ...}) — из памяти, файл может отставать."""
     try:
-        with open(os.path.join(PROFILE_DIR, "resources.json"), encoding="utf-8") as f:
-            return json.load(f).get("current_session", {}).get("current", {}) or {}
+        from requests_bot.resources import get_current_resources
+        return get_current_resources()
     except Exception:
         return {}
 
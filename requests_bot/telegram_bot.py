@@ -22,6 +22,8 @@ except ImportError:
     print("Установи python-telegram-bot: pip install python-telegram-bot")
     sys.exit(1)
 
+from requests_bot.cache import config_store
+
 # Пути
 SCRIPT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 PROFILES_DIR = os.path.join(SCRIPT_DIR, "profiles")
@@ -880,26 +882,81 @@ async def cmd_sell_crafts(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not is_allowed(update.effective_user.id):
         return
 
-    await update.message.reply_text("💰 Продаю крафты на аукционе у всех персонажей...\n(это займёт 1-2 мин)")
+    progress = await update.message.reply_text("💰 Продаю крафты на аукционе у всех персонажей...")
+
+    results = []
+    active = {}
+    total = 0
+    last_edit = 0.0
+
+    async def show_progress(force=False):
+        # Telegram ограничивает частоту правок — не чаще раза в 2 сек
+        nonlocal last_edit
+        now = asyncio.get_running_loop().time()
+        if not force and now - last_edit < 2:
+            return
+        last_edit = now
+        lines = [f"💰 Продажа крафтов: {len(results)}/{total}"]
+        for name, listed in active.values():
+            lines.append(f"⏳ {name}: выставлено {listed}")
+        try:
+            await progress.edit_text("\n".join(lines))
+        except Exception:
+            pass  # "message is not modified" и т.п.
+
+    async def read_events(process):
+        nonlocal total
+        async for raw in process.stdout:
+            try:
+                event = json.loads(raw.decode("utf-8", errors="replace"))
+            except ValueError:
+                continue
+            kind = event.get("type")
+            if kind == "start":
+                total = event["total"]
+            elif kind == "started":
+                active[event["profile"]] = (event["name"], 0)
+            elif kind == "listed":
+                active[event["profile"]] = (event["name"], event["listed"])
+            elif kind in ("finished", "error"):
+                active.pop(event["profile"], None)
+                results.append(event)
+            await show_progress(force=kind in ("finished", "error"))
+        await process.wait()
 
     try:
-        # Запускаем скрипт продажи крафтов
-        result = subprocess.run(
-            [sys.executable, "-m", "requests_bot.sell_crafts", "--telegram"],
+        # Запускаем скрипт продажи крафтов (профили параллельно, события — JSON-строками)
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, "-m", "requests_bot.sell_crafts", "--stream",
             cwd=SCRIPT_DIR,
-            capture_output=True,
-            text=True,
-            timeout=180  # 3 минуты на все профили
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
         )
+        try:
+            await asyncio.wait_for(read_events(process), timeout=180)  # 3 минуты на все профили
+        except asyncio.TimeoutError:
+            process.kill()
+            await update.message.reply_text("❌ Таймаут (3 мин)", reply_markup=get_main_keyboard())
+            return
+
+        if process.returncode != 0 and not results:
+            await update.message.reply_text("❌ Ошибка: скрипт продажи завершился с ошибкой",
+                                            reply_markup=get_main_keyboard())
+            return
+
+        lines = ["💰 Продажа крафтов на аукционе:\n"]
+        skipped = 0
+        for r in sorted(results, key=lambda e: e["name"]):
+            if r["type"] == "error":
+                lines.append(f"❌ {r['name']}: {r['error']}")
+            elif r.get("skipped"):
+                lines.append(f"⏭️ {r['name']}: пропущен (бот работает)")
+                skipped += 1
+            else:
+                lines.append(f"✅ {r['name']}: продано {r['sold']}")
+        lines.append(f"\n📊 Обработано: {len(results) - skipped}, пропущено: {skipped}")
+        await update.message.reply_text("\n".join(lines), reply_markup=get_main_keyboard())
 
-        if result.returncode == 0 and result.stdout.strip():
-            await update.message.reply_text(result.stdout.strip(), reply_markup=get_main_keyboard())
-        else:
-            error = result.stderr.strip() if result.stderr else "Неизвестная ошибка"
-            await update.message.reply_text(f"❌ Ошибка: {error}", reply_markup=get_main_keyboard())
-
-    except subprocess.TimeoutExpired:
-        await update.message.reply_text("❌ Таймаут (3 мин)", reply_markup=get_main_keyboard())
     except Exception as e:
         await update.message.reply_text(f"❌ Ошибка: {e}", reply_markup=get_main_keyboard())
 
@@ -1039,22 +1096,14 @@ async def cmd_cooldown(update: Update, context: ContextTypes.DEFAULT_TYPE):
 # ============================================
 
 def get_user_settings(profile: str) -> dict:
-    """Получает все настройки персонажа"""
+    """Получает все настройки персонажа (копия из config_store — можно менять)"""
     config_path = os.path.join(PROFILES_DIR, profile, "config.json")
-    if os.path.exists(config_path):
-        with open(config_path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return {}
+    return config_store.read_copy(config_path, {})
 
 def save_user_settings(profile: str, settings: dict) -> bool:
-    """Сохраняет настройки персонажа"""
+    """Сохраняет настройки персонажа (атомарно)"""
     config_path = os.path.join(PROFILES_DIR, profile, "config.json")
-    try:
-        with open(config_path, "w", encoding="utf-8") as f:
-            json.dump(settings, f, indent=4, ensure_ascii=False)
-        return True
-    except Exception:
-        return False
+    return config_store.write(config_path, settings, indent=4)
 
 def toggle_setting(profile: str, setting: str) -> tuple:
     """Переключает настройку (вкл/выкл)"""
@@ -1919,23 +1968,12 @@ DEFAULT_PROTECTED_ITEMS = [
 
 def load_protected_items() -> list:
     """Загружает список защищённых предметов"""
-    if os.path.exists(PROTECTED_ITEMS_FILE):
-        try:
-            with open(PROTECTED_ITEMS_FILE, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except Exception:
-            pass
-    return DEFAULT_PROTECTED_ITEMS.copy()
+    return config_store.read_copy(PROTECTED_ITEMS_FILE) or DEFAULT_PROTECTED_ITEMS.copy()
 
 
 def save_protected_items(items: list) -> bool:
     """Сохраняет список защищённых предметов"""
-    try:
-        with open(PROTECTED_ITEMS_FILE, "w", encoding="utf-8") as f:
-            json.dump(items, f, ensure_ascii=False, indent=2)
-        return True
-    except Exception:
-        return False
+    return config_store.write(PROTECTED_ITEMS_FILE, items)
 
 
 def add_protected_item(item_name: str) -> bool:
@@ -14,13 +14,15 @@ import hashlib
 from urllib.parse import parse_qsl
 from datetime import datetime
 from functools import wraps
-from flask import Flask, render_template, jsonify, request, redirect, url_for, session
+from flask import Flask, render_template, jsonify, request, redirect, url_for, session, make_response
+
+from requests_bot.cache import config_store
+from requests_bot.dashboard import DashboardAggregator
 
 # Resource History модуль
 try:
-    from requests_bot.resource_history import (
-        get_history, get_sessions, get_all_chart_data
-    )
+    from requests_bot.resource_history import get_sessions
+    from requests_bot import fleet_history, chart_analytics
     RESOURCE_HISTORY_AVAILABLE = True
 except ImportError:
     RESOURCE_HISTORY_AVAILABLE = False
@@ -289,19 +291,17 @@ def telegram_auth():
 # ============================================
 
 def get_config(profile):
-    """Загружает конфиг профиля"""
+    """Загружает конфиг профиля (копия из config_store — можно менять)"""
     config_path = os.path.join(PROFILES_DIR, profile, "config.json")
-    if os.path.exists(config_path):
-        with open(config_path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return {}
+    return config_store.read_copy(config_path, {})
 
 
 def save_config(profile, config):
-    """Сохраняет конфиг профиля"""
+    """Сохраняет конфиг профиля (атомарно)"""
     config_path = os.path.join(PROFILES_DIR, profile, "config.json")
-    with open(config_path, "w", encoding="utf-8") as f:
-        json.dump(config, f, ensure_ascii=False, indent=4)
+    if not config_store.write(config_path, config, indent=4):
+        raise IOError(f"Не удалось записать {config_path}")
+    dashboard.invalidate()
 
 
 def get_resources(profile):
@@ -345,12 +345,12 @@ def get_bot_status(profile):
     """Проверяет статус бота"""
     lock_file = os.path.join(PROFILES_DIR, profile, ".lock")
 
-    if profile in active_bots:
-        proc = active_bots[profile]
+    # Статус читает и поток дашборда — без гонок на del
+    proc = active_bots.get(profile)
+    if proc is not None:
         if proc.poll() is None:
             return "running"
-        else:
-            del active_bots[profile]
+        active_bots.pop(profile, None)
 
     if os.path.exists(lock_file):
         try:
@@ -390,6 +390,7 @@ def start_bot(profile):
             )
 
         active_bots[profile] = proc
+        dashboard.invalidate()
         return True, f"Бот запущен (PID: {proc.pid})"
     except Exception as e:
         return False, f"Ошибка: {e}"
@@ -401,8 +402,8 @@ def stop_bot(profile):
     stopped = False
 
     # Через subprocess
-    if profile in active_bots:
-        proc = active_bots[profile]
+    proc = active_bots.pop(profile, None)
+    if proc is not None:
         if proc.poll() is None:
             proc.terminate()
             try:
@@ -410,7 +411,6 @@ def stop_bot(profile):
             except subprocess.TimeoutExpired:
                 proc.kill()
             stopped = True
-        del active_bots[profile]
 
     # Через lock файл
     lock_file = os.path.join(PROFILES_DIR, profile, ".lock")
@@ -427,6 +427,7 @@ def stop_bot(profile):
         except Exception:
             pass
 
+    dashboard.invalidate()
     if stopped:
         return True, "Бот остановлен"
     return False, "Бот не был запущен"
@@ -522,9 +523,10 @@ def get_all_stats():
     return stats
 
 
-def get_grouped_stats():
+def get_grouped_stats(all_stats=None):
     """Собирает статистику с группировкой: мейны отдельно, мулы сгруппированы"""
-    all_stats = get_all_stats()
+    if all_stats is None:
+        all_stats = get_all_stats()
 
     # Craft-only боты (Пупупу-получатель золота) — отдельный блок в самом верху
     craft_only_profiles = set()
@@ -591,6 +593,80 @@ def get_grouped_stats():
     }
 
 
+def get_total_stats(all_stats):
+    """Итоги для hero-панели главной страницы"""
+    total_stats = {
+        "running": 0,
+        "total": len(all_stats),
+        "gold": 0,
+        "gold_earned": 0,
+        "minerals": 0,
+        "minerals_earned": 0,
+        "skulls": 0,
+        "skulls_earned": 0,
+        "gold_per_hour": 0.0,
+        "total_hours": 0.0,
+    }
+
+    for bot in all_stats:
+        if bot.get("status") == "running":
+            total_stats["running"] += 1
+        total_stats["gold"] += bot.get("resources", {}).get("золото", 0)
+        total_stats["gold_earned"] += bot.get("earned", {}).get("золото", 0)
+        total_stats["minerals"] += bot.get("resources", {}).get("минералы", 0)
+        total_stats["minerals_earned"] += bot.get("earned", {}).get("минералы", 0)
+        total_stats["skulls"] += bot.get("resources", {}).get("черепа", 0)
+        total_stats["skulls_earned"] += bot.get("earned", {}).get("черепа", 0)
+        total_stats["total_hours"] += bot.get("hours", 0)
+
+    # Gold per hour (за всю сессию)
+    if total_stats["total_hours"] > 0:
+        total_stats["gold_per_hour"] = total_stats["gold_earned"] / total_stats["total_hours"]
+
+    return total_stats
+
+
+# ============================================
+# Снимок дашборда (фоновый поток, см. dashboard.py)
+# ============================================
+
+DASHBOARD_FILES = ["config.json", "resources.json", "status.json", "char_info.json",
+                   ".lock", "craft_inventory.json"]
+
+
+def _build_dashboard():
+    """Всё, что нужно главной, /stats и /api/stats"""
+    stats = get_all_stats()
+    grouped = get_grouped_stats(stats)
+    ordered = grouped["craft_only_bots"] + grouped["party_bots"] + grouped["mains"] + grouped["mules"]
+    return {
+        "stats": stats,
+        "grouped": grouped,
+        "total_stats": get_total_stats(ordered),
+    }
+
+
+def _dashboard_files():
+    """Файлы, от которых зависит снимок"""
+    paths = [os.path.join(os.path.dirname(PROFILES_DIR), "shared_craft_locks.json")]
+    for profile in list(PROFILE_NAMES):
+        paths.extend(os.path.join(PROFILES_DIR, profile, name) for name in DASHBOARD_FILES)
+    return paths
+
+
+dashboard = DashboardAggregator(_build_dashboard, watch=_dashboard_files,
+                                to_json=lambda data: data["stats"])
+
+
+def _not_modified(etag):
+    """304, если у клиента уже есть эта версия"""
+    if request.if_none_match.contains(etag):
+        resp = make_response("", 304)
+        resp.set_etag(etag)
+        return resp
+    return None
+
+
 def get_logs(profile, lines=100):
     """Получает последние логи бота"""
     # Основные логи находятся в /logs/bot_charN_live.log
@@ -649,23 +725,12 @@ def reset_deaths(profile):
 
 def load_protected_items():
     """Загружает список защищённых предметов"""
-    if os.path.exists(PROTECTED_ITEMS_FILE):
-        try:
-            with open(PROTECTED_ITEMS_FILE, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except Exception:
-            pass
-    return DEFAULT_PROTECTED_ITEMS.copy()
+    return config_store.read_copy(PROTECTED_ITEMS_FILE) or DEFAULT_PROTECTED_ITEMS.copy()
 
 
 def save_protected_items(items):
     """Сохраняет список защищённых предметов"""
-    try:
-        with open(PROTECTED_ITEMS_FILE, "w", encoding="utf-8") as f:
-            json.dump(items, f, ensure_ascii=False, indent=2)
-        return True
-    except Exception:
-        return False
+    return config_store.write(PROTECTED_ITEMS_FILE, items)
 
 
 UNPROTECTED_ITEMS_FILE = os.path.join(SCRIPT_DIR, "unprotected_items.json")
@@ -673,23 +738,12 @@ UNPROTECTED_ITEMS_FILE = os.path.join(SCRIPT_DIR, "unprotected_items.json")
 
 def load_unprotected_items():
     """Загружает список исключений (можно разбирать/продавать)"""
-    if os.path.exists(UNPROTECTED_ITEMS_FILE):
-        try:
-            with open(UNPROTECTED_ITEMS_FILE, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except Exception:
-            pass
-    return []
+    return config_store.read_copy(UNPROTECTED_ITEMS_FILE, [])
 
 
 def save_unprotected_items(items):
     """Сохраняет список исключений"""
-    try:
-        with open(UNPROTECTED_ITEMS_FILE, "w", encoding="utf-8") as f:
-            json.dump(items, f, ensure_ascii=False, indent=2)
-        return True
-    except Exception:
-        return False
+    return config_store.write(UNPROTECTED_ITEMS_FILE, items)
 
 
 def _reset_dungeon_entry(data):
@@ -818,7 +872,7 @@ def get_craft_inventory_cache(profile):
 
 def build_ingredient_chain(recipe_id, inventory=None, multiplier=1, depth=0, max_depth=5):
     """
-    Рекурсивно строит цепочку ингредиентов для рецепта.
+    Строит цепочку ингредиентов для рецепта по графу рецептов (craft.dag).
 
     Args:
         recipe_id: ID рецепта (например, "thorBar")
@@ -830,7 +884,7 @@ def build_ingredient_chain(recipe_id, inventory=None, multiplier=1, depth=0, max
     Returns:
         list: [{"id": "thor", "name": "Тор", "amount": 5, "have": 3, "children": [...]}]
     """
-    from requests_bot.craft import RECIPES, ITEM_NAMES
+    from requests_bot.craft import ITEM_NAMES, get_ingredients
 
     if inventory is None:
         inventory = {}
@@ -838,29 +892,15 @@ def build_ingredient_chain(recipe_id, inventory=None, multiplier=1, depth=0, max
     if depth >= max_depth:
         return []
 
-    recipe = RECIPES.get(recipe_id)
-    if not recipe:
-        return []
-
-    requires = recipe.get("requires", {})
-    if not requires:
-        return []
-
     result = []
-    for ing_id, ing_amount in requires.items():
+    for ing_id, ing_amount in get_ingredients(recipe_id):
         total_amount = ing_amount * multiplier
-        ing_name = ITEM_NAMES.get(ing_id, ing_id)
-        have_amount = inventory.get(ing_id, 0)
-
-        # Рекурсивно получаем дочерние ингредиенты
-        children = build_ingredient_chain(ing_id, inventory, total_amount, depth + 1, max_depth)
-
         result.append({
             "id": ing_id,
-            "name": ing_name,
+            "name": ITEM_NAMES.get(ing_id, ing_id),
             "amount": total_amount,
-            "have": have_amount,
-            "children": children
+            "have": inventory.get(ing_id, 0),
+            "children": build_ingredient_chain(ing_id, inventory, total_amount, depth + 1, max_depth),
         })
 
     return result
@@ -996,6 +1036,8 @@ def reload_profiles():
             except Exception:
                 PROFILE_NAMES[folder] = folder
 
+    dashboard.invalidate()
+
 
 def create_profile(username, password):
     """Создаёт новый профиль"""
@@ -1081,39 +1123,16 @@ reload_profiles()
 @login_required
 def index():
     """Главная страница - обзор всех ботов"""
-    grouped = get_grouped_stats()
-    all_stats = grouped["craft_only_bots"] + grouped["party_bots"] + grouped["mains"] + grouped["mules"]
+    snap = dashboard.snapshot()
+    etag = "index-" + snap.etag
+    cached = _not_modified(etag)
+    if cached:
+        return cached
 
-    # Расчёт total_stats для hero-панели
-    total_stats = {
-        "running": 0,
-        "total": len(all_stats),
-        "gold": 0,
-        "gold_earned": 0,
-        "minerals": 0,
-        "minerals_earned": 0,
-        "skulls": 0,
-        "skulls_earned": 0,
-        "gold_per_hour": 0.0,
-        "total_hours": 0.0,
-    }
-
-    for bot in all_stats:
-        if bot.get("status") == "running":
-            total_stats["running"] += 1
-        total_stats["gold"] += bot.get("resources", {}).get("золото", 0)
-        total_stats["gold_earned"] += bot.get("earned", {}).get("золото", 0)
-        total_stats["minerals"] += bot.get("resources", {}).get("минералы", 0)
-        total_stats["minerals_earned"] += bot.get("earned", {}).get("минералы", 0)
-        total_stats["skulls"] += bot.get("resources", {}).get("черепа", 0)
-        total_stats["skulls_earned"] += bot.get("earned", {}).get("черепа", 0)
-        total_stats["total_hours"] += bot.get("hours", 0)
-
-    # Gold per hour (за всю сессию)
-    if total_stats["total_hours"] > 0:
-        total_stats["gold_per_hour"] = total_stats["gold_earned"] / total_stats["total_hours"]
+    grouped = snap.data["grouped"]
+    all_stats = grouped["craft_only_bots"] + grouped["party_bots"] + grouped["mains"] + grouped["mules"]
 
-    return render_template("index.html",
+    resp = make_response(render_template("index.html",
                            craft_only_bots=grouped["craft_only_bots"],
                            party_bots=grouped["party_bots"],
                            mains=grouped["mains"],
@@ -1122,15 +1141,17 @@ def index():
                            best_mule=grouped["best_mule"],
                            mules_sorted=grouped["mules_sorted"],
                            stats=all_stats,
-                           total_stats=total_stats,
-                           profile_names=PROFILE_NAMES)
+                           total_stats=snap.data["total_stats"],
+                           profile_names=PROFILE_NAMES))
+    resp.set_etag(etag)
+    return resp
 
 
 @app.route("/stats")
 @login_required
 def stats_page():
     """Страница статистики с графиками"""
-    stats = get_all_stats()
+    stats = dashboard.snapshot().data["stats"]
     return render_template("stats.html", stats=stats, profiles=PROFILE_NAMES)
 
 
@@ -1224,8 +1245,14 @@ def profiles_page():
 @app.route("/api/stats")
 @login_required
 def api_stats():
-    """API: Статистика всех ботов"""
-    return jsonify(get_all_stats())
+    """API: Статистика всех ботов (снимок из памяти)"""
+    snap = dashboard.snapshot()
+    cached = _not_modified(snap.etag)
+    if cached:
+        return cached
+    resp = app.response_class(snap.body, mimetype="application/json")
+    resp.set_etag(snap.etag)
+    return resp
 
 
 @app.route("/api/bot/<profile>/start", methods=["POST"])
@@ -2383,266 +2410,24 @@ def api_stats_chart(profile):
     mode = request.args.get("mode", "sessions")  # sessions или days
     hours = {'day': 24, 'week': 168, 'month': 720}.get(period, 168)
 
-    resource_keys = ['золото', 'серебро', 'черепа', 'минералы', 'сапфиры', 'рубины']
-
-    def round_timestamp_to_minute(ts_str):
-        """Округляет ISO timestamp до минуты и добавляет московский timezone"""
-        try:
-            dt = datetime.fromisoformat(ts_str.replace('+03:00', '').replace('Z', ''))
-            return dt.replace(second=0, microsecond=0).isoformat() + '+03:00'
-        except Exception:
-            return ts_str
-
-    def add_timezone(ts_str):
-        """Добавляет московский timezone к timestamp"""
-        if '+' not in ts_str and 'Z' not in ts_str:
-            return ts_str + '+03:00'
-        return ts_str
-
-    def get_daily_data(profiles_to_check):
-        """Агрегирует данные по дням (00:00 каждого дня)"""
-        from collections import defaultdict
-        from datetime import timedelta
-
-        all_snapshots = []
-
-        for p in profiles_to_check:
-            history = get_history(hours, p)
-            for snap in history:
-                all_snapshots.append({
-                    'profile': p,
-                    'timestamp': snap['timestamp'],
-                    'resources': snap['resources']
-                })
-
-        if not all_snapshots:
-            return {"timestamps": [], "resources": {r: [] for r in resource_keys}}
-
-        # Группируем снэпшоты по дате
-        daily_data = defaultdict(lambda: defaultdict(dict))
-
-        for snap in all_snapshots:
-            try:
-                ts = snap['timestamp'].replace('+03:00', '').replace('Z', '')
-                dt = datetime.fromisoformat(ts)
-                date_key = dt.date()
-                profile = snap['profile']
-
-                # Берём последний снэпшот за день для каждого профиля
-                if profile not in daily_data[date_key] or dt > datetime.fromisoformat(daily_data[date_key][profile]['timestamp'].replace('+03:00', '')):
-                    daily_data[date_key][profile] = snap
-            except Exception:
-                continue
-
-        if not daily_data:
-            return {"timestamps": [], "resources": {r: [] for r in resource_keys}}
-
-        # Определяем диапазон дат
-        min_date = min(daily_data.keys())
-        max_date = max(daily_data.keys())
-
-        # Генерируем все даты в диапазоне
-        all_dates = []
-        current_date = min_date
-        while current_date <= max_date:
-            all_dates.append(current_date)
-            current_date += timedelta(days=1)
-
-        # Формируем результат с интерполяцией
-        timestamps = []
-        resources = {r: [] for r in resource_keys}
-        last_known = {p: {r: 0 for r in resource_keys} for p in profiles_to_check}
-
-        for date in all_dates:
-            # Timestamp на 00:00 этого дня
-            dt = datetime(date.year, date.month, date.day, 0, 0, 0)
-            timestamps.append(dt.isoformat() + '+03:00')
-
-            # Обновляем last_known если есть данные за этот день
-            if date in daily_data:
-                for p, snap in daily_data[date].items():
-                    for r in resource_keys:
-                        last_known[p][r] = snap['resources'].get(r, last_known[p][r])
-
-            # Суммируем все профили (или берём один)
-            for r in resource_keys:
-                total = sum(last_known[p][r] for p in profiles_to_check)
-                resources[r].append(total)
-
-        return {"timestamps": timestamps, "resources": resources}
-
-    def get_daily_earnings(profiles_to_check):
-        """Вычисляет заработок по дням (разница между последним и первым снэпшотом каждого дня)"""
-        from collections import defaultdict
-        from datetime import timedelta
-
-        all_snapshots = []
-
-        for p in profiles_to_check:
-            history = get_history(hours, p)
-            for snap in history:
-                all_snapshots.append({
-                    'profile': p,
-                    'timestamp': snap['timestamp'],
-                    'resources': snap['resources']
-                })
-
-        if not all_snapshots:
-            return {"timestamps": [], "resources": {r: [] for r in resource_keys}}
-
-        # Группируем снэпшоты по дате и профилю
-        # Сохраняем первый и последний снэпшот каждого дня для каждого профиля
-        daily_snapshots = defaultdict(lambda: defaultdict(lambda: {'first': None, 'last': None}))
-
-        for snap in all_snapshots:
-            try:
-                ts = snap['timestamp'].replace('+03:00', '').replace('Z', '')
-                dt = datetime.fromisoformat(ts)
-                date_key = dt.date()
-                profile_name = snap['profile']
-
-                current = daily_snapshots[date_key][profile_name]
-
-                # Первый снэпшот дня
-                if current['first'] is None:
-                    current['first'] = {'dt': dt, 'resources': snap['resources']}
-                elif dt < current['first']['dt']:
-                    current['first'] = {'dt': dt, 'resources': snap['resources']}
-
-                # Последний снэпшот дня
-                if current['last'] is None:
-                    current['last'] = {'dt': dt, 'resources': snap['resources']}
-                elif dt > current['last']['dt']:
-                    current['last'] = {'dt': dt, 'resources': snap['resources']}
-            except Exception:
-                continue
-
-        if not daily_snapshots:
-            return {"timestamps": [], "resources": {r: [] for r in resource_keys}}
-
-        # Формируем результат - заработок за каждый день
-        timestamps = []
-        resources = {r: [] for r in resource_keys}
-
-        for date_key in sorted(daily_snapshots.keys()):
-            dt = datetime(date_key.year, date_key.month, date_key.day, 12, 0, 0)
-            timestamps.append(dt.isoformat() + '+03:00')
-
-            # Суммируем заработок по всем профилям за этот день
-            daily_earnings = {r: 0 for r in resource_keys}
-
-            for profile_name in profiles_to_check:
-                if profile_name in daily_snapshots[date_key]:
-                    snap_data = daily_snapshots[date_key][profile_name]
-                    if snap_data['first'] and snap_data['last']:
-                        first_res = snap_data['first']['resources']
-                        last_res = snap_data['last']['resources']
-                        for r in resource_keys:
-                            earned = last_res.get(r, 0) - first_res.get(r, 0)
-                            daily_earnings[r] += earned
-
-            for r in resource_keys:
-                resources[r].append(daily_earnings[r])
-
-        return {"timestamps": timestamps, "resources": resources}
-
-    # Режим по дням
-    if mode == "days":
-        if profile == "all":
-            profiles_to_check = list(PROFILE_NAMES.keys())
-        else:
-            if profile not in PROFILE_NAMES:
-                return jsonify({"success": False, "error": "Profile not found"})
-            profiles_to_check = [profile]
-
-        data = get_daily_data(profiles_to_check)
-        return jsonify({"success": True, "data": data})
-
-    # Режим заработка по дням
-    if mode == "earnings":
-        if profile == "all":
-            profiles_to_check = list(PROFILE_NAMES.keys())
-        else:
-            if profile not in PROFILE_NAMES:
-                return jsonify({"success": False, "error": "Profile not found"})
-            profiles_to_check = [profile]
-
-        data = get_daily_earnings(profiles_to_check)
-        return jsonify({"success": True, "data": data})
-
-    # Если "all" - суммируем ресурсы всех профилей
     if profile == "all":
-        # Собираем последние данные каждого профиля
-        # Для "all" показываем суммарные ресурсы на каждый уникальный момент времени
-        all_data = []
-
-        for p in PROFILE_NAMES.keys():
-            history = get_history(hours, p)
-            for snap in history:
-                all_data.append({
-                    'profile': p,
-                    'timestamp': snap['timestamp'],
-                    'timestamp_rounded': round_timestamp_to_minute(snap['timestamp']),
-                    'resources': snap['resources']
-                })
-
-        if not all_data:
-            return jsonify({"success": True, "data": {"timestamps": [], "resources": {r: [] for r in resource_keys}}})
-
-        # Группируем по округлённому времени
-        from collections import defaultdict
-        grouped = defaultdict(dict)
-
-        for item in sorted(all_data, key=lambda x: x['timestamp']):
-            ts_rounded = item['timestamp_rounded']
-            grouped[ts_rounded][item['profile']] = item['resources']
-
-        # Формируем результат - для каждого момента времени суммируем ресурсы всех профилей
-        timestamps = []
-        resources = {r: [] for r in resource_keys}
-        last_known = {p: {r: 0 for r in resource_keys} for p in PROFILE_NAMES.keys()}
-
-        for ts_rounded in sorted(grouped.keys()):
-            # Обновляем last_known для профилей с данными в этот момент
-            for p, res_data in grouped[ts_rounded].items():
-                for r in resource_keys:
-                    last_known[p][r] = res_data.get(r, 0)
-
-            # Суммируем все профили
-            timestamps.append(ts_rounded)
-            for r in resource_keys:
-                total = sum(last_known[p][r] for p in PROFILE_NAMES.keys())
-                resources[r].append(total)
-
-        return jsonify({
-            "success": True,
-            "data": {
-                "timestamps": timestamps,
-                "resources": resources
-            }
-        })
+        profiles_to_check = list(PROFILE_NAMES.keys())
     else:
-        # Один профиль
         if profile not in PROFILE_NAMES:
             return jsonify({"success": False, "error": "Profile not found"})
+        profiles_to_check = [profile]
 
-        history = get_history(hours, profile)
+    if mode == "days":
+        # Ресурсы на начало каждого дня
+        data = chart_analytics.daily_totals(profiles_to_check, hours)
+    elif mode == "earnings":
+        # Заработок по дням
+        data = chart_analytics.daily_earnings(profiles_to_check, hours)
+    else:
+        # По минутам ("all" - сумма ресурсов всех профилей)
+        data = chart_analytics.minute_totals(profiles_to_check, hours)
 
-        timestamps = []
-        resources = {r: [] for r in resource_keys}
-
-        for snap in sorted(history, key=lambda x: x['timestamp']):
-            timestamps.append(add_timezone(snap['timestamp']))
-            for res in resource_keys:
-                resources[res].append(snap['resources'].get(res, 0))
-
-        return jsonify({
-            "success": True,
-            "data": {
-                "timestamps": timestamps,
-                "resources": resources
-            }
-        })
+    return jsonify({"success": True, "data": data})
 
 
 @app.route("/api/stats/sessions/<profile>")
@@ -2656,16 +2441,8 @@ def api_stats_sessions(profile):
 
     if profile == "all":
         # Все сессии со всех профилей
-        all_sessions = []
-        for p in PROFILE_NAMES.keys():
-            sessions = get_sessions(limit, p)
-            for s in sessions:
-                s['profile'] = p
-                all_sessions.append(s)
-
-        # Сортируем по времени старта
-        all_sessions.sort(key=lambda x: x['start_time'], reverse=True)
-        return jsonify({"success": True, "sessions": all_sessions[:limit]})
+        all_sessions = fleet_history.sessions(list(PROFILE_NAMES.keys()), limit)
+        return jsonify({"success": True, "sessions": all_sessions})
     else:
         if profile not in PROFILE_NAMES:
             return jsonify({"success": False, "error": "Profile not found"})
@@ -2691,23 +2468,12 @@ def api_stats_summary(profile):
 
     if profile == "all":
         # Суммируем изменения по всем профилям
-        for p in PROFILE_NAMES.keys():
-            history = get_history(hours, p)
-            if len(history) >= 2:
-                first = history[0]['resources']
-                last = history[-1]['resources']
-                for res in resources:
-                    summary[res] += (last.get(res, 0) - first.get(res, 0))
+        summary.update(fleet_history.period_change(list(PROFILE_NAMES.keys()), hours))
     else:
         if profile not in PROFILE_NAMES:
             return jsonify({"success": False, "error": "Profile not found"})
 
-        history = get_history(hours, profile)
-        if len(history) >= 2:
-            first = history[0]['resources']
-            last = history[-1]['resources']
-            for res in resources:
-                summary[res] = last.get(res, 0) - first.get(res, 0)
+        summary.update(fleet_history.period_change([profile], hours))
 
     return jsonify({"success": True, "summary": summary})
 
@@ -2727,17 +2493,45 @@ def gold_transfer_page():
 @login_required
 def api_gold_balances():
     """
-    GET /api/gold_balances
-    Получает балансы золота всех профилей
+    GET /api/gold_balances[?refresh=1]
+    Получает балансы золота всех профилей (refresh=1 — мимо кэша)
     """
     try:
         from .gold_transfer import get_balances
-        balances = get_balances()
+        balances = get_balances(use_cache=request.args.get("refresh") != "1")
         return jsonify({"success": True, "balances": balances})
     except Exception as e:
         return jsonify({"success": False, "error": str(e)})
 
 
+@app.route("/api/gold_balances/stream")
+@login_required
+def api_gold_balances_stream():
+    """SSE endpoint: балансы профилей по мере опроса (refresh=1 — мимо кэша)"""
+    from flask import Response
+    from .gold_transfer import stream_balances
+
+    use_cache = request.args.get("refresh") != "1"
+
+    def generate():
+        try:
+            for profile, info in stream_balances(use_cache=use_cache):
+                yield f"data: {json.dumps({'profile': profile, 'balance': info}, ensure_ascii=False)}\n\n"
+        except Exception as e:
+            yield f"data: {json.dumps({'error': str(e)}, ensure_ascii=False)}\n\n"
+        yield f"data: {{\"done\": true}}\n\n"
+
+    return Response(
+        generate(),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'Connection': 'keep-alive',
+            'X-Accel-Buffering': 'no'  # Для nginx
+        }
+    )
+
+
 # Глобальное состояние асинхронного трансфера. В рамках одного процесса
 # web_panel допускается один трансфер за раз — этого достаточно для всех
 # реалистичных сценариев и убирает таймаут UI на длинных операциях.
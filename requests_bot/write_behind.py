@@ -0,0 +1,224 @@
+# ============================================
+# VMMO Write-Behind - отложенная запись JSON-файлов бота
+# ============================================
+# stats.json и resources.json раньше переписывались целиком на КАЖДОЕ
+# событие (этап, смерть, аукцион, разбор, обновление ресурсов) — десятки
+# json.dump(indent=2) за данж.
+#
+# Теперь документ живёт в памяти: правка помечает его грязным, на диск он
+# уходит не чаще раза в FLUSH_INTERVAL секунд — фоновым потоком или на
+# границе цикла бота (flush_due), — и обязательно при выходе (atexit,
+# SIGTERM/SIGHUP). Запись атомарная (временный файл + os.replace). При
+# падении теряется не больше FLUSH_INTERVAL последних изменений.
+#
+# Файлы, которые правят и снаружи (resources.json — compensate_transfer из
+# панели/TG), открываются с merge: если файл изменился на диске, при
+# следующем обращении/записи наши изменения накладываются на дисковую
+# версию, а не затирают её.
+# ============================================
+
+import atexit
+import json
+import os
+import signal
+import threading
+import time
+from contextlib import contextmanager
+
+from requests_bot.cache.file_cache import atomic_write_json, _file_sig
+
+# Как часто (сек) грязные документы сбрасываются на диск
+FLUSH_INTERVAL = 60
+
+_docs = {}                 # path -> WriteBehindFile
+_docs_lock = threading.Lock()
+_flusher = None
+_flusher_stop = threading.Event()
+
+
+class WriteBehindFile:
+    """
+    JSON-документ в памяти с отложенной записью.
+
+    Менять данные — только внутри edit() (держит блокировку от фонового
+    сброса и помечает документ грязным).
+    """
+
+    def __init__(self, path, default=dict, merge=None, name="WB", indent=2):
+        """
+        Args:
+            path: путь к файлу
+            default: фабрика документа, если файла нет/он битый
+            merge: merge(disk_doc, mem_doc) -> doc, если файл правят и снаружи
+                   (None — файл пишет только этот процесс)
+            name: тег для логов
+            indent: отступ JSON
+        """
+        self.path = path
+        self.default = default
+        self.merge = merge
+        self.name = name
+        self.indent = indent
+        self._data = None
+        self._sig = None
+        self._dirty = False
+        self._last_flush = time.time()
+        self._lock = threading.RLock()
+
+    def _read_disk(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"[{self.name}] Ошибка чтения {self.path}: {e}")
+            return None
+
+    def _sync(self):
+        """Подтягивает дисковую версию, если файл изменили снаружи."""
+        if self._data is None:
+            self._sig = _file_sig(self.path)
+            disk = self._read_disk()
+            self._data = disk if disk is not None else self.default()
+            return
+        if self.merge is None:
+            return
+        sig = _file_sig(self.path)
+        if sig == self._sig or sig is None:
+            return
+        disk = self._read_disk()
+        self._sig = sig
+        if disk is None:
+            return
+        self._data = self.merge(disk, self._data) if self._dirty else disk
+
+    @property
+    def data(self):
+        """Документ (только чтение; для правок — edit())."""
+        with self._lock:
+            self._sync()
+            return self._data
+
+    @contextmanager
+    def edit(self):
+        """with doc.edit() as data: ... — правка с отложенной записью."""
+        with self._lock:
+            self._sync()
+            yield self._data
+            self._dirty = True
+        _ensure_flusher()
+
+    def replace(self, data):
+        """Подменяет документ целиком (с отложенной записью)."""
+        with self._lock:
+            self._sync()
+            self._data = data
+            self._dirty = True
+        _ensure_flusher()
+
+    @property
+    def dirty(self):
+        return self._dirty
+
+    def flush(self):
+        """
+        Пишет документ на диск, если он грязный.
+
+        Returns:
+            bool: False при ошибке записи (документ остаётся грязным)
+        """
+        with self._lock:
+            if not self._dirty:
+                return True
+            self._sync()
+            try:
+                atomic_write_json(self.path, self._data, self.indent)
+            except Exception as e:
+                print(f"[{self.name}] Ошибка сохранения: {e}")
+                return False
+            self._sig = _file_sig(self.path)
+            self._dirty = False
+            self._last_flush = time.time()
+            return True
+
+    def flush_if_due(self, interval=None):
+        """Сбрасывает документ, если он грязный дольше interval."""
+        interval = FLUSH_INTERVAL if interval is None else interval
+        if self._dirty and time.time() - self._last_flush >= interval:
+            return self.flush()
+        return True
+
+
+def document(path, default=dict, merge=None, name="WB", indent=2) -> WriteBehindFile:
+    """Документ для пути (один на процесс; параметры — при первом вызове)."""
+    path = os.path.abspath(path)
+    with _docs_lock:
+        doc = _docs.get(path)
+        if doc is None:
+            doc = WriteBehindFile(path, default, merge, name, indent)
+            _docs[path] = doc
+        return doc
+
+
+def flush_all():
+    """Сбрасывает все грязные документы (выход, конец сессии)."""
+    with _docs_lock:
+        docs = list(_docs.values())
+    for doc in docs:
+        doc.flush()
+
+
+def flush_due(interval=None):
+    """Сбрасывает документы, грязные дольше interval (граница цикла бота)."""
+    with _docs_lock:
+        docs = list(_docs.values())
+    for doc in docs:
+        doc.flush_if_due(interval)
+
+
+def _flusher_loop():
+    while not _flusher_stop.wait(FLUSH_INTERVAL / 2):
+        try:
+            flush_due()
+        except Exception as e:
+            print(f"[WB] Ошибка фонового сохранения: {e}")
+
+
+def _ensure_flusher():
+    global _flusher
+    if _flusher is not None and _flusher.is_alive():
+        return
+    with _docs_lock:
+        if _flusher is None or not _flusher.is_alive():
+            _flusher = threading.Thread(target=_flusher_loop, name="write-behind", daemon=True)
+            _flusher.start()
+
+
+def install_signal_handlers(signals=("SIGTERM", "SIGHUP")):
+    """
+    Сброс на диск перед завершением по сигналу (панель/TG останавливают
+    бота через SIGTERM — atexit при этом не срабатывает).
+
+    После сброса вызывается прежний обработчик, а если его не было —
+    сигнал повторяется с обработчиком по умолчанию (процесс завершается
+    как и раньше). Вызывать из главного потока.
+    """
+    for sig_name in signals:
+        signum = getattr(signal, sig_name, None)
+        if signum is None:
+            continue
+        previous = signal.getsignal(signum)
+
+        def handler(num, frame, previous=previous):
+            flush_all()
+            if callable(previous):
+                previous(num, frame)
+            elif previous != signal.SIG_IGN:
+                signal.signal(num, signal.SIG_DFL)
+                os.kill(os.getpid(), num)
+
+        signal.signal(signum, handler)
+
+
+atexit.register(flush_all)